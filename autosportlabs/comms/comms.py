@@ -21,8 +21,9 @@
 import traceback
 import threading
 import multiprocessing
+from collections import deque
 from Queue import Empty
-from time import sleep
+from time import sleep, time
 from kivy.logger import Logger
 from autosportlabs.comms.commscommon import PortNotOpenException
 
@@ -30,14 +31,20 @@ STAY_ALIVE_TIMEOUT = 4
 COMMAND_CLOSE = 'CLOSE'
 COMMAND_KEEP_ALIVE = 'PING'
 
+# Where the connection I/O runs; see serial_comm() in commsfactory
+TRANSPORT_PROCESS = 'process'
+TRANSPORT_IN_PROCESS = 'inprocess'
+TRANSPORTS = [TRANSPORT_PROCESS, TRANSPORT_IN_PROCESS]
+
 def connection_process_message_reader(rx_queue, connection, should_run):
     Logger.debug('Comms: connection process message reader started')
 
     while should_run.is_set():
         try:
-            msg = connection.read_line()
-            if msg:
-                rx_queue.put(msg)
+            # transfer every line received so far in one queue operation
+            msgs = connection.read_lines()
+            if msgs:
+                rx_queue.put(msgs)
         except:
             Logger.error('Comms: Exception in connection_process_message_reader')
             Logger.debug(traceback.format_exc())
@@ -121,6 +128,8 @@ class Comms():
         self.device = device
         self._connection = connection
         self.supports_streaming = False
+        # messages from the last batch received, not yet read
+        self._rx_pending = deque()
 
     def start_connection_process(self):
         rx_queue = multiprocessing.Queue()
@@ -129,6 +138,7 @@ class Comms():
         connection_process = multiprocessing.Process(target=connection_message_process, args=(self._connection, self.device, rx_queue, tx_queue, command_queue))
         connection_process.start()
         self._rx_queue = rx_queue
+        self._rx_pending.clear()
         self._tx_queue = tx_queue
         self._command_queue = command_queue
         self._connection_process = connection_process
@@ -136,6 +146,13 @@ class Comms():
     def get_available_devices(self):
         return self._connection.get_available_devices()
 
+    def create_probe_connection(self):
+        """
+        Create a new, unopened connection of the same type, used to probe
+        devices independently of this comms
+        """
+        return self._connection.__class__()
+
     def isOpen(self):
         return self._connection_process != None and self._connection_process.is_alive()
 
@@ -162,12 +179,15 @@ class Comms():
                 Logger.error('Comms: Timeout joining connection process')
 
     def read_message(self):
-        if not self.isOpen():
-            raise PortNotOpenException('Port Closed')
-        try:
-            return self._rx_queue.get(True, self._timeout)
-        except:  # returns Empty object if timeout is hit
-            return None
+        pending = self._rx_pending
+        if not pending:
+            if not self.isOpen():
+                raise PortNotOpenException('Port Closed')
+            try:
+                pending.extend(self._rx_queue.get(True, self._timeout))
+            except:  # returns Empty object if timeout is hit
+                return None
+        return pending.popleft()
 
     def write_message(self, message):
         if not self.isOpen(): raise PortNotOpenException('Port Closed')
@@ -178,3 +198,77 @@ class Comms():
         :return: False
         """
         return False
+
+
+class InProcessComms(Comms):
+    """
+    Comms that perform the connection I/O in this process, on the calling
+    threads: read_message() reads from the connection on the caller's
+    (receive) thread and write_message() writes on the caller's thread. There
+    are no helper threads or queues, so a message is never copied between
+    processes or handed between threads.
+
+    As with the connection process, the connection is closed if keep_alive()
+    is not called for STAY_ALIVE_TIMEOUT seconds.
+    """
+
+    def __init__(self, device, connection):
+        Comms.__init__(self, device, connection)
+        self._write_lock = threading.RLock()
+        self._is_open = False
+        self._last_keep_alive = 0
+
+    def start_connection_process(self):
+        connection = self._connection
+        self._rx_pending.clear()
+        connection.open(self.device)
+        connection.flushInput()
+        connection.flushOutput()
+        self._last_keep_alive = time()
+        self._is_open = True
+
+    def isOpen(self):
+        if self._is_open and time() - self._last_keep_alive > STAY_ALIVE_TIMEOUT:
+            Logger.debug('Comms: keep alive timeout')
+            self.close()
+        return self._is_open
+
+    def keep_alive(self):
+        self._last_keep_alive = time()
+
+    def close(self):
+        Logger.debug('Comms: comms.close()')
+        with self._write_lock:
+            if self._is_open:
+                self._is_open = False
+                try:
+                    self._connection.close()
+                except:
+                    Logger.debug('Comms: Exception closing connection')
+                    Logger.debug(traceback.format_exc())
+
+    def read_message(self):
+        pending = self._rx_pending
+        if not pending:
+            if not self.isOpen():
+                raise PortNotOpenException('Port Closed')
+            try:
+                pending.extend(self._connection.read_lines())
+            except:
+                if self._is_open:
+                    Logger.error('Comms: Exception reading from connection')
+                    Logger.debug(traceback.format_exc())
+                    self.close()
+                return None
+            if not pending:
+                return None
+        return pending.popleft()
+
+    def write_message(self, message):
+        with self._write_lock:
+            if not self.isOpen(): raise PortNotOpenException('Port Closed')
+            try:
+                self._connection.write(message)
+            except:
+                self.close()
+                raise
@@ -23,7 +23,16 @@ from kivy import platform
 __all__ = 'comms_factory'
 
 
-def comms_factory(device, conn_type):
+def comms_factory(device, conn_type, transport=None):
+    """
+    Create the comms for a connection type
+    :param device: the device to connect to, or None to auto detect
+    :param conn_type: the connection type, or None for the platform default
+    :param transport: for serial comms, where the connection I/O runs: in a
+    separate process (comms.TRANSPORT_PROCESS, the default) or on the calling
+    threads (comms.TRANSPORT_IN_PROCESS)
+    :return: the comms
+    """
     # Connection type can be overridden by user or for testing purposes
     if conn_type is not None:
         conn_type = conn_type.lower()
@@ -32,14 +41,14 @@ def comms_factory(device, conn_type):
         if conn_type == 'wifi':
             return socket_comm(device)
         if conn_type == 'serial':
-            return serial_comm(device)
+            return serial_comm(device, transport)
     else:
         if platform == 'android':
             return android_comm(device)
         elif platform == 'ios':
             return socket_comm(device)
         else:
-            return serial_comm(device)
+            return serial_comm(device, transport)
 
 
 def socket_comm(device):
@@ -48,9 +57,11 @@ def socket_comm(device):
     return SocketComm(SocketConnection(), device)
 
 
-def serial_comm(device):
+def serial_comm(device, transport=None):
     from autosportlabs.comms.serial.serialconnection import SerialConnection
-    from autosportlabs.comms.comms import Comms
+    from autosportlabs.comms.comms import Comms, InProcessComms, TRANSPORT_IN_PROCESS
+    if transport == TRANSPORT_IN_PROCESS:
+        return InProcessComms(device, SerialConnection())
     return Comms(device, SerialConnection())
 
 
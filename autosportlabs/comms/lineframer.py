@@ -0,0 +1,131 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+
+class LineFramer(object):
+    """
+    Splits a byte stream into delimited messages.
+
+    Received data is written into a reusable buffer, either directly by a
+    recv_into style function or by copying in a chunk with feed(). Only
+    newly received data is scanned for the delimiter, and unconsumed data is
+    moved to the front of the buffer only when the buffer runs out of room.
+    Empty messages are skipped.
+    """
+    DELIMITER = b'\r\n'
+    DEFAULT_BUFFER_SIZE = 16384
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE):
+        self._buffer = bytearray(buffer_size)
+        # unconsumed data is _buffer[_start:_end]; _scan is where the
+        # delimiter search resumes
+        self._start = 0
+        self._end = 0
+        self._scan = 0
+
+    @property
+    def buffered(self):
+        """
+        The number of bytes received but not yet returned as a message
+        """
+        return self._end - self._start
+
+    def clear(self):
+        self._start = self._end = self._scan = 0
+
+    def _reserve(self, count):
+        """
+        Ensure there is room for at least count bytes after the buffered data
+        """
+        buf = self._buffer
+        if len(buf) - self._end >= count:
+            return
+        pending = self._end - self._start
+        if self._start > 0:
+            buf[0:pending] = buf[self._start:self._end]
+            self._scan -= self._start
+            self._start = 0
+            self._end = pending
+        if len(buf) - pending < count:
+            # a message larger than the buffer; grow it
+            buf.extend(bytearray(max(len(buf), count)))
+
+    def recv_into(self, recv_into, size=None):
+        """
+        Receive data directly into the buffer
+        :param recv_into: function taking a writable buffer, such as
+        socket.recv_into, returning the number of bytes received
+        :type recv_into: function
+        :param size: the most bytes to receive; defaults to the free space
+        :type size: int
+        :return: the number of bytes received
+        """
+        self._reserve(size or 1)
+        end = self._end
+        view = memoryview(self._buffer)[end:end + size] if size else memoryview(self._buffer)[end:]
+        count = recv_into(view)
+        self._end += count
+        return count
+
+    def feed(self, data):
+        """
+        Add received data to the buffer
+        :param data: the received bytes
+        :type data: str
+        """
+        count = len(data)
+        if count == 0:
+            return
+        self._reserve(count)
+        self._buffer[self._end:self._end + count] = data
+        self._end += count
+
+    def next_message(self):
+        """
+        Return the next complete message, without its delimiter
+        :return: str, or None if no complete message is buffered
+        """
+        buf = self._buffer
+        delimiter = self.DELIMITER
+        while True:
+            # the delimiter may straddle the previous scan position
+            index = buf.find(delimiter, max(self._start, self._scan - 1), self._end)
+            if index < 0:
+                self._scan = self._end
+                return None
+            start = self._start
+            self._start = self._scan = index + len(delimiter)
+            if self._start == self._end:
+                # everything consumed; reuse the buffer from the front
+                self._start = self._end = self._scan = 0
+            if index > start:
+                return str(buf[start:index])
+
+    def messages(self):
+        """
+        Return all complete messages
+        :return: list of str
+        """
+        messages = []
+        while True:
+            message = self.next_message()
+            if message is None:
+                return messages
+            messages.append(message)
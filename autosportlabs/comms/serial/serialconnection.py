@@ -22,6 +22,7 @@ import serial
 from serial import SerialException
 from serial.tools import list_ports
 from autosportlabs.comms.commscommon import PortNotOpenException, CommsErrorException
+from autosportlabs.comms.lineframer import LineFramer
 from kivy.logger import Logger
 
 
@@ -34,7 +35,7 @@ class SerialConnection():
     ser = None
 
     def __init__(self, **kwargs):
-        pass
+        self._framer = LineFramer()
 
     def get_available_devices(self):
         Logger.debug("SerialConnection: getting available devices")
@@ -50,6 +51,7 @@ class SerialConnection():
         return self.ser != None
 
     def open(self, device):
+        self._framer.clear()
         self.ser = serial.Serial(device, timeout=self.timeout, write_timeout=self.writeTimeout)
 
     def close(self):
@@ -68,16 +70,39 @@ class SerialConnection():
             else:
                 raise
 
+    def _read_available(self):
+        """
+        Wait up to the read timeout for data, then buffer everything available
+        :return: False if no data arrived
+        """
+        data = self.read(1)
+        if data == '':
+            return False
+        waiting = self.ser.in_waiting
+        if waiting > 0:
+            data += self.read(waiting)
+        self._framer.feed(data)
+        return True
+
+    def read_lines(self):
+        """
+        Read the available data, waiting up to the read timeout for a complete line
+        :return: list of the complete lines received, without line endings
+        """
+        messages = self._framer.messages()
+        while len(messages) == 0 and self._read_available():
+            messages = self._framer.messages()
+        return messages
+
     def read_line(self):
-        msg = ''
-        while True:
-            c = self.read(1)
-            if c == '':
-                return None
-            msg += c
-            if msg[-2:] == '\r\n':
-                msg = msg[:-2]
-                return msg
+        """
+        Read a single line, waiting up to the read timeout for data
+        :return: the line without its line ending, or None if none was received
+        """
+        msg = self._framer.next_message()
+        while msg is None and self._read_available():
+            msg = self._framer.next_message()
+        return msg
 
     def write(self, data):
         try:
@@ -21,6 +21,7 @@
 from kivy.logger import Logger
 import threading
 import Queue
+from collections import deque
 from Queue import Empty
 from time import sleep
 import traceback
@@ -59,6 +60,8 @@ class SocketComm(object):
         self.device = device
         self._connection = connection
         self.supports_streaming = False
+        # messages from the last batch received, not yet read
+        self._rx_pending = deque()
         Logger.info('SocketComm: init')
 
     def start_connection_process(self):
@@ -73,6 +76,7 @@ class SocketComm(object):
                                                                                            tx_queue, command_queue))
         connection_thread.start()
         self._rx_queue = rx_queue
+        self._rx_pending.clear()
         self._tx_queue = tx_queue
         self._command_queue = command_queue
         self._connection_process = connection_thread
@@ -120,15 +124,19 @@ class SocketComm(object):
                 Logger.debug('SocketComm: Timeout joining connection process')
 
     def read_message(self):
-        """Reads a message from the RX queue and returns it
+        """Reads a message from the RX queue and returns it. Messages are queued in batches; the rest of a
+        batch is returned by subsequent calls
         :return: String or None
         """
-        if not self.isOpen():
-            raise PortNotOpenException('Port Closed')
-        try:
-            return self._rx_queue.get(True, self._timeout)
-        except:  # returns Empty object if timeout is hit
-            return None
+        pending = self._rx_pending
+        if not pending:
+            if not self.isOpen():
+                raise PortNotOpenException('Port Closed')
+            try:
+                pending.extend(self._rx_queue.get(True, self._timeout))
+            except:  # returns Empty object if timeout is hit
+                return None
+        return pending.popleft()
 
     def write_message(self, message):
         """Writes a message to the TX queue, which is then written by the tx thread
@@ -147,7 +155,7 @@ class SocketComm(object):
         """This method is designed to be run in a thread, it will loop infinitely as long as should_run.is_set()
         returns True. In its loop it will attempt to read data from the socket connection
 
-        :param rx_queue Queue for pushing data read from the socket onto
+        :param rx_queue Queue for pushing lists of lines read from the socket onto
         :param connection Socket connection to read data from
         :param should_run Event to check on each loop to determine if to continue reading
         :type rx_queue threading.Queue
@@ -159,9 +167,10 @@ class SocketComm(object):
 
         while should_run.is_set():
             try:
-                msg = connection.read_line(should_run)
-                if msg:
-                    rx_queue.put(msg)
+                # transfer every line received so far in one queue operation
+                msgs = connection.read_lines(should_run)
+                if msgs:
+                    rx_queue.put(msgs)
             except:
                 Logger.error('SocketComm: Exception in connection_process_message_reader')
                 Logger.debug(traceback.format_exc())
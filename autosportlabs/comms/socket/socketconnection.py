@@ -22,6 +22,7 @@ from kivy.logger import Logger
 import socket
 import json
 import errno
+from autosportlabs.comms.lineframer import LineFramer
 
 READ_TIMEOUT = 2
 SCAN_TIMEOUT = 3
@@ -33,12 +34,18 @@ class InvalidAddressException(Exception):
 
 
 class SocketConnection(object):
-    MSG_RECEIVE_BUFFER_SIZE = 32
+    MSG_RECEIVE_BUFFER_SIZE = 4096
     BEACON_RECEIVE_BUFFER_SIZE = 4096
     PORT = 7223
-    def __init__(self):
+    def __init__(self, port=PORT):
+        """
+        Initializer.
+        :param port: the TCP port of the device
+        :type port: int
+        """
+        self.port = port
         self.socket = None
-        self._data = ''
+        self._framer = LineFramer()
 
     def get_available_devices(self):
         """
@@ -89,7 +96,7 @@ class SocketConnection(object):
             raise InvalidAddressException("{} is not a valid IP address".format(address))
 
         # Connect to ip address here
-        rc_address = (address, SocketConnection.PORT)
+        rc_address = (address, self.port)
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.settimeout(READ_TIMEOUT)
         self.socket.connect(rc_address)
@@ -102,36 +109,20 @@ class SocketConnection(object):
         if self.socket is not None:
             self.socket.close()
         self.socket = None
-        self._data = ''
+        self._framer.clear()
 
-    def read_line(self, keep_reading):
+    def _read_available(self, keep_reading):
         """
-        Reads data from the socket. Will continue to read until either "\r\n" is found in the data read from the
-        socket or keep_reading.is_set() returns false
-        :param keep_reading: Event object that is checked while data is read
-        :type keep_reading: threading.Event
-        :return: String or None
+        Receive data into the framer, retrying on timeouts while keep_reading.is_set()
+        :return: False if the connection was closed by the device or reading was stopped
         """
-
         timeout_count = 0
         max_timeouts = 3
 
         while keep_reading.is_set():
             try:
-                data = self.socket.recv(SocketConnection.MSG_RECEIVE_BUFFER_SIZE)
-
-                if data == '':
-                    return None
-
-                self._data += data
-
-                if '\r\n' in self._data:
-                    lines = self._data.split('\r\n', 1)
-                    msg = lines[0]
-                    self._data = lines[1]
-
-                    Logger.debug("SocketConnection: returning data {}".format(msg))
-                    return msg
+                count = self._framer.recv_into(self.socket.recv_into, SocketConnection.MSG_RECEIVE_BUFFER_SIZE)
+                return count > 0
 
             except socket.timeout:
                 Logger.error("SocketConnection: timeout")
@@ -149,6 +140,33 @@ class SocketConnection(object):
                     self.close()
                     raise
                 Logger.error("SocketConnection: error: {}".format(e))
+        return False
+
+    def read_lines(self, keep_reading):
+        """
+        Reads data from the socket until at least one complete line has been received, or keep_reading.is_set()
+        returns false
+        :param keep_reading: Event object that is checked while data is read
+        :type keep_reading: threading.Event
+        :return: list of the complete lines received, without line endings
+        """
+        messages = self._framer.messages()
+        while len(messages) == 0 and self._read_available(keep_reading):
+            messages = self._framer.messages()
+        return messages
+
+    def read_line(self, keep_reading):
+        """
+        Reads data from the socket. Will continue to read until either "\r\n" is found in the data read from the
+        socket or keep_reading.is_set() returns false
+        :param keep_reading: Event object that is checked while data is read
+        :type keep_reading: threading.Event
+        :return: String or None
+        """
+        msg = self._framer.next_message()
+        while msg is None and self._read_available(keep_reading):
+            msg = self._framer.next_message()
+        return msg
 
     def write(self, data):
         """
@@ -0,0 +1,211 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import traceback
+from threading import Thread, Event, Lock, Semaphore
+from time import time
+from kivy.logger import Logger
+
+
+class DeviceProbeScores(object):
+    """
+    Remembers how recently each device answered a probe, so the devices
+    most likely to be a RaceCapture unit are probed first.
+
+    A device's score decays by DECAY every time it is probed without
+    answering, and gains 1 when it answers.
+    """
+    DECAY = 0.5
+    MIN_SCORE = 0.01
+
+    def __init__(self, scores=None):
+        self._scores = dict(scores) if scores else {}
+
+    def responded(self, device):
+        self._scores[device] = self._scores.get(device, 0) * self.DECAY + 1
+
+    def failed(self, device):
+        score = self._scores.get(device)
+        if score is not None:
+            score *= self.DECAY
+            if score < self.MIN_SCORE:
+                del self._scores[device]
+            else:
+                self._scores[device] = score
+
+    def score(self, device):
+        return self._scores.get(device, 0)
+
+    def order(self, devices):
+        """
+        Sort devices by descending score; unscored devices keep their order
+        :param devices: the devices to order
+        :type devices: list
+        :return: the ordered list
+        """
+        return sorted(devices, key=lambda device: -self.score(device))
+
+    def to_json(self):
+        return json.dumps(self._scores, sort_keys=True)
+
+    @staticmethod
+    def from_json(scores_json):
+        try:
+            scores = json.loads(scores_json) if scores_json else {}
+            return DeviceProbeScores({str(k): float(v) for k, v in scores.iteritems()})
+        except (ValueError, TypeError, AttributeError):
+            Logger.warn('DeviceProbeScores: ignoring invalid scores: {}'.format(scores_json))
+            return DeviceProbeScores()
+
+
+class DeviceProbeResult(object):
+
+    def __init__(self, device, version_json, elapsed):
+        self.device = device
+        self.version_json = version_json
+        self.elapsed = elapsed
+
+
+class DeviceProber(object):
+    """
+    Probes candidate devices in parallel, each over its own connection, by
+    sending getVer and waiting for a valid version reply. The first device
+    to reply wins; the remaining probes are cancelled and every probe
+    connection is closed before probe() returns, leaving the winning device
+    free to be opened by the comms.
+    """
+    DEFAULT_PROBE_TIMEOUT = 1.5
+    DEFAULT_MAX_PARALLEL = 8
+    READ_TIMEOUT = 0.1
+    COMMAND_DELIMITER = '\r\n'
+    VERSION_COMMAND = json.dumps({'getVer': None}, separators=(',', ':')) + COMMAND_DELIMITER
+
+    def __init__(self, create_connection, is_valid_version,
+                 probe_timeout=DEFAULT_PROBE_TIMEOUT, max_parallel=DEFAULT_MAX_PARALLEL):
+        """
+        Initializer.
+        :param create_connection: returns a new, unopened connection
+        :type create_connection: function
+        :param is_valid_version: returns True if a 'ver' reply is from a supported device
+        :type is_valid_version: function
+        :param probe_timeout: how long to wait for each device to reply, in seconds
+        :type probe_timeout: float
+        :param max_parallel: the most devices to probe at once
+        :type max_parallel: int
+        """
+        self._create_connection = create_connection
+        self._is_valid_version = is_valid_version
+        self.probe_timeout = probe_timeout
+        self.max_parallel = max_parallel
+
+    def probe(self, devices, scores=None):
+        """
+        Probe the devices. When there are more than max_parallel devices,
+        they are probed in the order given.
+        :param devices: the candidate devices
+        :type devices: list
+        :param scores: updated with the outcome of each completed probe
+        :type scores: DeviceProbeScores
+        :return: DeviceProbeResult for the first device to reply, or None
+        """
+        if len(devices) == 0:
+            return None
+
+        start = time()
+        done = Event()
+        stop = Event()
+        lock = Lock()
+        slots = Semaphore(self.max_parallel)
+        state = {'result': None, 'remaining': len(devices)}
+
+        def finished(device, version_json, cancelled):
+            with lock:
+                if scores is not None:
+                    if version_json is not None:
+                        scores.responded(device)
+                    elif not cancelled:
+                        scores.failed(device)
+                if version_json is not None and state['result'] is None:
+                    state['result'] = DeviceProbeResult(device, version_json, time() - start)
+                    stop.set()
+                state['remaining'] -= 1
+                if state['remaining'] == 0 or stop.is_set():
+                    done.set()
+
+        def probe_worker(device):
+            version_json = None
+            with slots:
+                if not stop.is_set():
+                    version_json = self._probe_device(device, stop)
+            finished(device, version_json, stop.is_set())
+
+        threads = []
+        for device in devices:
+            t = Thread(target=probe_worker, args=(device,), name='DeviceProbe-{}'.format(device))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        # every device gets probe_timeout once a slot frees up for it
+        batches = (len(devices) + self.max_parallel - 1) // self.max_parallel
+        done.wait(self.probe_timeout * batches + 1)
+        stop.set()
+
+        # let the probes close their ports before the winner is opened again
+        for t in threads:
+            t.join(self.READ_TIMEOUT * 2)
+
+        result = state['result']
+        if result is not None:
+            Logger.info('DeviceProber: {} replied after {:.2f}s, {} devices probed'.format(result.device, result.elapsed, len(devices)))
+        return result
+
+    def _probe_device(self, device, stop):
+        """
+        Send getVer to a device and wait for a valid version reply
+        :return: the version json, or None
+        """
+        connection = self._create_connection()
+        # poll often so a cancelled probe releases its port promptly
+        connection.timeout = self.READ_TIMEOUT
+        try:
+            connection.open(device)
+            connection.flushInput()
+            connection.write(self.VERSION_COMMAND)
+            deadline = time() + self.probe_timeout
+            while not stop.is_set() and time() < deadline:
+                for line in connection.read_lines():
+                    try:
+                        msg = json.loads(line)
+                    except ValueError:
+                        continue
+                    version_json = msg.get('ver') if isinstance(msg, dict) else None
+                    if version_json is not None and self._is_valid_version(version_json):
+                        return msg
+        except Exception as e:
+            Logger.debug('DeviceProber: could not probe {}: {}'.format(device, e))
+            Logger.trace(traceback.format_exc())
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        return None
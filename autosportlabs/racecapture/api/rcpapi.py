@@ -22,12 +22,14 @@ import io
 import json
 import traceback
 import Queue
-from time import sleep
+from collections import deque
+from time import sleep, time
 from threading import Thread, RLock, Event
 from autosportlabs.racecapture.config.rcpconfig import *
 from autosportlabs.comms.commscommon import PortNotOpenException, CommsErrorException
 from autosportlabs.util.threadutil import safe_thread_exit, ThreadSafeDict
 from autosportlabs.racecapture.config.rcpconfig import Capabilities
+from autosportlabs.racecapture.api.deviceprobe import DeviceProber, DeviceProbeScores
 from functools import partial
 from kivy.clock import Clock
 from kivy.logger import Logger
@@ -46,9 +48,43 @@ AUTODETECT_COOLOFF_TIME = 1
 AUTODETECT_LEVEL2_RETRIES = 1
 DEFAULT_READ_RETRIES = 2
 
+# Number of sequence commands sent ahead of their replies; 1 sends them serially
+DEFAULT_PIPELINE_WINDOW = 4
+
 COMMS_KEEP_ALIVE_TIMEOUT = 2
 
 NO_DATA_AVAILABLE_DELAY = 0.1
+
+try:
+    import ujson
+    try:
+        # ujson 1.x parses floats imprecisely unless asked not to; 2.x is always precise
+        ujson.loads('0', precise_float=True)
+        _fast_json_loads = partial(ujson.loads, precise_float=True)
+    except TypeError:
+        _fast_json_loads = ujson.loads
+except ImportError:
+    _fast_json_loads = None
+
+
+def parse_message(msg):
+    """
+    Parse a received JSON message, using ujson when it is available.
+    Messages ujson rejects, such as ones with illegal characters, are
+    cleaned and parsed with the standard parser.
+    :param msg: the raw message
+    :type msg: str
+    :return: dict
+    """
+    if _fast_json_loads is not None:
+        try:
+            return _fast_json_loads(msg)
+        except ValueError:
+            pass
+    # clean incoming string, and drop illegal characters
+    msg = unicode(msg, errors='ignore')
+    return json.loads(msg, strict=False)
+
 class RcpCmd:
     name = None
     cmd = None
@@ -83,6 +119,9 @@ class RcpApi:
     on_rx = lambda self, value: None
     level_2_retries = DEFAULT_LEVEL2_RETRIES
     msg_rx_timeout = DEFAULT_MSG_RX_TIMEOUT
+    pipeline_window = DEFAULT_PIPELINE_WINDOW
+    # probe candidate devices in parallel, when the comms support it
+    parallel_probe = True
     _cmd_sequence_thread = None
     _auto_detect_worker = None
     _msg_rx_thread = None
@@ -102,6 +141,11 @@ class RcpApi:
         self._disconnect_listeners = []
         self._connect_listeners = []
         self.connected_version = None
+        # cleared if the connected device drops pipelined commands
+        self._pipeline_supported = True
+        # when auto detect started, until the first sample after connecting
+        self._detect_start_time = None
+        self._awaiting_first_sample = False
 
         if on_disconnect:
             self.add_disconnect_listener(on_disconnect)
@@ -200,13 +244,20 @@ class RcpApi:
             Logger.info(traceback.format_exc())
 
     def detect_win(self, version_info):
+        if self._detect_start_time is not None:
+            Logger.info('RCPAPI: device detected {:.2f}s after auto detect started'.format(time() - self._detect_start_time))
+            self._awaiting_first_sample = True
         self.level_2_retries = DEFAULT_LEVEL2_RETRIES
         self.msg_rx_timeout = DEFAULT_MSG_RX_TIMEOUT
+        self._pipeline_supported = True
         if self.detect_win_callback: self.detect_win_callback(version_info)
         self.connected_version = version_info
         self._notify_connect_listeners()
 
     def run_auto_detect(self):
+        if self._detect_start_time is None:
+            self._detect_start_time = time()
+        self._awaiting_first_sample = False
         self.level_2_retries = AUTODETECT_LEVEL2_RETRIES
         self.msg_rx_timeout = self.comms.CONNECT_TIMEOUT
         self._auto_detect_event.set()
@@ -234,12 +285,12 @@ class RcpApi:
             try:
                 msg = comms.read_message()
                 if msg:
-                    # clean incoming string, and drop illegal characters
-                    msg = unicode(msg, errors='ignore')
-                    msgJson = json.loads(msg, strict=False)
+                    msgJson = parse_message(msg)
 
                     if 's' in msgJson:
                         Logger.trace('RCPAPI: Rx: ' + str(msg))
+                        if self._awaiting_first_sample:
+                            self._log_time_to_first_sample()
                     else:
                         Logger.debug('RCPAPI: Rx: ' + str(msg))
                     Clock.schedule_once(lambda dt: self.on_rx(True))
@@ -279,6 +330,13 @@ class RcpApi:
         safe_thread_exit()
         Logger.info("RCPAPI: msg_rx_worker exiting")
 
+    def _log_time_to_first_sample(self):
+        self._awaiting_first_sample = False
+        start_time = self._detect_start_time
+        self._detect_start_time = None
+        if start_time is not None:
+            Logger.info('RCPAPI: first sample received {:.2f}s after auto detect started'.format(time() - start_time))
+
     def rcpCmdComplete(self, msgReply):
         self.cmdSequenceQueue.put(msgReply)
 
@@ -306,6 +364,162 @@ class RcpApi:
         command.failCallback = fail_callback
         self._command_queue.put(command)
 
+    def _send_rcp_cmd(self, rcpCmd):
+        args = []
+        if rcpCmd.payload is not None:
+            args.append(rcpCmd.payload)
+        if rcpCmd.index is not None:
+            args.append(rcpCmd.index)
+        if rcpCmd.option is not None:
+            args.append(rcpCmd.option)
+        if rcpCmd.last is not None:
+            args.append(rcpCmd.last)
+        rcpCmd.cmd(*args)
+
+    def _execute_serial(self, command_list, responseResults, on_complete):
+        """
+        Send each command and wait for its reply before sending the next,
+        retrying as needed. Raises an Exception if a command does not complete.
+        """
+        q = self.cmdSequenceQueue
+        for rcpCmd in command_list:
+            level2Retry = 0
+            name = rcpCmd.name
+            result = None
+
+            self.addListener(name, self.rcpCmdComplete)
+            while not result and level2Retry <= self.level_2_retries:
+                self._send_rcp_cmd(rcpCmd)
+                retry = 0
+                while not result and retry < DEFAULT_READ_RETRIES:
+                    try:
+                        result = q.get(True, self.msg_rx_timeout)
+                        msgName = result.keys()[0]
+                        if not msgName == name:
+                            Logger.warn('RCPAPI: rx message did not match expected name ' + str(name) + '; ' + str(msgName))
+                            result = None
+                    except Exception as e:
+                        Logger.warn('RCPAPI: Read message timeout waiting for {}'.format(name))
+                        self.recoverTimeout()
+                        retry += 1
+                if not result:
+                    Logger.warn('RCPAPI: Level 2 retry for (' + str(level2Retry) + ') ' + name)
+                    level2Retry += 1
+
+
+            if not result:
+                raise Exception('Timeout waiting for ' + name)
+
+
+            responseResults[name] = result[name]
+            self.removeListener(name, self.rcpCmdComplete)
+            on_complete()
+
+    def _execute_pipelined(self, command_list, responseResults, on_complete):
+        """
+        Send commands without waiting for each reply, keeping up to
+        pipeline_window commands in flight. The device replies in order, so a
+        reply is matched to the oldest in flight command of the same name.
+
+        If no reply arrives within msg_rx_timeout, the oldest command in
+        flight has failed and pipelining stops: the replies still outstanding
+        are discarded, so a late reply cannot complete a command sent after
+        them, and the index of the failed command is returned. Commands from
+        that one onward must be sent again, in order, since later commands
+        may have been applied before the failed one.
+        :return: the index of the first failed command, or None if every command completed
+        """
+        q = self.cmdSequenceQueue
+        window = self.pipeline_window
+        names = set(rcpCmd.name for rcpCmd in command_list)
+        to_send = deque(enumerate(command_list))
+        # (index, command) in the order sent
+        in_flight = []
+        completed = set()
+        # the index of the first command not yet completed; progress is
+        # reported in order, as the serial retry repeats commands after it
+        next_index = 0
+        for name in names:
+            self.addListener(name, self.rcpCmdComplete)
+        try:
+            last_activity = time()
+            while len(to_send) > 0 or len(in_flight) > 0:
+                while len(to_send) > 0 and len(in_flight) < window:
+                    index, rcpCmd = to_send.popleft()
+                    self._send_rcp_cmd(rcpCmd)
+                    in_flight.append((index, rcpCmd))
+                    if len(in_flight) == 1:
+                        last_activity = time()
+
+                try:
+                    wait = max(0, last_activity + self.msg_rx_timeout - time())
+                    result = q.get(True, wait)
+                except Queue.Empty:
+                    index, rcpCmd = in_flight[0]
+                    Logger.warn('RCPAPI: Pipelined read timeout waiting for {}'.format(rcpCmd.name))
+                    self._discard_replies(len(in_flight))
+                    return index
+
+                msgName = result.keys()[0]
+                for pending in in_flight:
+                    index, rcpCmd = pending
+                    if rcpCmd.name == msgName:
+                        in_flight.remove(pending)
+                        responseResults[msgName] = result[msgName]
+                        last_activity = time()
+                        completed.add(index)
+                        while next_index in completed:
+                            next_index += 1
+                            on_complete()
+                        break
+                else:
+                    Logger.warn('RCPAPI: rx message did not match a pending command; ' + str(msgName))
+        finally:
+            for name in names:
+                self.removeListener(name, self.rcpCmdComplete)
+            while not q.empty():
+                q.get_nowait()
+
+        return None
+
+    def _discard_replies(self, outstanding):
+        """
+        Wait for, and discard, the replies to commands still in flight, until
+        they have all arrived or none arrives within msg_rx_timeout
+        :param outstanding: the number of replies still expected
+        :type outstanding: int
+        """
+        q = self.cmdSequenceQueue
+        while outstanding > 0:
+            try:
+                result = q.get(True, self.msg_rx_timeout)
+                Logger.debug('RCPAPI: Discarding pipelined reply {}'.format(result.keys()[0]))
+                outstanding -= 1
+            except Queue.Empty:
+                break
+
+    def _execute_sequence(self, command_list, responseResults, on_complete):
+        """
+        Execute a command sequence, pipelining it when enabled and supported
+        by the device. The last command of the sequence, such as flashCfg, is
+        only sent once every other command has completed. When a pipelined
+        command fails, the sequence is sent serially from that command onward,
+        keeping the commands in their original order, and the connection falls
+        back to serial execution.
+        """
+        if self.pipeline_window <= 1 or not self._pipeline_supported or len(command_list) <= 2:
+            self._execute_serial(command_list, responseResults, on_complete)
+            return
+
+        failed_index = self._execute_pipelined(command_list[:-1], responseResults, on_complete)
+        if failed_index is not None:
+            Logger.warn('RCPAPI: pipelined command {} failed; resending serially and disabling pipelining'.format(
+                command_list[failed_index].name))
+            self._pipeline_supported = False
+            self._execute_serial(command_list[failed_index:], responseResults, on_complete)
+        else:
+            self._execute_serial(command_list[-1:], responseResults, on_complete)
+
     def cmd_sequence_worker(self):
         Logger.info('RCPAPI: cmd_sequence_worker starting')
         while self._running.is_set():
@@ -323,60 +537,17 @@ class RcpApi:
 
                 if not comms.isOpen(): self.run_auto_detect()
 
-                q = self.cmdSequenceQueue
-
                 responseResults = {}
-                cmdCount = 0
                 cmdLength = len(command_list)
-                self.notifyProgress(cmdCount, cmdLength)
-                try:
-                    for rcpCmd in command_list:
-                        payload = rcpCmd.payload
-                        index = rcpCmd.index
-                        option = rcpCmd.option
-                        last = rcpCmd.last
-
-                        level2Retry = 0
-                        name = rcpCmd.name
-                        result = None
-
-                        self.addListener(name, self.rcpCmdComplete)
-                        while not result and level2Retry <= self.level_2_retries:
-                            args = []
-                            if payload is not None:
-                                args.append(payload)
-                            if index is not None:
-                                args.append(index)
-                            if option is not None:
-                                args.append(option)
-                            if last is not None:
-                                args.append(last)
-                            rcpCmd.cmd(*args)
-                            retry = 0
-                            while not result and retry < DEFAULT_READ_RETRIES:
-                                try:
-                                    result = q.get(True, self.msg_rx_timeout)
-                                    msgName = result.keys()[0]
-                                    if not msgName == name:
-                                        Logger.warn('RCPAPI: rx message did not match expected name ' + str(name) + '; ' + str(msgName))
-                                        result = None
-                                except Exception as e:
-                                    Logger.warn('RCPAPI: Read message timeout waiting for {}'.format(name))
-                                    self.recoverTimeout()
-                                    retry += 1
-                            if not result:
-                                Logger.warn('RCPAPI: Level 2 retry for (' + str(level2Retry) + ') ' + name)
-                                level2Retry += 1
+                progress = [0]
 
+                def on_complete():
+                    progress[0] += 1
+                    self.notifyProgress(progress[0], cmdLength)
 
-                        if not result:
-                            raise Exception('Timeout waiting for ' + name)
-
-
-                        responseResults[name] = result[name]
-                        self.removeListener(name, self.rcpCmdComplete)
-                        cmdCount += 1
-                        self.notifyProgress(cmdCount, cmdLength)
+                self.notifyProgress(0, cmdLength)
+                try:
+                    self._execute_sequence(command_list, responseResults, on_complete)
 
                     if rootName:
                         callback = self.callback_factory(winCallback, {rootName: responseResults})
@@ -902,6 +1073,40 @@ class RcpApi:
         t.start()
         self._auto_detect_worker = t
 
+    def _load_probe_scores(self):
+        return DeviceProbeScores.from_json(self._settings.userPrefs.get_pref('preferences', 'device_probe_scores'))
+
+    def _save_probe_scores(self, scores):
+        self._settings.userPrefs.set_pref('preferences', 'device_probe_scores', scores.to_json())
+
+    def _probe_devices(self, devices, last_known_device, create_probe_connection):
+        """
+        Probe the devices in parallel for a RaceCapture unit
+        :param devices: the candidate devices
+        :type devices: list
+        :param last_known_device: the device last connected to, probed first
+        :type last_known_device: string
+        :param create_probe_connection: returns a new connection for probing
+        :type create_probe_connection: function
+        :return: list containing the device found, or an empty list
+        """
+        def is_valid_version(version_json):
+            version = VersionConfig()
+            version.fromJson(version_json)
+            return version.is_valid
+
+        scores = self._load_probe_scores()
+        devices = scores.order(devices)
+        if last_known_device in devices:
+            devices.remove(last_known_device)
+            devices.insert(0, last_known_device)
+
+        Logger.info('RCPAPI: probing {} devices in parallel'.format(len(devices)))
+        prober = DeviceProber(create_probe_connection, is_valid_version)
+        result = prober.probe(devices, scores)
+        self._save_probe_scores(scores)
+        return [result.device] if result is not None else []
+
     def auto_detect_worker(self):
         Logger.info('RCPAPI: auto_detect_worker starting')
         class VersionResult(object):
@@ -938,8 +1143,12 @@ class RcpApi:
                 else:
                     devices = comms.get_available_devices()
                     last_known_device = self._settings.userPrefs.get_pref('preferences', 'last_known_device')
+                    create_probe_connection = getattr(comms, 'create_probe_connection', None)
+                    if self.parallel_probe and create_probe_connection is not None and len(devices) > 1:
+                        # confirm the device found, if any, through the comms below
+                        devices = self._probe_devices(devices, last_known_device, create_probe_connection)
                     # if there was a last known device try it repeatedly while trying the other devices.
-                    if last_known_device:
+                    elif last_known_device:
                         Logger.info('RCPAPI: trying last known device before each other device: {}'.format(last_known_device))
                         # ensure we remove it from the existing list
                         try:
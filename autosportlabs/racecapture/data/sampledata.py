@@ -18,6 +18,7 @@
 # have received a copy of the GNU General Public License along with
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
+from array import array
 from autosportlabs.racecapture.data.channels import ChannelMeta, ChannelMetaCollection
 
 class SampleMetaException(Exception):
@@ -29,18 +30,107 @@ class SampleValue(object):
         self.channelMeta = channelMeta
 
 STARTING_BITMAP = 1
-        
+
+class SampleDecoder(object):
+    """
+    Decodes the data fields of sample packets for a fixed number of channels.
+
+    The trailing bitmask fields of a packet select which channels are present.
+    Channels report at a handful of fixed rates, so only a small set of bitmask
+    combinations ever occur; the channel indexes for each combination are
+    resolved once and cached.
+    """
+    MAX_CACHED_BITMASKS = 1024
+
+    def __init__(self, channel_count):
+        self.channel_count = channel_count
+        self.bitmask_field_count = max(0, (channel_count - 1) / 32) + 1
+        self.max_field_count = channel_count + self.bitmask_field_count
+        self._channel_indexes_cache = {}
+
+    def _resolve_channel_indexes(self, bitmasks):
+        channel_count = self.channel_count
+        indexes = []
+        for bitmask_index, bitmask in enumerate(bitmasks):
+            bitmask = int(bitmask)
+            base = bitmask_index * 32
+            while bitmask:
+                low_bit = bitmask & -bitmask
+                index = base + low_bit.bit_length() - 1
+                if index < channel_count:
+                    indexes.append(index)
+                bitmask ^= low_bit
+        return tuple(indexes)
+
+    def decode(self, data, values):
+        """
+        Decode a sample packet's data fields into values.
+        :param data: the packet's data fields, values followed by the bitmask fields
+        :type data: list
+        :param values: receives the value of each channel present, by channel index. Other entries are left unchanged
+        :type values: array
+        :return: tuple of the indexes of the channels present, in channel order
+        """
+        field_count = len(data)
+        bitmask_field_count = self.bitmask_field_count
+        if field_count > self.max_field_count or field_count < bitmask_field_count:
+            raise SampleMetaException('Unexpected data packet count {}; channel meta expects between {} and {} channels'.format(field_count, bitmask_field_count, self.max_field_count))
+
+        bitmasks = tuple(data[field_count - bitmask_field_count:])
+        cache = self._channel_indexes_cache
+        indexes = cache.get(bitmasks)
+        if indexes is None:
+            indexes = self._resolve_channel_indexes(bitmasks)
+            if len(cache) >= SampleDecoder.MAX_CACHED_BITMASKS:
+                cache.clear()
+            cache[bitmasks] = indexes
+
+        if len(indexes) != field_count - bitmask_field_count:
+            raise SampleMetaException('Unexpected data packet count {}; bitmask selects {} channels'.format(field_count, len(indexes)))
+
+        field_index = 0
+        for index in indexes:
+            values[index] = data[field_index]
+            field_index += 1
+        return indexes
+
 class Sample(object):
+    """
+    The most recently received sample.
+
+    After processing, values holds the latest value of every channel, as a
+    preallocated array of floats, and value_metas the ChannelMeta for each
+    entry. channel_indexes holds the indexes of the channels present in the
+    sample. All are reused between samples.
+    """
     tick = 0
-    samples = []
     metas = ChannelMetaCollection()
     updated_meta = False
     
     def __init__(self, **kwargs):
         self.tick = kwargs.get('tick', self.tick)
-        self.samples = kwargs.get('samples', self.samples)
         self.metas = kwargs.get('channelMetas', self.metas)
         self.updated_meta = len(self.metas.channel_metas) > 0
+        self.channel_indexes = ()
+        self.values = array('d')
+        self.value_metas = []
+        self._decoder = None
+
+    @property
+    def samples(self):
+        """
+        The channels present in the most recent sample, as a new list of SampleValue objects
+        """
+        metas = self.value_metas
+        values = self.values
+        return [SampleValue(values[index], metas[index]) for index in self.channel_indexes]
+
+    @samples.setter
+    def samples(self, samples):
+        self._decoder = None
+        self.values = array('d', [sample_value.value for sample_value in samples])
+        self.value_metas = [sample_value.channelMeta for sample_value in samples]
+        self.channel_indexes = tuple(range(len(samples)))
         
     def fromJson(self, json):
         if json:
@@ -59,40 +149,14 @@ class Sample(object):
     
     def processData(self, dataJson):
         metas = self.metas.channel_metas
-        channelConfigCount = len(metas) 
-        bitmaskFieldCount = max(0, (channelConfigCount - 1) / 32) + 1       
-        
-        maxFieldCount = channelConfigCount + bitmaskFieldCount
-                
-        fieldData = dataJson
-        fieldDataSize = len(fieldData)
-        if fieldDataSize > maxFieldCount or fieldDataSize < bitmaskFieldCount:
-            raise SampleMetaException('Unexpected data packet count {}; channel meta expects between {} and {} channels'.format(fieldDataSize, bitmaskFieldCount, maxFieldCount))
-
-        bitmaskFields = []
-        for i in range(fieldDataSize - bitmaskFieldCount, fieldDataSize):
-            bitmaskFields.append(int(fieldData[i]))
-        
-        samples = self.samples
-        del samples[:]
-        
-        channelConfigIndex = 0
-        bitmapIndex = 0
-        fieldIndex = 0
-        mask_index = 0
-        channelConfigCount = len(metas)
-        while channelConfigIndex < channelConfigCount:
-            if mask_index >= 32:            
-                mask_index = 0;
-                bitmapIndex += 1
-                if bitmapIndex > len(bitmaskFields):
-                    raise Exception("channel count overflowed number of bitmap fields available")
-            
-            mask = 1 << mask_index
-            if (bitmaskFields[bitmapIndex] & mask) != 0:
-                value = float(fieldData[fieldIndex])
-                fieldIndex += 1
-                sample = SampleValue(value, metas[channelConfigIndex])
-                samples.append(sample)
-            channelConfigIndex += 1
-            mask_index += 1
+        channel_count = len(metas)
+        decoder = self._decoder
+        # the decoder depends only on the number of channels; metas may be
+        # updated in place, so check it on every sample
+        if decoder is None or decoder.channel_count != channel_count:
+            decoder = SampleDecoder(channel_count)
+            self._decoder = decoder
+            self.values = array('d', [0.0]) * channel_count
+
+        self.channel_indexes = decoder.decode(dataJson, self.values)
+        self.value_metas = metas
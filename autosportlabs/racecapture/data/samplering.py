@@ -0,0 +1,119 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+from threading import Condition
+
+
+class SampleRing(object):
+    """
+    Fixed capacity ring buffer of sample snapshots for a single producer and
+    a single consumer thread.
+
+    Every slot is a preallocated array of floats, one per channel in the order
+    given at construction, so taking a snapshot copies the current values into
+    an existing slot instead of allocating a new container. Channels that have
+    not reported a value yet are NaN, which SQLite stores as NULL.
+    """
+    MISSING = float('nan')
+
+    def __init__(self, channels, capacity):
+        """
+        Initializer.
+        :param channels: the channel names, in slot order
+        :type channels: list
+        :param capacity: the number of snapshots the ring can hold
+        :type capacity: int
+        """
+        self.channels = list(channels)
+        self.capacity = capacity
+        self._channel_index = dict((name, index) for index, name in enumerate(self.channels))
+        width = len(self.channels)
+        self._current = array('d', [SampleRing.MISSING]) * width
+        self._slots = [array('d', [SampleRing.MISSING]) * width for i in range(capacity)]
+        self._write_count = 0
+        self._read_count = 0
+        self._ready = Condition()
+
+    @property
+    def count(self):
+        """
+        The number of snapshots waiting to be read
+        """
+        return self._write_count - self._read_count
+
+    @property
+    def fill_level(self):
+        """
+        The fraction of the ring holding unread snapshots, from 0.0 to 1.0
+        """
+        return float(self._write_count - self._read_count) / self.capacity
+
+    def update(self, sample):
+        """
+        Merge channel values into the current snapshot. Channels not in the
+        ring's channel list are ignored.
+        :param sample: channel name / value pairs
+        :type sample: dict
+        """
+        channel_index = self._channel_index
+        current = self._current
+        for name, value in sample.iteritems():
+            index = channel_index.get(name)
+            if index is not None:
+                current[index] = value
+
+    def push(self):
+        """
+        Store the current snapshot in the next free slot.
+        :return: False if the ring is full and the snapshot was dropped
+        """
+        if self._write_count - self._read_count >= self.capacity:
+            return False
+        self._slots[self._write_count % self.capacity][:] = self._current
+        with self._ready:
+            self._write_count += 1
+            self._ready.notify()
+        return True
+
+    def read(self, max_count, timeout=None):
+        """
+        Read the oldest snapshots, waiting for one to become available if the
+        ring is empty.
+        :param max_count: the maximum number of snapshots to read
+        :type max_count: int
+        :param timeout: seconds to wait for a snapshot, or None to wait indefinitely
+        :type timeout: float
+        :return: list of snapshots, each a list of values in channel order. Empty if the wait timed out
+        """
+        with self._ready:
+            if self._write_count == self._read_count:
+                self._ready.wait(timeout)
+            available = min(self._write_count - self._read_count, max_count)
+
+        # slots up to the write count are not touched by the producer until
+        # the read count moves past them
+        start = self._read_count
+        slots = self._slots
+        capacity = self.capacity
+        records = [slots[(start + i) % capacity].tolist() for i in range(available)]
+        with self._ready:
+            self._read_count += available
+        return records
@@ -18,8 +18,8 @@
 # have received a copy of the GNU General Public License along with
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
-from datetime import datetime
 from threading import Thread
+import time
 from kivy.clock import Clock
 from kivy.logger import Logger
 from kivy.event import EventDispatcher
@@ -27,9 +27,8 @@ from autosportlabs.util.timeutil import format_date
 from autosportlabs.racecapture.config.rcpconfig import GpsSample
 from autosportlabs.racecapture.geo.geopoint import GeoPoint
 from autosportlabs.util.threadutil import safe_thread_exit
+from autosportlabs.racecapture.data.samplering import SampleRing
 import copy
-import Queue
-from Queue import Empty, Full
 
 
 class SessionRecorder(EventDispatcher):
@@ -40,31 +39,37 @@ class SessionRecorder(EventDispatcher):
     # Main app views that the SessionRecorder should start recording when
     # displayed
     RECORDING_VIEWS = ['dash']
-    SAMPLE_QUEUE_GET_TIMEOUT = 0.5
-    SAMPLE_QUEUE_MAX_SIZE = 50
-    SAMPLE_QUEUE_UNCOMMITTED_INSERT_LIMIT = 37
-    SAMPLE_QUEUE_BACKLOG_LOG_THRESHOLD = 0.5
-    SAMPLE_QUEUE_BACKLOG_LOG_INTERVAL = 100
-    SAMPLE_QUEUE_MIN_SEND_DELAY_MS = 4 
-    SAMPLE_QUEUE_MAX_SEND_DELAY_MS = 250
-    SAMPLE_QUEUE_SLOWING_THRESHOLD = SAMPLE_QUEUE_MAX_SIZE * SAMPLE_QUEUE_BACKLOG_LOG_THRESHOLD
-
-    def __init__(self, datastore, databus, rcpapi, settings, track_manager=None, status_pump=None, stop_delay=120):
+    SAMPLE_RING_GET_TIMEOUT = 0.5
+    SAMPLE_RING_SIZE = 128
+    SAMPLE_UNCOMMITTED_INSERT_LIMIT = 37
+    SAMPLE_BACKLOG_LOG_INTERVAL = 100
+    # Above this ring fill level snapshots are throttled, reaching the maximum
+    # send delay (in seconds) when the ring is full
+    SAMPLE_RING_SLOWING_THRESHOLD = 0.5
+    SAMPLE_MAX_SEND_DELAY = 0.25
+    # Batched write mode: commit once either budget is reached
+    SAMPLE_BATCH_COMMIT_SIZE = 200
+    SAMPLE_BATCH_COMMIT_INTERVAL = 1.0
+    SAMPLE_STATS_INTERVAL = 5.0
+
+    def __init__(self, datastore, databus, rcpapi, settings, track_manager=None, status_pump=None, stop_delay=120,
+                 batch_writes=True):
         """
         Initializer.
         :param datastore: Datastore for saving data
         :param databus: Databus for listening for data
         :param rcpapi: RcpApi object for listening for connect/disconnect events
+        :param batch_writes: True to drain the sample ring in batches, False to write each sample individually
+        :type batch_writes: bool
         :return:
         """
-        self._sample_queue = Queue.Queue(
-            maxsize=SessionRecorder.SAMPLE_QUEUE_MAX_SIZE)
+        self._sample_ring = None
         self._recorder_thread = None
-        self._sample_queue_full = False
-        self._sample_last_send = datetime(1,1,1)
-        self._sample_send_delay = SessionRecorder.SAMPLE_QUEUE_MIN_SEND_DELAY_MS
+        self._sample_ring_full = False
+        self._sample_last_send = 0
+        self._batch_writes = batch_writes
+        self._reset_stats()
 
-        self._sample_accumulator = {}
         self._datastore = datastore
         self._databus = databus
         self._rcapi = rcpapi
@@ -109,6 +114,40 @@ class SessionRecorder(EventDispatcher):
     def on_recording(self, recording):
         pass
 
+    @property
+    def samples_per_second(self):
+        """
+        Rate at which samples were written to the datastore over the last stats interval
+        """
+        return self._samples_per_second
+
+    @property
+    def batch_size(self):
+        """
+        Average number of samples written per batch over the last stats interval
+        """
+        return self._batch_size
+
+    @property
+    def commit_latency(self):
+        """
+        Duration of the most recent datastore commit, in milliseconds
+        """
+        return self._commit_latency
+
+    @property
+    def queue_high_water(self):
+        """
+        Largest sample ring backlog seen during the current session
+        """
+        return self._queue_high_water
+
+    def _reset_stats(self):
+        self._samples_per_second = 0.0
+        self._batch_size = 0.0
+        self._commit_latency = 0.0
+        self._queue_high_water = 0
+
     def start(self, session_name=None):
         """
         Starts recording a new session.
@@ -126,9 +165,12 @@ class SessionRecorder(EventDispatcher):
                 self._create_session_name(), self._channels)
             self.dispatch('on_recording', True)
             self.recording = True
-            self._sample_accumulator = {}
+            self._sample_ring = SampleRing(sorted(self._channels.keys()), SessionRecorder.SAMPLE_RING_SIZE)
+            self._sample_last_send = 0
+            self._reset_stats()
 
-            t = Thread(target=self._session_recorder_worker)
+            worker = self._session_recorder_batch_worker if self._batch_writes else self._session_recorder_worker
+            t = Thread(target=worker, args=(self._sample_ring,))
             t.daemon = True
             t.start()
             self._recorder_thread = t
@@ -160,6 +202,7 @@ class SessionRecorder(EventDispatcher):
             if self._recorder_thread is not None:
                 self._recorder_thread.join()
             self._recorder_thread = None
+            self._sample_ring = None
 
             self._current_session_id = None
             self.dispatch('on_recording', False)
@@ -220,41 +263,29 @@ class SessionRecorder(EventDispatcher):
         self._current_view = view_name
         self._check_should_record()
 
-    def _session_recorder_worker(self):
+    def _session_recorder_worker(self, ring):
         Logger.info('SessionRecorder: session recorder worker starting')
         try:
-            # reset our sample data dict
-            qsize = 0
             insert_counter = 0
-            sample_queue = self._sample_queue
+            channels = ring.channels
             index = 0
-            # will drain the queue before exiting thread
-            while self.recording or qsize > 0:
-                try:
-                    sample_data = sample_queue.get(
-                        True, SessionRecorder.SAMPLE_QUEUE_GET_TIMEOUT)
+            # will drain the ring before exiting thread
+            while self.recording or ring.count > 0:
+                for record in ring.read(1, SessionRecorder.SAMPLE_RING_GET_TIMEOUT):
                     self._datastore.insert_sample_nocommit(
-                        sample_data, self._current_session_id)
+                        dict(zip(channels, record)), self._current_session_id)
                     insert_counter += 1
-                    qsize = sample_queue.qsize()
-                    # since the commit is slow, only do the commit once the queue empty to prevent overrunning the buffer.
-                    if (qsize == 0) or (insert_counter >= SessionRecorder.SAMPLE_QUEUE_UNCOMMITTED_INSERT_LIMIT):
+                    backlog = ring.count
+                    # since the commit is slow, only do the commit once the ring empty to prevent overrunning the buffer.
+                    if (backlog == 0) or (insert_counter >= SessionRecorder.SAMPLE_UNCOMMITTED_INSERT_LIMIT):
                         self._datastore.commit()
                         insert_counter = 0
-                    
-                    if qsize > 0 and index % SessionRecorder.SAMPLE_QUEUE_BACKLOG_LOG_INTERVAL == 0:
-                        Logger.info( 'SessionRecorder: queue backlog: {}, commit backlog: {}, sample send delay: {}ms'
-				.format(qsize, insert_counter, self._sample_send_delay ))
 
-                    if insert_counter > (SessionRecorder.SAMPLE_QUEUE_UNCOMMITTED_INSERT_LIMIT*SessionRecorder.SAMPLE_QUEUE_BACKLOG_LOG_THRESHOLD):
-                        Logger.debug( 'SessionRecorder: commit backlog: {}'.format(insert_counter))
-
-                    if qsize > (SessionRecorder.SAMPLE_QUEUE_MAX_SIZE*SessionRecorder.SAMPLE_QUEUE_BACKLOG_LOG_THRESHOLD):
-                        Logger.debug( 'SessionRecorder: queue backlog: {}'.format(qsize))
+                    if backlog > 0 and index % SessionRecorder.SAMPLE_BACKLOG_LOG_INTERVAL == 0:
+                        Logger.info('SessionRecorder: ring backlog: {}, commit backlog: {}'
+                                    .format(backlog, insert_counter))
 
                     index += 1
-                except Empty:
-                    pass
         except Exception as e:
             Logger.error(
                 'SessionRecorder: Exception in session recorder worker ' + str(e))
@@ -263,6 +294,54 @@ class SessionRecorder(EventDispatcher):
 
         Logger.info('SessionRecorder: session recorder worker ending')
 
+    def _session_recorder_batch_worker(self, ring):
+        Logger.info('SessionRecorder: session recorder batch worker starting')
+        try:
+            datastore = self._datastore
+            channels = ring.channels
+            uncommitted = 0
+            last_commit = time.time()
+            stats_start = last_commit
+            stats_samples = 0
+            stats_batches = 0
+            # will drain the ring before exiting thread
+            while self.recording or ring.count > 0:
+                batch = ring.read(ring.capacity, SessionRecorder.SAMPLE_RING_GET_TIMEOUT)
+                if len(batch) > 0:
+                    datastore.insert_records_nocommit(batch, channels, self._current_session_id)
+                    uncommitted += len(batch)
+                    stats_samples += len(batch)
+                    stats_batches += 1
+
+                now = time.time()
+                if uncommitted > 0 and (uncommitted >= SessionRecorder.SAMPLE_BATCH_COMMIT_SIZE or
+                                        now - last_commit >= SessionRecorder.SAMPLE_BATCH_COMMIT_INTERVAL):
+                    datastore.commit()
+                    last_commit = time.time()
+                    self._commit_latency = (last_commit - now) * 1000.0
+                    uncommitted = 0
+
+                if now - stats_start >= SessionRecorder.SAMPLE_STATS_INTERVAL:
+                    self._samples_per_second = stats_samples / (now - stats_start)
+                    self._batch_size = float(stats_samples) / stats_batches if stats_batches > 0 else 0.0
+                    Logger.debug('SessionRecorder: {:.1f} samples/s, batch size {:.1f}, commit latency {:.1f}ms, '
+                                 'queue high water {}, ring fill level {:.2f}'
+                                 .format(self._samples_per_second, self._batch_size, self._commit_latency,
+                                         self._queue_high_water, ring.fill_level))
+                    stats_start = now
+                    stats_samples = 0
+                    stats_batches = 0
+
+            if uncommitted > 0:
+                datastore.commit()
+        except Exception as e:
+            Logger.error(
+                'SessionRecorder: Exception in session recorder batch worker ' + str(e))
+        finally:
+            safe_thread_exit()
+
+        Logger.info('SessionRecorder: session recorder batch worker ending')
+
     def _channel_metas_same(self, metas):
         # determine if the provided channel metas have the same channel names
         # as the current
@@ -284,13 +363,13 @@ class SessionRecorder(EventDispatcher):
         self._channels = copy.deepcopy(dict(metas))
         self._check_should_record()
 
-    def _slow_down_send_rate(self):
-            self._sample_send_delay = min( self._sample_send_delay * 1.5,
-                        SessionRecorder.SAMPLE_QUEUE_MAX_SEND_DELAY_MS )
-
-    def _speed_up_send_rate(self):
-        self._sample_send_delay = max( self._sample_send_delay - SessionRecorder.SAMPLE_QUEUE_MIN_SEND_DELAY_MS,
-                SessionRecorder.SAMPLE_QUEUE_MIN_SEND_DELAY_MS )
+    def _sample_send_delay(self, fill_level):
+        """
+        Minimum interval between snapshots, in seconds, for the given ring fill level.
+        Rises linearly from zero at the slowing threshold to the maximum delay when the ring is full
+        """
+        threshold = SessionRecorder.SAMPLE_RING_SLOWING_THRESHOLD
+        return SessionRecorder.SAMPLE_MAX_SEND_DELAY * max(0.0, fill_level - threshold) / (1.0 - threshold)
 
     def _on_sample(self, sample):
         """
@@ -302,29 +381,25 @@ class SessionRecorder(EventDispatcher):
             return
 
         # Merging previous sample with new data to desparsify the data
-        self._sample_accumulator.update( sample )
-        qsize = self._sample_queue.qsize()
-        if qsize == 0:
-            self._speed_up_send_rate()
-
-        deltaT_ms = (datetime.utcnow() - self._sample_last_send).microseconds/1000
-        if ((deltaT_ms >= self._sample_send_delay)
-                or (qsize < SessionRecorder.SAMPLE_QUEUE_SLOWING_THRESHOLD)):
-
-            if qsize > SessionRecorder.SAMPLE_QUEUE_SLOWING_THRESHOLD:
-                self._slow_down_send_rate()
-
-            self._sample_last_send = datetime.utcnow()
-
-            try:
-                self._sample_queue.put_nowait(copy.deepcopy(self._sample_accumulator))
-                self._sample_queue_full = False
-
-            except Full:
-                if not self._sample_queue_full:
-                    # latch to prevent the log from filling up with warnings
-                    Logger.warn('SessionRecorder: dropping sample; queue full')
-                self._sample_queue_full = True
+        ring = self._sample_ring
+        ring.update(sample)
+
+        fill_level = ring.fill_level
+        if fill_level > SessionRecorder.SAMPLE_RING_SLOWING_THRESHOLD:
+            # the writer is falling behind; record the merged values less often
+            now = time.time()
+            if now - self._sample_last_send < self._sample_send_delay(fill_level):
+                return
+            self._sample_last_send = now
+
+        if ring.push():
+            self._sample_ring_full = False
+            self._queue_high_water = max(self._queue_high_water, ring.count)
+        else:
+            if not self._sample_ring_full:
+                # latch to prevent the log from filling up with warnings
+                Logger.warn('SessionRecorder: dropping sample; ring full')
+            self._sample_ring_full = True
 
     def _on_rc_connected(self):
         """
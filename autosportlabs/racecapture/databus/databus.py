@@ -19,7 +19,7 @@
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
 from kivy.clock import Clock
-from time import sleep
+from time import sleep, time
 from kivy.logger import Logger
 from threading import Thread, Event, Lock
 from autosportlabs.racecapture.data.channels import ChannelMeta
@@ -39,6 +39,18 @@ class DataBusFactory(object):
         databus.add_data_filter(LaptimeDeltaFilter(system_channels))
         return databus
 
+class _DataBusListener(object):
+    """
+    A DataBus listener and its update rate limiting state
+    """
+    __slots__ = ('callback', 'interval', 'last_notify')
+
+    def __init__(self, callback, max_rate=None):
+        self.callback = callback
+        self.interval = 1.0 / max_rate if max_rate else 0
+        self.last_notify = 0
+
+
 class DataBus(object):
     """Central hub for current sample data. Receives data from DataBusPump
     Also contains the periodic updater for listeners. Updates occur in the UI thread via Clock.schedule_interval
@@ -49,22 +61,36 @@ class DataBus(object):
     (CHANNEL LISTENERS) => DataBus.addChannelListener()  -- listeners receive updates with a particular channel's value
     (META LISTENERS) => DataBus.addMetaListener() -- Listeners receive updates with meta data
 
+    Only channels whose value changed since the previous update are notified.
+    Channel and sample listeners may specify a maximum update rate; changes
+    arriving faster than that are coalesced and the latest value delivered
+    once the interval has passed.
+
     Note: DataBus must be started via start_update before any data flows
     """
     channel_metas = {}
-    channel_data = {}
     sample = None
-    channel_listeners = {}
     meta_listeners = []
     meta_updated = False
     data_filters = []
-    sample_listeners = []
     _polling = False
     rcp_meta_read = False
 
     def __init__(self, **kwargs):
         super(DataBus, self).__init__(**kwargs)
         self.update_lock = Lock()
+        # current channel values, updated by the data source
+        self.channel_data = {}
+        self.channel_listeners = {}
+        self.sample_listeners = []
+        # channel values changed since the last notification; swapped out under the lock
+        self._changed_data = {}
+        # channel values as last notified; only touched by the notifying thread
+        self._notified_data = {}
+        # (channel, listener) pairs with an update held back by their max rate,
+        # or waiting for their first value. channel is None for sample listeners
+        self._deferred = set()
+        self._filter_channels = []
 
     def start_update(self, interval=DEFAULT_DATABUS_UPDATE_INTERVAL):
         if self._polling:
@@ -81,8 +107,11 @@ class DataBus(object):
         channel_metas = self.channel_metas
         metas = datafilter.get_channel_meta(channel_metas)
         cm = self.channel_metas
+        filter_channels = self._filter_channels
         for channel, meta in metas.iteritems():
             cm[channel] = meta
+            if channel not in filter_channels:
+                filter_channels.append(channel)
 
     def update_channel_meta(self, metas):
         """update channel metadata information
@@ -96,6 +125,7 @@ class DataBus(object):
             # clear our list of channel data values, in case channels
             # were removed on this metadata update
             cd.clear()
+            self._changed_data.clear()
 
             # clear and reload our channel metas
             cm.clear()
@@ -111,8 +141,8 @@ class DataBus(object):
         finally:
             self.update_lock.release()
 
-    def addSampleListener(self, callback):
-        self.sample_listeners.append(callback)
+    def addSampleListener(self, callback, max_rate=None):
+        self.add_sample_listener(callback, max_rate)
 
     def update_samples(self, sample):
         """Update channel data with new samples
@@ -120,58 +150,129 @@ class DataBus(object):
         try:
             self.update_lock.acquire()
             cd = self.channel_data
-            for sample_item in sample.samples:
-                channel = sample_item.channelMeta.name
-                value = sample_item.value
-                cd[channel] = value
+            changed = self._changed_data
+            metas = sample.value_metas
+            values = sample.values
+            for index in sample.channel_indexes:
+                channel = metas[index].name
+                value = values[index]
+                if cd.get(channel) != value:
+                    cd[channel] = value
+                    changed[channel] = value
 
             # apply filters to updated data
-            for f in self.data_filters:
-                f.filter(cd)
+            data_filters = self.data_filters
+            if data_filters:
+                filter_channels = self._filter_channels
+                previous = [cd.get(channel) for channel in filter_channels]
+                for f in data_filters:
+                    f.filter(cd)
+                for channel, previous_value in zip(filter_channels, previous):
+                    value = cd.get(channel)
+                    if value != previous_value:
+                        changed[channel] = value
         finally:
             self.update_lock.release()
 
     def notify_listeners(self, dt):
-
+        # swap out the changes under the lock; listeners are called without holding it
         try:
             self.update_lock.acquire()
-            if self.meta_updated:
-                cm = self.channel_metas
-                self.notify_meta_listeners(cm)
+            meta_updated = self.meta_updated
+            if meta_updated:
+                metas = dict(self.channel_metas)
                 self.meta_updated = False
-
-            cd = self.channel_data
-            for channel, value in cd.iteritems():
-                self.notify_channel_listeners(channel, value)
-
-            for listener in self.sample_listeners:
-                listener(cd)
+            changed = self._changed_data
+            self._changed_data = {}
         finally:
             self.update_lock.release()
 
+        notified = self._notified_data
+        if meta_updated:
+            notified.clear()
+            self.notify_meta_listeners(metas)
+        notified.update(changed)
+
+        now = time()
+        deferred = self._deferred
+        channel_listeners = self.channel_listeners
+        for channel, value in changed.iteritems():
+            listeners = channel_listeners.get(channel)
+            if listeners:
+                for listener in listeners:
+                    if now - listener.last_notify >= listener.interval:
+                        listener.last_notify = now
+                        listener.callback(value)
+                    else:
+                        deferred.add((channel, listener))
+
+        if changed:
+            for listener in self.sample_listeners:
+                if now - listener.last_notify >= listener.interval:
+                    listener.last_notify = now
+                    listener.callback(notified)
+                else:
+                    deferred.add((None, listener))
+
+        if deferred:
+            self._notify_deferred(now)
+
+    def _notify_deferred(self, now):
+        notified = self._notified_data
+        deferred = self._deferred
+        for channel, listener in list(deferred):
+            if listener.last_notify == now:
+                # already updated with the latest values
+                deferred.discard((channel, listener))
+            elif now - listener.last_notify >= listener.interval:
+                deferred.discard((channel, listener))
+                if channel is None:
+                    if notified:
+                        listener.last_notify = now
+                        listener.callback(notified)
+                elif channel in notified:
+                    listener.last_notify = now
+                    listener.callback(notified[channel])
+
     def notify_channel_listeners(self, channel, value):
         listeners = self.channel_listeners.get(str(channel))
         if listeners:
             for listener in listeners:
-                listener(value)
+                listener.callback(value)
 
     def notify_meta_listeners(self, channelMeta):
         for listener in self.meta_listeners:
             listener(channelMeta)
 
-    def addChannelListener(self, channel, callback):
+    def addChannelListener(self, channel, callback, max_rate=None):
+        """
+        Add a listener for a channel's value
+        :param channel: the channel name
+        :type channel: string
+        :param callback: called with the channel's value when it changes
+        :type callback: function
+        :param max_rate: maximum rate, in Hz, to call the listener. None for every update
+        :type max_rate: float
+        """
+        listener = _DataBusListener(callback, max_rate)
         listeners = self.channel_listeners.get(channel)
         if listeners == None:
-            listeners = [callback]
+            listeners = [listener]
             self.channel_listeners[channel] = listeners
         else:
-            listeners.append(callback)
+            listeners.append(listener)
+        # deliver the current value, even if it does not change
+        self._deferred.add((channel, listener))
 
     def removeChannelListener(self, channel, callback):
         try:
             listeners = self.channel_listeners.get(channel)
             if listeners:
-                listeners.remove(callback)
+                for listener in listeners:
+                    if listener.callback == callback:
+                        listeners.remove(listener)
+                        self._deferred.discard((channel, listener))
+                        break
         except:
             pass
 
@@ -181,10 +282,12 @@ class DataBus(object):
         :param listener
         :type object / callback function
         '''
-        try:
-            self.sample_listeners.remove(listener)
-        except Exception as e:
-            Logger.debug('Could not remove sample listener {}: {}'.format(listener, e))
+        for sample_listener in self.sample_listeners:
+            if sample_listener.callback == listener:
+                self.sample_listeners.remove(sample_listener)
+                self._deferred.discard((None, sample_listener))
+                return
+        Logger.debug('Could not remove sample listener {}'.format(listener))
 
     def remove_meta_listener(self, listener):
         '''
@@ -197,8 +300,18 @@ class DataBus(object):
         except Exception as e:
             Logger.debug('Could not remove meta listener {}: {}'.format(listener, e))
 
-    def add_sample_listener(self, callback):
-        self.sample_listeners.append(callback)
+    def add_sample_listener(self, callback, max_rate=None):
+        """
+        Add a listener for the current values of all channels
+        :param callback: called with a dict of channel values when any channel changes.
+        The dict is reused between calls and must not be modified or retained
+        :type callback: function
+        :param max_rate: maximum rate, in Hz, to call the listener. None for every update
+        :type max_rate: float
+        """
+        listener = _DataBusListener(callback, max_rate)
+        self.sample_listeners.append(listener)
+        self._deferred.add((None, listener))
 
     def addMetaListener(self, callback):
         self.meta_listeners.append(callback)
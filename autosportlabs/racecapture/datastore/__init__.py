@@ -19,3 +19,5 @@
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
 from datastore import *
+from columnstore import ColumnarDataStore
+from queryexecutor import QueryExecutor, QueryRequest
@@ -0,0 +1,201 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import traceback
+from Queue import Empty
+from kivy.logger import Logger
+from autosportlabs.racecapture.datastore.desparsifier import ChunkedDesparsifier
+
+# Number of records per batch sent from a worker when NumPy is unavailable
+RECORD_BATCH_SIZE = 10000
+# Number of batches per worker that may be waiting for the writer
+RESULT_QUEUE_DEPTH = 4
+RESULT_QUEUE_TIMEOUT = 1.0
+
+
+class DatalogImport(object):
+    """
+    Describes a datalog to import as part of a batch, and holds the outcome
+    once the batch import completes.
+    """
+
+    def __init__(self, path, name, notes=''):
+        self.path = path
+        self.name = name
+        self.notes = notes
+        self.session_id = None
+        self.warnings = []
+        self.error = None
+
+    @property
+    def success(self):
+        return self.error is None and self.session_id is not None
+
+
+def _parse_datalog_worker(task_queue, result_queue):
+    """
+    Worker process entry point. Parses and desparsifies datalogs taken from the
+    task queue, sending the header, batches of records and finally the backfills
+    and warnings to the result queue.
+    """
+    from autosportlabs.racecapture.datastore.datastore import DataStore
+
+    for index, path in iter(task_queue.get, None):
+        try:
+            with open(path, 'rb') as data_file:
+                header = data_file.readline()
+                result_queue.put((index, 'header', header))
+
+                warnings = []
+
+                def progress_cb(percent):
+                    result_queue.put((index, 'progress', percent))
+
+                if ChunkedDesparsifier.available():
+                    desparsifier = ChunkedDesparsifier(data_file, len(header.split(',')), warnings=warnings,
+                                                       progress_cb=progress_cb)
+                    for rows in desparsifier.chunks():
+                        result_queue.put((index, 'records', rows))
+                    backfills = desparsifier.backfills
+                else:
+                    batch = []
+                    for record in DataStore()._desparsified_data_generator(data_file, warnings=warnings,
+                                                                           progress_cb=progress_cb):
+                        batch.append(record)
+                        if len(batch) >= RECORD_BATCH_SIZE:
+                            result_queue.put((index, 'records', batch))
+                            batch = []
+                    if len(batch):
+                        result_queue.put((index, 'records', batch))
+                    backfills = {}
+
+                result_queue.put((index, 'done', (backfills, warnings)))
+        except Exception as e:
+            Logger.error('DataStore: Error parsing datalog {}: {}'.format(path, traceback.format_exc()))
+            result_queue.put((index, 'error', str(e)))
+
+
+def run_batch_import(datastore, imports, progress_cb=None, worker_count=None):
+    """
+    Imports several datalogs, parsing and desparsifying them concurrently in
+    worker processes. The finished record batches are written by the calling
+    thread, which is the only one using the datastore's connection.
+    Each datalog is imported into its own session.
+    :param datastore: the datastore to import into
+    :type datastore: DataStore
+    :param imports: the datalogs to import. Updated with the session id, warnings or error for each
+    :type imports: list of DatalogImport
+    :param progress_cb: callback receiving the overall percent complete
+    :type progress_cb: function
+    :param worker_count: number of worker processes; defaults to the number of CPUs
+    :type worker_count: int
+    """
+    if len(imports) == 0:
+        return
+
+    worker_count = min(len(imports), worker_count or multiprocessing.cpu_count())
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue(maxsize=worker_count * RESULT_QUEUE_DEPTH)
+    for index, datalog in enumerate(imports):
+        task_queue.put((index, datalog.path))
+    for i in range(worker_count):
+        task_queue.put(None)
+
+    workers = []
+    for i in range(worker_count):
+        worker = multiprocessing.Process(target=_parse_datalog_worker, args=(task_queue, result_queue))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    Logger.info('DataStore: importing {} datalogs with {} workers'.format(len(imports), worker_count))
+
+    headers = {}
+    progress = [0.0] * len(imports)
+    remaining = len(imports)
+
+    def _fail(index, error):
+        datalog = imports[index]
+        progress[index] = 100
+        Logger.error('DataStore: Failed to import datalog {}: {}'.format(datalog.path, error))
+        datalog.error = error
+        if datalog.session_id is not None:
+            datastore.delete_session(datalog.session_id)
+            datalog.session_id = None
+
+    try:
+        while remaining > 0:
+            try:
+                index, kind, payload = result_queue.get(True, RESULT_QUEUE_TIMEOUT)
+            except Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    for index, datalog in enumerate(imports):
+                        if not datalog.success and datalog.error is None:
+                            _fail(index, 'Datalog import worker exited unexpectedly')
+                    break
+                continue
+
+            datalog = imports[index]
+            if datalog.error is not None:
+                # the datalog already failed; drop anything else from its worker
+                continue
+
+            try:
+                if kind == 'header':
+                    channels = datastore._parse_datalog_headers(payload)
+                    datastore._extend_datalog_channels(channels)
+                    datalog.session_id = datastore.create_session(datalog.name, datalog.notes)
+                    datastore._add_session_channels(datalog.session_id, channels)
+                    headers[index] = channels
+
+                elif kind == 'records':
+                    records = payload.tolist() if hasattr(payload, 'tolist') else payload
+                    datastore._write_records(datalog.session_id, headers[index], records)
+
+                elif kind == 'progress':
+                    progress[index] = payload
+
+                elif kind == 'done':
+                    backfills, warnings = payload
+                    datastore._finish_records(datalog.session_id, headers[index], backfills)
+                    datastore._update_lap_summary(datalog.session_id)
+                    datastore.commit()
+                    datalog.warnings = warnings
+                    progress[index] = 100
+                    remaining -= 1
+
+                elif kind == 'error':
+                    _fail(index, payload)
+                    remaining -= 1
+
+            except Exception as e:
+                Logger.error('DataStore: Error writing datalog {}: {}'.format(datalog.path, traceback.format_exc()))
+                _fail(index, str(e))
+                remaining -= 1
+
+            if progress_cb and kind in ('progress', 'done', 'error'):
+                progress_cb(sum(progress) / len(progress))
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        datastore.commit()
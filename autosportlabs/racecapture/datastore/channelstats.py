@@ -0,0 +1,110 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ChannelStatistics(object):
+    """
+    Statistics of one channel over the samples of a session, or several
+    sessions combined. The minimum and maximum only consider values above
+    zero, matching DataStore.get_channel_min / max; the count, sum and sum
+    of squares cover every value present, with the number of zero values
+    kept so averages can leave them out.
+    """
+
+    def __init__(self, value_count=0, zero_count=0, sum_value=None, sum_squares=None, min_value=None, max_value=None):
+        self.value_count = value_count
+        self.zero_count = zero_count
+        self.sum_value = sum_value
+        self.sum_squares = sum_squares
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @property
+    def average(self):
+        """
+        :return: the average of every value present, or None without values
+        """
+        return None if not self.value_count else self.sum_value / float(self.value_count)
+
+    @property
+    def nonzero_average(self):
+        """
+        :return: the average of the values other than zero, or None without any
+        """
+        count = self.value_count - self.zero_count
+        return None if count <= 0 else self.sum_value / float(count)
+
+    @property
+    def std_dev(self):
+        """
+        :return: the population standard deviation of the values present, or None without values
+        """
+        if not self.value_count:
+            return None
+        mean = self.sum_value / float(self.value_count)
+        return math.sqrt(max(0.0, self.sum_squares / float(self.value_count) - mean * mean))
+
+    def merge(self, other):
+        """
+        Combine the statistics of another set of samples into this one
+        """
+        for value in (other.min_value, other.max_value):
+            if value is not None:
+                self.min_value = value if self.min_value is None else min(self.min_value, value)
+                self.max_value = value if self.max_value is None else max(self.max_value, value)
+        if other.value_count:
+            self.sum_value = other.sum_value if self.sum_value is None else self.sum_value + other.sum_value
+            self.sum_squares = other.sum_squares if self.sum_squares is None else self.sum_squares + other.sum_squares
+            self.value_count += other.value_count
+            self.zero_count += other.zero_count
+
+
+def summarize_values(values):
+    """
+    Calculate the statistics of a channel's values
+    :param values: the values; None or NaN where missing
+    :type values: list
+    :return: ChannelStatistics
+    """
+    if np is not None:
+        present = np.array(values, dtype=float)
+        present = present[~np.isnan(present)]
+        if len(present) == 0:
+            return ChannelStatistics()
+        positive = present[present > 0]
+        return ChannelStatistics(len(present), int((present == 0).sum()), float(present.sum()),
+                                 float(np.dot(present, present)),
+                                 float(positive.min()) if len(positive) else None,
+                                 float(positive.max()) if len(positive) else None)
+
+    present = [value for value in values if value is not None and value == value]
+    if len(present) == 0:
+        return ChannelStatistics()
+    positive = [value for value in present if value > 0]
+    return ChannelStatistics(len(present), present.count(0), float(sum(present)),
+                             float(sum(value * value for value in present)),
+                             min(positive) if positive else None, max(positive) if positive else None)
@@ -0,0 +1,725 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import copy
+import sqlite3
+from array import array
+from collections import OrderedDict
+from itertools import compress
+from kivy.logger import Logger
+from autosportlabs.racecapture.datastore.datastore import DataStore, DataSet, \
+    DatastoreException, InvalidChannelException, Lap, _scrub_sql_value
+from autosportlabs.racecapture.datastore.lapsummary import summarize_columns, summarize_ranges
+from autosportlabs.racecapture.datastore.lapsegmentation import segment_columns
+from autosportlabs.racecapture.datastore.channelstats import ChannelStatistics, summarize_values
+
+NAN = float('nan')
+
+
+def _pack_values(values):
+    """
+    Packs a list of channel values into a typed array.
+    Values are stored as float32 if every value survives the round trip,
+    otherwise float64. Missing values (None) are stored as NaN.
+    :param values: list of values
+    :type values: list
+    :return: tuple of (typecode, packed bytes)
+    """
+    values = [NAN if v is None else v for v in values]
+    packed = array('f', values)
+    for unpacked, value in zip(packed, values):
+        if unpacked != value and value == value:
+            packed = array('d', values)
+            break
+    return packed.typecode, packed.tostring()
+
+
+def _unpack_values(typecode, data):
+    """
+    Unpacks a typed array produced by _pack_values into a list of values,
+    restoring missing values as None
+    """
+    packed = array(str(typecode))
+    packed.fromstring(str(data))
+    return [None if v != v else v for v in packed]
+
+
+def _value_stats(values):
+    """
+    Calculates min, max, sum and count for the non-empty values in a list
+    """
+    present = [v for v in values if v is not None and v == v]
+    if len(present) == 0:
+        return None, None, None, 0
+    return min(present), max(present), sum(present), len(present)
+
+
+class _ColumnCursor(object):
+    """
+    Presents columnar query results with the subset of the DB-API cursor
+    interface used by DataSet, reading the rows a block at a time as they
+    are fetched
+    """
+
+    def __init__(self, columns, row_blocks):
+        self.description = [(c, None, None, None, None, None, None) for c in columns]
+        self._row_blocks = iter(row_blocks)
+        self._rows = []
+
+    def fetchmany(self, count):
+        while len(self._rows) < count:
+            block = next(self._row_blocks, None)
+            if block is None:
+                break
+            self._rows.extend(block)
+        rows = self._rows[:count]
+        del self._rows[:count]
+        return rows
+
+    def fetchall(self):
+        rows = self._rows
+        for block in self._row_blocks:
+            rows.extend(block)
+        self._rows = []
+        return rows
+
+
+class _SessionColumnWriter(object):
+    """
+    Accumulates rows for a session and writes them out as fixed size,
+    per channel column chunks. The last, partially filled chunk is re-written
+    on every flush until it fills up.
+    """
+
+    def __init__(self, conn, session_id, channels, chunk_size):
+        self._conn = conn
+        self._session_id = session_id
+        self._chunk_size = chunk_size
+        self._columns = OrderedDict()
+        self._chunk_index = 0
+        self._row_count = 0
+        self._pending_count = 0
+        self._resume()
+        for channel in channels:
+            self._add_channel(channel)
+
+    @property
+    def row_count(self):
+        return self._row_count + self._pending_count
+
+    def _resume(self):
+        # Pick up where a previous writer left off, re-loading the
+        # partially filled tail chunk if there is one
+        c = self._conn.cursor()
+        c.execute('SELECT sample_count FROM column_session WHERE session_id = ?', (self._session_id,))
+        res = c.fetchone()
+        if res is None:
+            return
+        self._row_count = res[0]
+        self._chunk_index = self._row_count / self._chunk_size
+        tail_count = self._row_count % self._chunk_size
+        if tail_count == 0:
+            return
+
+        self._row_count -= tail_count
+        self._pending_count = tail_count
+        for channel, typecode, data in c.execute('''SELECT channel, typecode, data FROM column_chunk
+                                                    WHERE session_id = ? AND chunk_index = ?''',
+                                                 (self._session_id, self._chunk_index)):
+            self._columns[channel] = _unpack_values(typecode, data)
+
+    def _add_channel(self, channel):
+        if channel not in self._columns:
+            self._columns[channel] = [None] * self._pending_count
+
+    def append(self, values):
+        """
+        Append a row of values, in the order of the writer's channels
+        """
+        for column, value in zip(self._columns.itervalues(), values):
+            column.append(value)
+        self._pending_count += 1
+        if self._pending_count >= self._chunk_size:
+            self.flush()
+
+    def append_records(self, records, channels):
+        """
+        Append rows of values given in the order of the specified channels,
+        a chunk's worth of rows at a time
+        """
+        for channel in channels:
+            self._add_channel(channel)
+        positions = dict((channel, index) for index, channel in enumerate(channels))
+        indexes = [positions.get(channel) for channel in self._columns]
+
+        start = 0
+        while start < len(records):
+            block = records[start:start + self._chunk_size - self._pending_count]
+            block_columns = zip(*block)
+            for column, index in zip(self._columns.itervalues(), indexes):
+                column.extend(block_columns[index] if index is not None else [None] * len(block))
+            start += len(block)
+            self._pending_count += len(block)
+            if self._pending_count >= self._chunk_size:
+                self.flush()
+
+    def append_sample(self, sample):
+        """
+        Append a row from a dict of channel values
+        """
+        for channel in sample:
+            self._add_channel(channel)
+        for channel, column in self._columns.iteritems():
+            column.append(sample.get(channel))
+        self._pending_count += 1
+        if self._pending_count >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending rows to the column_chunk table. Does not commit.
+        """
+        if self._pending_count == 0:
+            return
+
+        chunks = []
+        for channel, values in self._columns.iteritems():
+            min_value, max_value, sum_value, value_count = _value_stats(values)
+            typecode, data = _pack_values(values)
+            chunks.append((self._session_id, channel, self._chunk_index, self._pending_count,
+                           min_value, max_value, sum_value, value_count, typecode, sqlite3.Binary(data)))
+
+        self._conn.executemany('''INSERT OR REPLACE INTO column_chunk
+                                  (session_id, channel, chunk_index, sample_count, min_value, max_value,
+                                   sum_value, value_count, typecode, data)
+                                  VALUES (?,?,?,?,?,?,?,?,?,?)''', chunks)
+        self._conn.execute('INSERT OR REPLACE INTO column_session (session_id, sample_count) VALUES (?,?)',
+                           (self._session_id, self._row_count + self._pending_count))
+
+        if self._pending_count >= self._chunk_size:
+            self._row_count += self._pending_count
+            self._pending_count = 0
+            self._chunk_index += 1
+            for channel in self._columns:
+                self._columns[channel] = []
+
+
+class ColumnarDataStore(DataStore):
+    """
+    DataStore backend which keeps each session's channels as compact, typed
+    column chunks instead of rows of the wide datapoint table.
+
+    Each chunk holds up to CHUNK_SIZE samples of one channel along with the
+    min / max / sum / count of its values, so queries only read the channels
+    they ask for and can skip chunks that cannot pass the filter.
+
+    Sessions stored as rows by the DataStore are not readable through this
+    store until they are converted with migrate_row_sessions(). Once
+    converted, the database can only be read with this store.
+    """
+    CHUNK_SIZE = 4096
+    # seconds the conversion waits for writes through the datastore's own connection
+    MIGRATION_LOCK_TIMEOUT = 30.0
+
+    def __init__(self, **kwargs):
+        super(ColumnarDataStore, self).__init__(**kwargs)
+        self._writers = {}
+
+    @staticmethod
+    def is_columnar_database(db_path):
+        """
+        Check if a database holds sessions in column storage
+        :param db_path: the path of the database file
+        :type db_path: string
+        :return: True if any session is stored as column chunks
+        """
+        if not os.path.isfile(db_path):
+            return False
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM column_session').fetchone()[0] > 0
+        except sqlite3.OperationalError:  # the database predates column storage
+            return False
+        finally:
+            conn.close()
+
+    def open_db(self, db_path):
+        self._writers.clear()
+        super(ColumnarDataStore, self).open_db(db_path)
+
+    def open_reader(self):
+        reader = super(ColumnarDataStore, self).open_reader()
+        # the reader never writes, and must not share the pending writes of this store
+        reader._writers = {}
+        return reader
+
+    def _extend_datalog_channels(self, channels):
+        # Channels are stored as column chunks; there is no
+        # datapoint column to add
+        pass
+
+    def _columnar_sessions(self):
+        return [row[0] for row in self._conn.execute('SELECT session_id FROM column_session')]
+
+    def migrate_row_sessions(self, progress_cb=None):
+        """
+        Converts sessions stored in the wide datapoint table into column chunks,
+        removing the original rows as each session is converted. The conversion
+        cannot be undone; the database is compacted afterwards.
+
+        The conversion uses its own database connection and converts each
+        session in a single transaction, so writes committed meanwhile through
+        this datastore never persist a partially converted session.
+        :param progress_cb: callback receiving the percentage of sessions migrated
+        :type progress_cb: function
+        :return: the number of sessions migrated
+        """
+        conn = sqlite3.connect(self._db_path, timeout=self.MIGRATION_LOCK_TIMEOUT,
+                               isolation_level=None, check_same_thread=False)
+        migrator = copy.copy(self)
+        migrator._conn = conn
+        migrator._writers = {}
+        try:
+            columnar = set(migrator._columnar_sessions())
+            # sessions being recorded are already written as column chunks
+            row_sessions = [s.session_id for s in migrator.get_sessions()
+                            if s.session_id not in columnar and s.session_id not in self._writers]
+            migrated = 0
+            for session_id in row_sessions:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    migrator._migrate_row_session(session_id)
+                    conn.execute('COMMIT')
+                except:  # rollback under any exception, then re-raise exception
+                    conn.execute('ROLLBACK')
+                    raise
+                migrated += 1
+                if progress_cb:
+                    progress_cb(migrated * 100 / len(row_sessions))
+
+            if migrated > 0:
+                Logger.info('ColumnarDataStore: migrated {} sessions; compacting database'.format(migrated))
+                conn.execute('VACUUM')
+            return migrated
+        finally:
+            conn.close()
+
+    def _migrate_row_session(self, session_id):
+        if self._get_session_record_count(session_id) is not None:
+            return  # converted since the sessions were listed
+
+        channels = list(OrderedDict.fromkeys(c.name for c in self.get_channel_list(session_id)))
+        Logger.info('ColumnarDataStore: migrating session {} to column storage'.format(session_id))
+        writer = _SessionColumnWriter(self._conn, session_id, channels, self.CHUNK_SIZE)
+        if len(channels) > 0:
+            sql = """SELECT {} FROM sample JOIN datapoint ON datapoint.sample_id=sample.id
+                     WHERE sample.session_id = ? ORDER BY sample.id""".format(
+                         ','.join(['datapoint.' + _scrub_sql_value(c) for c in channels]))
+            for record in self._conn.cursor().execute(sql, (session_id,)):
+                writer.append(record)
+            writer.flush()
+        self._conn.execute('DELETE FROM datapoint WHERE sample_id IN (SELECT id FROM sample WHERE session_id = ?)',
+                           (session_id,))
+        self._conn.execute('DELETE FROM sample WHERE session_id = ?', (session_id,))
+        # the summary refers to samples by position from now on
+        self._delete_lap_summary(session_id)
+        self._update_lap_summary(session_id)
+        # marks the session as converted
+        self._conn.execute('INSERT OR REPLACE INTO column_session (session_id, sample_count) VALUES (?,?)',
+                           (session_id, writer.row_count))
+
+    def _write_records(self, session_id, headers, records):
+        writer = self._writers.get(session_id)
+        if writer is None:
+            writer = _SessionColumnWriter(self._conn, session_id, [h.name for h in headers], self.CHUNK_SIZE)
+            self._writers[session_id] = writer
+        try:
+            for record in records:
+                writer.append(record)
+            writer.flush()
+        except:  # the writer's pending rows are lost on rollback
+            self._writers.pop(session_id, None)
+            raise
+
+    def _finish_records(self, session_id, headers, backfills):
+        self._writers.pop(session_id, None)
+        for index, (value, count) in backfills.iteritems():
+            self._backfill_column(session_id, headers[index].name, value, count)
+
+    def _backfill_column(self, session_id, channel, value, count):
+        """
+        Replaces missing values in the leading rows of a session's channel
+        """
+        chunks = self._conn.execute('''SELECT chunk_index, typecode, data FROM column_chunk
+                                       WHERE session_id = ? AND channel = ? AND chunk_index < ?''',
+                                    (session_id, channel, (count + self.CHUNK_SIZE - 1) / self.CHUNK_SIZE)).fetchall()
+        for chunk_index, typecode, data in chunks:
+            values = _unpack_values(typecode, data)
+            fill_count = min(len(values), count - chunk_index * self.CHUNK_SIZE)
+            values[:fill_count] = [value if v is None else v for v in values[:fill_count]]
+            min_value, max_value, sum_value, value_count = _value_stats(values)
+            typecode, data = _pack_values(values)
+            self._conn.execute('''UPDATE column_chunk SET min_value = ?, max_value = ?, sum_value = ?,
+                                  value_count = ?, typecode = ?, data = ?
+                                  WHERE session_id = ? AND channel = ? AND chunk_index = ?''',
+                               (min_value, max_value, sum_value, value_count, typecode, sqlite3.Binary(data),
+                                session_id, channel, chunk_index))
+
+    def _read_session_columns(self, session_id, channels):
+        # samples are identified by their position within the session
+        return range(self._get_session_record_count(session_id) or 0), self._read_columns(session_id, channels)
+
+    def _write_lap_segments(self, session_id, sample_ids, segments, times, include_sectors):
+        self._writers.pop(session_id, None)
+        chunks = []
+        for channel, values in segment_columns(segments, times, include_sectors).iteritems():
+            for chunk_index, start in enumerate(range(0, len(values), self.CHUNK_SIZE)):
+                chunk_values = values[start:start + self.CHUNK_SIZE]
+                min_value, max_value, sum_value, value_count = _value_stats(chunk_values)
+                typecode, data = _pack_values(chunk_values)
+                chunks.append((session_id, channel, chunk_index, len(chunk_values), min_value, max_value,
+                               sum_value, value_count, typecode, sqlite3.Binary(data)))
+        self._conn.executemany('''INSERT OR REPLACE INTO column_chunk
+                                  (session_id, channel, chunk_index, sample_count, min_value, max_value,
+                                   sum_value, value_count, typecode, data)
+                                  VALUES (?,?,?,?,?,?,?,?,?,?)''', chunks)
+
+    def insert_record(self, record, channels, session_id):
+        writer = _SessionColumnWriter(self._conn, session_id, [c.name for c in channels], self.CHUNK_SIZE)
+        try:
+            writer.append(record)
+            writer.flush()
+            self._update_lap_summary(session_id)
+            self._conn.commit()
+        except:  # rollback under any exception, then re-raise exception
+            self._conn.rollback()
+            raise
+
+    def _session_writer(self, session_id):
+        writer = self._writers.get(session_id)
+        if writer is None:
+            writer = _SessionColumnWriter(self._conn, session_id, [], self.CHUNK_SIZE)
+            self._writers[session_id] = writer
+        return writer
+
+    def insert_sample_nocommit(self, sample, session_id):
+        self._session_writer(session_id).append_sample(sample)
+        self._unsummarized_sessions.add(session_id)
+
+    def insert_records_nocommit(self, records, channel_names, session_id):
+        if len(records) == 0:
+            return
+        self._session_writer(session_id).append_records(records, channel_names)
+        self._unsummarized_sessions.add(session_id)
+
+    def commit(self):
+        try:
+            for writer in self._writers.itervalues():
+                writer.flush()
+            summarized = self._update_lap_summaries()
+            self._conn.commit()
+            self._summaries_committed(summarized)
+        except:  # rollback under any exception, then re-raise exception
+            self._conn.rollback()
+            raise
+
+    def delete_session(self, session_id):
+        self._writers.pop(session_id, None)
+        self._conn.execute('DELETE FROM column_chunk WHERE session_id = ?', (session_id,))
+        self._conn.execute('DELETE FROM column_session WHERE session_id = ?', (session_id,))
+        super(ColumnarDataStore, self).delete_session(session_id)
+
+    def _get_session_record_count(self, session_id):
+        c = self._conn.cursor()
+        c.execute('SELECT sample_count FROM column_session WHERE session_id = ?', (session_id,))
+        res = c.fetchone()
+        return None if res is None else res[0]
+
+    def _chunk_ranges(self, session_id, channels):
+        """
+        Returns the value ranges of the specified channels for every chunk in a session
+        :return: OrderedDict of chunk index -> dict of channel -> (min, max)
+        """
+        chunks = OrderedDict()
+        for chunk_index in range((self._get_session_record_count(session_id) + self.CHUNK_SIZE - 1) / self.CHUNK_SIZE):
+            chunks[chunk_index] = dict((channel, (None, None)) for channel in channels)
+
+        if len(channels) > 0:
+            sql = '''SELECT chunk_index, channel, min_value, max_value FROM column_chunk
+                     WHERE session_id = ? AND channel IN ({})'''.format(','.join(['?'] * len(channels)))
+            for chunk_index, channel, min_value, max_value in self._conn.execute(sql, [session_id] + channels):
+                chunks[chunk_index][channel] = (min_value, max_value)
+        return chunks
+
+    def _read_columns(self, session_id, channels, chunk_indexes=None):
+        """
+        Reads the values of the specified channels for a session.
+        :param chunk_indexes: limit the read to these chunks; None reads all chunks
+        :return: dict of channel -> list of values. Channels missing from a chunk are filled with None
+        """
+        columns = dict((channel, []) for channel in channels)
+        if len(channels) == 0:
+            return columns
+
+        sql = '''SELECT chunk_index, sample_count, channel, typecode, data FROM column_chunk
+                 WHERE session_id = ? AND channel IN ({})'''.format(','.join(['?'] * len(channels)))
+        params = [session_id] + list(channels)
+        if chunk_indexes is not None:
+            if len(chunk_indexes) == 0:
+                return columns
+            sql += ' AND chunk_index IN ({})'.format(','.join(['?'] * len(chunk_indexes)))
+            params += list(chunk_indexes)
+        sql += ' ORDER BY chunk_index'
+
+        chunk_counts = OrderedDict()
+        chunk_values = {}
+        for chunk_index, sample_count, channel, typecode, data in self._conn.execute(sql, params):
+            chunk_counts[chunk_index] = sample_count
+            chunk_values[(chunk_index, channel)] = _unpack_values(typecode, data)
+
+        for chunk_index, sample_count in chunk_counts.iteritems():
+            for channel in channels:
+                values = chunk_values.get((chunk_index, channel))
+                columns[channel].extend(values if values is not None else [None] * sample_count)
+        return columns
+
+    def _session_row_blocks(self, session_id, channels, data_filter=None):
+        """
+        Reads the rows for a session one chunk at a time, applying the filter
+        to each chunk's columns.
+        :return: generator of lists of tuples of (session_id, channel values...)
+        """
+        chunk_count = ((self._get_session_record_count(session_id) or 0) + self.CHUNK_SIZE - 1) / self.CHUNK_SIZE
+        chunk_indexes = range(chunk_count)
+        filter_channels = []
+        if data_filter is not None:
+            filter_channels = [c for c in OrderedDict.fromkeys(data_filter.channels)]
+            chunk_ranges = self._chunk_ranges(session_id, filter_channels)
+            chunk_indexes = [index for index, ranges in chunk_ranges.iteritems() if data_filter.may_match(ranges)]
+
+            # only read the chunks holding the laps the filter selects
+            sample_ranges = self._filter_sample_ranges([session_id], data_filter)
+            if sample_ranges is not None:
+                lap_chunks = set()
+                for start, end in sample_ranges:
+                    lap_chunks.update(range(start / self.CHUNK_SIZE, end / self.CHUNK_SIZE + 1))
+                chunk_indexes = [index for index in chunk_indexes if index in lap_chunks]
+
+        read_channels = list(OrderedDict.fromkeys(channels + filter_channels))
+        if len(read_channels) == 0:
+            return
+
+        for chunk_index in chunk_indexes:
+            columns = self._read_columns(session_id, read_channels, [chunk_index])
+            count = len(columns[read_channels[0]])
+            rows = zip([session_id] * count, *[columns[c] for c in channels])
+            if data_filter is not None:
+                rows = list(compress(rows, data_filter.match_columns(columns, count)))
+            if len(rows) > 0:
+                yield rows
+
+    def _row_blocks(self, sessions, channels, data_filter, distinct_records):
+        seen = set()
+        for session_id in sessions:
+            for rows in self._session_row_blocks(session_id, channels, data_filter):
+                if distinct_records:
+                    rows = [row for row in OrderedDict.fromkeys(rows) if row not in seen]
+                    seen.update(rows)
+                yield rows
+
+    def query(self, sessions=[], channels=[], data_filter=None, distinct_records=False):
+        if type(sessions) != list or len(sessions) == 0:
+            raise DatastoreException(
+                "Must provide a list of sessions to query!")
+
+        if data_filter is not None and not 'Filter' in type(data_filter).__name__:
+            raise TypeError("data_filter must be of class Filter")
+
+        if len(channels) == 0 or '*' in channels:
+            channels = [x.name for x in self._channels]
+
+        smoothing_map = {}
+        for ch in channels:
+            smoothing_map[ch] = self.get_channel_smoothing(ch)
+        smoothing_map['session_id'] = 0
+
+        row_blocks = self._row_blocks(sorted(set(sessions)), channels, data_filter, distinct_records)
+        return DataSet(_ColumnCursor(['session_id'] + channels, row_blocks), smoothing_map)
+
+    def _sessions_or_all(self, sessions):
+        return self._columnar_sessions() if not sessions else sessions
+
+    def _scan_location_center(self, sessions=None):
+        lat_total = lon_total = 0.0
+        count = 0
+        for session_id in self._sessions_or_all(sessions):
+            columns = self._read_columns(session_id, ['Latitude', 'Longitude'])
+            for lat, lon in zip(columns['Latitude'], columns['Longitude']):
+                if lat and lon:
+                    lat_total += lat
+                    lon_total += lon
+                    count += 1
+
+        if count == 0:
+            return (None, None)
+        return (lat_total / count, lon_total / count)
+
+    def _scan_channel_average(self, channel, sessions=None):
+        params = [channel]
+        sql = 'SELECT SUM(sum_value), SUM(value_count) FROM column_chunk WHERE channel = ?'
+        if sessions:
+            sql += ' AND session_id IN ({})'.format(','.join(['?'] * len(sessions)))
+            params += sessions
+        c = self._conn.cursor()
+        c.execute(sql, params)
+        total, count = c.fetchone()
+        return None if not count else total / count
+
+    def _get_channel_aggregate(self, aggregate, channel, sessions=None, extra_channels=None, exclude_zero=True):
+        if not self.channel_exists(channel):
+            raise InvalidChannelException()
+
+        is_max = aggregate == 'MAX'
+        params = [channel]
+        sql = '''SELECT session_id, chunk_index, min_value, max_value FROM column_chunk
+                 WHERE channel = ? AND value_count > 0'''
+        if sessions:
+            sql += ' AND session_id IN ({})'.format(','.join(['?'] * len(sessions)))
+            params += sessions
+        if exclude_zero:
+            sql += ' AND max_value > 0'
+        sql += ' ORDER BY session_id, chunk_index'
+        chunks = self._conn.execute(sql, params).fetchall()
+
+        # Narrow down to the chunks that can hold the extreme value using the
+        # chunk statistics; only chunks straddling zero need to be scanned
+        best = None
+        candidates = []
+        for session_id, chunk_index, min_value, max_value in chunks:
+            if is_max:
+                value = max_value
+            elif exclude_zero and min_value <= 0:
+                candidates.append((session_id, chunk_index))
+                continue
+            else:
+                value = min_value
+            if best is None or (value > best if is_max else value < best):
+                best = value
+
+        for session_id, chunk_index in candidates:
+            values = self._read_columns(session_id, [channel], [chunk_index])[channel]
+            value = min(v for v in values if v > 0)
+            if best is None or value < best:
+                best = value
+
+        if not extra_channels:
+            return best
+        if best is None:
+            return (None,) + tuple(None for c in extra_channels)
+
+        # Locate the first sample holding the extreme value and report the
+        # extra channel values alongside it
+        for session_id, chunk_index, min_value, max_value in chunks:
+            if not min_value <= best <= max_value:
+                continue
+            columns = self._read_columns(session_id, [channel] + extra_channels, [chunk_index])
+            values = columns[channel]
+            if best in values:
+                index = values.index(best)
+                return (best,) + tuple(columns[c][index] for c in extra_channels)
+        return (best,) + tuple(None for c in extra_channels)
+
+    def _scan_session_has_laps(self, session_id):
+        columns = self._read_columns(session_id, ['LapCount', 'CurrentLap'])
+        lap_counts = columns['LapCount']
+        if len(lap_counts) == 0:
+            return False
+
+        present = [lc for lc in lap_counts if lc is not None]
+        if len(present) == 0:
+            return False
+        index = lap_counts.index(max(present))
+        return columns['CurrentLap'][index] is not None
+
+    def _scan_laps(self, session_id):
+        lap_time_channel = ['LapTime'] if self.channel_exists('LapTime') else []
+        columns = self._read_columns(session_id, ['LapCount', 'CurrentLap'] + lap_time_channel)
+        lap_times = columns['LapTime'] if lap_time_channel else [None] * len(columns['LapCount'])
+
+        # Group by LapCount, keeping the first sample seen for each lap count, same as SQL
+        lap_groups = {}
+        for lap_count, current_lap, lap_time in zip(columns['LapCount'], columns['CurrentLap'], lap_times):
+            lap_groups.setdefault(lap_count, (current_lap, lap_time))
+
+        laps = []
+        # NULL lap counts sort first, same as SQL
+        for lap_count in sorted(lap_groups.keys(), key=lambda lc: (lc is not None, lc)):
+            lap, lap_time = lap_groups[lap_count]
+            lap = 1 if lap is None else lap
+            laps.append(Lap(session_id=session_id, lap=lap - 1, lap_time=lap_time))
+        return laps
+
+    def _summarize_channel_stats(self, session_id, after_sample_id=None):
+        # Samples are identified by their position within the session
+        sample_count = self._get_session_record_count(session_id) or 0
+        start = 0 if after_sample_id is None else after_sample_id + 1
+        if start >= sample_count:
+            return {}
+
+        first_chunk = start / self.CHUNK_SIZE
+        offset = start - first_chunk * self.CHUNK_SIZE
+        channel_stats = {}
+        for channel, chunk_index, typecode, data in self._conn.execute(
+                '''SELECT channel, chunk_index, typecode, data FROM column_chunk
+                   WHERE session_id = ? AND chunk_index >= ?''', (session_id, first_chunk)):
+            values = _unpack_values(typecode, data)
+            if chunk_index == first_chunk:
+                values = values[offset:]
+            channel_stats.setdefault(channel, ChannelStatistics()).merge(summarize_values(values))
+        return channel_stats
+
+    def _summarize_samples(self, session_id, after_sample_id=None):
+        # Samples are identified by their position within the session
+        sample_count = self._get_session_record_count(session_id) or 0
+        start = 0 if after_sample_id is None else after_sample_id + 1
+        if start >= sample_count:
+            return [], []
+
+        first_chunk = start / self.CHUNK_SIZE
+        # a channel present in the first chunk read is in every later chunk,
+        # so the columns read cover every sample
+        c = self._conn.cursor()
+        c.execute('SELECT channel FROM column_chunk WHERE session_id = ? AND chunk_index = ? LIMIT 1',
+                  (session_id, first_chunk))
+        res = c.fetchone()
+        if res is None:
+            return [], []
+
+        lap_channels = ['LapCount', 'CurrentLap', 'LapTime']
+        channels = list(OrderedDict.fromkeys(lap_channels + self.LAP_SUMMARY_CHANNELS + [res[0]]))
+        columns = self._read_columns(session_id, channels,
+                                     range(first_chunk, (sample_count + self.CHUNK_SIZE - 1) / self.CHUNK_SIZE))
+        offset = start - first_chunk * self.CHUNK_SIZE
+        for channel in channels:
+            columns[channel] = columns[channel][offset:]
+        laps = summarize_columns(start, columns['LapCount'], columns['CurrentLap'], columns['LapTime'],
+                                 dict((channel, columns[channel]) for channel in self.LAP_SUMMARY_CHANNELS))
+        return laps, summarize_ranges(start, columns['CurrentLap'])
@@ -19,6 +19,7 @@
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
 import sqlite3
+import copy
 from sqlalchemy import create_engine, MetaData, Table, Column, Integer, Text
 from sqlturk.migration import MigrationTool
 import logging
@@ -26,8 +27,16 @@ import os
 import os.path
 import time
 import datetime
+import operator
 from kivy.logger import Logger
 from collections import OrderedDict
+from autosportlabs.racecapture.datastore.desparsifier import ChunkedDesparsifier
+from autosportlabs.racecapture.datastore.batchimport import DatalogImport, run_batch_import
+from autosportlabs.racecapture.datastore.export import ExportTarget, CsvExportTarget, SessionExporter, EXPORT_CHUNK_SIZE
+from autosportlabs.racecapture.datastore.lapsummary import LapSummary, ChannelSummary, SampleRange
+from autosportlabs.racecapture.datastore.channelstats import ChannelStatistics
+from autosportlabs.racecapture.datastore.lapsegmentation import segment_laps, DEFAULT_GATE_RADIUS_METERS
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
 
 
 class InvalidChannelException(Exception):
@@ -184,6 +193,26 @@ class DataSet(object):
 
         return zip(*zlist)
 
+    def iter_records(self, chunk_size):
+        """
+        Iterate over the records, reading chunk_size rows at a time rather
+        than the whole result. Smoothing interpolates across each channel's
+        entire dataset, so a smoothed dataset is still read in one go.
+        :param chunk_size: the number of rows read at a time
+        :type chunk_size: int
+        """
+        if self._smoothing_map and any(rate > 1 for rate in self._smoothing_map.itervalues()):
+            for record in self.fetch_records():
+                yield record
+            return
+
+        while True:
+            rows = self._cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
 
 class Session(object):
 
@@ -205,11 +234,19 @@ class Lap(object):
 
 
 class Filter(object):
+    _COMPARATORS = {'eq': operator.eq,
+                    'neq': operator.ne,
+                    'lt': operator.lt,
+                    'gt': operator.gt,
+                    'lteq': operator.le,
+                    'gteq': operator.ge,
+                    'in_': lambda value, values: value in values}
 
     def __init__(self):
         self._cmd_seq = ''
         self._comb_op = 'AND '
         self._channels = []
+        self._terms = []
         self.params = []
 
     @property
@@ -218,15 +255,21 @@ class Filter(object):
 
     def add_combop(f):
         def wrap(self, *args, **kwargs):
+            comb_op = None
             if len(self._cmd_seq):
                 self._cmd_seq += self._comb_op
+                comb_op = self._comb_op.strip()
             ret = f(self, *args, **kwargs)
+            # The term appended by f is tagged with the operator joining it
+            # to the previous term, so the filter can be evaluated in Python
+            self._terms[-1] = (comb_op,) + self._terms[-1]
             return ret
         return wrap
 
     def chan_adj(f):
         def wrap(self, chan, val):
             self._channels.append(chan)
+            self._terms.append((f.__name__, chan, val))
             prefix = 'datapoint.'
             chan = prefix + str(chan)
             ret = f(self, chan, val)
@@ -275,6 +318,13 @@ class Filter(object):
         self.params.append(val)
         return self
 
+    @add_combop
+    @chan_adj
+    def in_(self, chan, val):
+        self._cmd_seq += '{} IN ({}) '.format(chan, ','.join(['?'] * len(val)))
+        self.params.extend(val)
+        return self
+
     def and_(self):
         self._comb_op = 'AND '
         return self
@@ -290,8 +340,124 @@ class Filter(object):
     def group(self, filterchain):
         self._cmd_seq += '({})'.format(str(filterchain).strip())
         self.params = self.params + filterchain.params
+        self._channels += filterchain.channels
+        self._terms.append(('group', filterchain, None))
         return self
 
+    def pinned_values(self, chan):
+        """
+        The values a channel must equal for a record to pass the filter,
+        e.g. the laps selected by CurrentLap = 1 OR CurrentLap = 2
+        :param chan: the channel name
+        :type chan: string
+        :return: set of values, or None if the filter does not pin the channel to a set of values
+        """
+        values = set()
+        for group in self._or_groups():
+            pinned = None
+            for op, term_chan, val in group:
+                if op == 'eq' and term_chan == chan:
+                    pinned = set([val])
+                elif op == 'in_' and term_chan == chan:
+                    pinned = set(val)
+                elif op == 'group':
+                    pinned = term_chan.pinned_values(chan)
+                if pinned is not None:
+                    break
+            if pinned is None:
+                return None
+            values |= pinned
+        return values
+
+    def _or_groups(self):
+        # AND binds tighter than OR, same as SQL
+        groups = [[]]
+        for comb_op, op, chan, val in self._terms:
+            if comb_op == 'OR':
+                groups.append([])
+            groups[-1].append((op, chan, val))
+        return groups
+
+    def matches(self, values):
+        """
+        Evaluates the filter against a single record, with SQL semantics
+        for NULL (None) values.
+        :param values: channel values for the record
+        :type values: dict
+        :return: True if the record passes the filter
+        """
+        def term_matches(op, chan, val):
+            if op == 'group':
+                return chan.matches(values)
+            value = values.get(chan)
+            if value is None:
+                return False
+            return Filter._COMPARATORS[op](value, val)
+
+        for group in self._or_groups():
+            if all(term_matches(*term) for term in group):
+                return True
+        return False
+
+    def match_columns(self, columns, count):
+        """
+        Evaluates the filter against a block of records held as columns, with
+        the same semantics as matches()
+        :param columns: list of values for each channel
+        :type columns: dict
+        :param count: the number of records in the block
+        :type count: int
+        :return: list of True / False for each record in the block
+        """
+        def term_mask(op, chan, val):
+            if op == 'group':
+                return chan.match_columns(columns, count)
+            values = columns.get(chan)
+            if values is None:
+                return [False] * count
+            compare = Filter._COMPARATORS[op]
+            return [value is not None and compare(value, val) for value in values]
+
+        mask = [False] * count
+        for group in self._or_groups():
+            group_mask = [True] * count
+            for term in group:
+                group_mask = map(operator.and_, group_mask, term_mask(*term))
+            mask = map(operator.or_, mask, group_mask)
+        return mask
+
+    def may_match(self, ranges):
+        """
+        Conservatively determines if any record within a block of records
+        could pass the filter, given the value range of each channel.
+        :param ranges: (min, max) range for each channel in the block. A range of (None, None)
+        indicates the block has no values for the channel.
+        :type ranges: dict
+        :return: False if no record in the block can pass the filter
+        """
+        def term_may_match(op, chan, val):
+            if op == 'group':
+                return chan.may_match(ranges)
+            if chan not in ranges:
+                return True
+            low, high = ranges[chan]
+            if low is None or high is None:
+                return False
+            if op == 'eq':
+                return low <= val <= high
+            if op == 'in_':
+                return any(low <= v <= high for v in val)
+            if op == 'neq':
+                return not (low == high == val)
+            if op in ('lt', 'lteq'):
+                return Filter._COMPARATORS[op](low, val)
+            return Filter._COMPARATORS[op](high, val)
+
+        for group in self._or_groups():
+            if all(term_may_match(*term) for term in group):
+                return True
+        return False
+
 
 class DatalogChannel(object):
 
@@ -318,15 +484,38 @@ class DataStore(object):
     # Channels to index on, WARNING: only [A-z] channel names with no spaces
     # will work currently
     EXTRA_INDEX_CHANNELS = ["CurrentLap"]
+
+    # Channels with per lap statistics in the lap summary
+    LAP_SUMMARY_CHANNELS = ['LapTime', 'Speed', 'RPM', 'TPS', 'EngineTemp', 'OilTemp', 'OilPress', 'Battery']
+
+    # Version of the per session summaries: the lap summary, the sample ranges of
+    # each lap and the channel statistics. Sessions summarized by an earlier
+    # version are summarized again when the database is opened
+    LAP_SUMMARY_VERSION = 1
+
+    # Channels written when dividing a session into laps from its GPS positions, with their units
+    LAP_TIMING_CHANNELS = [('LapCount', ''), ('CurrentLap', ''), ('LapTime', 'Min'), ('ElapsedTime', 'Min')]
+    SECTOR_TIMING_CHANNELS = [('Sector', ''), ('SectorTime', 'Min')]
+
+    # Number of ids per query when looking up a list of samples
+    SQL_ID_BATCH_SIZE = 500
     val_filters = ['lt', 'gt', 'eq', 'lt_eq', 'gt_eq']
 
-    def __init__(self, databus=None):
+    def __init__(self, databus=None, track_manager=None):
         self._channels = []
+        # the channels by name, for get_channel
+        self._channel_index = {}
         self._isopen = False
         self.datalogchanneltypes = {}
         self._ending_datalog_id = 0
         self._conn = None
+        self._db_path = None
         self._databus = databus
+        # finds the track of imported sessions without lap data
+        self._track_manager = track_manager
+        self._sample_sql_cache = {}
+        # sessions with samples added since their laps were last summarized
+        self._unsummarized_sessions = set()
 
     def close(self):
         self._conn.close()
@@ -337,6 +526,7 @@ class DataStore(object):
             self.close()
 
         db_uri = 'sqlite:///{}'.format(db_path)
+        self._db_path = db_path
 
         # Perform any pending database migrations
         # Will create the database if necessary
@@ -351,11 +541,25 @@ class DataStore(object):
         self._populate_channel_list()
 
         self._isopen = True
+        self._summarize_sessions()
 
     @property
     def connection(self):
         return self._conn
 
+    def open_reader(self):
+        """
+        Open a read only view of this datastore with its own database
+        connection, for querying from another thread. The reader shares this
+        datastore's channel information. Close it with close().
+        :return a copy of this datastore using the new connection
+        """
+        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        conn.execute('PRAGMA query_only = 1')
+        reader = copy.copy(self)
+        reader._conn = conn
+        return reader
+
     def _populate_channel_list(self):
         del self._channels[:]
         channels = self.get_channel_list()
@@ -376,6 +580,9 @@ class DataStore(object):
                     c.units = d.units
 
         self._channels += filtered_channels
+        # updated in place, as readers share the channels with this datastore
+        self._channel_index.clear()
+        self._channel_index.update((c.name, c) for c in filtered_channels)
 
     @property
     def is_open(self):
@@ -429,6 +636,9 @@ class DataStore(object):
         :type name string
         :returns DatalogChannel object for the channel. Raises DatastoreException if channel is unknown
         '''
+        channel = self._channel_index.get(name)
+        if channel is not None:
+            return channel
         channel = [c for c in self._channels if name in c.name]
         if not len(channel):
             raise DatastoreException("Unknown channel: {}".format(name))
@@ -554,6 +764,7 @@ class DataStore(object):
             base_sql = "INSERT INTO datapoint ({}) VALUES({});".format(','.join(['sample_id'] + [_scrub_sql_value(x.name) for x in channels]),
                                                                        ','.join(['?'] * (len(extrap_vals) + 1)))
             cursor.execute(base_sql, extrap_vals)
+            self._update_lap_summary(session_id)
             self._conn.commit()
         except:  # rollback under any exception, then re-raise exception
             self._conn.rollback()
@@ -561,10 +772,13 @@ class DataStore(object):
 
     def commit(self):
         """
-        Commit any pending changes to the database.
+        Commit any pending changes to the database, summarizing the laps
+        of the samples added.
         """
         try:
+            summarized = self._update_lap_summaries()
             self._conn.commit()
+            self._summaries_committed(summarized)
         except:  # rollback under any exception, then re-raise exception
             self._conn.rollback()
             raise
@@ -581,6 +795,7 @@ class DataStore(object):
             cursor.execute(
                 """INSERT INTO sample (session_id) VALUES (?)""", [session_id])
             sample_id = cursor.lastrowid
+            self._unsummarized_sessions.add(session_id)
 
             values = [sample_id]
             names = []
@@ -599,6 +814,49 @@ class DataStore(object):
             self._conn.rollback()
             raise
 
+    def _sample_insert_sql(self, names):
+        """
+        Returns the datapoint insert statement for a set of channel names,
+        building and caching it the first time the set is seen
+        :param names: the channel names, in the order values will be supplied
+        :type names: tuple
+        :return: String
+        """
+        sql = self._sample_sql_cache.get(names)
+        if sql is None:
+            sql = "INSERT INTO datapoint ({}) VALUES({});".format(','.join(['sample_id'] + [_scrub_sql_value(x) for x in names]),
+                                                                 ','.join(['?'] * (len(names) + 1)))
+            self._sample_sql_cache[names] = sql
+        return sql
+
+    def insert_records_nocommit(self, records, channel_names, session_id):
+        """
+        Insert a batch of samples which share the same channels, supplied as
+        lists of values. None or NaN values are stored as NULL.
+        A subsequent commit is required before the samples will appear in the DB.
+        :param records: the samples to insert, each a list of values in channel order
+        :type records: list
+        :param channel_names: the channel names
+        :type channel_names: list
+        :param session_id: the session the samples belong to
+        :type session_id: int
+        """
+        if len(records) == 0:
+            return
+
+        cursor = self._conn.cursor()
+        try:
+            starting_sample_id = self._get_last_table_id('sample') + 1
+            cursor.executemany("""INSERT INTO sample (session_id) VALUES (?)""",
+                               [[session_id]] * len(records))
+            self._unsummarized_sessions.add(session_id)
+            cursor.executemany(self._sample_insert_sql(tuple(channel_names)),
+                               ([sample_id] + record for sample_id, record in enumerate(records, starting_sample_id)))
+
+        except:  # rollback under any exception, then re-raise exception
+            self._conn.rollback()
+            raise
+
     def _extrap_datapoints(self, datapoints):
         """
         Takes a list of datapoints, and returns a new list of extrapolated datapoints
@@ -789,6 +1047,20 @@ class DataStore(object):
                 progress_cb(percent_complete)
             yield ds_to_yield
 
+    def _desparsified_records(self, data_file, headers, warnings=None, progress_cb=None):
+        """
+        Selects the import engine for a datalog; the chunked desparsifier is
+        used if NumPy is available, otherwise the desparsified data generator.
+        :return: tuple of (records generator, backfills). backfills is populated
+        once the generator is exhausted, mapping channel index -> (value, row count)
+        for leading rows which need to be back filled with the channel's first value.
+        """
+        if ChunkedDesparsifier.available():
+            desparsifier = ChunkedDesparsifier(data_file, len(headers), warnings=warnings, progress_cb=progress_cb)
+            return desparsifier.records(), desparsifier.backfills
+
+        return self._desparsified_data_generator(data_file, warnings=warnings, progress_cb=progress_cb), {}
+
     def delete_session(self, session_id):
         self._conn.execute(
             """DELETE FROM datapoint WHERE sample_id in (select id from sample where session_id = ?)""", (session_id,))
@@ -797,6 +1069,7 @@ class DataStore(object):
         self._conn.execute("""DELETE FROM session where id=?""", (session_id,))
         self._conn.execute(
             """DELETE FROM channel where session_id=?""", (session_id,))
+        self._delete_lap_summary(session_id)
         self._conn.commit()
 
     def init_session(self, name, channel_metas=None, notes=''):
@@ -836,14 +1109,33 @@ class DataStore(object):
         return session_id
 
     # class member variable to track ending datalog id when importing
-    def _handle_data(self, data_file, headers, session_id, warnings=None, progress_cb=None):
+    def _handle_data(self, data_file, headers, session_id, warnings=None, progress_cb=None, summarize=True):
         """
         takes a raw dataset in the form of a CSV file and inserts the data
-        into the sqlite database.
+        into the sqlite database. The laps are summarized unless summarize is False.
 
         This function is not thread-safe.
         """
 
+        # Create the generator for the desparsified data
+        newdata_gen, backfills = self._desparsified_records(
+            data_file, headers, warnings=warnings, progress_cb=progress_cb)
+
+        try:
+            self._write_records(session_id, headers, newdata_gen)
+            self._finish_records(session_id, headers, backfills)
+            if summarize:
+                self._update_lap_summary(session_id)
+            self._conn.commit()
+        except:  # rollback under any exception, then re-raise exception
+            self._conn.rollback()
+            raise
+
+    def _write_records(self, session_id, headers, records):
+        """
+        Inserts desparsified records for a session. May be called repeatedly
+        for the same session to append further records. Does not commit.
+        """
         starting_datalog_id = self._get_last_table_id('sample') + 1
         self._ending_datalog_id = starting_datalog_id
 
@@ -858,10 +1150,6 @@ class DataStore(object):
                 yield record
             self._ending_datalog_id = datalog_id
 
-        # Create the generator for the desparsified data
-        newdata_gen = self._desparsified_data_generator(
-            data_file, warnings=warnings, progress_cb=progress_cb)
-
         # Put together an insert statement containing the column names
         datapoint_sql = "INSERT INTO datapoint ({}) VALUES ({});".format(','.join(['sample_id'] + [_scrub_sql_value(x.name) for x in headers]),
                                                                          ','.join(['?'] * (len(headers) + 1)))
@@ -872,31 +1160,48 @@ class DataStore(object):
         # Use a generator to efficiently insert data into table, within a
         # transaction
         cur = self._conn.cursor()
-        try:
-            cur.executemany(
-                datapoint_sql, datapoint_iter(newdata_gen, starting_datalog_id))
-            cur.executemany(sample_sql, sample_iter(
-                self._ending_datalog_id - starting_datalog_id, session_id))
-            self._conn.commit()
-        except:  # rollback under any exception, then re-raise exception
-            self._conn.rollback()
-            raise
+        cur.executemany(
+            datapoint_sql, datapoint_iter(records, starting_datalog_id))
+        cur.executemany(sample_sql, sample_iter(
+            self._ending_datalog_id - starting_datalog_id, session_id))
+
+    def _finish_records(self, session_id, headers, backfills):
+        """
+        Completes the records written for a session, back filling the leading
+        samples of channels as reported by the import engine. Does not commit.
+        """
+        cur = self._conn.cursor()
+        for index, (value, count) in backfills.iteritems():
+            cur.execute("""UPDATE datapoint SET {} = ? WHERE sample_id IN
+                        (SELECT id FROM sample WHERE session_id = ? ORDER BY id LIMIT ?)""".format(
+                _scrub_sql_value(headers[index].name)), (value, session_id, count))
 
     def get_location_center(self, sessions=None):
 
         if not (self.channel_exists('Latitude') and self.channel_exists('Longitude')):
             return (0, 0)
 
+        latitude = self._read_channel_stats('Latitude', sessions)
+        longitude = self._read_channel_stats('Longitude', sessions)
+        if latitude is not None and longitude is not None:
+            # the positions without a GPS fix are left out
+            return (latitude.nonzero_average, longitude.nonzero_average)
+        return self._scan_location_center(sessions)
+
+    def _scan_location_center(self, sessions=None):
         c = self._conn.cursor()
 
         base_sql = 'SELECT AVG(Latitude), AVG(Longitude) from datapoint'
-        params = ','.join(['?'] * (len(sessions)))
+        params = []
 
         if type(sessions) == list and len(sessions) > 0:
             base_sql += """ JOIN sample ON datapoint.sample_id=sample.id WHERE sample.session_id IN({}) AND
-            datapoint.Latitude != 0 AND datapoint.Longitude != 0""".format(params)
+            datapoint.Latitude != 0 AND datapoint.Longitude != 0""".format(','.join(['?'] * len(sessions)))
+            params = sessions
+        else:
+            base_sql += ' WHERE datapoint.Latitude != 0 AND datapoint.Longitude != 0'
 
-        c.execute(base_sql, sessions)
+        c.execute(base_sql, params)
         res = c.fetchone()
 
         lat_average = None
@@ -916,6 +1221,12 @@ class DataStore(object):
         return sql
 
     def get_channel_average(self, channel, sessions=None):
+        stats = self._read_channel_stats(channel, sessions)
+        if stats is not None:
+            return stats.average
+        return self._scan_channel_average(channel, sessions)
+
+    def _scan_channel_average(self, channel, sessions=None):
         c = self._conn.cursor()
         params = []
 
@@ -959,10 +1270,113 @@ class DataStore(object):
         res = c.fetchone()
         return None if res == None else res if extra_channels else res[0]
 
+    def _get_summary_aggregate(self, aggregate, channel, sessions=None, extra_channels=None):
+        """
+        Answers get_channel_min / max from the lap summary, when the channel
+        is summarized and the sessions have been
+        :return: (True, result) or (False, None) if the summary can't answer
+        """
+        if channel not in self.LAP_SUMMARY_CHANNELS or any(c != 'LapCount' for c in extra_channels or []):
+            return False, None
+        if not self.channel_exists(channel):
+            raise InvalidChannelException()
+
+        c = self._conn.cursor()
+        session_ids = self._covered_sessions(sessions)
+        if session_ids is None:
+            return False, None
+        session_clause = 'AND lap.session_id IN ({})'.format(','.join(['?'] * len(session_ids))) if session_ids else ''
+
+        is_max = aggregate == 'MAX'
+        best = None
+        best_lap_count = None
+        for value, lap_count in c.execute('''SELECT lap_channel.{0}, lap.lap_count FROM lap_channel
+                                             JOIN lap ON lap.id = lap_channel.lap_id
+                                             WHERE lap_channel.channel = ? AND lap_channel.{0} IS NOT NULL {1}
+                                             ORDER BY lap.session_id, lap.start_sample_id'''.format(
+                                                 'max_value' if is_max else 'min_value', session_clause),
+                                          [channel] + session_ids):
+            if best is None or (value > best if is_max else value < best):
+                best = value
+                best_lap_count = lap_count
+
+        if extra_channels:
+            return True, (best,) + tuple(best_lap_count for c in extra_channels)
+        return True, best
+
+    def _covered_sessions(self, sessions=None):
+        """
+        Check that the summaries cover the sessions: the lap summary and the
+        channel statistics, which are kept up to date together
+        :return: the list of distinct session ids; empty for all sessions. None if not covered
+        """
+        if sessions:
+            return list(set(sessions)) if self._summarized_sessions(sessions) else None
+        if self._unsummarized_sessions:
+            return None
+        c = self._conn.cursor()
+        c.execute('SELECT COUNT(*) FROM session WHERE id NOT IN (SELECT session_id FROM lap_summary)')
+        return [] if c.fetchone()[0] == 0 else None
+
+    def _read_channel_stats(self, channel, sessions=None):
+        """
+        Combine the statistics of a channel over sessions from the channel
+        statistics, without reading any samples
+        :return: ChannelStatistics, or None if the statistics don't cover the sessions
+        """
+        session_ids = self._covered_sessions(sessions)
+        if session_ids is None:
+            return None
+        sql = '''SELECT value_count, zero_count, sum_value, sum_squares, min_value, max_value
+                 FROM channel_stats WHERE channel = ?'''
+        if session_ids:
+            sql += ' AND session_id IN ({})'.format(','.join(['?'] * len(session_ids)))
+        stats = ChannelStatistics()
+        for row in self._conn.execute(sql, [channel] + session_ids):
+            stats.merge(ChannelStatistics(*row))
+        return stats
+
+    def get_channel_stats(self, channel, sessions=None):
+        """
+        Fetch the count, sum, sum of squares and extremes of a channel's values
+        over the specified sessions, from the channel statistics
+        :param channel the channel name
+        :type channel string
+        :param sessions the session ids; None for all sessions
+        :type sessions list
+        :return: ChannelStatistics, or None while samples recorded to the sessions are not yet committed
+        """
+        if not self.channel_exists(channel):
+            raise InvalidChannelException()
+        return self._read_channel_stats(channel, sessions)
+
+    def _get_stats_aggregate(self, aggregate, channel, sessions=None, extra_channels=None):
+        """
+        Answers get_channel_min / max from the channel statistics, when the
+        sessions are covered and no other channels are requested
+        :return: (True, result) or (False, None) if the statistics can't answer
+        """
+        if extra_channels:
+            return False, None
+        if not self.channel_exists(channel):
+            raise InvalidChannelException()
+        stats = self._read_channel_stats(channel, sessions)
+        if stats is None:
+            return False, None
+        return True, stats.max_value if aggregate == 'MAX' else stats.min_value
+
     def get_channel_max(self, channel, sessions=None, extra_channels=None):
+        for summary_aggregate in (self._get_stats_aggregate, self._get_summary_aggregate):
+            summarized, result = summary_aggregate('MAX', channel, sessions=sessions, extra_channels=extra_channels)
+            if summarized:
+                return result
         return self._get_channel_aggregate('MAX', channel, sessions=sessions, extra_channels=extra_channels)
 
     def get_channel_min(self, channel, sessions=None, extra_channels=None, exclude_zero=True):
+        for summary_aggregate in (self._get_stats_aggregate, self._get_summary_aggregate):
+            summarized, result = summary_aggregate('MIN', channel, sessions=sessions, extra_channels=extra_channels)
+            if summarized:
+                return result
         return self._get_channel_aggregate('MIN', channel, sessions=sessions, extra_channels=extra_channels)
 
     def set_channel_smoothing(self, channel, smoothing):
@@ -1020,11 +1434,41 @@ class DataStore(object):
         # Create an event to be tagged to these records
         session_id = self.create_session(name, notes)
         self._add_session_channels(session_id, channels)
-        self._handle_data(dl, channels, session_id, warnings, progress_cb)
+        # a session which may be divided into laps is summarized once, after its laps are found
+        segment = self._track_manager is not None
+        self._handle_data(dl, channels, session_id, warnings, progress_cb, summarize=not segment)
 
         self._populate_channel_list()
+        if segment:
+            self._segment_imported_laps(session_id)
         return session_id
 
+    def import_datalogs(self, imports, progress_cb=None, worker_count=None):
+        """
+        Imports several datalogs concurrently, each into its own session.
+        Parsing is spread across worker processes while this thread writes
+        the results to the database.
+        :param imports: the datalogs to import
+        :type imports: list of DatalogImport
+        :param progress_cb: callback receiving the overall percent complete
+        :type progress_cb: function
+        :param worker_count: number of worker processes; defaults to the number of CPUs
+        :type worker_count: int
+        :return: the list of DatalogImport, updated with the session id, warnings or error for each
+        """
+        if not self._isopen:
+            raise DatastoreException("Datastore is not open")
+
+        try:
+            run_batch_import(self, imports, progress_cb=progress_cb, worker_count=worker_count)
+        finally:
+            self._populate_channel_list()
+        if self._track_manager is not None:
+            for datalog in imports:
+                if datalog.success:
+                    self._segment_imported_laps(datalog.session_id)
+        return imports
+
     def query(self, sessions=[], channels=[], data_filter=None, distinct_records=False):
         # Build our select statement
         sel_st = 'SELECT '
@@ -1066,30 +1510,32 @@ class DataStore(object):
         # Add our joins
         sel_st += 'JOIN datapoint ON datapoint.sample_id=sample.id\n'
 
+        conditions = []
         if data_filter is not None:
             # Add our filter
-            sel_st += 'WHERE '
             if not 'Filter' in type(data_filter).__name__:
                 raise TypeError("data_filter must be of class Filter")
 
-            sel_st += str(data_filter)
+            conditions.append('({})'.format(str(data_filter).strip()))
             params = params + data_filter.params
 
         # create the session filter
-        if data_filter == None:
-            ses_st = "WHERE "
-        else:
-            ses_st = "AND "
-
-        ses_filters = []
-        for s in sessions:
-            ses_filters.append('sample.session_id = ?')
-            params.append(s)
-
-        ses_st += 'OR '.join(ses_filters)
-
-        # Now add the session filter to the select statement
-        sel_st += ses_st
+        conditions.append('({})'.format(' OR '.join(['sample.session_id = ?'] * len(sessions))))
+        params.extend(sessions)
+
+        # narrow the query down to the samples of the sessions / laps it
+        # selects, scanning ranges of the sample table's primary key
+        sample_ranges = self._query_sample_ranges(sessions, data_filter)
+        if sample_ranges is not None:
+            if len(sample_ranges) > 0:
+                conditions.append('({})'.format(' OR '.join(['sample.id BETWEEN ? AND ?'] * len(sample_ranges))))
+                for sample_range in sample_ranges:
+                    params.extend(sample_range)
+            else:
+                conditions.append('0')
+
+        # Now add the filters to the select statement
+        sel_st += 'WHERE ' + ' AND '.join(conditions)
 
         Logger.debug('[datastore] Query execute: {}'.format(sel_st))
         c = self._conn.cursor()
@@ -1132,6 +1578,18 @@ class DataStore(object):
         if not (self.channel_exists('CurrentLap') and self.channel_exists('LapCount')):
             return False
 
+        laps = self.get_lap_summary(session_id)
+        if laps is None:
+            return self._scan_session_has_laps(session_id)
+        return self._summary_has_laps(laps)
+
+    def _summary_has_laps(self, laps):
+        counted = [lap for lap in laps if lap.lap_count is not None]
+        if len(counted) == 0:
+            return False
+        return max(counted, key=lambda lap: lap.lap_count).current_lap is not None
+
+    def _scan_session_has_laps(self, session_id):
         c = self._conn.cursor()
         for row in c.execute('''SELECT s.session_id, d.LapCount, d.CurrentLap FROM sample s, 
                              datapoint d WHERE s.session_id = ? AND d.sample_id = s.id ORDER BY d.LapCount DESC LIMIT 1;''',
@@ -1147,13 +1605,40 @@ class DataStore(object):
         :returns list of Lap objects
         :type list 
         '''
-
         # if there is no lap information then just return a default single lap.
         if not self.session_has_laps(session_id):
             laps_dict = OrderedDict()
             laps_dict[1] = Lap(session_id=session_id, lap=1, lap_time=None)
             return laps_dict
 
+        laps = self.get_lap_summary(session_id)
+        if laps is None:
+            laps = self._scan_laps(session_id)
+        else:
+            laps = [Lap(session_id=session_id, lap=(1 if lap.current_lap is None else lap.current_lap) - 1,
+                        lap_time=lap.lap_time) for lap in laps]
+
+        # If there are samples beyond the last actual timed lap (crossed start/finish), add that lap to the end
+        # so users can view that data if needed
+        if len(laps) > 0:
+            laps.append(
+                Lap(session_id=session_id, lap=(laps[-1].lap + 1), lap_time=None))
+
+        # Filter so we only include valid laps
+        laps = [lap for lap in laps if lap.lap >= 0]
+
+        # Transform into an ordered dict so lap IDs are preserved as keys.
+        laps_dict = OrderedDict()
+        for lap in laps:
+            laps_dict[lap.lap] = lap
+
+        return laps_dict
+
+    def _scan_laps(self, session_id):
+        '''
+        Reads the laps of a session from its samples, grouped by lap count
+        :returns list of Lap objects
+        '''
         laps = []
         c = self._conn.cursor()
         for row in c.execute('''SELECT DISTINCT sample.session_id AS session_id, 
@@ -1168,30 +1653,437 @@ class DataStore(object):
             lap = row[1]
             lap = 1 if lap is None else lap
             laps.append(Lap(session_id=row[0], lap=lap - 1, lap_time=row[2]))
+        return laps
 
-        # Figure out if there are samples beyond the last lap
-        extra_lap_query = '''SELECT COUNT(*) FROM sample JOIN datapoint ON datapoint.sample_id=sample.id
-                             AND sample.session_id = ? WHERE datapoint.CurrentLap > ? LIMIT 1'''
+    def get_lap_summary(self, session_id):
+        '''
+        Fetches the summary of each lap count of a session: its samples, lap
+        time and statistics of the LAP_SUMMARY_CHANNELS
+        :param session_id the session id
+        :type session_id int
+        :returns list of LapSummary ordered by lap count, or None if the session has not been summarized
+        '''
+        c = self._conn.cursor()
+        c.execute('SELECT session_id FROM lap_summary WHERE session_id = ?', (session_id,))
+        if c.fetchone() is None:
+            return None
+        return self._read_lap_summaries('lap.session_id = ?', [session_id]).values()
 
-        # If there are samples beyond the last actual timed lap (crossed start/finish), add that lap to the end
-        # so users can view that data if needed
-        if len(laps) > 0:
-            c = self._conn.cursor()
+    def _read_lap_summaries(self, where, params):
+        laps = OrderedDict()
+        c = self._conn.cursor()
+        for row in c.execute('''SELECT id, lap_count, current_lap, lap_time, start_sample_id, end_sample_id, sample_count
+                                FROM lap WHERE {} ORDER BY lap_count, start_sample_id'''.format(where), params):
+            laps[row[0]] = LapSummary(*row[1:])
+        for row in c.execute('''SELECT lap_id, channel, lap_channel.min_value, lap_channel.max_value,
+                                lap_channel.sum_value, lap_channel.value_count
+                                FROM lap_channel JOIN lap ON lap.id = lap_channel.lap_id WHERE {}'''.format(where), params):
+            laps[row[0]].channels[row[1]] = ChannelSummary(*row[2:])
+        return laps
+
+    def _summarized_sessions(self, sessions):
+        '''
+        Whether the lap summaries of the sessions cover all of their samples
+        '''
+        session_ids = list(set(sessions))
+        if self._unsummarized_sessions.intersection(session_ids):
+            return False
+        c = self._conn.cursor()
+        c.execute('SELECT COUNT(*) FROM lap_summary WHERE session_id IN ({})'.format(','.join(['?'] * len(session_ids))),
+                  session_ids)
+        return c.fetchone()[0] == len(session_ids)
 
-            for row in c.execute(extra_lap_query, [session_id, laps[-1].lap]):
-                laps.append(
-                    Lap(session_id=session_id, lap=(laps[-1].lap + 1), lap_time=None))
-                break
+    def _filter_sample_ranges(self, sessions, data_filter=None):
+        '''
+        The ranges of samples in the specified sessions that may pass a filter,
+        known from the lap summary: the samples of the laps the filter selects
+        by CurrentLap or LapCount, otherwise every sample of the sessions
+        :returns list of (first, last) sample id tuples ordered by first sample, or None if they are not known
+        '''
+        if not self._summarized_sessions(sessions):
+            return None
+        session_ids = list(set(sessions))
+        session_params = ','.join(['?'] * len(session_ids))
+        c = self._conn.cursor()
 
-        # Filter so we only include valid laps
-        laps = [lap for lap in laps if lap.lap >= 0]
+        current_laps = data_filter.pinned_values('CurrentLap') if data_filter is not None else None
+        if current_laps is not None:
+            current_laps = list(current_laps)
+            return c.execute('''SELECT start_sample_id, end_sample_id FROM lap_range
+                                WHERE session_id IN ({}) AND current_lap IN ({}) ORDER BY start_sample_id'''.format(
+                session_params, ','.join(['?'] * len(current_laps))), session_ids + current_laps).fetchall()
 
-        # Transform into an ordered dict so lap IDs are preserved as keys.
-        laps_dict = OrderedDict()
+        lap_counts = data_filter.pinned_values('LapCount') if data_filter is not None else None
+        if lap_counts is not None:
+            lap_counts = list(lap_counts)
+            return c.execute('''SELECT start_sample_id, end_sample_id FROM lap
+                                WHERE session_id IN ({}) AND lap_count IN ({}) ORDER BY start_sample_id'''.format(
+                session_params, ','.join(['?'] * len(lap_counts))), session_ids + lap_counts).fetchall()
+
+        return c.execute('''SELECT MIN(start_sample_id), MAX(end_sample_id) FROM lap WHERE session_id IN ({})
+                            GROUP BY session_id ORDER BY 1'''.format(session_params), session_ids).fetchall()
+
+    def _query_sample_ranges(self, sessions, data_filter=None):
+        '''
+        The sample id ranges a query can be limited to, with adjacent ranges combined
+        :returns list of (first, last) sample id tuples, or None if they are not known
+        '''
+        sample_ranges = self._filter_sample_ranges(sessions, data_filter)
+        if sample_ranges is None:
+            return None
+        combined = []
+        for start, end in sample_ranges:
+            if combined and start <= combined[-1][1] + 1:
+                combined[-1] = (combined[-1][0], max(combined[-1][1], end))
+            else:
+                combined.append((start, end))
+        return combined
+
+    def _datapoint_columns(self):
+        return set(row[1].upper() for row in self._conn.execute('PRAGMA table_info(datapoint)'))
+
+    def _summarize_samples(self, session_id, after_sample_id=None):
+        '''
+        Summarizes a session's samples by lap count, and finds the samples of each lap
+        :param after_sample_id only summarize the samples after this one; None for all samples
+        :type after_sample_id int
+        :returns tuple of list of LapSummary, list of SampleRange of each CurrentLap
+        '''
+        existing_columns = self._datapoint_columns()
+
+        def column(name):
+            return 'datapoint.' + _scrub_sql_value(name) if name.upper() in existing_columns else 'NULL'
+
+        channels = [channel for channel in self.LAP_SUMMARY_CHANNELS if channel.upper() in existing_columns]
+        stats = ''.join(''',MIN(CASE WHEN {0} > 0 THEN {0} END),MAX(CASE WHEN {0} > 0 THEN {0} END),
+                        SUM({0}),COUNT({0})'''.format(column(channel)) for channel in channels)
+
+        laps = []
+        c = self._conn.cursor()
+        for row in c.execute('''SELECT {} AS lap_count, MIN(sample.id), MAX(sample.id), COUNT(*) {} FROM sample
+                                JOIN datapoint ON datapoint.sample_id=sample.id
+                                WHERE sample.session_id = ? AND sample.id > ?
+                                GROUP BY lap_count'''.format(column('LapCount'), stats),
+                             (session_id, -1 if after_sample_id is None else after_sample_id)):
+            channel_stats = {}
+            for index, channel in enumerate(channels):
+                channel_stats[channel] = ChannelSummary(*row[4 + index * 4:8 + index * 4])
+            laps.append(LapSummary(row[0], start_sample_id=row[1], end_sample_id=row[2], sample_count=row[3],
+                                   channels=channel_stats))
+
+        # The lap in progress and lap time are taken from each lap count's first sample
+        laps_by_start = dict((lap.start_sample_id, lap) for lap in laps)
+        start_ids = laps_by_start.keys()
+        for start in range(0, len(start_ids), self.SQL_ID_BATCH_SIZE):
+            batch = start_ids[start:start + self.SQL_ID_BATCH_SIZE]
+            for sample_id, current_lap, lap_time in c.execute('SELECT sample_id, {}, {} FROM datapoint WHERE sample_id IN ({})'.format(
+                    column('CurrentLap'), column('LapTime'), ','.join(['?'] * len(batch))), batch):
+                lap = laps_by_start[sample_id]
+                lap.current_lap = current_lap
+                lap.lap_time = lap_time
+
+        lap_ranges = [SampleRange(*row) for row in c.execute('''SELECT {} AS current_lap, MIN(sample.id), MAX(sample.id),
+                                                                COUNT(*) FROM sample
+                                                                JOIN datapoint ON datapoint.sample_id=sample.id
+                                                                WHERE sample.session_id = ? AND sample.id > ?
+                                                                GROUP BY current_lap'''.format(column('CurrentLap')),
+                                                             (session_id, -1 if after_sample_id is None else after_sample_id))]
+        return laps, lap_ranges
+
+    def _update_lap_summary(self, session_id):
+        '''
+        Adds the samples recorded since a session was last summarized to its
+        lap summary. Does not commit.
+        :param session_id the session id
+        :type session_id int
+        '''
+        c = self._conn.cursor()
+        c.execute('SELECT summarized_sample_id FROM lap_summary WHERE session_id = ?', (session_id,))
+        res = c.fetchone()
+        summarized_sample_id = None if res is None else res[0]
+
+        self._update_channel_stats(session_id, summarized_sample_id)
+        laps, lap_ranges = self._summarize_samples(session_id, summarized_sample_id)
         for lap in laps:
-            laps_dict[lap.lap] = lap
+            if summarized_sample_id is None or lap.end_sample_id > summarized_sample_id:
+                summarized_sample_id = lap.end_sample_id
+            c.execute('SELECT id FROM lap WHERE session_id = ? AND lap_count IS ?', (session_id, lap.lap_count))
+            res = c.fetchone()
+            if res is None:
+                c.execute('''INSERT INTO lap (session_id, lap_count, current_lap, lap_time, start_sample_id,
+                             end_sample_id, sample_count) VALUES (?,?,?,?,?,?,?)''',
+                          (session_id, lap.lap_count, lap.current_lap, lap.lap_time, lap.start_sample_id,
+                           lap.end_sample_id, lap.sample_count))
+                lap_id = c.lastrowid
+            else:
+                # samples added to a lap count that was already summarized
+                lap_id = res[0]
+                summary = self._read_lap_summaries('lap.id = ?', [lap_id])[lap_id]
+                summary.merge(lap)
+                lap = summary
+                c.execute('''UPDATE lap SET current_lap = ?, lap_time = ?, start_sample_id = ?, end_sample_id = ?,
+                             sample_count = ? WHERE id = ?''',
+                          (lap.current_lap, lap.lap_time, lap.start_sample_id, lap.end_sample_id, lap.sample_count,
+                           lap_id))
+            c.executemany('''INSERT OR REPLACE INTO lap_channel (lap_id, channel, min_value, max_value, sum_value,
+                             value_count) VALUES (?,?,?,?,?,?)''',
+                          [(lap_id, channel, stats.min_value, stats.max_value, stats.sum_value, stats.value_count)
+                           for channel, stats in lap.channels.iteritems()])
+
+        for lap_range in lap_ranges:
+            c.execute('''SELECT rowid, start_sample_id, end_sample_id, sample_count FROM lap_range
+                         WHERE session_id = ? AND current_lap IS ?''', (session_id, lap_range.value))
+            res = c.fetchone()
+            if res is None:
+                c.execute('''INSERT INTO lap_range (session_id, current_lap, start_sample_id, end_sample_id, sample_count)
+                             VALUES (?,?,?,?,?)''', (session_id, lap_range.value, lap_range.start_sample_id,
+                                                     lap_range.end_sample_id, lap_range.sample_count))
+            else:
+                lap_range.merge(SampleRange(lap_range.value, *res[1:]))
+                c.execute('UPDATE lap_range SET start_sample_id = ?, end_sample_id = ?, sample_count = ? WHERE rowid = ?',
+                          (lap_range.start_sample_id, lap_range.end_sample_id, lap_range.sample_count, res[0]))
+
+        c.execute('''INSERT OR REPLACE INTO lap_summary (session_id, summarized_sample_id, summary_version)
+                     VALUES (?,?,?)''', (session_id, summarized_sample_id, self.LAP_SUMMARY_VERSION))
+
+    def _summarize_channel_stats(self, session_id, after_sample_id=None):
+        '''
+        Calculates the statistics of each of a session's channels
+        :param after_sample_id only include the samples after this one; None for all samples
+        :type after_sample_id int
+        :returns dict of channel name -> ChannelStatistics
+        '''
+        existing_columns = self._datapoint_columns()
+        channels = [row[0] for row in self._conn.execute('SELECT DISTINCT name FROM channel WHERE session_id = ?',
+                                                         (session_id,)) if row[0].upper() in existing_columns]
+        if len(channels) == 0:
+            # samples recorded without describing their channels could hold any of them
+            channels = [row[1] for row in self._conn.execute('PRAGMA table_info(datapoint)')
+                        if row[1].upper() not in ('ID', 'SAMPLE_ID')]
+
+        # TOTAL() rather than SUM(), which fails when a sum of integers overflows
+        stats = ','.join('''COUNT({0}),TOTAL({0} = 0),TOTAL({0}),TOTAL({0} * {0}),
+                         MIN(CASE WHEN {0} > 0 THEN {0} END),MAX(CASE WHEN {0} > 0 THEN {0} END)'''.format(
+                             'datapoint.' + _scrub_sql_value(channel)) for channel in channels)
+        c = self._conn.cursor()
+        c.execute('''SELECT {} FROM sample JOIN datapoint ON datapoint.sample_id=sample.id
+                     WHERE sample.session_id = ? AND sample.id > ?'''.format(stats),
+                  (session_id, -1 if after_sample_id is None else after_sample_id))
+        row = c.fetchone()
+        channel_stats = {}
+        for index, channel in enumerate(channels):
+            value_count, zero_count, sum_value, sum_squares, min_value, max_value = row[index * 6:index * 6 + 6]
+            if value_count:
+                channel_stats[channel] = ChannelStatistics(value_count, int(zero_count), sum_value, sum_squares,
+                                                           min_value, max_value)
+            else:
+                channel_stats[channel] = ChannelStatistics()
+        return channel_stats
+
+    def _update_channel_stats(self, session_id, after_sample_id=None):
+        '''
+        Adds the samples after the specified one to a session's channel statistics. Does not commit.
+        :param after_sample_id the last sample already included; None for all samples
+        :type after_sample_id int
+        '''
+        channel_stats = self._summarize_channel_stats(session_id, after_sample_id)
+        if after_sample_id is not None:
+            for row in self._conn.execute('''SELECT channel, value_count, zero_count, sum_value, sum_squares,
+                                             min_value, max_value FROM channel_stats WHERE session_id = ?''',
+                                          (session_id,)):
+                stats = channel_stats.setdefault(row[0], ChannelStatistics())
+                stats.merge(ChannelStatistics(*row[1:]))
+        self._conn.executemany('''INSERT OR REPLACE INTO channel_stats (session_id, channel, value_count, zero_count,
+                                  sum_value, sum_squares, min_value, max_value) VALUES (?,?,?,?,?,?,?,?)''',
+                               [(session_id, channel, stats.value_count, stats.zero_count, stats.sum_value,
+                                 stats.sum_squares, stats.min_value, stats.max_value)
+                                for channel, stats in channel_stats.iteritems()])
+
+    def _update_lap_summaries(self):
+        '''
+        Summarizes the laps of the samples inserted since the last commit. Does not commit;
+        the sessions stay unsummarized until _summaries_committed() is called after committing.
+        :returns the list of sessions summarized
+        '''
+        session_ids = list(self._unsummarized_sessions)
+        for session_id in session_ids:
+            self._update_lap_summary(session_id)
+        return session_ids
 
-        return laps_dict
+    def _summaries_committed(self, session_ids):
+        '''
+        Marks sessions as summarized once their summaries are committed. Readers
+        share the unsummarized sessions, and scan the samples of those sessions
+        rather than rely on summaries their connection cannot see yet.
+        :param session_ids the sessions returned by _update_lap_summaries()
+        :type session_ids list
+        '''
+        self._unsummarized_sessions.difference_update(session_ids)
+
+    def _delete_lap_summary(self, session_id):
+        self._conn.execute('DELETE FROM lap_channel WHERE lap_id IN (SELECT id FROM lap WHERE session_id = ?)',
+                           (session_id,))
+        self._conn.execute('DELETE FROM lap WHERE session_id = ?', (session_id,))
+        self._conn.execute('DELETE FROM lap_range WHERE session_id = ?', (session_id,))
+        self._conn.execute('DELETE FROM lap_summary WHERE session_id = ?', (session_id,))
+        self._conn.execute('DELETE FROM channel_stats WHERE session_id = ?', (session_id,))
+
+    def _summarize_sessions(self):
+        '''
+        Summarizes sessions recorded before the current LAP_SUMMARY_VERSION:
+        before lap summaries, the sample ranges of each lap, or the channel
+        statistics were kept. Each session is summarized once, including
+        sessions without samples
+        '''
+        session_ids = [row[0] for row in self._conn.execute(
+            '''SELECT id FROM session WHERE id NOT IN
+               (SELECT session_id FROM lap_summary WHERE summary_version >= ?)''', (self.LAP_SUMMARY_VERSION,))]
+        if len(session_ids) == 0:
+            return
+        Logger.info('DataStore: summarizing laps of {} sessions'.format(len(session_ids)))
+        for session_id in session_ids:
+            self._delete_lap_summary(session_id)
+            self._update_lap_summary(session_id)
+            self._conn.commit()
+
+    def rebuild_lap_summaries(self, progress_cb=None):
+        '''
+        Rebuilds the lap summary of every session from its samples, for
+        existing databases or after changing the LAP_SUMMARY_CHANNELS
+        :param progress_cb callback receiving the percentage of sessions rebuilt
+        :type progress_cb function
+        :returns the number of sessions rebuilt
+        '''
+        session_ids = [session.session_id for session in self.get_sessions()]
+        for index, session_id in enumerate(session_ids):
+            try:
+                self._delete_lap_summary(session_id)
+                self._update_lap_summary(session_id)
+                self._conn.commit()
+            except:  # rollback under any exception, then re-raise exception
+                self._conn.rollback()
+                raise
+            if progress_cb:
+                progress_cb((index + 1) * 100 / len(session_ids))
+        return len(session_ids)
+
+    def find_session_track(self, session_id):
+        '''
+        Finds the track a session was recorded at, from the center of its GPS positions
+        :param session_id the session id
+        :type session_id int
+        :returns the most recent nearby TrackMap with a start / finish point, or None
+        '''
+        if self._track_manager is None:
+            return None
+        latitude, longitude = self.get_location_center([session_id])
+        if not latitude or not longitude:
+            return None
+        for track in self._track_manager.find_nearby_tracks(GeoPoint.fromPoint(latitude, longitude)):
+            if GeoPoint.is_valid(track.start_finish_point):
+                return track
+        return None
+
+    def _has_lap_timing(self, session_id):
+        '''
+        Whether a session has recorded lap timing: at least one completed lap
+        '''
+        return self.channel_exists('LapCount') and self.get_channel_max('LapCount', [session_id]) is not None
+
+    def _segment_imported_laps(self, session_id):
+        '''
+        Divides an imported session without lap timing into laps at the track it
+        was recorded at, then summarizes its laps if that is still to be done.
+        Failures are logged, leaving the import as it was.
+        '''
+        try:
+            track = None if self._has_lap_timing(session_id) else self.find_session_track(session_id)
+            if track is not None:
+                laps = self.segment_laps(session_id, track)
+                Logger.info('DataStore: found {} laps at {} in session {}'.format(laps, track.name, session_id))
+        except Exception as e:
+            Logger.error('DataStore: could not divide session {} into laps: {}'.format(session_id, e))
+
+        if not self._summarized_sessions([session_id]):
+            self._update_lap_summary(session_id)
+            self._conn.commit()
+
+    def segment_laps(self, session_id, track, radius_meters=DEFAULT_GATE_RADIUS_METERS):
+        '''
+        Divides a session into laps, and sectors, from its GPS positions and a track's
+        start / finish and sector points. The lap timing channels are written as the
+        firmware would have recorded them, replacing any recorded values, and the
+        session's lap summary is rebuilt.
+        :param session_id the session id
+        :type session_id int
+        :param track the track the session was recorded at
+        :type track TrackMap
+        :param radius_meters how close the path must pass to a start / finish or sector point
+        :type radius_meters float
+        :returns the number of completed laps found
+        '''
+        if not all(self.channel_exists(channel) for channel in ['Interval', 'Latitude', 'Longitude']):
+            return 0
+
+        sample_ids, columns = self._read_session_columns(session_id, ['Interval', 'Latitude', 'Longitude'])
+        times = columns['Interval']
+        segments = segment_laps(times, columns['Latitude'], columns['Longitude'], track.start_finish_point,
+                                track.sector_points, track.finish_point, radius_meters)
+        if len(segments) == 0:
+            return 0
+
+        include_sectors = any(GeoPoint.is_valid(point) for point in track.sector_points)
+        timing_channels = self.LAP_TIMING_CHANNELS + (self.SECTOR_TIMING_CHANNELS if include_sectors else [])
+        session_channels = set(channel.name for channel in self.get_channel_list(session_id))
+        rate = max([channel.sample_rate for channel in self.get_channel_list(session_id)
+                    if channel.name in ('Latitude', 'Longitude')] or [0])
+        new_channels = [DatalogChannel(name, units, 0, 0, rate) for name, units in timing_channels
+                        if name not in session_channels]
+
+        self._extend_datalog_channels([DatalogChannel(name, units) for name, units in timing_channels])
+        try:
+            self._add_session_channels(session_id, new_channels)
+            self._write_lap_segments(session_id, sample_ids, segments, times, include_sectors)
+            self._delete_lap_summary(session_id)
+            self._update_lap_summary(session_id)
+            self._conn.commit()
+        except:  # rollback under any exception, then re-raise exception
+            self._conn.rollback()
+            raise
+        self._populate_channel_list()
+        return segments[-1].lap_count
+
+    def _read_session_columns(self, session_id, channels):
+        '''
+        Reads every value of the specified channels for a session
+        :returns tuple of the list of sample ids, dict of channel -> list of values
+        '''
+        columns = ['datapoint.' + _scrub_sql_value(channel) for channel in channels]
+        rows = self._conn.execute('''SELECT sample.id, {} FROM sample JOIN datapoint ON datapoint.sample_id=sample.id
+                                     WHERE sample.session_id = ? ORDER BY sample.id'''.format(','.join(columns)),
+                                  (session_id,)).fetchall()
+        values = zip(*rows) if rows else [[]] * (len(channels) + 1)
+        return list(values[0]), dict((channel, list(values[index + 1])) for index, channel in enumerate(channels))
+
+    def _write_lap_segments(self, session_id, sample_ids, segments, times, include_sectors):
+        '''
+        Writes the lap timing values of each segment of a session's samples. Does not commit.
+        '''
+        assignments = ['LapCount = ?', 'CurrentLap = ?', 'LapTime = ?'] + (['Sector = ?', 'SectorTime = ?']
+                                                                          if include_sectors else [])
+        sql = 'UPDATE datapoint SET {}, ElapsedTime = {} WHERE sample_id BETWEEN ? AND ?'
+        in_lap_sql = sql.format(', '.join(assignments), '(Interval - ?) / 60000.0')
+        before_lap_sql = sql.format(', '.join(assignments), '0')
+        c = self._conn.cursor()
+        for segment in segments:
+            params = [segment.lap_count, segment.current_lap, segment.lap_time]
+            if include_sectors:
+                params += [segment.sector, segment.sector_time]
+            if segment.lap_start_time is None:
+                c.execute(before_lap_sql, params + [sample_ids[segment.start_index], sample_ids[segment.end_index]])
+            else:
+                c.execute(in_lap_sql, params + [segment.lap_start_time, sample_ids[segment.start_index],
+                                                sample_ids[segment.end_index]])
 
     def update_session(self, session):
         self._conn.execute("""UPDATE session SET name=?, notes=?, date=? WHERE id=?;""", (
@@ -1208,11 +2100,12 @@ class DataStore(object):
     @timing
     def export_session(self, session_id, export_file, progress_callback=None):
         """
-        Exports the specified session to a CSV file
+        Exports the specified session to a CSV file, or another export target.
+        Records are read and written in chunks, so the session is never held in memory
         :param session_id the session to export
         :type session_id int
-        :param export_file_name the file name to export
-        :type export_file_name string
+        :param export_file the file to export to, or the target to write rows to
+        :type export_file file or ExportTarget
         :param progress_callback callback function for progress. Return true from this function to cancel export
         :type progress_callback function
         :return the number of rows exported
@@ -1223,18 +2116,11 @@ class DataStore(object):
                 return progress_callback(progress)
             return False
 
+        target = export_file if isinstance(export_file, ExportTarget) else CsvExportTarget(export_file)
+
         # channel_list
         channels = self.get_channel_list(session_id)
 
-        header = ''
-        for channel in channels:
-            header += '"{}"|"{}"|{}|{}|{},'.format(channel.name,
-                                                   channel.units,
-                                                   channel.min,
-                                                   channel.max,
-                                                   channel.sample_rate)
-        export_file.write(header[:-1] + '\n')
-
         channel_names = []
         channel_intervals = []
         system_channel_indexes = []
@@ -1247,74 +2133,27 @@ class DataStore(object):
             system_channel_indexes.append(
                 True if name in DataStore.SYSTEM_CHANNELS else False)
 
-        export_count = self._get_session_record_count(session_id)
-
-        dataset = self.query([session_id], channel_names)
-        # dataset = self.query(sessions=[session_id], channels=channel_names)
-        records = dataset.fetch_records()
-        sync_point = None
-
         try:
-            datalog_interval_index = channel_names.index('Interval')
-        except ValueError:
-            raise DatastoreException(
-                'DataStore: Cannot export: Interval channel missing from data')
+            target.write_header(channels)
+            export_count = self._get_session_record_count(session_id)
 
-        # check if there are no samples to output!
-        if set(channel_names).issubset(DataStore.SYSTEM_CHANNELS):
-            raise DatastoreException(
-                'DataStore: Cannot export: No channels to output')
-
-        row_index = 0
-        channel_count = len(channels)
-
-        for record in records:
-            # Note 1 + offset; record contains session_id as first column,
-            # the rest are individual channels
-            sampled = False
-            while not sampled:
-                if sync_point is None:
-                    # the first interval is our synchronization point
-                    # for determining when to output samples
-                    # The first sample outputs all values by default
-                    interval_record = record[1 + datalog_interval_index]
-                    if interval_record is None:
-                        Logger.warning('DataStore: Export: invalid row detected, skipping: {}'.format(record))
-                        break
-                    sync_point = long(interval_record)
-
-                row = ''
-                current_interval = long(record[1 + datalog_interval_index])
-
-                for index in range(channel_count):
-                    # first column is session id, so skip it
-                    if system_channel_indexes[index] == True:
-                        # our system channels are in long integer format
-                        value = long(record[1 + index])
-                    else:
-                        channel_interval = channel_intervals[index]
-                        if (current_interval - sync_point) % channel_interval == 0:
-                            value = record[1 + index]
-                            if value is None:
-                                value = ''
-                            sampled = True
-                        else:
-                            value = ''
-                    row += str(value) + ','
-                if sampled:
-                    export_file.write(row[:-1] + '\n')
-                if not sampled:
-                    # The data log may have inconsistent data; if so
-                    # the interval will change. If we detect this then we need
-                    # to re-synchronize
-                    Logger.warning(
-                        'DataStore: Export: Inconsistent interval detected at interval {}; re-syncing'.format(current_interval))
-                    sync_point = None
-            row_index += 1
-            progress = row_index * 100 / export_count
-            if progress % 5 == 0:
-                cancel = _do_progress_cb(progress)
-                if cancel == True:
-                    break
+            dataset = self.query([session_id], channel_names)
+            records = dataset.iter_records(EXPORT_CHUNK_SIZE)
+
+            try:
+                datalog_interval_index = channel_names.index('Interval')
+            except ValueError:
+                raise DatastoreException(
+                    'DataStore: Cannot export: Interval channel missing from data')
+
+            # check if there are no samples to output!
+            if set(channel_names).issubset(DataStore.SYSTEM_CHANNELS):
+                raise DatastoreException(
+                    'DataStore: Cannot export: No channels to output')
+
+            exporter = SessionExporter(channel_intervals, system_channel_indexes, datalog_interval_index)
+            row_index = exporter.export(records, target, export_count, _do_progress_cb)
+        finally:
+            target.flush()
         _do_progress_cb(100)
         return row_index
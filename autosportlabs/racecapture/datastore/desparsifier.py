@@ -0,0 +1,201 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from kivy.logger import Logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ChunkedDesparsifier(object):
+    """
+    Parses the data lines of a RaceCapture CSV log in large chunks into NumPy
+    arrays and removes sparsity from the dataset, with the same semantics as
+    DataStore._desparsified_data_generator:
+
+    values are carried forward: [3, nil, nil, nil, 7] -> [3, 3, 3, 3, 7, 7, 7...]
+    and the start of a channel is back extrapolated: [nil, nil, nil, 5] -> [5, 5, 5, 5]
+
+    A channel whose first value only appears after earlier chunks were already
+    yielded cannot be back extrapolated in place; those are reported in
+    backfills so the consumer can fix up the leading rows afterwards.
+    """
+    CHUNK_SIZE_BYTES = 1 << 22
+
+    def __init__(self, data_file, channel_count, warnings=None, progress_cb=None, chunk_size=CHUNK_SIZE_BYTES):
+        """
+        :param data_file: log file, positioned after the header line
+        :type data_file: file
+        :param channel_count: the number of channels in the log header
+        :type channel_count: int
+        :param warnings: list to append (line, message) warnings to
+        :type warnings: list
+        :param progress_cb: callback receiving the percent complete, by byte offset
+        :type progress_cb: function
+        :param chunk_size: approximate number of bytes to parse at a time
+        :type chunk_size: int
+        """
+        self._data_file = data_file
+        self._channel_count = channel_count
+        self._warnings = warnings
+        self._progress_cb = progress_cb
+        self._chunk_size = chunk_size
+        self._line_number = 0
+        self.backfills = {}
+
+    @staticmethod
+    def available():
+        """
+        Indicates if the optimized desparsifier can be used on this platform
+        """
+        return np is not None
+
+    def _warn(self, line, message):
+        if self._warnings is not None:
+            self._warnings.append((line, message))
+        Logger.warn('DataStore: {}'.format(message))
+
+    def _parse_line(self, line):
+        values = np.fromstring(self._fill_empty_fields(line), sep=',')
+        return values if values.size == self._channel_count else None
+
+    @staticmethod
+    def _fill_empty_fields(text):
+        # Empty fields are missing values; mark them as NaN so the whole text
+        # can be handed to NumPy's parser in one go. Adjacent empty fields
+        # overlap, hence the second pass.
+        text = text.replace(',,', ',nan,').replace(',,', ',nan,')
+        if text.startswith(','):
+            text = 'nan' + text
+        if text.endswith(','):
+            text += 'nan'
+        return text
+
+    def _parse(self, text):
+        """
+        Parses a block of complete lines into a 2D array of rows x channels,
+        with NaN for missing values.
+        """
+        lines = [line for line in text.replace('\r', '').split('\n') if len(line.strip())]
+        expected_separators = self._channel_count - 1
+        first_line = self._line_number
+        self._line_number += len(lines)
+
+        separators = [line.count(',') for line in lines]
+        if separators.count(expected_separators) != len(lines):
+            checked_lines = []
+            for index, line in enumerate(lines):
+                count = separators[index]
+                if count > expected_separators:
+                    self._warn(line, 'Unexpected channel count in line {}. Expected {}, got {}'.format(
+                        first_line + index, self._channel_count, count + 1))
+                    continue
+                checked_lines.append(line + ',' * (expected_separators - count))
+            lines = checked_lines
+
+        if len(lines) == 0:
+            return None
+
+        values = np.fromstring(self._fill_empty_fields(','.join(lines)), sep=',')
+        if values.size == len(lines) * self._channel_count:
+            return values.reshape(len(lines), self._channel_count)
+
+        # Something in the block did not parse; fall back to line by line
+        # parsing so only the bad lines are dropped
+        rows = []
+        for index, line in enumerate(lines):
+            row = self._parse_line(line)
+            if row is None:
+                Logger.warn('Datastore: could not parse logfile data at line {}'.format(first_line + index))
+                continue
+            rows.append(row)
+        return np.vstack(rows) if len(rows) else None
+
+    def _fill(self, rows, carry, seen, emitted):
+        """
+        Forward fills the gaps in a block of rows, continuing from the
+        values carried over from the previous block, and back fills channels
+        seeing their first value.
+        """
+        row_count, channel_count = rows.shape
+        valid = ~np.isnan(rows)
+
+        # For every cell, find the index of the most recent valid row
+        # (0 refers to the carried over values)
+        source_index = np.where(valid, np.arange(1, row_count + 1)[:, None], 0)
+        np.maximum.accumulate(source_index, axis=0, out=source_index)
+        filled = np.vstack((carry[None, :], rows))[source_index, np.arange(channel_count)]
+
+        has_value = valid.any(axis=0)
+        for channel in np.flatnonzero(has_value & ~seen):
+            first = valid[:, channel].argmax()
+            value = rows[first, channel]
+            filled[:first, channel] = value
+            if emitted > 0:
+                self.backfills[channel] = (float(value), emitted)
+
+        seen |= has_value
+        carry[:] = filled[-1]
+        return filled
+
+    def chunks(self):
+        """
+        Generator yielding desparsified blocks of rows as 2D arrays of rows x channels.
+        Channels without any value remain NaN.
+        """
+        data_file = self._data_file
+        start_pos = data_file.tell()
+        try:
+            total_size = os.fstat(data_file.fileno()).st_size - start_pos
+        except (AttributeError, IOError, OSError):
+            total_size = None
+
+        carry = np.empty(self._channel_count)
+        carry.fill(np.nan)
+        seen = np.zeros(self._channel_count, dtype=bool)
+        emitted = 0
+
+        while True:
+            text = data_file.read(self._chunk_size)
+            if not text:
+                break
+            # complete the last, partial line
+            text += data_file.readline()
+
+            rows = self._parse(text)
+            if rows is not None:
+                filled = self._fill(rows, carry, seen, emitted)
+                emitted += len(filled)
+                yield filled
+
+            if self._progress_cb and total_size:
+                self._progress_cb(float(data_file.tell() - start_pos) / total_size * 100)
+
+    def records(self):
+        """
+        Generator yielding desparsified records as lists of values.
+        Missing values are NaN, which SQLite stores as NULL.
+        """
+        for rows in self.chunks():
+            for record in rows.tolist():
+                yield record
@@ -0,0 +1,209 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+from fractions import gcd
+from kivy.logger import Logger
+
+# Number of records read from the database at a time while exporting
+EXPORT_CHUNK_SIZE = 5000
+# Number of formatted rows held before they are written to the file
+EXPORT_BUFFER_ROWS = 2000
+
+
+def open_export_file(filename):
+    """
+    Opens a file for exporting a session, compressed with gzip if the
+    file name ends with .gz
+    :param filename: the file to create
+    :type filename: string
+    :return: file object
+    """
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'wb')
+    return open(filename, 'w')
+
+
+class ExportTarget(object):
+    """
+    Receives the rows of an exported session. Subclasses write them out in
+    a particular format.
+    """
+
+    def write_header(self, channels):
+        """
+        Called once before any rows are written
+        :param channels: the exported channels, in column order
+        :type channels: list of ChannelMeta
+        """
+        raise NotImplementedError()
+
+    def write_row(self, values):
+        """
+        Called for each exported sample
+        :param values: one value per channel; None where the channel has no value
+        :type values: list
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Called when the export finishes, is cancelled or fails
+        """
+        pass
+
+
+class CsvExportTarget(ExportTarget):
+    """
+    Writes the RaceCapture CSV log format, the same format that is imported
+    """
+
+    def __init__(self, export_file, buffer_rows=EXPORT_BUFFER_ROWS):
+        """
+        Initializer.
+        :param export_file: the file to write to
+        :type export_file: file object
+        :param buffer_rows: the number of rows to format before writing them
+        :type buffer_rows: int
+        """
+        self._file = export_file
+        self._buffer_rows = buffer_rows
+        self._lines = []
+
+    def write_header(self, channels):
+        self._file.write(','.join('"{}"|"{}"|{}|{}|{}'.format(channel.name,
+                                                              channel.units,
+                                                              channel.min,
+                                                              channel.max,
+                                                              channel.sample_rate) for channel in channels) + '\n')
+
+    def write_row(self, values):
+        self._lines.append(','.join(['' if value is None else str(value) for value in values]))
+        if len(self._lines) >= self._buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self._lines.append('')
+            self._file.write('\n'.join(self._lines))
+            self._lines = []
+
+
+class SessionExporter(object):
+    """
+    Turns the stored records of a session back into log rows. Each channel
+    is only output on the intervals matching its sample rate, measured from
+    the first interval of the session, re-synchronizing if the log's
+    intervals drift.
+    """
+
+    def __init__(self, channel_intervals, system_channels, interval_index):
+        """
+        Initializer.
+        :param channel_intervals: the interval between samples of each channel, in ms
+        :type channel_intervals: list of int
+        :param system_channels: whether each channel is a system channel, output on every row
+        :type system_channels: list of bool
+        :param interval_index: the index of the Interval channel
+        :type interval_index: int
+        """
+        self._channel_count = len(channel_intervals)
+        self._system_indexes = [i for i, system in enumerate(system_channels) if system]
+        self._data_indexes = [i for i, system in enumerate(system_channels) if not system]
+        self._channel_intervals = channel_intervals
+        self._interval_index = interval_index
+
+        # which channels are sampled only depends on the offset from the
+        # sync point, modulo the common period of all the intervals
+        period = 1
+        for i in self._data_indexes:
+            interval = channel_intervals[i]
+            period = period * interval / gcd(period, interval)
+        self._period = period
+        self._masks = {}
+
+    def _get_mask(self, offset):
+        """
+        Get the indexes of the channels sampled at an offset from the sync point
+        """
+        key = offset % self._period
+        mask = self._masks.get(key)
+        if mask is None:
+            intervals = self._channel_intervals
+            mask = tuple(i for i in self._data_indexes if key % intervals[i] == 0)
+            self._masks[key] = mask
+        return mask
+
+    def export(self, records, target, record_count, progress_callback=None):
+        """
+        Write records to an export target
+        :param records: the records, each starting with the session id column
+        :type records: iterable of tuples
+        :param target: where to write the rows
+        :type target: ExportTarget
+        :param record_count: the number of records, for reporting progress
+        :type record_count: int
+        :param progress_callback: called with the percent complete. Return True to cancel the export
+        :type progress_callback: function
+        :return: the number of records processed
+        """
+        interval_column = 1 + self._interval_index
+        system_indexes = self._system_indexes
+        blank_row = [None] * self._channel_count
+        sync_point = None
+        row_index = 0
+
+        for record in records:
+            while True:
+                if sync_point is None:
+                    # the first interval is our synchronization point
+                    # for determining when to output samples
+                    # The first sample outputs all values by default
+                    interval_record = record[interval_column]
+                    if interval_record is None:
+                        Logger.warning('SessionExporter: invalid row detected, skipping: {}'.format(record))
+                        break
+                    sync_point = long(interval_record)
+
+                current_interval = long(record[interval_column])
+                mask = self._get_mask(current_interval - sync_point)
+                if mask:
+                    # first column is session id, so skip it
+                    row = blank_row[:]
+                    for index in system_indexes:
+                        # our system channels are in long integer format
+                        row[index] = long(record[1 + index])
+                    for index in mask:
+                        row[index] = record[1 + index]
+                    target.write_row(row)
+                    break
+
+                # The data log may have inconsistent data; if so
+                # the interval will change. If we detect this then we need
+                # to re-synchronize
+                Logger.warning('SessionExporter: Inconsistent interval detected at interval {}; re-syncing'.format(current_interval))
+                sync_point = None
+
+            row_index += 1
+            progress = row_index * 100 / record_count
+            if progress % 5 == 0 and progress_callback is not None:
+                if progress_callback(progress) == True:
+                    break
+        return row_index
@@ -0,0 +1,207 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MS_PER_SECOND = 1000.0
+
+
+def _as_array(values):
+    # missing values become NaN
+    if isinstance(values, np.ndarray):
+        return values
+    if None in values:
+        return np.array([np.nan if value is None else value for value in values], dtype=float)
+    return np.asarray(values, dtype=float)
+
+
+def lap_trace(distances, times):
+    """
+    The distance and time into a lap at each sample where the distance moves
+    forward. Distance is only updated with each GPS fix, so of the samples
+    sharing a distance only the first, closest to the fix, is kept. Samples
+    missing either value are left out.
+    :param distances: the Distance of each sample of the lap
+    :type distances: sequence of float
+    :param times: the Interval of each sample of the lap, in milliseconds
+    :type times: sequence of float
+    :return: tuple of distances and times from the first sample kept; numpy arrays when available
+    """
+    if np is not None:
+        d = _as_array(distances)
+        t = _as_array(times)
+        present = ~(np.isnan(d) | np.isnan(t))
+        d = d[present]
+        t = t[present]
+        if len(d) == 0:
+            return d, t
+        # the running maximum, so distance going backwards is held until passed
+        forward = np.concatenate(([True], d[1:] > np.maximum.accumulate(d)[:-1]))
+        d = d[forward]
+        t = t[forward]
+        return d - d[0], t - t[0]
+
+    trace_distances = []
+    trace_times = []
+    for distance, time in zip(distances, times):
+        if distance is None or time is None:
+            continue
+        if not trace_distances or distance > trace_distances[-1]:
+            trace_distances.append(distance)
+            trace_times.append(time)
+    if not trace_distances:
+        return trace_distances, trace_times
+    d0 = trace_distances[0]
+    t0 = trace_times[0]
+    return [d - d0 for d in trace_distances], [t - t0 for t in trace_times]
+
+
+def interpolate(xs, xp, fp):
+    """
+    Linear interpolation of fp, known at the increasing points xp, at each of
+    xs; values beyond either end of xp are held at the end's value.
+    Equivalent to numpy.interp, which is used when available.
+    :return: list or numpy array of the interpolated values
+    """
+    if np is not None:
+        return np.interp(xs, xp, fp)
+
+    last = len(xp) - 1
+    values = []
+    for x in xs:
+        index = bisect.bisect_right(xp, x)
+        if index == 0:
+            values.append(fp[0])
+        elif index > last:
+            values.append(fp[last])
+        else:
+            x0 = xp[index - 1]
+            values.append(fp[index - 1] + (fp[index] - fp[index - 1]) * (x - x0) / (xp[index] - x0))
+    return values
+
+
+class ReferenceLap(object):
+    """
+    A lap that other laps are compared to. The lap's time is resampled onto
+    a grid of evenly spaced distances, which every compared lap is resampled
+    onto in turn; the difference is the cumulative time delta, in seconds,
+    positive where the compared lap is behind the reference.
+
+    The distance of a compared lap is scaled to the length of the reference,
+    so differences in the distance measured by GPS do not build up over the
+    lap, and the delta at the end is the difference in lap time.
+    """
+
+    def __init__(self, distances, times, grid_points=None):
+        """
+        Initializer.
+        :param distances: the Distance of each sample of the lap
+        :type distances: sequence of float
+        :param times: the Interval of each sample of the lap, in milliseconds
+        :type times: sequence of float
+        :param grid_points: the number of distances in the grid; defaults to one
+        per distance reported for the lap
+        :type grid_points: int
+        """
+        trace_distances, trace_times = lap_trace(distances, times)
+        points = grid_points or len(trace_distances)
+        self.length = trace_distances[-1] if len(trace_distances) > 1 else 0
+        if self.length <= 0 or points < 2:
+            self.grid = []
+            self.grid_times = []
+            return
+
+        if np is not None:
+            self.grid = np.linspace(0, self.length, points)
+        else:
+            step = self.length / float(points - 1)
+            self.grid = [index * step for index in xrange(points - 1)] + [self.length]
+        self.grid_times = interpolate(self.grid, trace_distances, trace_times)
+
+    @property
+    def valid(self):
+        """
+        Whether the lap covers enough distance to compare other laps against
+        """
+        return len(self.grid) > 0
+
+    def _deltas(self, distances, times):
+        # the deltas on the grid, and the scale from the lap's distance to the grid's
+        trace_distances, trace_times = lap_trace(distances, times)
+        if not self.valid or len(trace_distances) < 2 or trace_distances[-1] <= 0:
+            return None, None
+        scale = self.length / float(trace_distances[-1])
+        if np is not None:
+            lap_times = np.interp(self.grid, trace_distances * scale, trace_times)
+            return (lap_times - self.grid_times) / MS_PER_SECOND, scale
+        lap_times = interpolate(self.grid, [distance * scale for distance in trace_distances], trace_times)
+        return [(lap_time - grid_time) / MS_PER_SECOND
+                for lap_time, grid_time in zip(lap_times, self.grid_times)], scale
+
+    def grid_deltas(self, distances, times):
+        """
+        The time delta of a lap against this lap at each distance of the grid.
+        :param distances: the Distance of each sample of the lap
+        :type distances: sequence of float
+        :param times: the Interval of each sample of the lap, in milliseconds
+        :type times: sequence of float
+        :return: list or numpy array of the delta in seconds; None if either lap has no distance
+        """
+        return self._deltas(distances, times)[0]
+
+    def sample_deltas(self, distances, times):
+        """
+        The time delta of a lap against this lap at each of its samples, for
+        plotting alongside the lap's other channels.
+        :param distances: the Distance of each sample of the lap
+        :type distances: sequence of float
+        :param times: the Interval of each sample of the lap, in milliseconds
+        :type times: sequence of float
+        :return: list of the delta in seconds at each sample, None for samples missing
+        a distance or time; None if either lap has no distance
+        """
+        if np is not None:
+            d = _as_array(distances)
+            t = _as_array(times)
+            deltas, scale = self._deltas(d, t)
+            if deltas is None:
+                return None
+            present = ~(np.isnan(d) | np.isnan(t))
+            values = np.interp((d - d[present][0]) * scale, self.grid, deltas)
+            if present.all():
+                return values.tolist()
+            return [delta if sample_present else None for delta, sample_present in zip(values.tolist(), present)]
+
+        deltas, scale = self._deltas(distances, times)
+        if deltas is None:
+            return None
+        present = [index for index, (distance, time) in enumerate(zip(distances, times))
+                   if distance is not None and time is not None]
+        start = distances[present[0]]
+        sampled = interpolate([(distances[index] - start) * scale for index in present], self.grid, deltas)
+        values = [None] * len(distances)
+        for index, delta in zip(present, sampled):
+            values[index] = delta
+        return values
@@ -0,0 +1,319 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from autosportlabs.racecapture.geo.geopoint import GeoPoint, RADIUS_EARTH_KM
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+METERS_PER_DEGREE = RADIUS_EARTH_KM * 1000.0 * math.pi / 180.0
+# how close the path must pass to a start / finish or sector point to cross it
+DEFAULT_GATE_RADIUS_METERS = 20.0
+# GPS fixes further apart in time are not joined when looking for crossings
+MAX_FIX_GAP_MS = 5000.0
+MS_PER_MINUTE = 60000.0
+
+
+class TrackSegment(object):
+    """
+    A span of consecutive samples sharing the same lap timing values, as the
+    firmware would have recorded them:
+
+    LapCount: the number of completed laps
+    CurrentLap: the lap in progress; 0 before the first start crossing
+    LapTime: the time of the last completed lap, in minutes
+    Sector: the sector in progress within the lap; 0 before the first start crossing
+    SectorTime: the time of the last completed sector, in minutes
+    ElapsedTime: minutes since the start of the current lap, which varies by
+    sample and is found from lap_start_time
+    """
+
+    def __init__(self, start_index, lap_count=0, current_lap=0, lap_time=0.0, sector=0, sector_time=0.0,
+                 lap_start_time=None):
+        """
+        Initializer.
+        :param start_index: the position of the first sample of the segment within the session
+        :type start_index: int
+        :param lap_start_time: the Interval at which the current lap started; None before the first lap
+        :type lap_start_time: float
+        """
+        self.start_index = start_index
+        self.end_index = start_index
+        self.lap_count = lap_count
+        self.current_lap = current_lap
+        self.lap_time = lap_time
+        self.sector = sector
+        self.sector_time = sector_time
+        self.lap_start_time = lap_start_time
+
+    def _copy(self, start_index):
+        return TrackSegment(start_index, self.lap_count, self.current_lap, self.lap_time, self.sector,
+                            self.sector_time, self.lap_start_time)
+
+
+def _local_xy(latitude, longitude, gate):
+    # equirectangular projection in meters around the gate; accurate over the size of a gate
+    lon_scale = METERS_PER_DEGREE * math.cos(math.radians(gate.latitude))
+    return (longitude - gate.longitude) * lon_scale, (latitude - gate.latitude) * METERS_PER_DEGREE
+
+
+def _gps_fixes(times, latitudes, longitudes):
+    """
+    The samples where a new GPS position appears; positions are carried
+    forward between fixes, and missing positions are None or zero
+    :return: tuple of lists of times, latitudes, longitudes
+    """
+    if np is not None:
+        t = np.array(times, dtype=float)
+        lat = np.array(latitudes, dtype=float)
+        lon = np.array(longitudes, dtype=float)
+        with np.errstate(invalid='ignore'):
+            valid = ~np.isnan(t) & ~np.isnan(lat) & ~np.isnan(lon) & (lat != 0) & (lon != 0)
+        t, lat, lon = t[valid], lat[valid], lon[valid]
+        new_fix = np.ones(len(t), dtype=bool)
+        new_fix[1:] = (lat[1:] != lat[:-1]) | (lon[1:] != lon[:-1])
+        return t[new_fix], lat[new_fix], lon[new_fix]
+
+    fix_times, fix_lats, fix_lons = [], [], []
+    for t, lat, lon in zip(times, latitudes, longitudes):
+        if t is None or not lat or not lon:
+            continue
+        if len(fix_lats) and lat == fix_lats[-1] and lon == fix_lons[-1]:
+            continue
+        fix_times.append(t)
+        fix_lats.append(lat)
+        fix_lons.append(lon)
+    return fix_times, fix_lats, fix_lons
+
+
+def find_gate_crossings(times, latitudes, longitudes, gate, radius_meters=DEFAULT_GATE_RADIUS_METERS):
+    """
+    Find the times the path passes a gate, such as the start / finish point.
+    The path between consecutive GPS fixes is taken as a straight line, and
+    a crossing is where it passes closest to the gate point, interpolating the
+    time between the fixes. Each visit within the radius of the gate counts
+    once, so wander while parked near the gate is not counted as laps.
+    :param times: the Interval of each sample, in ms
+    :type times: list
+    :param latitudes: the Latitude of each sample
+    :type latitudes: list
+    :param longitudes: the Longitude of each sample
+    :type longitudes: list
+    :param gate: the gate's point
+    :type gate: GeoPoint
+    :param radius_meters: how close the path must pass to the gate
+    :type radius_meters: float
+    :return: list of crossing times, in ms
+    """
+    fix_times, fix_lats, fix_lons = _gps_fixes(times, latitudes, longitudes)
+    if len(fix_times) < 2:
+        return []
+
+    if np is None:
+        return _find_gate_crossings_python(fix_times, fix_lats, fix_lons, gate, radius_meters)
+
+    x, y = _local_xy(fix_lats, fix_lons, gate)
+    x0, y0 = x[:-1], y[:-1]
+    dx, dy = x[1:] - x0, y[1:] - y0
+    dt = fix_times[1:] - fix_times[:-1]
+    length2 = dx * dx + dy * dy
+    # the distance along each segment to its point closest to the gate, as a fraction of its length
+    along = -(x0 * dx + y0 * dy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = along / length2
+    closest = np.clip(fraction, 0, 1)
+    distance = np.hypot(x0 + closest * dx, y0 + closest * dy)
+
+    joined = (dt <= MAX_FIX_GAP_MS) & (length2 > 0)
+    near = joined & (distance <= radius_meters)
+    # passes the gate where it goes from ahead of the segment's start to behind its end
+    crossing = near & (along >= 0) & (along < length2)
+
+    # each run of consecutive segments near the gate is one visit; keep its closest crossing
+    visit_start = near.copy()
+    visit_start[1:] &= ~near[:-1]
+    visit = np.cumsum(visit_start)
+    candidates = np.flatnonzero(crossing)
+    if len(candidates) == 0:
+        return []
+    candidates = candidates[np.lexsort((distance[candidates], visit[candidates]))]
+    first_of_visit = np.ones(len(candidates), dtype=bool)
+    first_of_visit[1:] = visit[candidates][1:] != visit[candidates][:-1]
+    candidates = np.sort(candidates[first_of_visit])
+    return (fix_times[candidates] + fraction[candidates] * dt[candidates]).tolist()
+
+
+def _find_gate_crossings_python(fix_times, fix_lats, fix_lons, gate, radius_meters):
+    crossings = []
+    best = None
+    lon_scale = METERS_PER_DEGREE * math.cos(math.radians(gate.latitude))
+    points = [((lon - gate.longitude) * lon_scale, (lat - gate.latitude) * METERS_PER_DEGREE)
+              for lat, lon in zip(fix_lats, fix_lons)]
+    for index in range(len(points) - 1):
+        x0, y0 = points[index]
+        dx, dy = points[index + 1][0] - x0, points[index + 1][1] - y0
+        dt = fix_times[index + 1] - fix_times[index]
+        length2 = dx * dx + dy * dy
+        near = False
+        if dt <= MAX_FIX_GAP_MS and length2 > 0:
+            along = -(x0 * dx + y0 * dy)
+            fraction = along / length2
+            closest = min(max(fraction, 0), 1)
+            distance = math.hypot(x0 + closest * dx, y0 + closest * dy)
+            near = distance <= radius_meters
+            if near and 0 <= along < length2 and (best is None or distance < best[0]):
+                best = (distance, fix_times[index] + fraction * dt)
+        if not near and best is not None:
+            crossings.append(best[1])
+            best = None
+    if best is not None:
+        crossings.append(best[1])
+    return crossings
+
+
+def _first_sample_at(times, time):
+    # the position of the first sample at or after a time
+    if np is not None:
+        return int(np.searchsorted(times, time, 'left'))
+    low, high = 0, len(times)
+    while low < high:
+        mid = (low + high) // 2
+        if times[mid] < time:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def segment_laps(times, latitudes, longitudes, start_point, sector_points=None, finish_point=None,
+                 radius_meters=DEFAULT_GATE_RADIUS_METERS):
+    """
+    Divide a session into laps and sectors from its GPS positions.
+    For a circuit the start point is also the finish; a stage, with a
+    separate finish point, completes a lap at the finish and begins the
+    next at the following start crossing.
+    :param times: the Interval of each sample, in ms, in increasing order
+    :type times: list
+    :param latitudes: the Latitude of each sample
+    :type latitudes: list
+    :param longitudes: the Longitude of each sample
+    :type longitudes: list
+    :param start_point: the start / finish point
+    :type start_point: GeoPoint
+    :param sector_points: the sector points, in order; invalid points are ignored
+    :type sector_points: list of GeoPoint
+    :param finish_point: the finish point of a stage; None or invalid for a circuit
+    :type finish_point: GeoPoint
+    :param radius_meters: how close the path must pass to a point to cross it
+    :type radius_meters: float
+    :return: list of TrackSegment covering every sample, or an empty list if the start was never crossed
+    """
+    crossings = lambda gate: find_gate_crossings(times, latitudes, longitudes, gate, radius_meters)
+    START, FINISH, SECTOR = 0, 1, 2
+    events = [(time, START, 0) for time in crossings(start_point)]
+    if not events:
+        return []
+    if GeoPoint.is_valid(finish_point):
+        events += [(time, FINISH, 0) for time in crossings(finish_point)]
+    sector_points = [point for point in sector_points or [] if GeoPoint.is_valid(point)]
+    for index, point in enumerate(sector_points):
+        events += [(time, SECTOR, index) for time in crossings(point)]
+    events.sort()
+    is_stage = GeoPoint.is_valid(finish_point)
+
+    if np is not None:
+        times = np.array(times, dtype=float)
+    segments = [TrackSegment(0)]
+    in_lap = False
+    sector_start_time = None
+    for time, kind, index in events:
+        state = segments[-1]._copy(_first_sample_at(times, time))
+        if kind == SECTOR:
+            # sectors only count in order, within a lap
+            if not in_lap or index != state.sector - 1:
+                continue
+            state.sector_time = (time - sector_start_time) / MS_PER_MINUTE
+            state.sector += 1
+            sector_start_time = time
+        elif kind == FINISH or (kind == START and not is_stage and in_lap):
+            if not in_lap:
+                continue
+            state.lap_count += 1
+            state.lap_time = (time - state.lap_start_time) / MS_PER_MINUTE
+            if sector_points:
+                state.sector_time = (time - sector_start_time) / MS_PER_MINUTE
+            in_lap = False
+        if kind == START:
+            state.current_lap += 1
+            state.sector = 1
+            state.lap_start_time = time
+            sector_start_time = time
+            in_lap = True
+
+        if state.start_index == segments[-1].start_index:
+            segments[-1] = state
+        else:
+            segments[-1].end_index = state.start_index - 1
+            segments.append(state)
+
+    segments[-1].end_index = len(times) - 1
+    # drop changes past the last sample
+    return [segment for segment in segments if segment.start_index <= segment.end_index]
+
+
+def segment_columns(segments, times, include_sectors=True):
+    """
+    Expand segments into a value for every sample of each lap timing channel
+    :param segments: the segments, from segment_laps
+    :type segments: list of TrackSegment
+    :param times: the Interval of each sample, in ms
+    :type times: list
+    :param include_sectors: include the Sector and SectorTime channels
+    :type include_sectors: bool
+    :return: dict of channel name -> list of values
+    """
+    fields = [('LapCount', 'lap_count'), ('CurrentLap', 'current_lap'), ('LapTime', 'lap_time')]
+    if include_sectors:
+        fields += [('Sector', 'sector'), ('SectorTime', 'sector_time')]
+
+    if np is not None:
+        counts = [segment.end_index - segment.start_index + 1 for segment in segments]
+        columns = dict((channel, np.repeat([getattr(segment, field) for segment in segments], counts).tolist())
+                       for channel, field in fields)
+        lap_starts = np.repeat([np.nan if segment.lap_start_time is None else segment.lap_start_time
+                                for segment in segments], counts)
+        elapsed = (np.array(times[:len(lap_starts)], dtype=float) - lap_starts) / MS_PER_MINUTE
+        columns['ElapsedTime'] = np.where(np.isnan(lap_starts), 0.0, elapsed).tolist()
+        return columns
+
+    columns = dict((channel, []) for channel, _ in fields + [('ElapsedTime', None)])
+    for segment in segments:
+        count = segment.end_index - segment.start_index + 1
+        for channel, field in fields:
+            columns[channel].extend([getattr(segment, field)] * count)
+        if segment.lap_start_time is None:
+            columns['ElapsedTime'].extend([0.0] * count)
+        else:
+            columns['ElapsedTime'].extend((time - segment.lap_start_time) / MS_PER_MINUTE
+                                          for time in times[segment.start_index:segment.end_index + 1])
+    return columns
@@ -0,0 +1,195 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from itertools import groupby
+
+
+class ChannelSummary(object):
+    """
+    Statistics of one channel over a lap. The minimum and maximum only
+    consider values above zero, matching DataStore.get_channel_min / max;
+    the average covers every value present.
+    """
+
+    def __init__(self, min_value=None, max_value=None, sum_value=None, value_count=0):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.sum_value = sum_value
+        self.value_count = value_count
+
+    @property
+    def average(self):
+        return None if not self.value_count else self.sum_value / float(self.value_count)
+
+    def add(self, value):
+        if value is None or value != value:
+            return
+        if value > 0:
+            self.min_value = value if self.min_value is None else min(self.min_value, value)
+            self.max_value = value if self.max_value is None else max(self.max_value, value)
+        self.sum_value = value if self.sum_value is None else self.sum_value + value
+        self.value_count += 1
+
+    def add_values(self, values):
+        """
+        Add a run of values, with the same result as adding them one at a time
+        """
+        present = [value for value in values if value is not None and value == value]
+        if not present:
+            return
+        positive = [value for value in present if value > 0]
+        if positive:
+            low = min(positive)
+            high = max(positive)
+            self.min_value = low if self.min_value is None else min(self.min_value, low)
+            self.max_value = high if self.max_value is None else max(self.max_value, high)
+        # summed in order from the running total, as add() would
+        self.sum_value = sum(present[1:], present[0]) if self.sum_value is None else sum(present, self.sum_value)
+        self.value_count += len(present)
+
+    def merge(self, other):
+        """
+        Combine the statistics of another set of samples into this one
+        """
+        for value in (other.min_value, other.max_value):
+            if value is not None:
+                self.min_value = value if self.min_value is None else min(self.min_value, value)
+                self.max_value = value if self.max_value is None else max(self.max_value, value)
+        if other.value_count:
+            self.sum_value = other.sum_value if self.sum_value is None else self.sum_value + other.sum_value
+            self.value_count += other.value_count
+
+
+class LapSummary(object):
+    """
+    Summary of the samples of a session sharing a LapCount value. The lap
+    in progress and lap time are those of the first sample, which is what
+    SQLite reports when grouping the samples by LapCount.
+    """
+
+    def __init__(self, lap_count, current_lap=None, lap_time=None, start_sample_id=None,
+                 end_sample_id=None, sample_count=0, channels=None):
+        """
+        Initializer.
+        :param lap_count: the LapCount value; None for samples without one
+        :type lap_count: float
+        :param start_sample_id: the first sample of the lap; the sample id for the row based
+        DataStore, the position within the session for the ColumnarDataStore
+        :type start_sample_id: int
+        :param end_sample_id: the last sample of the lap
+        :type end_sample_id: int
+        :param channels: the statistics of the summarized channels
+        :type channels: dict of channel name -> ChannelSummary
+        """
+        self.lap_count = lap_count
+        self.current_lap = current_lap
+        self.lap_time = lap_time
+        self.start_sample_id = start_sample_id
+        self.end_sample_id = end_sample_id
+        self.sample_count = sample_count
+        self.channels = channels if channels is not None else {}
+
+    def merge(self, later):
+        """
+        Extend this summary with the summary of later samples of the same lap count
+        """
+        self.start_sample_id = min(self.start_sample_id, later.start_sample_id)
+        self.end_sample_id = max(self.end_sample_id, later.end_sample_id)
+        self.sample_count += later.sample_count
+        for channel, summary in later.channels.iteritems():
+            self.channels.setdefault(channel, ChannelSummary()).merge(summary)
+
+
+class SampleRange(object):
+    """
+    The span of samples of a session holding one value of a channel, such
+    as the samples of one CurrentLap
+    """
+
+    def __init__(self, value, start_sample_id=None, end_sample_id=None, sample_count=0):
+        self.value = value
+        self.start_sample_id = start_sample_id
+        self.end_sample_id = end_sample_id
+        self.sample_count = sample_count
+
+    def merge(self, later):
+        """
+        Extend this range with the range of later samples holding the same value
+        """
+        self.start_sample_id = min(self.start_sample_id, later.start_sample_id)
+        self.end_sample_id = max(self.end_sample_id, later.end_sample_id)
+        self.sample_count += later.sample_count
+
+
+def summarize_ranges(first_sample_id, values):
+    """
+    Find the span of consecutive samples holding each value
+    :param first_sample_id: the id of the first sample; the rest follow on consecutively
+    :type first_sample_id: int
+    :param values: the value of each sample
+    :type values: list
+    :return: list of SampleRange, in order of each value's first sample
+    """
+    ranges = OrderedDict()
+    sample_id = first_sample_id
+    for value in values:
+        sample_range = ranges.get(value)
+        if sample_range is None:
+            sample_range = SampleRange(value, start_sample_id=sample_id)
+            ranges[value] = sample_range
+        sample_range.end_sample_id = sample_id
+        sample_range.sample_count += 1
+        sample_id += 1
+    return ranges.values()
+
+
+def summarize_columns(first_sample_id, lap_counts, current_laps, lap_times, channel_columns):
+    """
+    Summarize consecutive samples by lap count
+    :param first_sample_id: the id of the first sample; the rest follow on consecutively
+    :type first_sample_id: int
+    :param lap_counts: the LapCount of each sample
+    :type lap_counts: list
+    :param current_laps: the CurrentLap of each sample
+    :type current_laps: list
+    :param lap_times: the LapTime of each sample
+    :type lap_times: list
+    :param channel_columns: the values of each summarized channel
+    :type channel_columns: dict of channel name -> list
+    :return: list of LapSummary, in order of each lap count's first sample
+    """
+    laps = OrderedDict()
+    index = 0
+    # samples of a lap follow each other, so whole runs of them are summarized at once
+    for lap_count, run in groupby(lap_counts):
+        run_length = sum(1 for _ in run)
+        lap = laps.get(lap_count)
+        if lap is None:
+            lap = LapSummary(lap_count, current_laps[index], lap_times[index],
+                             start_sample_id=first_sample_id + index,
+                             channels=dict((channel, ChannelSummary()) for channel in channel_columns))
+            laps[lap_count] = lap
+        lap.end_sample_id = first_sample_id + index + run_length - 1
+        lap.sample_count += run_length
+        for channel, values in channel_columns.iteritems():
+            lap.channels[channel].add_values(values[index:index + run_length])
+        index += run_length
+    return laps.values()
@@ -0,0 +1,236 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import itertools
+import traceback
+from threading import Thread, Condition
+from kivy.logger import Logger
+
+
+class QueryRequest(object):
+    """
+    A handle to a submitted query. The callback is invoked once every key of
+    the request has a result, unless the request is cancelled first.
+    """
+
+    def __init__(self, executor, keys, callback):
+        self.keys = keys
+        self.callback = callback
+        self.results = {}
+        self.error = None
+        self.cancelled = False
+        self._executor = executor
+        self._jobs = set()
+
+    @property
+    def done(self):
+        return len(self._jobs) == 0
+
+    def cancel(self):
+        """
+        Cancel the request. Queries that no other request is waiting on are
+        dropped, or interrupted if they are already running.
+        """
+        self._executor._cancel(self)
+
+
+class _QueryJob(object):
+    PENDING = 0
+    RUNNING = 1
+    FINISHED = 2
+
+    def __init__(self, keys, query, priority, seq):
+        self.keys = keys
+        self.query = query
+        self.priority = priority
+        self.seq = seq
+        self.state = _QueryJob.PENDING
+        self.requests = []
+        self.reader = None
+
+
+class QueryExecutor(object):
+    """
+    Runs queries on a pool of worker threads, each with its own read only
+    datastore reader, so the caller's thread is never blocked by SQLite.
+
+    Each query produces results for a list of keys. Requests for keys that
+    are already queued or running wait on the existing query rather than
+    starting a new one. Queued queries run highest priority first.
+    """
+    DEFAULT_WORKER_COUNT = 2
+
+    def __init__(self, open_reader, close_reader=None, interrupt_reader=None, worker_count=DEFAULT_WORKER_COUNT):
+        """
+        Initializer.
+        :param open_reader: called on each worker thread to create the reader passed to queries
+        :type open_reader: function
+        :param close_reader: called with a worker's reader when the worker exits
+        :type close_reader: function
+        :param interrupt_reader: called with a reader to abort its running query
+        :type interrupt_reader: function
+        :param worker_count: the number of worker threads
+        :type worker_count: int
+        """
+        self._open_reader = open_reader
+        self._close_reader = close_reader
+        self._interrupt_reader = interrupt_reader
+        self._cond = Condition()
+        self._queue = []
+        self._jobs_by_key = {}
+        self._seq = itertools.count()
+        self._running = True
+        self._workers = []
+        for i in range(worker_count):
+            t = Thread(target=self._query_worker, name='QueryExecutor-{}'.format(i))
+            t.daemon = True
+            t.start()
+            self._workers.append(t)
+
+    def submit(self, keys, query, callback, priority=0):
+        """
+        Submit a query.
+        :param keys: the keys the query produces results for
+        :type keys: list
+        :param query: called on a worker thread as query(reader, keys) for the
+        keys not already being queried; returns a dict of key => result
+        :type query: function
+        :param callback: called on a worker thread with the QueryRequest once
+        all results are available or the query failed
+        :type callback: function
+        :param priority: queries with a higher priority run first
+        :type priority: int
+        :return: the QueryRequest
+        """
+        request = QueryRequest(self, keys, callback)
+        with self._cond:
+            new_keys = []
+            for key in keys:
+                job = self._jobs_by_key.get(key)
+                if job is None:
+                    new_keys.append(key)
+                else:
+                    self._subscribe(job, request, priority)
+
+            if len(new_keys) > 0:
+                job = _QueryJob(new_keys, query, priority, next(self._seq))
+                for key in new_keys:
+                    self._jobs_by_key[key] = job
+                self._subscribe(job, request, priority)
+                heapq.heappush(self._queue, (-priority, job.seq, job))
+                self._cond.notify()
+        return request
+
+    def stop(self):
+        """
+        Stop the workers once their current queries complete. Queued queries
+        are discarded.
+        """
+        with self._cond:
+            self._running = False
+            del self._queue[:]
+            self._jobs_by_key.clear()
+            self._cond.notify_all()
+
+    def _subscribe(self, job, request, priority):
+        job.requests.append(request)
+        request._jobs.add(job)
+        if job.state == _QueryJob.PENDING and priority > job.priority:
+            # requeue at the higher priority; the old entry is skipped
+            job.priority = priority
+            job.seq = next(self._seq)
+            heapq.heappush(self._queue, (-priority, job.seq, job))
+            self._cond.notify()
+
+    def _release_keys(self, job):
+        for key in job.keys:
+            if self._jobs_by_key.get(key) is job:
+                del self._jobs_by_key[key]
+
+    def _cancel(self, request):
+        with self._cond:
+            request.cancelled = True
+            for job in request._jobs:
+                job.requests.remove(request)
+                if len(job.requests) == 0:
+                    self._release_keys(job)
+                    if job.state == _QueryJob.PENDING:
+                        job.state = _QueryJob.FINISHED
+                    elif job.state == _QueryJob.RUNNING and self._interrupt_reader:
+                        self._interrupt_reader(job.reader)
+            request._jobs.clear()
+
+    def _next_job(self, reader):
+        with self._cond:
+            while self._running:
+                while len(self._queue) > 0:
+                    _, seq, job = heapq.heappop(self._queue)
+                    if job.state == _QueryJob.PENDING and job.seq == seq:
+                        job.state = _QueryJob.RUNNING
+                        job.reader = reader
+                        return job
+                self._cond.wait()
+            return None
+
+    def _finish_job(self, job, results, error):
+        completed = []
+        with self._cond:
+            job.state = _QueryJob.FINISHED
+            job.reader = None
+            self._release_keys(job)
+            for request in job.requests:
+                for key in job.keys:
+                    if key in results and key in request.keys:
+                        request.results[key] = results[key]
+                if error is not None:
+                    request.error = error
+                request._jobs.discard(job)
+                if request.done:
+                    completed.append(request)
+            job.requests = []
+
+        for request in completed:
+            try:
+                request.callback(request)
+            except Exception as e:
+                Logger.error('QueryExecutor: Error in query callback: {}'.format(e))
+                Logger.debug(traceback.format_exc())
+
+    def _query_worker(self):
+        reader = self._open_reader()
+        try:
+            while True:
+                job = self._next_job(reader)
+                if job is None:
+                    break
+                results = {}
+                error = None
+                try:
+                    results = job.query(reader, job.keys)
+                except Exception as e:
+                    if len(job.requests) > 0:
+                        Logger.error('QueryExecutor: Error running query for {}: {}'.format(job.keys, e))
+                        Logger.debug(traceback.format_exc())
+                    error = e
+                self._finish_job(job, results, error)
+        finally:
+            if self._close_reader:
+                self._close_reader(reader)
@@ -0,0 +1,114 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+
+
+class GeoGridIndex(object):
+    """
+    A spatial index of keyed points on a fixed grid of latitude / longitude
+    cells. Range queries only visit the cells overlapping the search box.
+    """
+    DEFAULT_CELL_SIZE_DEGREES = 0.25
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE_DEGREES):
+        """
+        Initializer.
+        :param cell_size: the width and height of a grid cell, in degrees
+        :type cell_size: float
+        """
+        self.cell_size = cell_size
+        # cell => {key: GeoPoint}
+        self._cells = {}
+        # key => cell
+        self._key_cells = {}
+
+    def __len__(self):
+        return len(self._key_cells)
+
+    def _cell(self, latitude, longitude):
+        size = self.cell_size
+        return (int(math.floor(latitude / size)), int(math.floor(longitude / size)))
+
+    def clear(self):
+        self._cells.clear()
+        self._key_cells.clear()
+
+    def put(self, key, point):
+        """
+        Add or move a key
+        :param key: the key
+        :param point: the key's location
+        :type point: GeoPoint
+        """
+        self.remove(key)
+        cell = self._cell(point.latitude, point.longitude)
+        self._cells.setdefault(cell, {})[key] = point
+        self._key_cells[key] = cell
+
+    def remove(self, key):
+        cell = self._key_cells.pop(key, None)
+        if cell is not None:
+            points = self._cells[cell]
+            del points[key]
+            if len(points) == 0:
+                del self._cells[cell]
+
+    def within_box(self, min_latitude, min_longitude, max_latitude, max_longitude):
+        """
+        Find the keys located within a latitude / longitude box, inclusive
+        :return: generator of (key, GeoPoint) tuples
+        """
+        cells = self._cells
+        try:
+            min_lat_cell, min_lon_cell = self._cell(min_latitude, min_longitude)
+            max_lat_cell, max_lon_cell = self._cell(max_latitude, max_longitude)
+            cell_count = (max_lat_cell - min_lat_cell + 1) * (max_lon_cell - min_lon_cell + 1)
+        except (OverflowError, ValueError):
+            # an unbounded box
+            cell_count = None
+        if cell_count is None or cell_count > len(cells):
+            # a box larger than the populated area; scan the populated cells instead
+            candidates = cells.itervalues()
+        else:
+            candidates = (cells[(lat_cell, lon_cell)]
+                          for lat_cell in xrange(min_lat_cell, max_lat_cell + 1)
+                          for lon_cell in xrange(min_lon_cell, max_lon_cell + 1)
+                          if (lat_cell, lon_cell) in cells)
+
+        for points in candidates:
+            for key, point in points.iteritems():
+                if min_latitude <= point.latitude <= max_latitude and min_longitude <= point.longitude <= max_longitude:
+                    yield key, point
+
+    def within_circle(self, center, radius):
+        """
+        Find the keys within a radius of a point, using the same planar
+        degree distance as GeoPoint.withinCircle
+        :param center: the center of the search
+        :type center: GeoPoint
+        :param radius: the search radius, in degrees
+        :type radius: float
+        :return: generator of (key, GeoPoint) tuples
+        """
+        for key, point in self.within_box(center.latitude - radius, center.longitude - radius,
+                                          center.latitude + radius, center.longitude + radius):
+            if point.withinCircle(center, radius):
+                yield key, point
@@ -19,6 +19,8 @@
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
 import math
+from array import array
+from itertools import izip
 RADIUS_EARTH_KM = 6371
 
 class GeoPoint:
@@ -175,3 +177,79 @@ class Region:
                                 inside = not inside
                 p1x, p1y = p2x, p2y
         return inside
+
+
+class GeoPointSeries(object):
+    """
+    A compact, read only sequence of GeoPoints. The coordinates are held in
+    a pair of arrays; GeoPoint objects are created as items are accessed.
+    """
+    def __init__(self, latitudes=None, longitudes=None):
+        self.latitudes = array('d', latitudes or [])
+        self.longitudes = array('d', longitudes or [])
+        # the point of each sample, when built from samples
+        self.sample_points = None
+        if len(self.latitudes) != len(self.longitudes):
+            raise ValueError('GeoPointSeries: latitude and longitude counts differ')
+
+    @classmethod
+    def fromSamples(cls, latitudes, longitudes):
+        """
+        Factory to create a series from the location of consecutive samples,
+        leaving out samples without a GPS fix. Each sample keeps the point of
+        its latest fix, for point_at_sample().
+        :param latitudes the latitude of each sample
+        :type latitudes sequence of float
+        :param longitudes the longitude of each sample
+        :type longitudes sequence of float
+        :return GeoPointSeries
+        """
+        series = cls()
+        sample_points = array('l')
+        for latitude, longitude in izip(latitudes, longitudes):
+            if latitude and longitude:
+                series.append(latitude, longitude)
+            # samples before the first fix take the first fix
+            sample_points.append(max(len(series) - 1, 0))
+        series.sample_points = sample_points
+        return series
+
+    def append(self, latitude, longitude):
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def __getitem__(self, index):
+        return GeoPoint.fromPoint(self.latitudes[index], self.longitudes[index])
+
+    def __iter__(self):
+        for latitude, longitude in izip(self.latitudes, self.longitudes):
+            yield GeoPoint.fromPoint(latitude, longitude)
+
+    def point_at_sample(self, sample_index):
+        """
+        Get the location of a sample. Samples past the end take the last point.
+        :param sample_index the index of the sample, or of the point if not built from samples
+        :type sample_index int
+        :return GeoPoint, or None if the series is empty
+        """
+        if len(self.latitudes) == 0:
+            return None
+        sample_points = self.sample_points
+        if sample_points is not None:
+            index = sample_points[min(sample_index, len(sample_points) - 1)]
+        else:
+            index = min(sample_index, len(self.latitudes) - 1)
+        return self[index]
+
+    @property
+    def size(self):
+        """
+        The size of the coordinate arrays and sample index, in bytes
+        """
+        size = self.latitudes.buffer_info()[1] * self.latitudes.itemsize * 2
+        if self.sample_points is not None:
+            size += self.sample_points.buffer_info()[1] * self.sample_points.itemsize
+        return size
@@ -33,7 +33,9 @@ import traceback
 from StringIO import StringIO
 import gzip
 import zipfile
+from functools import partial
 from autosportlabs.util.timeutil import time_to_epoch, epoch_to_time
+from autosportlabs.util.dircache import DirectoryCache
 from kivy.logger import Logger
 from collections import OrderedDict
 
@@ -51,10 +53,28 @@ class Preset(object):
         self.more_info_url = None
         self.image_url = None
         self.local_image_path = None
-        self.mapping = None
+        self._mapping = None
+        # for a preset created from a summary, loads the full preset dict
+        self._load_details = None
         self.mapping_type_id = None
         self.mapping_type = None
 
+    @property
+    def mapping(self):
+        load_details = self._load_details
+        if load_details is not None:
+            self._load_details = None
+            try:
+                self._mapping = load_details().get('mapping')
+            except Exception as e:
+                Logger.error('Preset: could not load mapping for preset {}: {}'.format(self.mapping_id, e))
+        return self._mapping
+
+    @mapping.setter
+    def mapping(self, value):
+        self._load_details = None
+        self._mapping = value
+
     def from_dict(self, preset_dict):
         self.mapping_id = int(preset_dict.get('id'))
         self.uri = preset_dict.get('URI')
@@ -82,6 +102,27 @@ class Preset(object):
                 'mapping_type_id': self.mapping_type_id,
                 'mapping_type': self.mapping_type}
 
+    def to_summary_dict(self):
+        """Create a dict of everything but the mapping, for caching
+        """
+        preset_dict = self.to_dict()
+        del preset_dict['mapping']
+        return preset_dict
+
+    @classmethod
+    def from_summary_dict(cls, summary_dict, load_details):
+        """
+        Create a preset from a summary, deferring loading its mapping until it is used
+        :param summary_dict the summary, from to_summary_dict()
+        :type summary_dict dict
+        :param load_details function returning the full preset dict
+        :type load_details function
+        """
+        preset = Preset()
+        preset.from_dict(summary_dict)
+        preset._load_details = load_details
+        return preset
+
     def __eq__(self, other):
         if isinstance(other, self.__class__):
             return self.mapping_id == other.mapping_id
@@ -94,6 +135,8 @@ class PresetManager(object):
     READ_RETRIES = 3
     RETRY_DELAY = 1.0
     PRESET_DOWNLOAD_TIMEOUT = 30
+    # the version of the preset summaries in the preset cache
+    PRESET_CACHE_VERSION = 1
 
     def __init__(self, **kwargs):
         self.on_progress = lambda self, value: value
@@ -256,7 +299,7 @@ class PresetManager(object):
             self.update_lock.release()
 
     def _check_load_default_presets(self):
-        preset_file_names = os.listdir(self.presets_user_dir)
+        preset_file_names = DirectoryCache(self.presets_user_dir, self.PRESET_CACHE_VERSION).list_files()
         if (len(preset_file_names) == 0):
             Logger.info("PresetManager: No presets found; loading defaults")
             try:
@@ -273,29 +316,42 @@ class PresetManager(object):
             t.daemon = True
             t.start()
         else:
-            preset_file_names = [f for f in os.listdir(self.presets_user_dir) if f.endswith('.json')]
+            cache = DirectoryCache(self.presets_user_dir, self.PRESET_CACHE_VERSION)
+            preset_file_names = cache.list_files('.json')
             self.presets.clear()
             preset_count = len(preset_file_names)
             count = 0
 
             for preset_path in preset_file_names:
                 try:
-                    json_data = open(os.path.join(self.presets_user_dir, preset_path))
-                    preset_dict = json.load(json_data)
-
-                    if preset_dict is not None:
+                    path = os.path.join(self.presets_user_dir, preset_path)
+                    summary = cache.get(preset_path)
+                    if summary is not None:
+                        preset = Preset.from_summary_dict(summary, partial(self._read_preset_file, path))
+                    else:
+                        preset_dict = self._read_preset_file(path)
+                        if preset_dict is None:
+                            continue
                         preset = Preset()
                         preset.from_dict(preset_dict)
-                        self._set_preset_local_path(preset)
+                        cache.put(preset_path, preset.to_summary_dict())
 
-                        self.presets[preset.mapping_id] = preset
-                        count += 1
-                        if progress_cb:
-                            progress_cb(count=preset.count, total=preset_count, message=preset.name)
+                    self._set_preset_local_path(preset)
+                    self.presets[preset.mapping_id] = preset
+                    count += 1
+                    if progress_cb:
+                        progress_cb(count=count, total=preset_count, message=preset.name)
                 except Exception as detail:
                     Logger.warning('PresetManager: failed to read preset file ' + preset_path + ';\n' + str(detail))
                     raise
 
+            cache.save()
+            Logger.info('PresetManager: loaded {} presets, {} from the preset cache'.format(count, cache.hits))
+
+    def _read_preset_file(self, path):
+        with open(path) as json_data:
+            return json.load(json_data)
+
 
     def _set_preset_local_path(self, preset):
         local_path = self._image_url_to_local_path(preset.mapping_id, preset.image_url)
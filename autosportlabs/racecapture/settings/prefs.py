@@ -218,6 +218,8 @@ class UserPrefs(EventDispatcher):
         self.config.setdefault('preferences', 'import_datalog_dir', default_user_files_dir)
         self.config.setdefault('preferences', 'send_telemetry', '0')
         self.config.setdefault('preferences', 'record_session', '1')
+        self.config.setdefault('preferences', 'preload_views', '1')
+        self.config.setdefault('preferences', 'columnar_storage', '0')
         self.config.setdefault('preferences', 'global_help', True)
 
         # Connection type for mobile
@@ -32,9 +32,12 @@ import traceback
 from StringIO import StringIO
 import gzip
 import zipfile
+from functools import partial
 from autosportlabs.racecapture.geo.geopoint import GeoPoint, Region
+from autosportlabs.racecapture.geo.geoindex import GeoGridIndex
 from autosportlabs.racecapture.config.rcpconfig import Track
 from autosportlabs.util.timeutil import time_to_epoch, epoch_to_time
+from autosportlabs.util.dircache import DirectoryCache
 from kivy.logger import Logger
 
 
@@ -46,8 +49,11 @@ class TrackMap(object):
 
     def __init__(self):
         self.custom = False
-        self.map_points = []
-        self.sector_points = []
+        self._map_points = []
+        self._sector_points = []
+        # for a track created from a summary, loads the full track dict
+        self._load_details = None
+        self._center = None
         self.name = TrackMap.DEFAULT_TRACK_NAME
         self.configuration = TrackMap.DEFAULT_CONFIGURATION
         self.created = None
@@ -92,11 +98,47 @@ class TrackMap(object):
         """
         return '{} {}'.format(self.name, '' if self.configuration is None or self.configuration.strip() == '' else '({})'.format(self.configuration))
 
+    @property
+    def map_points(self):
+        self._check_load_details()
+        return self._map_points
+
+    @map_points.setter
+    def map_points(self, value):
+        self._check_load_details()
+        self._map_points = value
+
+    @property
+    def sector_points(self):
+        self._check_load_details()
+        return self._sector_points
+
+    @sector_points.setter
+    def sector_points(self, value):
+        self._check_load_details()
+        self._sector_points = value
+
+    def _check_load_details(self):
+        """
+        Load the map and sector points of a track created from a summary
+        """
+        load_details = self._load_details
+        if load_details is not None:
+            self._load_details = None
+            try:
+                track_dict = load_details()
+                self._map_points = [GeoPoint.fromPoint(p[0], p[1]) for p in track_dict.get('track_map_array') or []]
+                self._sector_points = [GeoPoint.fromPoint(p[0], p[1]) for p in track_dict.get('sector_points') or []]
+            except Exception as e:
+                Logger.error('TrackMap: could not load track details for {}: {}'.format(self.track_id, e))
+
     @property
     def centerpoint(self):
         """
         Return the a reference point for the map
         """
+        if self._load_details is not None:
+            return self._center
         if len(self.map_points) > 0:
             return self.map_points[0]
         return None
@@ -171,6 +213,32 @@ class TrackMap(object):
 
         return track_dict
 
+    def to_summary_dict(self):
+        """Create a dict of everything but the map and sector points, plus the centerpoint, for caching
+        """
+        track_dict = self.to_dict()
+        del track_dict['track_map_array']
+        del track_dict['sector_points']
+        center = self.centerpoint
+        track_dict['center'] = center.toJson() if center is not None else None
+        return track_dict
+
+    @classmethod
+    def from_summary_dict(cls, summary_dict, load_details):
+        """
+        Create a track from a summary, deferring loading its map and sector points until they are used
+        :param summary_dict the summary, from to_summary_dict()
+        :type summary_dict dict
+        :param load_details function returning the full track dict
+        :type load_details function
+        """
+        track = TrackMap()
+        track.from_dict(summary_dict)
+        center = summary_dict.get('center')
+        track._center = GeoPoint.fromPoint(center[0], center[1]) if center else None
+        track._load_details = load_details
+        return track
+
 
 class TrackManager(object):
     """Manages fetching tracks from RCL's API, figuring out if any tracks have been updated, saving and loading tracks
@@ -181,6 +249,8 @@ class TrackManager(object):
     TRACK_DEFAULT_SEARCH_RADIUS_METERS = 2000
     TRACK_DEFAULT_SEARCH_BEARING_DEGREES = 360
     TRACK_DOWNLOAD_TIMEOUT = 30
+    # the version of the track summaries in the track cache
+    TRACK_CACHE_VERSION = 1
 
     def __init__(self, **kwargs):
         self.on_progress = lambda self, value: value
@@ -193,6 +263,12 @@ class TrackManager(object):
         # Tracks are stored as key/object pairs to aid in finding a particular track quickly
         self.tracks = {}
         self.track_ids_in_region = []
+
+        # Indexes over self.tracks, maintained by _put_track() / _clear_tracks()
+        self._track_locations = GeoGridIndex()
+        self._tracks_by_short_id = {}
+        # region name => set of track ids within the region
+        self._region_track_ids = {}
         self.base_dir = kwargs.get('base_dir')
 
     def set_tracks_user_dir(self, path):
@@ -222,6 +298,50 @@ class TrackManager(object):
                     self.regions.append(region)
         except Exception as detail:
             Logger.warning('TrackManager: Error loading regions data ' + traceback.format_exc())
+        self._index_regions()
+
+    def _index_regions(self):
+        """
+        Work out which regions every track lies in
+        """
+        self._region_track_ids.clear()
+        for track in self.tracks.itervalues():
+            self._index_track_regions(track)
+
+    def _index_track_regions(self, track):
+        track_id = track.track_id
+        center = track.centerpoint
+        for region in self.regions:
+            track_ids = self._region_track_ids.setdefault(region.name, set())
+            if len(region.points) > 0 and region.withinRegion(center):
+                track_ids.add(track_id)
+            else:
+                track_ids.discard(track_id)
+
+    def _put_track(self, track):
+        """
+        Add or replace a track, updating the indexes
+        :param track the track
+        :type track TrackMap
+        """
+        previous = self.tracks.get(track.track_id)
+        if previous is not None and self._tracks_by_short_id.get(previous.short_id) is previous:
+            del self._tracks_by_short_id[previous.short_id]
+
+        self.tracks[track.track_id] = track
+        self._tracks_by_short_id[track.short_id] = track
+        center = track.centerpoint
+        if center is not None:
+            self._track_locations.put(track.track_id, center)
+        else:
+            self._track_locations.remove(track.track_id)
+        self._index_track_regions(track)
+
+    def _clear_tracks(self):
+        self.tracks.clear()
+        self._tracks_by_short_id.clear()
+        self._track_locations.clear()
+        self._region_track_ids.clear()
 
     @property
     def track_ids(self):
@@ -231,11 +351,7 @@ class TrackManager(object):
         return self.track_ids_in_region
 
     def find_track_by_short_id(self, short_id):
-        for track_id in self.tracks.keys():
-            track = self.tracks.get(track_id)
-            if track and short_id == track.short_id:
-                return track
-        return None
+        return self._tracks_by_short_id.get(short_id)
 
     def find_nearby_tracks(self, point, searchRadius=None, searchBearing=None):
         """
@@ -252,13 +368,8 @@ class TrackManager(object):
         if searchBearing is None:
             searchBearing = TrackManager.TRACK_DEFAULT_SEARCH_BEARING_DEGREES
 
-        tracks = []
         radius = point.metersToDegrees(searchRadius, searchBearing)
-        for trackId in self.tracks.keys():
-            track = self.tracks[trackId]
-            trackCenter = track.centerpoint
-            if trackCenter and trackCenter.withinCircle(point, radius):
-                tracks.append(track)
+        tracks = [self.tracks[track_id] for track_id, center in self._track_locations.within_circle(point, radius)]
 
         # order by short id, which is timestamp
         tracks.sort(key=lambda x: x.short_id, reverse=True)
@@ -288,10 +399,9 @@ class TrackManager(object):
             for region in self.regions:
                 if region.name == region_name:
                     if len(region.points) > 0:
-                        for track_id in track_ids:
-                            track = self.tracks[track_id]
-                            if region.withinRegion(track.centerpoint):
-                                filtered_track_ids.append((track.name, track_id))
+                        tracks = self.tracks
+                        for track_id in self._region_track_ids.get(region_name, ()):
+                            filtered_track_ids.append((tracks[track_id].name, track_id))
                     else:
                         track_ids_in_region.extend(self._sorted_track_ids(track_ids))
                     break
@@ -408,7 +518,7 @@ class TrackManager(object):
         :type track TrackMap
         """
         self.save_track(track)
-        self.tracks[track.track_id] = track
+        self._put_track(track)
 
     def save_track(self, track):
         path = os.path.join(self.tracks_user_dir, track.track_id + '.json')
@@ -430,7 +540,7 @@ class TrackManager(object):
             self.update_lock.release()
 
     def check_load_default_tracks(self):
-        track_file_names = os.listdir(self.tracks_user_dir)
+        track_file_names = DirectoryCache(self.tracks_user_dir, self.TRACK_CACHE_VERSION).list_files()
         if (len(track_file_names) == 0):
             Logger.info("TrackManager: No tracks found; loading defaults")
             try:
@@ -447,38 +557,60 @@ class TrackManager(object):
             t.daemon = True
             t.start()
         else:
-            track_file_names = os.listdir(self.tracks_user_dir)
-            self.tracks.clear()
+            cache = DirectoryCache(self.tracks_user_dir, self.TRACK_CACHE_VERSION)
+            track_file_names = cache.list_files()
+            self._clear_tracks()
             track_count = len(track_file_names)
             count = 0
 
             for trackPath in track_file_names:
                 try:
-                    json_data = open(os.path.join(self.tracks_user_dir, trackPath))
-                    track_dict = json.load(json_data)
-                    resave = False
-
-                    # Backwards compatible-check for old format of track files
-                    if 'venue' in track_dict:
-                        track_dict = track_dict.get('venue')
-                        resave = True
-
-                    if track_dict is not None:
+                    path = os.path.join(self.tracks_user_dir, trackPath)
+                    summary = cache.get(trackPath)
+                    if summary is not None:
+                        track = TrackMap.from_summary_dict(summary, partial(self._read_track_file, path))
+                    else:
+                        track_dict, resave = self._read_track_file(path, True)
+                        if track_dict is None:
+                            continue
                         track = TrackMap()
                         track.from_dict(track_dict)
                         if resave:
                             self.save_track(track)
+                        cache.put(trackPath, track.to_summary_dict())
 
-                        self.tracks[track.track_id] = track
-                        count += 1
-                        if progress_cb:
-                            progress_cb(count=track.count, total=track_count, message=track.name)
+                    self._put_track(track)
+                    count += 1
+                    if progress_cb:
+                        progress_cb(count=count, total=track_count, message=track.name)
                 except Exception as detail:
                     Logger.warning('TrackManager: failed to read track file ' + trackPath + ';\n' + str(detail))
 
+            cache.save()
+            Logger.info('TrackManager: loaded {} tracks, {} from the track cache'.format(count, cache.hits))
             del self.track_ids_in_region[:]
             self.track_ids_in_region.extend(self.track_ids)
 
+    def _read_track_file(self, path, with_resave=False):
+        """
+        Read a track file
+        :param path the track file path
+        :type path string
+        :param with_resave also return whether the file is in the old format and should be re-saved
+        :type with_resave bool
+        :return the track dict
+        """
+        with open(path) as json_data:
+            track_dict = json.load(json_data)
+        resave = False
+
+        # Backwards compatible-check for old format of track files
+        if 'venue' in track_dict:
+            track_dict = track_dict.get('venue')
+            resave = True
+
+        return (track_dict, resave) if with_resave else track_dict
+
     def update_all_tracks_worker(self, success_cb, fail_cb, progress_cb=None):
         """Method for updating all tracks in a separate thread
         """
@@ -516,7 +648,7 @@ class TrackManager(object):
                     if progress_cb:
                         progress_cb(count=count, total=total, message=track.name)
                     self.save_track(track)
-                    self.tracks[track_id] = track
+                    self._put_track(track)
             else:
                 Logger.info("TrackManager: refreshing tracks")
                 venues = self.fetch_venue_list()
@@ -540,7 +672,7 @@ class TrackManager(object):
                         updated_track = self.download_track(venue_id)
                         if updated_track is not None:
                             self.save_track(updated_track)
-                            self.tracks[venue_id] = updated_track
+                            self._put_track(updated_track)
                             if progress_cb:
                                 progress_cb(count=count, total=track_count, message=updated_track.name)
                     else:
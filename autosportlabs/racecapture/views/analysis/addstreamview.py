@@ -47,6 +47,7 @@ from iconbutton import IconButton
 from fieldlabel import FieldLabel
 from iconbutton import LabelIconButton
 from autosportlabs.uix.toast.kivytoast import toast
+from autosportlabs.racecapture.datastore import DatalogImport
 
 class AddStreamView(BoxLayout):
     Builder.load_string("""
@@ -66,6 +67,9 @@ class AddStreamView(BoxLayout):
         FileConnectView:
             id: fileConnectScreen
             name: 'file'
+        BatchFileConnectView:
+            id: batch_file_connect_screen
+            name: 'batch'
         SessionImportView:
             id: session_import_screen
             name: 'session'    
@@ -89,6 +93,12 @@ class AddStreamView(BoxLayout):
         file_connect_view.bind(on_connect_stream_complete=self.connect_stream_complete)
         file_connect_view.bind(on_connect_stream_start=self.connect_stream_start)
 
+        batch_file_connect_view = self.ids.batch_file_connect_screen
+        batch_file_connect_view.settings = settings
+        batch_file_connect_view.datastore = datastore
+        batch_file_connect_view.bind(on_connect_streams_complete=self.connect_streams_complete)
+        batch_file_connect_view.bind(on_connect_stream_start=self.connect_stream_start)
+
         session_import_view = self.ids.session_import_screen
         session_import_view.datastore = datastore
         session_import_view.bind(on_add=self.add_session)
@@ -98,6 +108,7 @@ class AddStreamView(BoxLayout):
 
         self.register_event_type('on_connect_stream_start')
         self.register_event_type('on_connect_stream_complete')
+        self.register_event_type('on_connect_streams_complete')
         self.register_event_type('on_export_session')
         self.register_event_type('on_add_session')
         self.register_event_type('on_delete_session')
@@ -127,6 +138,9 @@ class AddStreamView(BoxLayout):
     def on_connect_stream_complete(self, *args):
         pass
 
+    def on_connect_streams_complete(self, *args):
+        pass
+
     def on_select_stream(self, instance, stream_type):
         self.ids.screens.current = stream_type
 
@@ -136,6 +150,9 @@ class AddStreamView(BoxLayout):
     def connect_stream_complete(self, instance, session_id):
         self.dispatch('on_connect_stream_complete', session_id)
 
+    def connect_streams_complete(self, instance, session_ids):
+        self.dispatch('on_connect_streams_complete', session_ids)
+
     def close(self, *args):
         self.dispatch('on_close')
 
@@ -164,6 +181,10 @@ class AddStreamSelectView(Screen):
                 icon: u'\uf15b'
                 title: 'Import Log File'
                 on_press: root.select_stream('file')
+            AnalysisFeatureButton:
+                icon: u'\uf0c5'
+                title: 'Import Log Files'
+                on_press: root.select_stream('batch')
             AnalysisFeatureButton:
                 icon: u'\uf187'
                 title: 'Saved Session'
@@ -243,6 +264,42 @@ class FileConnectView(BaseStreamConnectView):
                    "There was a problem importing the datalog. Details:\n\n{}".format(message))
         self.dispatch('on_connect_stream_complete', None)
 
+class BatchFileConnectView(BaseStreamConnectView):
+    Builder.load_string("""
+<BatchFileConnectView>:
+    BoxLayout:
+        orientation: 'vertical'
+        BatchLogImportWidget:
+            id: log_import
+    """)
+    def __init__(self, **kwargs):
+        super(BatchFileConnectView, self).__init__(**kwargs)
+        self.register_event_type('on_connect_streams_complete')
+
+    def on_connect_streams_complete(self, *args):
+        pass
+
+    def on_enter(self):
+        log_import_view = self.ids.log_import
+        log_import_view.bind(on_import_complete=self.import_complete)
+        log_import_view.bind(on_import_start=self.import_start)
+        log_import_view.datastore = self.datastore
+        log_import_view.settings = self.settings
+
+    def import_start(self, *args):
+        self.dispatch('on_connect_stream_start')
+
+    def import_complete(self, instance, imports):
+        failed = [datalog for datalog in imports if not datalog.success]
+        warned = [datalog for datalog in imports if datalog.success and len(datalog.warnings)]
+        if len(failed) or len(warned):
+            details = ['{}: {}'.format(os.path.basename(d.path), d.error) for d in failed]
+            details += ['{}: {} lines skipped'.format(os.path.basename(d.path), len(d.warnings)) for d in warned]
+            alertPopup("Import Problems",
+                       "There were problems importing {} of {} datalogs. Details:\n\n{}".format(
+                           len(failed) + len(warned), len(imports), '\n'.join(details)))
+        self.dispatch('on_connect_streams_complete', [datalog.session_id for datalog in imports if datalog.success])
+
 class SessionImportView(BaseStreamConnectView):
     Builder.load_string("""
 <SessionImportView>:
@@ -576,3 +633,122 @@ class LogImportWidget(BoxLayout):
         t.daemon = True
         t.start()
 
+
+
+class BatchLogImportWidget(BoxLayout):
+    Builder.load_string("""
+<BatchLogImportWidget>:
+    size: root.size
+    BoxLayout:
+        spacing: dp(10)
+        padding: (sp(5), sp(5), sp(5), sp(5))
+        orientation: 'vertical'
+        BoxLayout:
+            size_hint_y: 0.85
+            orientation: 'horizontal'
+            spacing: sp(10)
+            FieldLabel:
+                text: 'Datalog Locations'
+            FieldLabel:
+                id: log_paths
+            LabelIconButton:
+                id: browse_button
+                size_hint_x: 0.5
+                size_hint_y: 0.2
+                pos_hint: {'top': 1}
+                title: 'Browse'
+                icon_size: self.height * .9
+                title_font_size: self.height * 0.7
+                icon: '\357\204\225'
+                on_press: root.select_logs()
+
+        AnchorLayout:
+            anchor_x: 'right'
+            size_hint_y: 0.15
+            LabelIconButton:
+                id: import_button
+                disabled: True
+                size_hint_x: 0.2
+                title: 'Import'
+                icon_size: self.height * .9
+                title_font_size: self.height * 0.7
+                icon: u'\uf090'
+                on_press: root.load_logs()
+
+        FieldLabel:
+            size_hint_y: .05
+            halign: 'center'
+            id: current_status
+
+        ProgressBar:
+            id: log_load_progress
+            size_hint_y: .05
+    """)
+    datastore = ObjectProperty(None)
+    settings = ObjectProperty(None)
+
+    def __init__(self, **kwargs):
+        super(BatchLogImportWidget, self).__init__(**kwargs)
+        self.register_event_type('on_import_complete')
+        self.register_event_type('on_import_start')
+        self._log_paths = []
+        self._log_select = None
+
+    def on_import_start(self, *args):
+        pass
+
+    def on_import_complete(self, imports):
+        pass
+
+    def close_log_select(self, *args):
+        self._log_select.dismiss()
+        self._log_select = None
+
+    def set_log_paths(self, instance):
+        paths = [path for path in instance.selection if os.path.isfile(path)]
+        if len(paths):
+            self._log_paths = paths
+            self.ids.log_paths.text = '{} datalogs selected'.format(len(paths))
+            self.ids.import_button.disabled = False
+            self._log_select.dismiss()
+            self.settings.userPrefs.set_pref('preferences', 'import_datalog_dir', instance.path)
+
+    def select_logs(self):
+        content = LoadDialog(ok=self.set_log_paths,
+                             cancel=self.close_log_select,
+                             filters=['*' + '.LOG', '*' + '.log'],
+                             user_path=self.settings.userPrefs.get_pref('preferences', 'import_datalog_dir'),
+                             multiselect=True)
+        self._log_select = Popup(title="Select Logs", content=content, size_hint=(0.9, 0.9))
+        self._log_select.open()
+
+    def _loader_thread(self, imports):
+        Clock.schedule_once(lambda dt: self.dispatch('on_import_start'))
+        try:
+            self.datastore.import_datalogs(imports, self._update_progress)
+        except Exception as e:
+            for datalog in imports:
+                if not datalog.success:
+                    datalog.error = str(e)
+            ExceptionManager.handle_exception(e)
+        Clock.schedule_once(lambda dt: self.dispatch('on_import_complete', imports))
+
+    def _update_progress(self, percent_complete=0):
+        def update(dt):
+            self.ids.current_status.text = "Loading log records"
+            self.ids.log_load_progress.value = int(percent_complete)
+        Clock.schedule_once(update)
+
+    def load_logs(self):
+        imports = []
+        for path in self._log_paths:
+            session_name, file_extension = os.path.splitext(os.path.basename(path))
+            imports.append(DatalogImport(path, session_name))
+
+        Logger.info("BatchLogImportWidget: loading {} logs".format(len(imports)))
+        self.ids.current_status.text = "Initializing Datastore"
+        self.ids.browse_button.disabled = True
+        self.ids.import_button.disabled = True
+        t = Thread(target=self._loader_thread, args=(imports,))
+        t.daemon = True
+        t.start()
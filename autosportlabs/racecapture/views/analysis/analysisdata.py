@@ -18,8 +18,13 @@
 # have received a copy of the GNU General Public License along with
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
-from autosportlabs.racecapture.datastore import DataStore, Filter, timing
-from autosportlabs.racecapture.geo.geopoint import GeoPoint
+import sys
+import itertools
+from array import array
+from autosportlabs.racecapture.datastore import DataStore, ColumnarDataStore, Filter, QueryExecutor, timing
+from autosportlabs.racecapture.datastore.lapdelta import ReferenceLap
+from autosportlabs.racecapture.geo.geopoint import GeoPointSeries
+from autosportlabs.util.lrucache import LRUCache
 from kivy.logger import Logger
 from kivy.clock import Clock
 
@@ -45,12 +50,115 @@ class ChannelData(object):
         self.source = kwargs.get('source', None)
 
 class CachingAnalysisDatastore(DataStore):
+    # Default budget for cached channel and location data
+    DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+    # The cumulative time delta of a lap against a reference lap, in seconds
+    TIME_DELTA_CHANNEL = 'TimeDelta'
 
     def __init__(self, **kwargs):
+        cache_bytes = kwargs.pop('cache_bytes', CachingAnalysisDatastore.DEFAULT_CACHE_BYTES)
         super(CachingAnalysisDatastore, self).__init__(**kwargs)
-        self._channel_data_cache = {}
-        self._session_location_cache = {}
+        # channel and location data, keyed by (source key, channel) and
+        # grouped by session id for invalidation
+        self._data_cache = LRUCache(cache_bytes)
         self._session_info_cache = {}
+        self._query_executor = None
+        # newer requests are queried first
+        self._query_priority = itertools.count()
+        # outstanding QueryRequests by source key
+        self._source_requests = {}
+        # cached time delta keys by the session of their reference lap
+        self._time_delta_keys = {}
+
+    def open_db(self, db_path):
+        self._stop_query_executor()
+        super(CachingAnalysisDatastore, self).open_db(db_path)
+        self._data_cache.clear()
+        self._time_delta_keys.clear()
+        self._query_executor = QueryExecutor(self.open_reader,
+                                             close_reader=lambda reader: reader.close(),
+                                             interrupt_reader=lambda reader: reader.connection.interrupt())
+
+    def open_reader(self):
+        reader = super(CachingAnalysisDatastore, self).open_reader()
+        # closing the reader must not stop this datastore's query executor
+        reader._query_executor = None
+        reader._source_requests = {}
+        return reader
+
+    def close(self):
+        self._stop_query_executor()
+        super(CachingAnalysisDatastore, self).close()
+
+    def _stop_query_executor(self):
+        if self._query_executor is not None:
+            self._query_executor.stop()
+            self._query_executor = None
+        self._source_requests.clear()
+
+    def _submit_query(self, source_ref, keys, query, callback):
+        """
+        Queue a query on the query executor, tracking it against the source
+        so it can be cancelled with cancel_queries()
+        """
+        source_key = str(source_ref)
+        request = self._query_executor.submit(keys, query, callback, priority=next(self._query_priority))
+        requests = [r for r in self._source_requests.get(source_key, []) if not r.done]
+        requests.append(request)
+        self._source_requests[source_key] = requests
+        return request
+
+    def _deliver(self, request, callback, results):
+        """
+        Deliver query results on the UI thread, unless the request was
+        cancelled in the meantime
+        """
+        def deliver(dt):
+            if not request.cancelled:
+                callback(results)
+        Clock.schedule_once(deliver)
+
+    def cancel_queries(self, source_ref):
+        """
+        Cancel outstanding channel and location queries for a session / lap.
+        Callbacks for cancelled queries are not called.
+        :param source_ref the session / lap reference
+        :type source_ref SourceRef
+        """
+        for request in self._source_requests.pop(str(source_ref), []):
+            request.cancel()
+
+    @property
+    def cache_stats(self):
+        """
+        Hit, miss and eviction counters for the channel / location data cache
+        :return dict of counters
+        """
+        return self._data_cache.stats
+
+    def invalidate_session(self, session_id):
+        """
+        Discard cached channel and location data for a session
+        :param session_id the session to discard
+        :type session_id int
+        """
+        self._data_cache.invalidate(session_id)
+        # time deltas are grouped with the compared lap's session; drop those against this session's laps too
+        for key in self._time_delta_keys.pop(session_id, []):
+            self._data_cache.pop(key)
+
+    @staticmethod
+    def _compact_values(values):
+        """
+        Store channel values as a double array, unless the channel has
+        missing (None) values that consumers need to see
+        :return tuple of the values and their size in bytes
+        """
+        if None in values:
+            return values, sys.getsizeof(values) + len(values) * sys.getsizeof(0.0)
+        values = array('d', values)
+        return values, values.buffer_info()[1] * values.itemsize
 
     @property
     def session_info_cache(self):
@@ -76,35 +184,52 @@ class CachingAnalysisDatastore(DataStore):
 
         for index in range(len(channels)):
             channel = channels[index]
-            values = []
-            for record in records:
-                # pluck out just the channel value
-                values.append(record[1 + index])
+            # pluck out just the channel value
+            values, size = self._compact_values([record[1 + index] for record in records])
 
             channel_meta = self.get_channel(channel)
             channel_data = ChannelData(values=values, channel=channel, min=channel_meta.min, max=channel_meta.max, source=source_ref)
             combined_channel_data[channel] = channel_data
+            self._data_cache.put((str(source_ref), channel), channel_data, size, group=session)
 
-    def _get_channel_data(self, source_ref, channels, callback):
+    def _get_channel_data(self, source_ref, channels, callback, fail_callback=None):
         '''
-        Retrieve cached or query channel data as appropriate.
+        Retrieve cached channel data, or queue a query for the missing channels.
         '''
         source_key = str(source_ref)
-        channel_data = self._channel_data_cache.get(str(source_key))
-        if not channel_data:
-            channel_data = {}
-            self._channel_data_cache[source_key] = channel_data
+        channel_data = {}
 
         channels_to_query = []
         for channel in channels:
-            channel_d = channel_data.get(channel)
-            if not channel_d:
+            channel_d = self._data_cache.get((source_key, channel))
+            if channel_d is None:
                 channels_to_query.append(channel)
+            else:
+                channel_data[channel] = channel_d
+
+        if len(channels_to_query) == 0:
+            Clock.schedule_once(lambda dt: callback(channel_data))
+            return None
+
+        # Fail on unknown channels here, rather than on the query thread
+        for channel in channels_to_query:
+            self.get_channel(channel)
+
+        def query(reader, keys):
+            queried = {}
+            reader._query_channel_data(source_ref, [channel for _, channel in keys], queried)
+            return dict(((source_key, channel), channel_d) for channel, channel_d in queried.iteritems())
 
-        if len(channels_to_query) > 0:
-            channel_d = self._query_channel_data(source_ref, channels_to_query, channel_data)
+        def query_complete(request):
+            if request.error is None:
+                for key, channel_d in request.results.iteritems():
+                    channel_data[key[1]] = channel_d
+                self._deliver(request, callback, channel_data)
+            elif fail_callback is not None:
+                self._deliver(request, fail_callback, request.error)
 
-        Clock.schedule_once(lambda dt: callback(channel_data))
+        keys = [(source_key, channel) for channel in channels_to_query]
+        return self._submit_query(source_ref, keys, query, query_complete)
 
     @timing
     def import_datalog(self, path, name, notes='', progress_cb=None):
@@ -112,9 +237,16 @@ class CachingAnalysisDatastore(DataStore):
         self._refresh_session_data()
         return session_id
 
-    def delete_session(self, session_id):
-        super(CachingAnalysisDatastore, self).delete_session(session_id)
+    def import_datalogs(self, imports, progress_cb=None, worker_count=None):
+        imports = super(CachingAnalysisDatastore, self).import_datalogs(imports, progress_cb, worker_count)
+        self._refresh_session_data()
+        return imports
+
+    def segment_laps(self, session_id, track, **kwargs):
+        laps = super(CachingAnalysisDatastore, self).segment_laps(session_id, track, **kwargs)
+        self.invalidate_session(session_id)
         self._refresh_session_data()
+        return laps
 
     @timing
     def _refresh_session_data(self):
@@ -160,22 +292,135 @@ class CachingAnalysisDatastore(DataStore):
         """
         super(CachingAnalysisDatastore, self).delete_session(session_id)
         self.session_info_cache.pop(session_id, None)
+        self.invalidate_session(session_id)
 
-    def get_channel_data(self, source_ref, channels, callback):
+    def get_channel_data(self, source_ref, channels, callback, fail_callback=None):
         '''
         Retrieve channel data for the specified source (session / lap combo).
-        Data is returned with the specified callback function.
+        Data is returned on the UI thread with the specified callback function;
+        uncached channels are queried in the background. If the query fails,
+        fail_callback, when specified, receives the exception on the UI thread.
+        :returns the QueryRequest for uncached channels, or None if all channels were cached
+        '''
+        return self._get_channel_data(source_ref, channels, callback, fail_callback)
+
+    def get_time_delta_data(self, reference_ref, source_refs, callback, fail_callback=None):
+        '''
+        Retrieve the cumulative time delta of laps against a reference lap, as
+        channel data of each lap's samples. The deltas are computed from the
+        laps' Distance and Interval channel data, queried as needed, and cached
+        alongside it.
+        Data is returned on the UI thread with the specified callback function.
+        :param reference_ref the session / lap compared against
+        :type reference_ref SourceRef
+        :param source_refs the session / laps to compare
+        :type source_refs list of SourceRef
+        :param callback receives a dict of source key -> ChannelData of the TimeDelta channel;
+        laps without distance data are left out
+        :type callback function
+        :param fail_callback receives the exception if querying a lap's data fails. Without
+        one, the callback receives the deltas of the laps whose data could be queried
+        :type fail_callback function
+        '''
+        delta_data = {}
+        missing = []
+        for source_ref in source_refs:
+            cached = self._data_cache.get(self._time_delta_key(source_ref, reference_ref))
+            if cached is None:
+                missing.append(source_ref)
+            else:
+                delta_data[str(source_ref)] = cached
+
+        if len(missing) == 0:
+            Clock.schedule_once(lambda dt: callback(delta_data))
+            return
+
+        lap_refs = dict((str(source_ref), source_ref) for source_ref in [reference_ref] + missing)
+        # the Interval and Distance data of each lap, or None where the query failed
+        lap_data = {}
+        errors = []
+
+        def lap_data_complete(source_key, results):
+            lap_data[source_key] = results
+            if len(lap_data) < len(lap_refs):
+                return
+            if len(errors) > 0 and fail_callback is not None:
+                fail_callback(errors[0])
+                return
+            if lap_data[str(reference_ref)] is not None:
+                queried = [source_ref for source_ref in missing if lap_data[str(source_ref)] is not None]
+                delta_data.update(self._compute_time_deltas(reference_ref, queried, lap_data))
+            callback(delta_data)
+
+        def lap_data_failed(source_key, error):
+            Logger.warn('CachingAnalysisDatastore: could not query {} for time deltas: {}'.format(source_key, error))
+            errors.append(error)
+            lap_data_complete(source_key, None)
+
+        for source_key, source_ref in lap_refs.iteritems():
+            self.get_channel_data(source_ref, ['Interval', 'Distance'],
+                                  lambda results, source_key=source_key: lap_data_complete(source_key, results),
+                                  lambda error, source_key=source_key: lap_data_failed(source_key, error))
+
+    @staticmethod
+    def _time_delta_key(source_ref, reference_ref):
+        return (str(source_ref), CachingAnalysisDatastore.TIME_DELTA_CHANNEL, str(reference_ref))
+
+    @timing
+    def _compute_time_deltas(self, reference_ref, source_refs, lap_data):
+        '''
+        Compute and cache the time deltas of laps against a reference lap
+        :param lap_data the Interval and Distance ChannelData of each lap, by source key
+        :type lap_data dict
+        :returns dict of source key -> ChannelData
+        '''
+        reference_data = lap_data[str(reference_ref)]
+        reference = ReferenceLap(reference_data['Distance'].values, reference_data['Interval'].values)
+        delta_data = {}
+        for source_ref in source_refs:
+            source_data = lap_data[str(source_ref)]
+            values = reference.sample_deltas(source_data['Distance'].values, source_data['Interval'].values)
+            if values is None:
+                continue
+            present = [value for value in values if value is not None]
+            values, size = self._compact_values(values)
+            channel_data = ChannelData(values=values, channel=self.TIME_DELTA_CHANNEL, min=min(present),
+                                       max=max(present), source=source_ref)
+            key = self._time_delta_key(source_ref, reference_ref)
+            self._data_cache.put(key, channel_data, size, group=source_ref.session)
+            self._time_delta_keys.setdefault(reference_ref.session, set()).add(key)
+            delta_data[str(source_ref)] = channel_data
+        return delta_data
+
+    def get_channel_lod(self, source_ref, key, build):
+        '''
+        Retrieve the cached levels of detail of a plotted channel, or other
+        series derived from the channel data for plotting, building them if
+        needed. They are cached alongside the channel data and discarded
+        with the session.
+        :param source_ref the session / lap reference
+        :type source_ref SourceRef
+        :param key identifies the levels of detail within the source, e.g. channel and x axis
+        :type key tuple
+        :param build function returning the levels of detail, such as a SeriesLOD, or anything with a size in bytes
+        :type build function
+        :returns the levels of detail
         '''
-        self._get_channel_data(source_ref, channels, callback)
+        cache_key = ('lod', str(source_ref)) + tuple(key)
+        lod = self._data_cache.get(cache_key)
+        if lod is None:
+            lod = build()
+            self._data_cache.put(cache_key, lod, lod.size, group=source_ref.session)
+        return lod
 
     def get_location_data(self, source_ref, callback=None):
         '''
         Retrieve location data for the specified source (session / lap combo). 
         If immediately available, return it, otherwise use the callback for a later return after querying.
         '''
-        cached = self._session_location_cache.get(str(source_ref))
+        cached = self._data_cache.get(('location', str(source_ref)))
         if callback:
-            if cached:
+            if cached is not None:
                 callback(cached)
             else:
                 self._get_location_data(source_ref, callback)
@@ -183,24 +428,53 @@ class CachingAnalysisDatastore(DataStore):
 
     def _get_location_data(self, source_ref, callback):
         '''
-        Retrieve cached or query Location data as appropriate.
+        Queue a query for location data.
         '''
+        key = ('location', str(source_ref))
+
+        def query(reader, keys):
+            return {key: reader._query_location_data(source_ref)}
+
+        def query_complete(request):
+            if request.error is None:
+                self._deliver(request, callback, request.results[key])
+
+        return self._submit_query(source_ref, [key], query, query_complete)
+
+    def _query_location_data(self, source_ref):
         session = source_ref.session
         lap = source_ref.lap
-        f = Filter().neq('Latitude', 0).and_().neq('Longitude', 0)
-        if self.session_has_laps(session):
-            f.eq("CurrentLap", lap)
+        # the same samples as the lap's channel data, so the location of any
+        # sample can be found; samples without a GPS fix are left off the path
+        f = Filter().eq('CurrentLap', lap) if self.session_has_laps(session) else None
         dataset = self.query(sessions=[session],
                                         channels=["Latitude", "Longitude"],
                                         data_filter=f)
         records = dataset.fetch_records()
-        cache = []
-        for r in records:
-            lat = r[1]
-            lon = r[2]
-            cache.append(GeoPoint.fromPoint(lat, lon))
-        self._session_location_cache[str(source_ref)] = cache
+        cache = GeoPointSeries.fromSamples([r[1] for r in records], [r[2] for r in records])
+        self._data_cache.put(('location', str(source_ref)), cache, cache.size, group=session)
+        return cache
+
 
-        Clock.schedule_once(lambda dt: callback(cache))
+class ColumnarAnalysisDatastore(CachingAnalysisDatastore, ColumnarDataStore):
+    """
+    CachingAnalysisDatastore keeping its sessions in column storage
+    """
+    pass
 
 
+class AnalysisDatastoreFactory(object):
+    def create_datastore(self, db_path, columnar=False, **kwargs):
+        """
+        Create the analysis datastore for a database. Column storage is used
+        when requested, and always for a database already holding sessions in
+        column storage, which the row based store cannot read.
+        :param db_path: the path of the database the datastore will open
+        :type db_path: string
+        :param columnar: True to store sessions in column storage
+        :type columnar: bool
+        :return: CachingAnalysisDatastore
+        """
+        if columnar or ColumnarDataStore.is_columnar_database(db_path):
+            return ColumnarAnalysisDatastore(**kwargs)
+        return CachingAnalysisDatastore(**kwargs)
@@ -60,6 +60,7 @@ class AnalysisMap(AnalysisWidget):
             id: track
             height: root.height
             width: root.width
+            detail_scale: scatter.scale
 
     AnchorLayout:
         anchor_x: 'right'
@@ -176,6 +176,7 @@ class AnalysisView(Screen):
             self._datastore.get_location_data(source_ref, lambda x: self.ids.analysismap.add_map_path(source_ref, x, map_path_color))
 
         else:
+            self._datastore.cancel_queries(source_ref)
             self.ids.mainchart.remove_lap(source_ref)
             self.ids.channelvalues.remove_lap(source_ref)
             self.ids.analysismap.remove_reference_mark(source_key)
@@ -193,11 +194,9 @@ class AnalysisView(Screen):
         self.ids.channelvalues.update_reference_mark(source, marker.data_index)
         cache = self._datastore.get_location_data(source)
         if cache != None:
-            try:
-                point = cache[marker.data_index]
-            except IndexError:
-                point = cache[len(cache) - 1]
-            self.ids.analysismap.update_reference_mark(source, point)
+            point = cache.point_at_sample(marker.data_index)
+            if point is not None:
+                self.ids.analysismap.update_reference_mark(source, point)
 
     def _sync_analysis_map(self, session):
         analysis_map = self.ids.analysismap
@@ -226,6 +225,15 @@ class AnalysisView(Screen):
             self.ids.sessions_view.append_session(session)
             self.check_load_suggested_lap(new_session_id)
 
+    def on_streams_connected(self, instance, new_session_ids):
+        self.stream_connecting = False
+        self._dismiss_popup()
+        for session_id in new_session_ids:
+            session = self._datastore.get_session_by_id(session_id)
+            self.ids.sessions_view.append_session(session)
+        if len(new_session_ids):
+            self.check_load_suggested_lap(new_session_ids[0])
+
     def _set_suggested_channels(self, channels):
         self._settings.userPrefs.set_pref_list('analysis_preferences', 'selected_analysis_channels', channels)
 
@@ -256,6 +264,7 @@ class AnalysisView(Screen):
         content = AddStreamView(settings=self._settings, datastore=self._datastore)
         content.bind(on_connect_stream_start=self.on_stream_connecting)
         content.bind(on_connect_stream_complete=self.on_stream_connected)
+        content.bind(on_connect_streams_complete=self.on_streams_connected)
         content.bind(on_add_session=self.on_add_session)
         content.bind(on_delete_session=self.on_delete_session)
         content.bind(on_export_session=self.on_export_session)
@@ -306,7 +315,13 @@ class AnalysisView(Screen):
                     try:
                         export_file = open(filename, 'w')
                         with export_file:
-                            records = self._datastore.export_session(session_id, export_file, progress_cb)
+                            # export on a separate connection, so commits made
+                            # while it runs don't reset the streaming query
+                            reader = self._datastore.open_reader()
+                            try:
+                                records = reader.export_session(session_id, export_file, progress_cb)
+                            finally:
+                                reader.close()
                             Clock.schedule_once(lambda dt: _export_complete('Export complete', '{} samples exported'.format(records)))
                             Clock.schedule_once(lambda dt: self._settings.userPrefs.set_pref('preferences', 'export_file_dir', os.path.dirname(filename)))
                     except Exception as e:
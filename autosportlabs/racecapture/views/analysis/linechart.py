@@ -25,10 +25,8 @@ from kivy.uix.label import Label
 from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.properties import ObjectProperty
-from collections import OrderedDict
 from  kivy.metrics import MetricsBase, sp
 from kivy.logger import Logger
-import bisect
 import copy
 
 from autosportlabs.racecapture.views.util.alertview import alertPopup
@@ -45,6 +43,7 @@ from autosportlabs.uix.toast.kivytoast import toast
 from fieldlabel import FieldLabel
 from iconbutton import IconButton, LabelIconButton
 from autosportlabs.racecapture.views.util.viewutils import format_laptime
+from autosportlabs.util.lod import SeriesLOD, SeriesXIndex
 
 Builder.load_file('autosportlabs/racecapture/views/analysis/linechart.kv')
 
@@ -53,6 +52,7 @@ class ChannelPlot(object):
     def __init__(self, plot, channel, min_value, max_value, sourceref):
         self.lap = None
         self.chart_x_index = None
+        self.lod = None
         self.plot = plot
         self.channel = channel
         self.min_value = min_value
@@ -96,7 +96,6 @@ class LineChart(ChannelAnalysisWidget):
     color_sequence = ObjectProperty(None)
     ZOOM_SCALING = 0.01
     TOUCH_ZOOM_SCALING = 0.000001
-    MAX_SAMPLES_TO_DISPLAY = 1000
 
     # The meaningful distance is an approximate distance / time threshold to consider
     # a dataset to have meaningful distance data. The threshold is:
@@ -127,10 +126,16 @@ class LineChart(ChannelAnalysisWidget):
         self.marker_pct = 0
         self.line_chart_mode = LineChartMode.DISTANCE
         self._channel_plots = {}
+        # source key -> (source ref, x index) of the plotted laps, for moving their markers
+        self._marker_sources = {}
         self.x_axis_value_label = None
 
         self._user_refresh_requested = False
 
+        # zooming and resizing redraw the plots at a suitable level of detail, once per frame
+        self._update_plot_detail_trigger = Clock.create_trigger(self._update_plot_detail)
+        self.bind(size=self._update_plot_detail_trigger)
+
     def add_option_buttons(self):
         '''
         Add additional buttons needed by this widget
@@ -215,6 +220,7 @@ class LineChart(ChannelAnalysisWidget):
 
                 chart.xmax = self.current_x
                 chart.xmin = self.current_offset
+                self._update_plot_detail_trigger()
             except:
                 pass  # no scrollwheel support
 
@@ -255,14 +261,11 @@ class LineChart(ChannelAnalysisWidget):
 
         self._update_x_marker_value()
 
-        for channel_plot in self._channel_plots.itervalues():
-            try:
-                value_index = bisect.bisect_right(channel_plot.chart_x_index.keys(), data_index)
-                index = channel_plot.chart_x_index.values()[value_index]
-                marker = MarkerEvent(int(index), channel_plot.sourceref)
-                self.dispatch('on_marker', marker)
-            except IndexError:
-                pass  # don't update marker for values that don't exist.
+        # plots of the same lap share an x index, so each lap's marker is found once
+        for sourceref, x_index in self._marker_sources.itervalues():
+            index = x_index.sample_index(data_index)
+            if index is not None:  # don't update marker for values that don't exist.
+                self.dispatch('on_marker', MarkerEvent(index, sourceref))
 
 
     def on_touch_move(self, touch):
@@ -303,6 +306,7 @@ class LineChart(ChannelAnalysisWidget):
                 chart = self.ids.chart
                 chart.xmax = self.current_x
                 chart.xmin = self.current_offset
+                self._update_plot_detail_trigger()
             return True
 
     def on_mouse_pos(self, x, pos):
@@ -324,8 +328,16 @@ class LineChart(ChannelAnalysisWidget):
             self.ids.chart.remove_plot(channel_plot.plot)
             del(self._channel_plots[str(channel_plot)])
 
+        self._update_marker_sources()
         self._update_max_chart_x()
 
+    def _update_marker_sources(self):
+        '''
+        Collect the laps currently plotted, with the x index of each
+        '''
+        self._marker_sources = dict((str(plot.sourceref), (plot.sourceref, plot.chart_x_index))
+                                    for plot in self._channel_plots.itervalues())
+
     def _update_max_chart_x(self):
         '''
         Reset max chart X dimension for the currently selected plots
@@ -333,14 +345,9 @@ class LineChart(ChannelAnalysisWidget):
         max_chart_x = 0
         for plot in self._channel_plots.itervalues():
             # Find the largest chart_x for all of the active plots
-            chart_x_index = plot.chart_x_index
-            try:
-                last = next(reversed(chart_x_index))
-                chart_x = last
-                if chart_x and chart_x > max_chart_x:
-                    max_chart_x = chart_x
-            except StopIteration:  # iterator is empty so just continue
-                pass
+            chart_x = plot.chart_x_index.max_x
+            if chart_x and chart_x > max_chart_x:
+                max_chart_x = chart_x
 
         # update chart zoom range
         self.current_offset = 0
@@ -349,6 +356,91 @@ class LineChart(ChannelAnalysisWidget):
 
         self.ids.chart.xmin = self.current_offset
         self.ids.chart.xmax = self.current_x
+        self._update_plot_detail()
+
+    def _update_plot_detail(self, *args):
+        '''
+        Draw each plot with the level of detail suiting the visible range
+        '''
+        chart = self.ids.chart
+        for channel_plot in self._channel_plots.itervalues():
+            if channel_plot.lod is not None:
+                channel_plot.plot.points = channel_plot.lod.get_points(chart.xmin, chart.xmax, chart.width)
+
+    def _set_plot_lod(self, channel_plot, lod, x_index):
+        '''
+        Plot a channel's levels of detail, with the x index of its lap for
+        following the marker
+        '''
+        channel_plot.chart_x_index = x_index
+        channel_plot.lod = lod
+        Logger.info('LineChart: {} points, {} levels of detail for {}'.format(len(lod), len(lod.levels), channel_plot))
+
+    @staticmethod
+    def _elapsed_times(time_data):
+        '''
+        Get the elapsed time at each sample from the Interval channel
+        '''
+        times = []
+        time = 0
+        last_time = time_data[0] if len(time_data) else 0
+        for current_time in time_data:
+            if last_time > current_time:
+                Logger.warn('LineChart: interruption in interval channel, possible reset in data stream ({}->{})'.format(last_time, current_time))
+                last_time = current_time
+            time += current_time - last_time
+            last_time = current_time
+            times.append(time)
+        return times
+
+    @staticmethod
+    def _build_time_lod(time_data, channel_data):
+        '''
+        Build the levels of detail of a channel against elapsed time
+        '''
+        xs = []
+        ys = []
+        indexes = []
+        times = LineChart._elapsed_times(time_data)
+        for sample_index in xrange(min(len(times), len(channel_data))):
+            sample = channel_data[sample_index]
+            if sample is not None:
+                xs.append(times[sample_index])
+                ys.append(sample)
+                indexes.append(sample_index)
+        return SeriesLOD(xs, ys, indexes)
+
+    @staticmethod
+    def _build_time_index(time_data):
+        '''
+        Build the x index of a lap against elapsed time
+        '''
+        return SeriesXIndex(LineChart._elapsed_times(time_data))
+
+    @staticmethod
+    def _build_distance_index(distance_data):
+        '''
+        Build the x index of a lap against distance
+        '''
+        indexes = [sample_index for sample_index, distance in enumerate(distance_data) if distance is not None]
+        return SeriesXIndex([distance_data[sample_index] for sample_index in indexes], indexes)
+
+    @staticmethod
+    def _build_distance_lod(distance_data, channel_data):
+        '''
+        Build the levels of detail of a channel against distance
+        '''
+        xs = []
+        ys = []
+        indexes = []
+        for sample_index in xrange(min(len(distance_data), len(channel_data))):
+            distance = distance_data[sample_index]
+            sample = channel_data[sample_index]
+            if distance is not None and sample is not None:
+                xs.append(distance)
+                ys.append(sample)
+                indexes.append(sample_index)
+        return SeriesLOD(xs, ys, indexes)
 
 
     def _add_channels_results_time(self, channels, query_data):
@@ -371,33 +463,18 @@ class LineChart(ChannelAnalysisWidget):
                                            channel_data_values.source)
 
                 chart.add_plot(plot)
-                points = []
-                time_index = OrderedDict()
-                sample_index = 0
                 time_data = time_data_values.values
-                sample_count = len(time_data)
-                interval = max(1, int(sample_count / self.MAX_SAMPLES_TO_DISPLAY))
-                Logger.info('LineChart: plot interval {}'.format(interval))
-                last_time = None
-                time = 0
-                last_time = time_data[0]
-                while sample_index < sample_count:
-                    current_time = time_data[sample_index]
-                    if last_time > current_time:
-                        Logger.warn('LineChart: interruption in interval channel, possible reset in data stream ({}->{})'.format(last_time, current_time))
-                        last_time = current_time
-                    sample = channel_data[sample_index]
-                    time += current_time - last_time
-                    last_time = current_time
-                    points.append((time, sample))
-                    time_index[time] = sample_index
-                    sample_index += interval
-
-                channel_plot.chart_x_index = time_index
+                lod = self.datastore.get_channel_lod(channel_data_values.source,
+                                                     (channel, LineChartMode.TIME),
+                                                     lambda: self._build_time_lod(time_data, channel_data))
+                x_index = self.datastore.get_channel_lod(channel_data_values.source,
+                                                         ('x_index', LineChartMode.TIME),
+                                                         lambda: self._build_time_index(time_data))
+                self._set_plot_lod(channel_plot, lod, x_index)
                 plot.ymin = channel_data_values.min
                 plot.ymax = channel_data_values.max
-                plot.points = points
                 self._channel_plots[str(channel_plot)] = channel_plot
+                self._update_marker_sources()
 
                 # sync max chart x dimension
                 self._update_max_chart_x()
@@ -422,26 +499,19 @@ class LineChart(ChannelAnalysisWidget):
                                            channel_data_values.source)
 
                 chart.add_plot(plot)
-                points = []
-                distance_index = OrderedDict()
-                sample_index = 0
                 distance_data = distance_data_values.values
                 channel_data = channel_data_values.values
-                sample_count = len(distance_data)
-                interval = max(1, int(sample_count / self.MAX_SAMPLES_TO_DISPLAY))
-                Logger.info('LineChart: plot interval {}'.format(interval))
-                while sample_index < sample_count:
-                    sample = channel_data[sample_index]
-                    distance = distance_data[sample_index]
-                    points.append((distance, sample))
-                    distance_index[distance] = sample_index
-                    sample_index += interval
-
-                channel_plot.chart_x_index = distance_index
+                lod = self.datastore.get_channel_lod(channel_data_values.source,
+                                                     (channel, LineChartMode.DISTANCE),
+                                                     lambda: self._build_distance_lod(distance_data, channel_data))
+                x_index = self.datastore.get_channel_lod(channel_data_values.source,
+                                                         ('x_index', LineChartMode.DISTANCE),
+                                                         lambda: self._build_distance_index(distance_data))
+                self._set_plot_lod(channel_plot, lod, x_index)
                 plot.ymin = channel_data_values.min
                 plot.ymax = channel_data_values.max
-                plot.points = points
                 self._channel_plots[str(channel_plot)] = channel_plot
+                self._update_marker_sources()
 
                 # sync max chart distances
                 self._update_max_chart_x()
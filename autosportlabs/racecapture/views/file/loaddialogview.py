@@ -39,6 +39,7 @@ class LoadDialog(FloatLayout):
         browser = kvFind(self, 'rcid', 'browser')
         browser.path = user_path
         browser.filters = kwargs.get('filters', ['*'])        
+        browser.multiselect = kwargs.get('multiselect', False)
         if ok: browser.bind(on_success = ok)
         if cancel: browser.bind(on_canceled = cancel)
             
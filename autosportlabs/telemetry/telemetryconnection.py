@@ -305,7 +305,7 @@ class TelemetryConnection(asynchat.async_chat):
         self._data_bus = data_bus
         self._update_status = update_status_cb
 
-        self._data_bus.add_sample_listener(self._on_sample)
+        self._data_bus.add_sample_listener(self._on_sample, max_rate=1.0 / self.SAMPLE_INTERVAL)
         self._data_bus.addMetaListener(self._on_meta)
         self.set_terminator("\n")
 
@@ -0,0 +1,229 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from autosportlabs.util.lod import path_importance
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEGREES_TO_RADIANS = math.pi / 180.0
+QUARTER_PI = math.pi / 4.0
+# beyond this, paths are drawn with every point
+MAX_DETAIL_LEVEL = 24
+
+
+def project_point(latitude, longitude):
+    """
+    Mercator projection of a latitude / longitude
+    :return: (x, y) tuple
+    """
+    return (longitude * DEGREES_TO_RADIANS,
+            math.log(math.tan(QUARTER_PI + 0.5 * latitude * DEGREES_TO_RADIANS)))
+
+
+def union_bounds(bounds_list):
+    """
+    Combine (min_x, min_y, max_x, max_y) bounds, skipping None
+    :return: the combined bounds, or None if there are none
+    """
+    bounds_list = [b for b in bounds_list if b is not None]
+    if len(bounds_list) == 0:
+        return None
+    return (min(b[0] for b in bounds_list), min(b[1] for b in bounds_list),
+            max(b[2] for b in bounds_list), max(b[3] for b in bounds_list))
+
+
+class ProjectedPath(object):
+    """
+    A list of GeoPoints projected once to Mercator x / y coordinates, held
+    as NumPy arrays when NumPy is available.
+    """
+
+    def __init__(self, geo_points):
+        latitudes = [p.latitude for p in geo_points]
+        longitudes = [p.longitude for p in geo_points]
+        if np is not None:
+            self.x = np.radians(np.array(longitudes, dtype=float))
+            self.y = np.log(np.tan(QUARTER_PI + 0.5 * np.radians(np.array(latitudes, dtype=float))))
+        else:
+            self.x = [lon * DEGREES_TO_RADIANS for lon in longitudes]
+            self.y = [math.log(math.tan(QUARTER_PI + 0.5 * lat * DEGREES_TO_RADIANS)) for lat in latitudes]
+
+        self.bounds = (min(self.x), min(self.y), max(self.x), max(self.y)) if len(geo_points) else None
+        self._importance = None
+        self._detail_levels = {}
+
+    def __len__(self):
+        return len(self.x)
+
+    def detail_level(self, tolerance):
+        """
+        Choose the level of detail for drawing the path, where level n is
+        simplified with a tolerance of the path's extent / 2^n
+        :param tolerance: the largest acceptable deviation from the path, in projected units
+        :type tolerance: float
+        :return: the level number, or None for every point
+        """
+        if self.bounds is None or tolerance <= 0:
+            return None
+        extent = max(self.bounds[2] - self.bounds[0], self.bounds[3] - self.bounds[1])
+        if extent <= 0:
+            return None
+        level = max(0, int(math.ceil(math.log(extent / tolerance, 2))))
+        return level if level <= MAX_DETAIL_LEVEL else None
+
+    def detail_indexes(self, level):
+        """
+        Get the indexes of the points kept at a level of detail by
+        Douglas-Peucker simplification
+        :param level: the level from detail_level()
+        :type level: int
+        :return: sorted list of point indexes
+        """
+        if level is None:
+            return range(len(self))
+        indexes = self._detail_levels.get(level)
+        if indexes is None:
+            if self._importance is None:
+                self._importance = path_importance(self.x, self.y)
+            extent = max(self.bounds[2] - self.bounds[0], self.bounds[3] - self.bounds[1])
+            tolerance = extent / (2 ** level)
+            indexes = [i for i, importance in enumerate(self._importance) if importance > tolerance]
+            self._detail_levels[level] = indexes
+        return indexes
+
+
+class MapTransform(object):
+    """
+    The affine transform that fits projected bounds into a box, centered and
+    with the same scale on both axes.
+    """
+
+    def __init__(self, bounds, pos, size, padding=0):
+        """
+        Initializer.
+        :param bounds: the projected (min_x, min_y, max_x, max_y) to fit, or None
+        :type bounds: tuple
+        :param pos: the bottom left of the box
+        :type pos: tuple
+        :param size: the width and height of the box
+        :type size: tuple
+        :param padding: the minimum space between the map and each side of the box
+        :type padding: float
+        """
+        width, height = float(size[0]), float(size[1])
+        min_x, min_y, max_x, max_y = bounds if bounds is not None else (0.0, 0.0, 0.0, 0.0)
+        span_x = max_x - min_x
+        span_y = max_y - min_y
+
+        width_ratio = (width - padding * 2) / span_x if span_x > 0 else 0
+        height_ratio = (height - padding * 2) / span_y if span_y > 0 else 0
+        # the same ratio on both axes, or the map would be stretched
+        self.scale = scale = min(width_ratio, height_ratio)
+
+        # center the map in the box
+        self.offset_x = pos[0] + (width - scale * span_x) / 2.0 - min_x * scale
+        self.offset_y = pos[1] + (height - scale * span_y) / 2.0 - min_y * scale
+
+    def apply_point(self, x, y):
+        """
+        Transform one projected point
+        :return: (x, y) tuple
+        """
+        return (x * self.scale + self.offset_x, y * self.scale + self.offset_y)
+
+    def apply(self, path, indexes=None):
+        """
+        Transform a projected path
+        :param path: the path
+        :type path: ProjectedPath
+        :param indexes: only transform the points at these indexes
+        :type indexes: list
+        :return: flat list of [x0, y0, x1, y1, ...], as used for Line points
+        """
+        scale = self.scale
+        offset_x = self.offset_x
+        offset_y = self.offset_y
+        if np is not None and isinstance(path.x, np.ndarray):
+            xs = path.x if indexes is None else path.x[indexes]
+            ys = path.y if indexes is None else path.y[indexes]
+            points = np.empty(len(xs) * 2)
+            points[0::2] = xs * scale + offset_x
+            points[1::2] = ys * scale + offset_y
+            return points.tolist()
+
+        xs = path.x if indexes is None else [path.x[i] for i in indexes]
+        ys = path.y if indexes is None else [path.y[i] for i in indexes]
+        points = [0.0] * (len(xs) * 2)
+        points[0::2] = [x * scale + offset_x for x in xs]
+        points[1::2] = [y * scale + offset_y for y in ys]
+        return points
+
+
+def heat_segments(heat_values, point_count, heat_min, heat_max):
+    """
+    Split a path into runs of points with the same heat percentage. Each run
+    after the first also starts at the last point of the previous run, so
+    the runs join up.
+    :param heat_values: the value at each point of the path; None for no value
+    :type heat_values: list
+    :param point_count: the number of points in the path
+    :type point_count: int
+    :param heat_min: the value at 0%
+    :type heat_min: float
+    :param heat_max: the value at 100%
+    :type heat_max: float
+    :return: list of (start index, end index (exclusive), heat percent)
+    """
+    count = min(len(heat_values), point_count)
+    if count == 0:
+        return []
+    heat_range = float(heat_max - heat_min)
+
+    if np is not None:
+        if heat_range > 0:
+            values = np.array(heat_values[:count], dtype=float)
+            pcts = np.trunc((values - heat_min) / heat_range * 100.0)
+            pcts[np.isnan(pcts)] = 0
+            pcts = pcts.astype(int)
+        else:
+            pcts = np.zeros(count, dtype=int)
+        starts = (np.flatnonzero(pcts[1:] != pcts[:-1]) + 1).tolist()
+        pcts = pcts.tolist()
+    else:
+        if heat_range > 0:
+            pcts = [int((value - heat_min) / heat_range * 100.0) if value is not None else 0
+                    for value in heat_values[:count]]
+        else:
+            pcts = [0] * count
+        starts = [i for i in xrange(1, count) if pcts[i] != pcts[i - 1]]
+
+    segments = []
+    start = 0
+    pct = pcts[0]
+    for end in starts:
+        segments.append((start, end, pct))
+        start = end - 1
+        pct = pcts[end]
+    segments.append((start, count, pct))
+    return segments
@@ -20,7 +20,9 @@
 
 import kivy
 import math
+import bisect
 kivy.require('1.10.0')
+from collections import OrderedDict
 from autosportlabs.uix.color import colorgradient
 from kivy.core.image import Image as CoreImage
 from kivy.core.text import Label as CoreLabel
@@ -29,10 +31,12 @@ from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.widget import Widget
 from kivy.uix.scatter import Scatter
 from kivy.app import Builder
+from kivy.clock import Clock
 from kivy.metrics import dp
 from kivy.properties import ListProperty, NumericProperty, ObjectProperty
-from kivy.graphics import Color, Line, Bezier, Rectangle
+from kivy.graphics import Color, Line, Bezier, Rectangle, InstructionGroup
 from autosportlabs.racecapture.geo.geopoint import GeoPoint
+from autosportlabs.uix.track.projection import ProjectedPath, MapTransform, project_point, union_bounds, heat_segments
 from autosportlabs.uix.color.colorgradient import HeatColorGradient, SimpleColorGradient
 from utils import *
 
@@ -51,7 +55,15 @@ class MarkerPoint(Point):
 class TrackPath(object):
     def __init__(self, path, color):
         self.color = color
+        # the projected points, as a ProjectedPath
         self.path = path
+        # the level of detail drawn, and the indexes of the points drawn
+        self.detail_level = None
+        self.indexes = []
+        # the canvas instructions for the path, and the (start, end, Line)
+        # drawing each run of the drawn points
+        self.group = InstructionGroup()
+        self.lines = []
 
 class TrackMapView(Widget):
     start_image = CoreImage('resource/trackmap/startfinish_64px.png')
@@ -76,6 +88,10 @@ class TrackMapView(Widget):
     alt_track_color = ListProperty([1.0, 0.0, 0.0, 0.5])
     marker_scale = NumericProperty(1.0)
 
+    # how much the map is magnified on screen, e.g. by a Scatter; paths are
+    # drawn with more detail when magnified
+    detail_scale = NumericProperty(1.0)
+
     MIN_PADDING = dp(1)
     DEFAULT_TARGET_WIDTH_SCALE = 0.075
     DEFAULT_TRACK_WIDTH_SCALE = 0.01
@@ -83,52 +99,71 @@ class TrackMapView(Widget):
     DEFAULT_PATH_WIDTH_SCALE = 0.004
     DEFAULT_HEAT_WIDTH_SCALE = 0.01
     HEAT_MAP_WIDTH_STEP = 2
+    # paths are simplified by up to this distance, in pixels
+    DETAIL_TOLERANCE = 0.5
     DEFAULT_MARKER_SCALE = 1.0
 
     target_scale = NumericProperty(1.0)
     def __init__(self, **kwargs):
-        super(TrackMapView, self).__init__(**kwargs)
-        self.bind(pos=self._update_map)
-        self.bind(size=self._update_map)
-
         self.target_width_scale = self.DEFAULT_TARGET_WIDTH_SCALE
         self.track_width_scale = self.DEFAULT_TRACK_WIDTH_SCALE
         self.marker_width_scale = self.DEFAULT_MARKER_WIDTH_SCALE
         self.path_width_scale = self.DEFAULT_PATH_WIDTH_SCALE
         self.heat_width_scale = self.DEFAULT_HEAT_WIDTH_SCALE
 
-        # these manage rendering of the points
-        self._offset_point = Point(0, 0)
-        self._global_ratio = 0
-        self._height_padding = 0
-        self._width_padding = 0
-        self._min_XY = Point(-1, -1)
-        self._max_XY = Point(-1, -1)
+        # these manage rendering of the points. Everything is projected once,
+        # then placed on the widget by one transform of the combined bounds.
+        self._bounds = None
+        self._transform = MapTransform(None, (0, 0), (0, 0))
 
         # The trackmap
-        self._map_points = []
-        self._scaled_map_points = []
+        self._map_path = ProjectedPath([])
+        self._track_color = Color(*self.track_color)
+        self._track_line = Line(points=[], closed=True, cap='round', joint='round')
 
         # markers for trackmap
         self._marker_points = {}
         self._marker_locations = {}
+        self._marker_groups = {}
 
         # start / finish points
         self._start_finish_width_scale = self.DEFAULT_MARKER_WIDTH_SCALE
 
+        # sector label textures by sector number, for the current font size
+        self._sector_labels = {}
+        self._sector_label_font_size = None
+
         # The map _paths
-        self._paths = {}
-        self._scaled_paths = {}
+        self._paths = OrderedDict()
         self._heat_map_values = {}
 
+        # canvas instructions are grouped so each part of the map can be
+        # updated without redrawing the rest
+        self._track_group = InstructionGroup()
+        self._track_group.add(self._track_color)
+        self._track_group.add(self._track_line)
+        self._paths_group = InstructionGroup()
+        self._targets_group = InstructionGroup()
+        self._markers_group = InstructionGroup()
+
+        # a move and a resize in the same frame only rescale once
+        self._update_map_trigger = Clock.create_trigger(self._update_map)
+
+        super(TrackMapView, self).__init__(**kwargs)
+        for group in [self._track_group, self._paths_group, self._targets_group, self._markers_group]:
+            self.canvas.add(group)
+
+        self.bind(pos=self._update_map_trigger)
+        self.bind(size=self._update_map_trigger)
+
     def on_marker_scale(self, instance, value):
         self._draw_current_markers()
 
     def on_track_color(self, instance, value):
-        self._draw_current_map()
+        self._track_color.rgba = value
 
-    def on_alt_track_color(self, instance, value):
-        self._draw_current_map()
+    def on_detail_scale(self, instance, value):
+        self._update_map_trigger()
 
     def setTrackPoints(self, geoPoints):
         '''
@@ -136,23 +171,27 @@ class TrackMapView(Widget):
         :param geoPoints The list of points for the map
         :type geoPoints list
         '''
-        self._gen_map_points(geoPoints)
-        self._update_map()
+        self._map_path = ProjectedPath(geoPoints)
+        if not self._update_bounds():
+            self._track_line.points = self._transform.apply(self._map_path)
 
     def on_sector_points(self, instance, value):
-        self._draw_current_map()
+        self._draw_targets()
+
+    def on_sector_point_color(self, instance, value):
+        self._draw_targets()
 
     def on_start_point(self, instance, value):
-        self._draw_current_map()
+        self._draw_targets()
 
     def on_start_point_color(self, instance, value):
-        self._draw_current_map()
+        self._draw_targets()
 
     def on_finish_point(self, instance, value):
-        self._draw_current_map()
+        self._draw_targets()
 
     def on_finish_point_color(self, instance, value):
-        self._draw_current_map()
+        self._draw_targets()
 
     def get_path(self, key):
         '''
@@ -173,28 +212,16 @@ class TrackMapView(Widget):
         :param color the color of the path
         :type color list rgba colors
         '''
-        points = []
-        min_XY = self._min_XY
-        max_XY = self._max_XY
-
-        for geo_point in path:
-            point = self._project_point(geo_point)
-            min_XY.x = point.x if min_XY.x == -1 else min(min_XY.x, point.x)
-            min_XY.y = point.y if min_XY.y == -1 else min(min_XY.y, point.y)
-            points.append(point);
-
-        # now, we need to keep track the max X and Y values
-        for point in points:
-            point.x = point.x - min_XY.x
-            point.y = point.y - min_XY.y
-            max_XY.x = point.x if max_XY.x == -1 else max(max_XY.x, point.x)
-            max_XY.y = point.y if max_XY.y == -1 else max(max_XY.y, point.y)
-
-        self._min_XY = min_XY
-        self._max_XY = max_XY
-
-        self._paths[key] = TrackPath(points, color)
-        self._update_map()
+        existing_path = self._paths.pop(key, None)
+        if existing_path is not None:
+            self._paths_group.remove(existing_path.group)
+
+        track_path = TrackPath(ProjectedPath(path), color)
+        self._paths[key] = track_path
+        self._paths_group.add(track_path.group)
+        self._update_bounds()
+        self._draw_path(key)
+        self._update_path_widths()
 
     def set_heat_range(self, min_range, max_range):
         '''
@@ -204,8 +231,14 @@ class TrackMapView(Widget):
         :param max_range - maximum channel value
         :type max_range float
         '''
+        if min_range == self.heat_min and max_range == self.heat_max:
+            return
         self.heat_min = min_range
         self.heat_max = max_range
+        for key in self._paths.iterkeys():
+            if self._heat_map_values.get(key):
+                self._draw_path(key)
+        self._update_path_widths()
 
     def add_heat_values(self, key, heat_map_values):
         '''
@@ -216,7 +249,9 @@ class TrackMapView(Widget):
         :type heat_map_values list
         '''
         self._heat_map_values[key] = heat_map_values
-        self._draw_current_map()
+        if key in self._paths:
+            self._draw_path(key)
+            self._update_path_widths()
 
     def remove_heat_values(self, key):
         '''
@@ -224,8 +259,9 @@ class TrackMapView(Widget):
         :param key the key for set of heat values to remove
         :type key string
         '''
-        self._heat_map_values.pop(key, None)
-        self._draw_current_map()
+        if self._heat_map_values.pop(key, None) is not None and key in self._paths:
+            self._draw_path(key)
+            self._update_path_widths()
 
     def remove_path(self, key):
         '''
@@ -233,11 +269,13 @@ class TrackMapView(Widget):
         :param key the key representing the path to remove
         :type key string 
         '''
-        self._paths.pop(key, None)
-        self._scaled_paths.pop(key, None)
+        track_path = self._paths.pop(key, None)
         # Also remove heat values since they are paired with the same key
         self._heat_map_values.pop(key, None)
-        self._draw_current_map()
+        if track_path is not None:
+            self._paths_group.remove(track_path.group)
+            if not self._update_bounds():
+                self._update_path_widths()
 
     def add_marker(self, key, color):
         '''
@@ -247,8 +285,21 @@ class TrackMapView(Widget):
         :param color color of the marker
         :type color list
         '''
-        self._marker_points[key] = MarkerPoint(color)
-        self._draw_current_map()
+        self.remove_marker(key)
+        marker_point = MarkerPoint(color)
+        if self._bounds is not None:
+            # until it is positioned, the marker sits at the corner of the map
+            marker_point.x, marker_point.y = self._bounds[0], self._bounds[1]
+        marker_location = Line(circle=(0, 0, 1), closed=True)
+        group = InstructionGroup()
+        group.add(Color(*color))
+        group.add(marker_location)
+        self._markers_group.add(group)
+
+        self._marker_points[key] = marker_point
+        self._marker_locations[key] = marker_location
+        self._marker_groups[key] = group
+        self.update_marker(key)
 
     def remove_marker(self, key):
         '''
@@ -258,7 +309,9 @@ class TrackMapView(Widget):
         '''
         self._marker_points.pop(key, None)
         self._marker_locations.pop(key, None)
-        self._draw_current_map()
+        group = self._marker_groups.pop(key, None)
+        if group is not None:
+            self._markers_group.remove(group)
 
     def get_marker(self, key):
         '''
@@ -280,222 +333,170 @@ class TrackMapView(Widget):
         marker_point = self._marker_points.get(key)
         marker_location = self._marker_locations.get(key)
         if marker_point and marker_location:
-            left = self.pos[0]
-            bottom = self.pos[1]
             if geoPoint is not None:
-                point = self._offset_track_point(self._project_point(geoPoint))
-                marker_point.x = point.x
-                marker_point.y = point.y
-            scaled_point = self._scale_point(marker_point, self.height, left, bottom)
+                marker_point.x, marker_point.y = project_point(geoPoint.latitude, geoPoint.longitude)
+            x, y = self._transform.apply_point(marker_point.x, marker_point.y)
             marker_size = (self.marker_width_scale * self.height) * self.marker_scale
-            marker_location.circle = (scaled_point.x, scaled_point.y, marker_size)
+            marker_location.circle = (x, y, marker_size)
             marker_location.width = marker_size
 
     def _draw_current_markers(self):
         for key in self._marker_points.iterkeys():
             self.update_marker(key)
 
-    def _update_map(self, *args):
-        padding_both_sides = self.MIN_PADDING * 2
-
-        width = self.size[0]
-        height = self.size[1]
-
-        left = self.pos[0]
-        bottom = self.pos[1]
-
-        # the actual drawing space for the map on the image
-        map_width = width - padding_both_sides;
-        map_height = height - padding_both_sides;
-
-        # determine the width and height ratio because we need to magnify the map to fit into the given image dimension
-        max_x = float(self._max_XY.x)
-        map_width_ratio = float(map_width) / max_x if max_x > 0 else 0
-
-        max_y = float(self._max_XY.y)
-        map_height_ratio = float(map_height) / max_y if max_y > 0 else 0
-
-        # using different ratios for width and height will cause the map to be stretched. So, we have to determine
-        # the global ratio that will perfectly fit into the given image dimension
-        self._global_ratio = min(map_width_ratio, map_height_ratio)
+    def _update_bounds(self):
+        '''
+        Recalculate the area covered by the map and paths, and rescale
+        everything if it changed
+        :returns True if the map was rescaled
+        '''
+        bounds = union_bounds([self._map_path.bounds] + [track_path.path.bounds for track_path in self._paths.itervalues()])
+        if bounds == self._bounds:
+            return False
+        self._bounds = bounds
+        self._update_map()
+        return True
 
-        # now we need to readjust the padding to ensure the map is always drawn on the center of the given image dimension
-        self._height_padding = (height - (self._global_ratio * self._max_XY.y)) / 2.0
-        self._width_padding = (width - (self._global_ratio * self._max_XY.x)) / 2.0
-        self._offset_point = self._min_XY
+    def _update_map(self, *args):
+        self._transform = MapTransform(self._bounds, self.pos, self.size, self.MIN_PADDING)
 
         # track outline
-        points = self._map_points
-        scaled_map_points = []
-        for point in points:
-            scaled_point = self._scale_point(point, self.height, left, bottom)
-            scaled_map_points.append(scaled_point.x)
-            scaled_map_points.append(scaled_point.y)
-        self._scaled_map_points = scaled_map_points
-
-        paths = self._paths
-        scaled_paths = {}
-        for key, track_path in paths.iteritems():
-            scaled_path_points = []
-            for point in track_path.path:
-                scaled_path_point = self._scale_point(point, self.height, left, bottom)
-                scaled_path_points.append(scaled_path_point.x)
-                scaled_path_points.append(scaled_path_point.y)
-            scaled_paths[key] = scaled_path_points
-
-        self._scaled_paths = scaled_paths
-        self._draw_current_map()
-
-    def _draw_current_map(self):
-
-        def _calc_heat_pct(heat_value, heat_min, heat_range):
-            if heat_value is not None and heat_range > 0:
-                return int(((heat_value - heat_min) / heat_range) * 100.0)
-            else:
-                return 0
-
-        left = self.pos[0]
-        bottom = self.pos[1]
-        self.canvas.clear()
+        self._track_line.points = self._transform.apply(self._map_path)
+        self._track_line.width = dp(self.track_width_scale * self.height)
 
-        heat_width_step = dp(self.HEAT_MAP_WIDTH_STEP)
-        path_count = len(self._scaled_paths.keys())
-        heat_width = dp(self.heat_width_scale * self.height) + ((path_count - 1) * heat_width_step)
+        for key, track_path in self._paths.iteritems():
+            if self._get_detail_level(track_path) != track_path.detail_level:
+                self._draw_path(key)
+            else:
+                self._scale_path(track_path)
+        self._update_path_widths()
 
-        with self.canvas:
-            Color(*self.track_color)
-            Line(points=self._scaled_map_points, width=dp(self.track_width_scale * self.height), closed=True, cap='round', joint='round')
+        self._draw_targets()
+        self._draw_current_markers()
 
+    def _draw_path(self, key):
+        '''
+        Rebuild the canvas instructions for one path, as a plain trace or
+        as a heat map if it has heat values
+        '''
+        track_path = self._paths[key]
+        path = track_path.path
+        group = track_path.group
+        group.clear()
+        lines = []
+        detail_level = self._get_detail_level(track_path)
+        indexes = path.detail_indexes(detail_level)
+        heat_values = self._heat_map_values.get(key)
+        if heat_values:
             color_gradient = HeatColorGradient()
+            segments = heat_segments(heat_values, len(path), self.heat_min, self.heat_max)
+            if detail_level is not None:
+                # keep the ends of every heat run, so the colors change in
+                # the same places at every level of detail
+                run_ends = set(i for start, end, _ in segments for i in (start, end - 1))
+                indexes = sorted(run_ends.union(indexes))
+
+            # one line per run of points with the same heat color
+            for start, end, heat_pct in segments:
+                line = Line(closed=False, joint='miter', cap='round')
+                group.add(Color(*color_gradient.get_color_value(heat_pct / 100.0)))
+                group.add(line)
+                lines.append((bisect.bisect_left(indexes, start), bisect.bisect_left(indexes, end - 1) + 1, line))
+        else:
+            line = Line(closed=True, cap='square', joint='miter')
+            group.add(Color(*track_path.color))
+            group.add(line)
+            lines.append((0, len(indexes), line))
+        track_path.detail_level = detail_level
+        track_path.indexes = indexes
+        track_path.lines = lines
+        self._scale_path(track_path)
+
+    def _get_detail_level(self, track_path):
+        scale = self._transform.scale * self.detail_scale
+        if scale <= 0:
+            return None
+        return track_path.path.detail_level(self.DETAIL_TOLERANCE / scale)
+
+    def _scale_path(self, track_path):
+        points = self._transform.apply(track_path.path, track_path.indexes)
+        for start, end, line in track_path.lines:
+            line.points = points[start * 2:end * 2]
+
+    def _update_path_widths(self):
+        heat_width_step = dp(self.HEAT_MAP_WIDTH_STEP)
+        heat_width = dp(self.heat_width_scale * self.height) + ((len(self._paths) - 1) * heat_width_step)
+        path_width = dp(self.path_width_scale * self.height)
+
+        # each heat map is narrower than the one beneath it, so they all show
+        for key, track_path in self._paths.iteritems():
+            if self._heat_map_values.get(key):
+                width = heat_width
+                heat_width -= heat_width_step
+            else:
+                width = path_width
+            for _, _, line in track_path.lines:
+                line.width = width
 
-            # draw all of the traces
-            for key, path_points in self._scaled_paths.iteritems():
-                heat_path = self._heat_map_values.get(key)
-                if heat_path:
-                    # draw heat map
-                    point_count = len(path_points)
-                    heat_min = self.heat_min
-                    heat_range = self.heat_max - heat_min
-                    value_index = 0
-                    current_heat_pct = 0
-                    i = 0
-                    line_points = []
-
-                    try:
-                        line_points.extend([path_points[i], path_points[i + 1]])
-                        current_heat_pct = _calc_heat_pct(heat_path[value_index], heat_min, heat_range)
-
-                        while i < point_count - 2:
-                            heat_pct = _calc_heat_pct(heat_path[value_index], heat_min, heat_range)
-
-                            if heat_pct != current_heat_pct:
-                                heat_color = color_gradient.get_color_value(heat_pct / 100.0)
-                                Color(*heat_color)
-                                Line(points=line_points, width=heat_width, closed=False, joint='miter', cap='round')
-                                line_points = [path_points[i - 2], path_points[i - 1]]
-                                current_heat_pct = heat_pct
-                            line_points.extend([path_points[i], path_points[i + 1]])
-                            value_index += 1
-                            i += 2
-                        heat_width -= heat_width_step
-                    except IndexError:  # if the number of heat values mismatch the heat map points, terminate early
-                        pass
-                else:
-                    # draw regular map trace
-                    Color(*self._paths[key].color)
-                    Line(points=path_points, width=dp(self.path_width_scale * self.height), closed=True, cap='square', joint='miter')
-
-            target_size = (self.target_width_scale * self.height) * self.target_scale
-            # draw start point
-            if GeoPoint.is_valid(self.start_point):
-                Color(*self.start_point_color)
-                scaled_point = self._scale_geopoint(self.start_point)
-                Rectangle(texture=TrackMapView.start_image.texture, pos=self._center_point(scaled_point, (target_size, target_size)), size=[target_size, target_size])
-
-            # draw finish point
-            if GeoPoint.is_valid(self.finish_point):
-                Color(*self.finish_point_color)
-                scaled_point = self._scale_geopoint(self.finish_point)
-                Rectangle(texture=TrackMapView.finish_image.texture, pos=self._center_point(scaled_point, (target_size, target_size)), size=[target_size, target_size])
-
-            # draw the sector points
-            sector_count = 0
-            for sector_point in self.sector_points:
-                sector_count += 1
-                scaled_point = self._scale_geopoint(sector_point)
-                label = CoreLabel(text='{:>2}'.format(sector_count), font_size=target_size * 0.8, font_name='resource/fonts/ASL_regular.ttf')
-                label.refresh()
-                texture = label.texture
-                centered_point = self._center_point(scaled_point, texture.size)
-                Color(*self.sector_point_color)
-                Rectangle(source='resource/trackmap/sector_64px.png', pos=self._center_point(scaled_point, texture.size), size=[target_size, target_size])
-                Color(0.0, 0.0, 0.0, 1.0)
-                # Tweak font position to improve centering. SHould be a better way to do this
-                trim_x = texture.size[0] * 0.1
-                trim_y = -texture.size[1] * 0.05
-                Rectangle(size=texture.size, pos=(centered_point[0] + trim_x, centered_point[1] + trim_y), texture=texture)
-                
-            # draw the dynamic markers
-            marker_size = (self.marker_width_scale * self.height) * self.marker_scale
-            for key, marker_point in self._marker_points.iteritems():
-                scaled_point = self._scale_point(marker_point, self.height, left, bottom)
-                Color(*marker_point.color)
-                self._marker_locations[key] = Line(circle=(scaled_point.x, scaled_point.y, marker_size), width=marker_size, closed=True)
-                
-            Color(1.0, 1.0, 1.0, 1.0)
-
-
+    def _draw_targets(self):
+        '''
+        Redraw the start, finish and sector points
+        '''
+        group = self._targets_group
+        group.clear()
+        target_size = (self.target_width_scale * self.height) * self.target_scale
+
+        # draw start point
+        if GeoPoint.is_valid(self.start_point):
+            group.add(Color(*self.start_point_color))
+            scaled_point = self._scale_geopoint(self.start_point)
+            group.add(Rectangle(texture=TrackMapView.start_image.texture, pos=self._center_point(scaled_point, (target_size, target_size)), size=[target_size, target_size]))
+
+        # draw finish point
+        if GeoPoint.is_valid(self.finish_point):
+            group.add(Color(*self.finish_point_color))
+            scaled_point = self._scale_geopoint(self.finish_point)
+            group.add(Rectangle(texture=TrackMapView.finish_image.texture, pos=self._center_point(scaled_point, (target_size, target_size)), size=[target_size, target_size]))
+
+        # draw the sector points
+        sector_count = 0
+        for sector_point in self.sector_points:
+            sector_count += 1
+            scaled_point = self._scale_geopoint(sector_point)
+            texture = self._get_sector_label(sector_count, target_size * 0.8)
+            centered_point = self._center_point(scaled_point, texture.size)
+            group.add(Color(*self.sector_point_color))
+            group.add(Rectangle(source='resource/trackmap/sector_64px.png', pos=centered_point, size=[target_size, target_size]))
+            group.add(Color(0.0, 0.0, 0.0, 1.0))
+            # Tweak font position to improve centering. SHould be a better way to do this
+            trim_x = texture.size[0] * 0.1
+            trim_y = -texture.size[1] * 0.05
+            group.add(Rectangle(size=texture.size, pos=(centered_point[0] + trim_x, centered_point[1] + trim_y), texture=texture))
+
+        group.add(Color(1.0, 1.0, 1.0, 1.0))
+
+    def _get_sector_label(self, sector_number, font_size):
+        '''
+        Get the texture for a sector number; textures are only rendered again
+        when the font size changes
+        '''
+        if font_size != self._sector_label_font_size:
+            self._sector_labels = {}
+            self._sector_label_font_size = font_size
+        texture = self._sector_labels.get(sector_number)
+        if texture is None:
+            label = CoreLabel(text='{:>2}'.format(sector_number), font_size=font_size, font_name='resource/fonts/ASL_regular.ttf')
+            label.refresh()
+            texture = label.texture
+            self._sector_labels[sector_number] = texture
+        return texture
 
     def _center_point(self, point, size):
         return (point.x - (size[0] / 2.0), point.y - (size[1] / 2.0))
 
     def _scale_geopoint(self, geopoint):
-        left = self.pos[0]
-        bottom = self.pos[1]
-        point = self._offset_track_point(self._project_point(geopoint))
-        scaled_point = self._scale_point(point, self.height, left, bottom)
-        return scaled_point
-
-    def _offset_track_point(self, point):
-        point.x = point.x - self._min_XY.x
-        point.y = point.y - self._min_XY.y
-        return point
-
-    def _project_point(self, geo_point):
-        latitude = geo_point.latitude * float(math.pi / 180.0)
-        longitude = geo_point.longitude * float(math.pi / 180.0)
-        point = Point(longitude, float(math.log(math.tan((math.pi / 4.0) + 0.5 * latitude))))
-        return point;
-
-    def _scale_point(self, point, height, left, bottom):
-        adjusted_X = int((self._width_padding + (point.x * self._global_ratio))) + left
-        # need to invert the Y since 0,0 starts at top left
-        adjusted_Y = int((self._height_padding + (point.y * self._global_ratio))) + bottom
-        return Point(adjusted_X, adjusted_Y)
-
-    def _gen_map_points(self, geo_points):
-        points = []
-
-        # min and max coordinates, used in the computation below
-        min_XY = Point(-1, -1)
-        max_XY = Point(-1, -1)
-
-        for geo_point in geo_points:
-            point = self._project_point(geo_point)
-            min_XY.x = point.x if min_XY.x == -1 else min(min_XY.x, point.x)
-            min_XY.y = point.y if min_XY.y == -1 else min(min_XY.y, point.y)
-            points.append(point);
-
-        # now, we need to keep track the max X and Y values
-        for point in points:
-            point.x = point.x - min_XY.x
-            point.y = point.y - min_XY.y
-            max_XY.x = point.x if max_XY.x == -1 else max(max_XY.x, point.x)
-            max_XY.y = point.y if max_XY.y == -1 else max(max_XY.y, point.y);
-
-        self._min_XY = min_XY
-        self._max_XY = max_XY
-        self._map_points = points
+        x, y = self._transform.apply_point(*project_point(geopoint.latitude, geopoint.longitude))
+        return Point(x, y)
 
     def _get_heat_map_color(self, value):
         colors = [[0, 0, 1, 1], [0, 1, 0, 1], [1, 1, 0, 1], [1, 0, 0, 1]]
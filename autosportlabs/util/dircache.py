@@ -0,0 +1,163 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import marshal
+from kivy.logger import Logger
+
+
+class DirectoryCache(object):
+    """
+    Keeps a summary of each file in a directory in a single cache file, so
+    the directory can be loaded without opening and parsing every file.
+
+    A file's cached summary is used only while the file's modification time
+    and size are unchanged. Typical use:
+
+        cache = DirectoryCache(directory, version)
+        for name in cache.list_files('.json'):
+            summary = cache.get(name)
+            if summary is None:
+                summary = summarize(name)
+                cache.put(name, summary)
+        cache.save()
+
+    Summaries must be made of types the marshal module supports: dicts,
+    lists, tuples, strings, numbers, booleans and None.
+    """
+    CACHE_FILE_NAME = '.cache'
+    MAGIC = 'RCDC'
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory, version, cache_file_name=CACHE_FILE_NAME):
+        """
+        Initializer.
+        :param directory: the directory of files to summarize
+        :type directory: string
+        :param version: the version of the summaries; a cache written with
+        a different version is discarded
+        :type version: int
+        :param cache_file_name: the name of the cache file in the directory
+        :type cache_file_name: string
+        """
+        self.directory = directory
+        self.version = version
+        self.cache_file_name = cache_file_name
+        self.cache_path = os.path.join(directory, cache_file_name)
+        self.hits = 0
+        self.misses = 0
+        # file name => (mtime, size, summary)
+        self._entries = None
+        self._seen = set()
+        self._changed = False
+
+    def list_files(self, suffix=''):
+        """
+        List the directory's files, excluding the cache file
+        :param suffix: only list files ending with this suffix
+        :type suffix: string
+        :return: list of file names
+        """
+        return [name for name in os.listdir(self.directory)
+                if not name.startswith(self.cache_file_name) and name.endswith(suffix)]
+
+    def _read(self):
+        entries = {}
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                data = cache_file.read()
+            if data.startswith(self.MAGIC):
+                format_version, version, cached_entries = marshal.loads(data[len(self.MAGIC):])
+                if format_version == self.FORMAT_VERSION and version == self.version:
+                    entries = cached_entries
+        except (IOError, OSError):
+            pass
+        except Exception as e:
+            Logger.warn('DirectoryCache: discarding unreadable cache {}: {}'.format(self.cache_path, e))
+        return entries
+
+    def _stat(self, name):
+        st = os.stat(os.path.join(self.directory, name))
+        return st.st_mtime, st.st_size
+
+    def get(self, name):
+        """
+        Get a file's cached summary
+        :param name: the file name
+        :type name: string
+        :return: the summary, or None if it is not cached or the file changed
+        """
+        if self._entries is None:
+            self._entries = self._read()
+        self._seen.add(name)
+        entry = self._entries.get(name)
+        if entry is not None:
+            try:
+                if self._stat(name) == (entry[0], entry[1]):
+                    self.hits += 1
+                    return entry[2]
+            except OSError:
+                pass
+        self.misses += 1
+        return None
+
+    def put(self, name, summary):
+        """
+        Cache a file's summary, for the file as it is now
+        :param name: the file name
+        :type name: string
+        :param summary: the summary
+        """
+        if self._entries is None:
+            self._entries = self._read()
+        self._seen.add(name)
+        mtime, size = self._stat(name)
+        self._entries[name] = (mtime, size, summary)
+        self._changed = True
+
+    def save(self):
+        """
+        Write the cache file if any summary changed. Entries for files not
+        requested since the cache was read are dropped.
+        """
+        entries = self._entries
+        if entries is None:
+            return
+        for name in entries.keys():
+            if name not in self._seen:
+                del entries[name]
+                self._changed = True
+        if not self._changed:
+            return
+
+        temp_path = self.cache_path + '.tmp'
+        try:
+            with open(temp_path, 'wb') as cache_file:
+                cache_file.write(self.MAGIC)
+                cache_file.write(marshal.dumps((self.FORMAT_VERSION, self.version, entries)))
+            try:
+                os.rename(temp_path, self.cache_path)
+            except OSError:
+                # Windows will not rename over an existing file
+                os.remove(self.cache_path)
+                os.rename(temp_path, self.cache_path)
+            self._changed = False
+        except (IOError, OSError, ValueError) as e:
+            Logger.warn('DirectoryCache: could not write cache {}: {}'.format(self.cache_path, e))
@@ -0,0 +1,282 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import bisect
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INFINITY = float('inf')
+
+
+def minmax_decimate(ys, bucket_size):
+    """
+    Decimate a series, keeping the minimum and maximum value of each bucket
+    of samples, in their original order, plus the first and last samples.
+    Peaks survive decimation, unlike taking every Nth sample.
+    :param ys: the values
+    :type ys: sequence of float
+    :param bucket_size: the number of samples in each bucket
+    :type bucket_size: int
+    :return: sorted list of the indexes of the samples kept
+    """
+    count = len(ys)
+    if count <= 2 or bucket_size <= 2:
+        return range(count)
+
+    if np is not None:
+        values = np.frombuffer(ys, dtype=float) if isinstance(ys, array) else np.asarray(ys, dtype=float)
+        bucket_count = count // bucket_size
+        buckets = values[:bucket_count * bucket_size].reshape(bucket_count, bucket_size)
+        starts = np.arange(0, bucket_count * bucket_size, bucket_size)
+        keep = np.concatenate((starts + buckets.argmin(axis=1), starts + buckets.argmax(axis=1)))
+        remainder = values[bucket_count * bucket_size:]
+        if len(remainder):
+            start = bucket_count * bucket_size
+            keep = np.concatenate((keep, [start + remainder.argmin(), start + remainder.argmax()]))
+        keep = np.unique(np.concatenate((keep, [0, count - 1])))
+        return keep.tolist()
+
+    keep = set([0, count - 1])
+    for start in xrange(0, count, bucket_size):
+        end = min(start + bucket_size, count)
+        bucket = ys[start:end]
+        keep.add(start + bucket.index(min(bucket)))
+        keep.add(start + bucket.index(max(bucket)))
+    return sorted(keep)
+
+
+def path_importance(xs, ys):
+    """
+    Rank the points of a path for Douglas-Peucker simplification. The path
+    simplified with tolerance t is exactly the points whose importance is
+    greater than t, so any number of levels of detail can be taken from
+    one pass. The end points have infinite importance.
+    :param xs: the x coordinates
+    :type xs: sequence of float
+    :param ys: the y coordinates
+    :type ys: sequence of float
+    :return: list of importance for each point
+    """
+    count = len(xs)
+    importance = [0.0] * count
+    if count == 0:
+        return importance
+    importance[0] = importance[-1] = INFINITY
+    if np is not None:
+        np_xs = np.asarray(xs, dtype=float)
+        np_ys = np.asarray(ys, dtype=float)
+
+    # (first, last, importance of the split that made the span)
+    spans = [(0, count - 1, INFINITY)]
+    while spans:
+        first, last, limit = spans.pop()
+        if last - first < 2:
+            continue
+        x0 = xs[first]
+        y0 = ys[first]
+        dx = xs[last] - x0
+        dy = ys[last] - y0
+        length = math.hypot(dx, dy)
+
+        # the point farthest from the line between the span's end points
+        if np is not None and last - first > 16:
+            span_xs = np_xs[first + 1:last] - x0
+            span_ys = np_ys[first + 1:last] - y0
+            if length > 0:
+                distances = np.abs(dy * span_xs - dx * span_ys) / length
+            else:
+                distances = np.hypot(span_xs, span_ys)
+            farthest = int(distances.argmax())
+            distance = float(distances[farthest])
+            farthest += first + 1
+        else:
+            distance = -1.0
+            farthest = first + 1
+            for i in xrange(first + 1, last):
+                if length > 0:
+                    d = abs(dy * (xs[i] - x0) - dx * (ys[i] - y0)) / length
+                else:
+                    d = math.hypot(xs[i] - x0, ys[i] - y0)
+                if d > distance:
+                    distance = d
+                    farthest = i
+
+        # a point is only kept if the split that exposed it is kept too
+        distance = min(distance, limit)
+        importance[farthest] = distance
+        spans.append((first, farthest, distance))
+        spans.append((farthest, last, distance))
+    return importance
+
+
+class SeriesLOD(object):
+    """
+    Levels of detail of an (x, y) series, for drawing it at any zoom with
+    about as many points as there are pixels. Level 0 is the full series;
+    each coarser level has about LEVEL_FACTOR times fewer points, keeping
+    the minimum and maximum of each bucket so peaks show at every level.
+    """
+    LEVEL_FACTOR = 2
+    MIN_LEVEL_POINTS = 256
+    POINTS_PER_PIXEL = 1
+
+    def __init__(self, xs, ys, indexes=None):
+        """
+        Initializer.
+        :param xs: the x values, normally increasing
+        :type xs: sequence of float
+        :param ys: the y values
+        :type ys: sequence of float
+        :param indexes: the sample index of each point; defaults to the position
+        :type indexes: sequence of int
+        """
+        xs = array('d', xs)
+        ys = array('d', ys)
+        indexes = array('l', indexes if indexes is not None else xrange(len(xs)))
+        self.levels = [(xs, ys, indexes)]
+        self.increasing = all(xs[i] <= xs[i + 1] for i in xrange(len(xs) - 1))
+
+        while len(xs) > self.MIN_LEVEL_POINTS * self.LEVEL_FACTOR:
+            # two points are kept per bucket
+            keep = minmax_decimate(ys, self.LEVEL_FACTOR * 2)
+            xs = array('d', (xs[i] for i in keep))
+            ys = array('d', (ys[i] for i in keep))
+            indexes = array('l', (indexes[i] for i in keep))
+            self.levels.append((xs, ys, indexes))
+
+    def __len__(self):
+        return len(self.levels[0][0])
+
+    @property
+    def size(self):
+        """
+        The size of all levels, in bytes
+        """
+        return sum(values.buffer_info()[1] * values.itemsize for level in self.levels for values in level)
+
+    def select_level(self, xmin, xmax, pixel_width):
+        """
+        Choose the coarsest level that still has POINTS_PER_PIXEL points
+        for each pixel across the visible x range
+        :return: the level number
+        """
+        xs = self.levels[0][0]
+        if len(xs) < 2:
+            return 0
+        extent = xs[-1] - xs[0]
+        visible = min(1.0, float(xmax - xmin) / extent) if extent > 0 else 1.0
+        wanted = pixel_width * self.POINTS_PER_PIXEL
+        level = 0
+        for i in xrange(1, len(self.levels)):
+            if len(self.levels[i][0]) * visible < wanted:
+                break
+            level = i
+        return level
+
+    def get_level(self, min_points):
+        """
+        Get the coarsest level with at least min_points points
+        :return: (xs, ys, sample indexes) tuple of arrays
+        """
+        level = self.levels[0]
+        for candidate in self.levels[1:]:
+            if len(candidate[0]) < min_points:
+                break
+            level = candidate
+        return level
+
+    def get_points(self, xmin, xmax, pixel_width):
+        """
+        Get the points to draw for a visible x range, from the level suiting
+        the range and width. The points just outside the range are included
+        so the line runs to the edges.
+        :param xmin: the left of the visible range
+        :type xmin: float
+        :param xmax: the right of the visible range
+        :type xmax: float
+        :param pixel_width: the width the range is drawn across
+        :type pixel_width: int
+        :return: list of (x, y) tuples
+        """
+        xs, ys, _ = self.levels[self.select_level(xmin, xmax, pixel_width)]
+        start = 0
+        end = len(xs)
+        if self.increasing:
+            start = max(0, bisect.bisect_left(xs, xmin) - 1)
+            end = min(end, bisect.bisect_right(xs, xmax) + 1)
+        return zip(xs[start:end], ys[start:end])
+
+
+class SeriesXIndex(object):
+    """
+    Maps the x values of a series, such as elapsed time or distance, to the
+    sample at each x, for following a marker across a chart. The x values
+    are held sorted in an array, so a lookup is a bisection that allocates
+    nothing.
+    """
+
+    def __init__(self, xs, indexes=None):
+        """
+        Initializer.
+        :param xs: the x values, normally increasing
+        :type xs: sequence of float
+        :param indexes: the sample index of each x value; defaults to the position
+        :type indexes: sequence of int
+        """
+        xs = array('d', xs)
+        indexes = array('l', indexes if indexes is not None else xrange(len(xs)))
+        if not all(xs[i] <= xs[i + 1] for i in xrange(len(xs) - 1)):
+            order = sorted(xrange(len(xs)), key=xs.__getitem__)
+            xs = array('d', (xs[i] for i in order))
+            indexes = array('l', (indexes[i] for i in order))
+        self.xs = xs
+        self.indexes = indexes
+
+    def __len__(self):
+        return len(self.xs)
+
+    @property
+    def size(self):
+        """
+        The size of the index, in bytes
+        """
+        return sum(values.buffer_info()[1] * values.itemsize for values in (self.xs, self.indexes))
+
+    @property
+    def max_x(self):
+        """
+        The largest x value, or None if the series is empty
+        """
+        return self.xs[-1] if len(self.xs) else None
+
+    def sample_index(self, x):
+        """
+        Get the sample following an x value
+        :param x: the x value
+        :type x: float
+        :return: the index of the first sample past x, or None if x is at or past the end of the series
+        """
+        position = bisect.bisect_right(self.xs, x)
+        return self.indexes[position] if position < len(self.indexes) else None
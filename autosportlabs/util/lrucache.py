@@ -0,0 +1,131 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from threading import RLock
+
+
+class LRUCache(object):
+    """
+    A least recently used cache bounded by the total size of its values.
+    The size of each value is supplied by the caller when it is added.
+    Entries may be tagged with a group, so related entries can be
+    invalidated together.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Initializer.
+        :param max_bytes: the total size of values the cache may hold
+        :type max_bytes: int
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key => (value, size, group), least recently used first
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def stats(self):
+        """
+        The cache's counters
+        :return: dict of hits, misses, evictions, entries and bytes
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes}
+
+    def get(self, key, default=None):
+        """
+        Retrieve a value, marking it as the most recently used
+        :param key: the key of the value
+        :param default: returned if the key is not cached
+        :return: the cached value, or default
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size, group=None):
+        """
+        Add or replace a value, evicting the least recently used values as
+        needed to stay within the budget. A value larger than the whole
+        budget is not cached.
+        :param key: the key of the value
+        :param value: the value
+        :param size: the size of the value, in bytes
+        :type size: int
+        :param group: the group the value belongs to, for invalidate()
+        """
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            entries = self._entries
+            while self.current_bytes + size > self.max_bytes:
+                oldest_key = next(iter(entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+            entries[key] = (value, size, group)
+            self.current_bytes += size
+
+    def pop(self, key):
+        """
+        Remove a value
+        :param key: the key of the value
+        """
+        with self._lock:
+            self._remove(key)
+
+    def invalidate(self, group):
+        """
+        Remove all values belonging to a group
+        :param group: the group to remove
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.iteritems() if entry[2] == group]
+            for key in keys:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
@@ -0,0 +1,194 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+# This module is imported ahead of kivy so the kivy imports themselves can
+# be profiled; kivy is only imported once a timeline is logged or staged
+# startup begins.
+__all__ = ('StartupProfiler', 'StagedStartup')
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupPhase(object):
+    """
+    A named span of startup work, in seconds since the profiler was created
+    """
+
+    def __init__(self, name, start, end, thread_name):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.thread_name = thread_name
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __str__(self):
+        return '+{:7.3f}s {:8.1f} ms  {}{}'.format(self.start, self.duration * 1000.0, self.name,
+                                                    '' if self.thread_name == 'MainThread' else ' [{}]'.format(self.thread_name))
+
+
+class StartupProfiler(object):
+    """
+    Records a timeline of the import and initialization phases of app startup.
+    Disabled unless requested, in which case recording a phase costs nothing.
+
+    Enable it by setting the RC_PROFILE_STARTUP environment variable, or by
+    placing a file named profile_startup in the app's working directory for
+    platforms where the environment cannot be set.
+    """
+    ENV_VAR = 'RC_PROFILE_STARTUP'
+    FLAG_FILE = 'profile_startup'
+
+    def __init__(self, enabled=False, clock=time.time):
+        """
+        Initializer.
+        :param enabled: True to record phases
+        :type enabled: bool
+        :param clock: returns the current time in seconds
+        :type clock: function
+        """
+        self.enabled = enabled
+        self._clock = clock
+        self._started = clock()
+        self._phases = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def requested(environ=os.environ, flag_file=FLAG_FILE):
+        """
+        Check if startup profiling was requested
+        :return: True if the environment variable or flag file is present
+        """
+        return bool(environ.get(StartupProfiler.ENV_VAR)) or os.path.isfile(flag_file)
+
+    @property
+    def phases(self):
+        """
+        :return: the recorded phases, in order of their start
+        """
+        with self._lock:
+            return sorted(self._phases, key=lambda phase: phase.start)
+
+    def _record(self, name, start, end):
+        phase = StartupPhase(name, start - self._started, end - self._started, threading.current_thread().name)
+        with self._lock:
+            self._phases.append(phase)
+        from kivy.logger import Logger
+        Logger.info('StartupProfiler: {}'.format(phase))
+        return phase
+
+    def mark(self, name):
+        """
+        Record a point in time during startup
+        :param name: what happened
+        :type name: string
+        """
+        if self.enabled:
+            now = self._clock()
+            self._record(name, now, now)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Record the time spent within the with block
+        :param name: the name of the phase
+        :type name: string
+        """
+        if not self.enabled:
+            yield
+            return
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self._record(name, start, self._clock())
+
+    def log_timeline(self):
+        """
+        Log every phase recorded so far, in order of their start
+        """
+        if not self.enabled:
+            return
+        from kivy.logger import Logger
+        Logger.info('StartupProfiler: startup timeline')
+        for phase in self.phases:
+            Logger.info('StartupProfiler:   {}'.format(phase))
+
+
+class StagedStartup(object):
+    """
+    Runs startup tasks in order of priority, one task per frame, so work
+    needed to show something to the user runs first and the window keeps
+    drawing in between the slower tasks that follow.
+    """
+
+    def __init__(self, profiler=None, schedule=None):
+        """
+        Initializer.
+        :param profiler: records the time taken by each task
+        :type profiler: StartupProfiler
+        :param schedule: schedules a callback after a delay, taking the callback and
+        delay like Clock.schedule_once. Defaults to Clock.schedule_once
+        :type schedule: function
+        """
+        if schedule is None:
+            from kivy.clock import Clock
+            schedule = Clock.schedule_once
+        self._profiler = profiler if profiler is not None else StartupProfiler()
+        self._schedule = schedule
+        self._tasks = []
+
+    def add_task(self, priority, name, task):
+        """
+        Add a task to run at startup. Tasks of the same priority run in the
+        order they are added
+        :param priority: lower priorities run first
+        :type priority: int
+        :param name: the name the task is profiled under
+        :type name: string
+        :param task: the task to run, taking no arguments
+        :type task: function
+        """
+        self._tasks.append((priority, len(self._tasks), name, task))
+
+    def start(self, delay=0):
+        """
+        Begin running the tasks
+        :param delay: seconds to wait before the first task
+        :type delay: float
+        """
+        tasks = [(name, task) for _, _, name, task in sorted(self._tasks)]
+        self._tasks = []
+        self._schedule(lambda dt: self._run_next(tasks), delay)
+
+    def _run_next(self, tasks):
+        if not tasks:
+            self._profiler.mark('startup complete')
+            self._profiler.log_timeline()
+            return
+        name, task = tasks[0]
+        # schedule the remaining tasks first, so they still run if this one raises
+        self._schedule(lambda dt: self._run_next(tasks[1:]), 0)
+        with self._profiler.phase(name):
+            task()
@@ -23,7 +23,11 @@
 __version__ = "1.12.0"
 import sys
 import os
+from autosportlabs.util.startup import StartupProfiler, StagedStartup
 
+# records the import and init phases of startup when requested,
+# see StartupProfiler for how to enable it
+startup_profiler = StartupProfiler(enabled=StartupProfiler.requested())
 
 # do stuff for windows platforms
 if __name__ == '__main__' and sys.platform == 'win32':
@@ -36,63 +40,62 @@ if __name__ == '__main__' and sys.platform == 'win32':
     Config.set('graphics', 'multisamples', '0')
 
 if __name__ == '__main__':
-    import logging
-    import argparse
-    import platform
-    import kivy
-    import os
-    import traceback
-    import time
-    from threading import Thread
-    from kivy.config import Config
-    from kivy.properties import AliasProperty
-    from functools import partial
-    from kivy.clock import Clock
-    from kivy.logger import Logger
-    kivy.require('1.10.0')
-    from kivy.base import ExceptionManager, ExceptionHandler
-    Config.set('graphics', 'width', '1024')
-    Config.set('graphics', 'height', '576')
-    Config.set('kivy', 'exit_on_escape', 0)
-    from utils import is_mobile_platform, is_windows
-
-
-    if is_mobile_platform():
-        # optimize scroll vs touch behavior for mobile platform
-        Config.set('widgets', 'scroll_distance', 40)
-        Config.set('widgets', 'scroll_timeout', 250)
-
-    from kivy.core.window import Window
-    from kivy.uix.boxlayout import BoxLayout
-    from kivy.uix.label import Label
-    from kivy.uix.popup import Popup
-    from kivy.uix.screenmanager import *
-    if hasattr(sys, '_MEIPASS'):  # handle pyinstaller frozen packaging
-        kivy.resources.resource_add_path(os.path.join(sys._MEIPASS))
-
-    from installfix_garden_navigationdrawer import NavigationDrawer
-    from autosportlabs.racecapture.views.util.alertview import alertPopup, confirmPopup
-    from autosportlabs.racecapture.views.configuration.rcp.configview import ConfigView
-    from autosportlabs.racecapture.views.status.statusview import StatusView
-    from autosportlabs.racecapture.views.dashboard.dashboardview import DashboardView
-    from autosportlabs.racecapture.views.analysis.analysisview import AnalysisView
-    from autosportlabs.racecapture.views.preferences.preferences import PreferencesView
-    from autosportlabs.racecapture.views.setup.setupview import SetupView
-    from autosportlabs.racecapture.views.toolbar.toolbarview import ToolbarView
-    from autosportlabs.racecapture.menu.mainmenu import MainMenu
-    from autosportlabs.comms.commsfactory import comms_factory
-    from autosportlabs.racecapture.tracks.trackmanager import TrackManager
-    from autosportlabs.racecapture.presets.presetmanager import PresetManager
-    from autosportlabs.racecapture.menu.homepageview import HomePageView
-    from autosportlabs.racecapture.settings.systemsettings import SystemSettings
-    from autosportlabs.racecapture.settings.prefs import Range
-    from autosportlabs.racecapture.config.rcpconfig import Track
-    from autosportlabs.racecapture.config.rcpconfig import Capabilities
-    from autosportlabs.telemetry.telemetryconnection import TelemetryManager
-    from autosportlabs.help.helpmanager import HelpInfo
-    from autosportlabs.racecapture.views.analysis.analysisdata import CachingAnalysisDatastore
-    from autosportlabs.racecapture.data.sessionrecorder import SessionRecorder
-    from autosportlabs.uix.toast.kivytoast import toast
+    with startup_profiler.phase('import kivy'):
+        import logging
+        import argparse
+        import platform
+        import kivy
+        import os
+        import traceback
+        import time
+        import importlib
+        from threading import Thread
+        from kivy.config import Config
+        from kivy.properties import AliasProperty
+        from functools import partial
+        from kivy.clock import Clock
+        from kivy.logger import Logger
+        kivy.require('1.10.0')
+        from kivy.base import ExceptionManager, ExceptionHandler
+        Config.set('graphics', 'width', '1024')
+        Config.set('graphics', 'height', '576')
+        Config.set('kivy', 'exit_on_escape', 0)
+        from utils import is_mobile_platform, is_windows
+
+
+        if is_mobile_platform():
+            # optimize scroll vs touch behavior for mobile platform
+            Config.set('widgets', 'scroll_distance', 40)
+            Config.set('widgets', 'scroll_timeout', 250)
+
+        from kivy.core.window import Window
+        from kivy.uix.boxlayout import BoxLayout
+        from kivy.uix.label import Label
+        from kivy.uix.popup import Popup
+        from kivy.uix.screenmanager import *
+        if hasattr(sys, '_MEIPASS'):  # handle pyinstaller frozen packaging
+            kivy.resources.resource_add_path(os.path.join(sys._MEIPASS))
+
+    with startup_profiler.phase('import app modules'):
+        from installfix_garden_navigationdrawer import NavigationDrawer
+        from autosportlabs.racecapture.views.util.alertview import alertPopup, confirmPopup
+        from autosportlabs.racecapture.views.toolbar.toolbarview import ToolbarView
+        from autosportlabs.racecapture.menu.mainmenu import MainMenu
+        from autosportlabs.comms.commsfactory import comms_factory
+        from autosportlabs.racecapture.tracks.trackmanager import TrackManager
+        from autosportlabs.racecapture.presets.presetmanager import PresetManager
+        from autosportlabs.racecapture.menu.homepageview import HomePageView
+        from autosportlabs.racecapture.settings.systemsettings import SystemSettings
+        from autosportlabs.racecapture.settings.prefs import Range
+        from autosportlabs.racecapture.config.rcpconfig import Track
+        from autosportlabs.racecapture.config.rcpconfig import Capabilities
+        from autosportlabs.telemetry.telemetryconnection import TelemetryManager
+        from autosportlabs.help.helpmanager import HelpInfo
+        from autosportlabs.racecapture.views.analysis.analysisdata import AnalysisDatastoreFactory
+        from autosportlabs.racecapture.datastore import ColumnarDataStore
+        from autosportlabs.racecapture.data.sessionrecorder import SessionRecorder
+        from autosportlabs.uix.toast.kivytoast import toast
+
     if not is_mobile_platform():
         kivy.config.Config.set ('input', 'mouse', 'mouse,multitouch_on_demand')
 
@@ -121,6 +124,31 @@ class RaceCaptureApp(App):
     # map of view keys to factory functions for building top level views
     view_builders = {}
 
+    # modules and classes of the top level views, imported when the view is first built
+    VIEW_CLASSES = {'config': ('autosportlabs.racecapture.views.configuration.rcp.configview', 'ConfigView'),
+                    'status': ('autosportlabs.racecapture.views.status.statusview', 'StatusView'),
+                    'dash': ('autosportlabs.racecapture.views.dashboard.dashboardview', 'DashboardView'),
+                    'analysis': ('autosportlabs.racecapture.views.analysis.analysisview', 'AnalysisView'),
+                    'preferences': ('autosportlabs.racecapture.views.preferences.preferences', 'PreferencesView'),
+                    'setup': ('autosportlabs.racecapture.views.setup.setupview', 'SetupView')
+                    }
+
+    # views likely to be shown next from each view, imported ahead of time in the background
+    LIKELY_NEXT_VIEWS = {'home': ['dash', 'analysis', 'config'],
+                         'setup': ['dash', 'config'],
+                         'dash': ['analysis'],
+                         'analysis': ['dash'],
+                         'config': ['dash', 'status'],
+                         'status': ['config'],
+                         'preferences': []
+                         }
+
+    # startup task priorities; the UI comes first, data loading follows
+    STARTUP_PRIORITY_COMMS = 0
+    STARTUP_PRIORITY_VIEW = 1
+    STARTUP_PRIORITY_DATA = 2
+    STARTUP_PRIORITY_PREWARM = 3
+
     # container for all settings
     settings = None
 
@@ -159,6 +187,8 @@ class RaceCaptureApp(App):
 
     _telemetry_connection = None
 
+    _startup_complete = False
+
     @staticmethod
     def get_app_version():
         return __version__
@@ -201,7 +231,10 @@ class RaceCaptureApp(App):
 
         self._databus = DataBusFactory().create_standard_databus(self.settings.systemChannels)
         self.settings.runtimeChannels.data_bus = self._databus
-        self._datastore = CachingAnalysisDatastore(databus=self._databus)
+        self._datastore = AnalysisDatastoreFactory().create_datastore(
+            self.settings.userPrefs.datastore_location,
+            self.settings.userPrefs.get_pref_bool('preferences', 'columnar_storage', default=False),
+            databus=self._databus, track_manager=self.track_manager)
         self._session_recorder = SessionRecorder(self._datastore, self._databus, self._rc_api, self.settings, self.track_manager, self._status_pump)
         self._session_recorder.bind(on_recording=self._on_session_recording)
 
@@ -218,6 +251,7 @@ class RaceCaptureApp(App):
         self.processArgs()
         self.settings.appConfig.setUserDir(self.user_data_dir)
         self.setup_telemetry()
+        startup_profiler.mark('app initialized')
 
     def on_pause(self):
         return True
@@ -253,6 +287,7 @@ class RaceCaptureApp(App):
         parser.add_argument('-p', '--port', help='Port', required=False)
         parser.add_argument('--telemetryhost', help='Telemetry host', required=False)
         parser.add_argument('--conn_type', help='Connection type', required=False, choices=['bt', 'serial', 'wifi'])
+        parser.add_argument('--comms_transport', help='Where serial connection I/O runs', required=False, choices=['process', 'inprocess'])
 
         if sys.platform == 'win32':
             parser.add_argument('--multiprocessing-fork', required=False, action='store_true')
@@ -276,14 +311,26 @@ class RaceCaptureApp(App):
         Logger.error('RaceCaptureApp: Error initializing presets: {}'.format(details))
 
     def init_data(self):
+        self._init_tracks()
+        self._init_presets()
+        self._init_datastore()
+
+    def _init_tracks(self):
         self.track_manager.init(None, self._init_tracks_success, self._init_tracks_error)
+
+    def _init_presets(self):
         self.preset_manager.init(None, self._init_presets_success, self._init_presets_error)
-        self._init_datastore()
 
     def _init_datastore(self):
         def _init_datastore(dstore_path):
             Logger.info('RaceCaptureApp:initializing datastore...')
             self._datastore.open_db(dstore_path)
+            if isinstance(self._datastore, ColumnarDataStore):
+                # sessions stored before column storage was selected are converted once,
+                # each in its own transaction on a separate connection
+                migrated = self._datastore.migrate_row_sessions()
+                if migrated > 0:
+                    Logger.info('RaceCaptureApp: converted {} sessions to column storage'.format(migrated))
 
         dstore_path = self.settings.userPrefs.datastore_location
         Logger.info("RaceCaptureApp:Datastore Path:" + str(dstore_path))
@@ -382,10 +429,55 @@ class RaceCaptureApp(App):
     def _get_main_screen(self, view_name):
         view = self.mainViews.get(view_name)
         if not view:
-            view = self.view_builders[view_name]()
+            with startup_profiler.phase('build {} view'.format(view_name)):
+                view = self.view_builders[view_name]()
             self.mainViews[view_name] = view
         return view
 
+    def _get_view_class(self, view_name):
+        """
+        Import the module of a top level view, if not already imported
+        :param view_name: the key of the view in VIEW_CLASSES
+        :type view_name: string
+        :return: the view's class
+        """
+        module_name, class_name = self.VIEW_CLASSES[view_name]
+        with startup_profiler.phase('import {}'.format(module_name)):
+            return getattr(importlib.import_module(module_name), class_name)
+
+    def _prewarm_views(self, view_names):
+        """
+        Import the modules of views ahead of showing them, so showing one
+        of them later only needs to build the view. The modules load kv
+        rules as they are imported, which Kivy only supports on the main
+        thread, so they are imported there, one per frame.
+        :param view_names: the keys of the views, in order of importance
+        :type view_names: list
+        """
+        if not self.settings.userPrefs.get_pref_bool('preferences', 'preload_views', default=True):
+            return
+
+        module_names = [self.VIEW_CLASSES[view_name][0] for view_name in view_names if view_name in self.VIEW_CLASSES]
+        module_names = [module_name for module_name in module_names if module_name not in sys.modules]
+        if not module_names:
+            return
+
+        def prewarm_next(module_names):
+            if not module_names:
+                return
+            module_name = module_names[0]
+            # the view may have been shown, and imported, since this was scheduled
+            if module_name not in sys.modules:
+                try:
+                    with startup_profiler.phase('prewarm {}'.format(module_name)):
+                        importlib.import_module(module_name)
+                except Exception as e:
+                    # a failed import is retried, and reported, when the view is shown
+                    Logger.warn('RaceCaptureApp: Could not prewarm view {}: {}'.format(module_name, e))
+            Clock.schedule_once(lambda dt: prewarm_next(module_names[1:]))
+
+        Clock.schedule_once(lambda dt: prewarm_next(module_names))
+
     def _show_main_view(self, view_name):
         screen = self._get_main_screen(view_name)
 
@@ -398,12 +490,15 @@ class RaceCaptureApp(App):
         self._session_recorder.on_view_change(view_name)
         self._data_bus_pump.on_view_change(view_name)
 
+        if self._startup_complete:
+            self._prewarm_views(self.LIKELY_NEXT_VIEWS.get(view_name, []))
+
     def switchMainView(self, view_name):
             self.mainNav.anim_to_state('closed')
             Clock.schedule_once(lambda dt: self._show_main_view(view_name), 0.25)
 
     def build_config_view(self):
-        config_view = ConfigView(name='config',
+        config_view = self._get_view_class('config')(name='config',
                                 rcpConfig=self.rc_config,
                                 rc_api=self._rc_api,
                                 databus=self._databus,
@@ -419,23 +514,23 @@ class RaceCaptureApp(App):
         return config_view
 
     def build_status_view(self):
-        status_view = StatusView(self.track_manager, self._status_pump, name='status')
+        status_view = self._get_view_class('status')(self.track_manager, self._status_pump, name='status')
         self.tracks_listeners.append(status_view)
         return status_view
 
     def build_dash_view(self):
-        dash_view = DashboardView(self._status_pump, self.track_manager, self._rc_api, self.rc_config, self._databus, self.settings, name='dash')
+        dash_view = self._get_view_class('dash')(self._status_pump, self.track_manager, self._rc_api, self.rc_config, self._databus, self.settings, name='dash')
         self.config_listeners.append(dash_view)
         self.tracks_listeners.append(dash_view)
         return dash_view
 
     def build_analysis_view(self):
-        analysis_view = AnalysisView(name='analysis', datastore=self._datastore, databus=self._databus, settings=self.settings, track_manager=self.track_manager, session_recorder=self._session_recorder)
+        analysis_view = self._get_view_class('analysis')(name='analysis', datastore=self._datastore, databus=self._databus, settings=self.settings, track_manager=self.track_manager, session_recorder=self._session_recorder)
         self.tracks_listeners.append(analysis_view)
         return analysis_view
 
     def build_preferences_view(self):
-        preferences_view = PreferencesView(name='preferences', settings=self.settings, base_dir=self.base_dir)
+        preferences_view = self._get_view_class('preferences')(name='preferences', settings=self.settings, base_dir=self.base_dir)
         preferences_view.bind(on_pref_change=self._on_preference_change)
         return preferences_view
 
@@ -445,7 +540,7 @@ class RaceCaptureApp(App):
         return homepage_view
 
     def build_setup_view(self):
-        setup_view = SetupView(name='setup',
+        setup_view = self._get_view_class('setup')(name='setup',
                                track_manager=self.track_manager,
                                preset_manager=self.preset_manager,
                                settings=self.settings,
@@ -468,7 +563,8 @@ class RaceCaptureApp(App):
     def build(self):
         self.init_view_builders()
 
-        Builder.load_file('racecapture.kv')
+        with startup_profiler.phase('load racecapture.kv'):
+            Builder.load_file('racecapture.kv')
         root = self.root
 
         status_bar = root.ids.status_bar
@@ -502,26 +598,45 @@ class RaceCaptureApp(App):
 
         self.screenMgr = screenMgr
         self.icon = ('resource/images/app_icon_128x128.ico' if sys.platform == 'win32' else 'resource/images/app_icon_128x128.png')
+
+        # import the startup view in the frames while the window settles
+        self._prewarm_views([self._get_startup_view_name()])
         Clock.schedule_once(lambda dt: self.post_launch(), 1.0)
+        startup_profiler.mark('app built')
 
     def post_launch(self):
-        self._setup_toolbar()
-        Clock.schedule_once(lambda dt: self.init_data())
-        Clock.schedule_once(lambda dt: self.init_rc_comms())
-        Clock.schedule_once(lambda dt: self._show_startup_view())
-
-    def _show_preferred_view(self):
+        startup = StagedStartup(profiler=startup_profiler)
+        startup.add_task(self.STARTUP_PRIORITY_COMMS, 'setup toolbar', self._setup_toolbar)
+        startup.add_task(self.STARTUP_PRIORITY_COMMS, 'init comms', self.init_rc_comms)
+        startup.add_task(self.STARTUP_PRIORITY_VIEW, 'show startup view', self._show_startup_view)
+        startup.add_task(self.STARTUP_PRIORITY_DATA, 'init tracks', self._init_tracks)
+        startup.add_task(self.STARTUP_PRIORITY_DATA, 'init presets', self._init_presets)
+        startup.add_task(self.STARTUP_PRIORITY_DATA, 'init datastore', self._init_datastore)
+        startup.add_task(self.STARTUP_PRIORITY_PREWARM, 'prewarm views', self._on_startup_complete)
+        startup.start()
+
+    def _on_startup_complete(self):
+        self._startup_complete = True
+        self._prewarm_views(self.LIKELY_NEXT_VIEWS.get(self.screenMgr.current, []))
+
+    def _get_preferred_view_name(self):
         settings_to_view = {'Home Page':'home',
                             'Dashboard':'dash',
                             'Analysis': 'analysis',
                             'Setup': 'config' }
         view_pref = self.settings.userPrefs.get_pref('preferences', 'startup_screen')
-        self._show_main_view(settings_to_view.get(view_pref, 'home'))
+        return settings_to_view.get(view_pref, 'home')
 
-    def _show_startup_view(self):
+    def _get_startup_view_name(self):
         # should we show the stetup wizard?
         setup_enabled = self.settings.userPrefs.get_pref_bool('setup', 'setup_enabled')
-        if setup_enabled:
+        return 'setup' if setup_enabled else self._get_preferred_view_name()
+
+    def _show_preferred_view(self):
+        self._show_main_view(self._get_preferred_view_name())
+
+    def _show_startup_view(self):
+        if self._get_startup_view_name() == 'setup':
             setup_view = self._get_main_screen('setup')
             setup_view.bind(on_setup_complete=lambda x: self._show_preferred_view())
             self._show_main_view('setup')
@@ -539,7 +654,11 @@ class RaceCaptureApp(App):
 
         Logger.info("RaceCaptureApp: initializing rc comms with, conn type: {}".format(conn_type))
 
-        comms = comms_factory(port, conn_type)
+        transport = self.getAppArg('comms_transport')
+        if transport:
+            Logger.info("RaceCaptureApp: using {} comms transport".format(transport))
+
+        comms = comms_factory(port, conn_type, transport)
         rc_api = self._rc_api
         rc_api.detect_win_callback = self.rc_detect_win
         rc_api.detect_fail_callback = self.rc_detect_fail
@@ -0,0 +1,18 @@
+CREATE TABLE IF NOT EXISTS column_session
+        (session_id INTEGER PRIMARY KEY,
+        sample_count INTEGER NOT NULL);
+
+CREATE TABLE IF NOT EXISTS column_chunk
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        chunk_index INTEGER NOT NULL,
+        sample_count INTEGER NOT NULL,
+        min_value REAL NULL,
+        max_value REAL NULL,
+        sum_value REAL NULL,
+        value_count INTEGER NOT NULL,
+        typecode TEXT NOT NULL,
+        data BLOB NOT NULL);
+
+CREATE UNIQUE INDEX IF NOT EXISTS column_chunk_session_channel_index_id on column_chunk(session_id, channel, chunk_index);
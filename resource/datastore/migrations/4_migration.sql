@@ -0,0 +1,25 @@
+CREATE TABLE IF NOT EXISTS lap_summary
+        (session_id INTEGER PRIMARY KEY,
+        summarized_sample_id INTEGER NULL);
+
+CREATE TABLE IF NOT EXISTS lap
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        lap_count,
+        current_lap,
+        lap_time,
+        start_sample_id INTEGER NOT NULL,
+        end_sample_id INTEGER NOT NULL,
+        sample_count INTEGER NOT NULL);
+
+CREATE INDEX IF NOT EXISTS lap_session_id_index_id on lap(session_id, lap_count);
+
+CREATE TABLE IF NOT EXISTS lap_channel
+        (lap_id INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        min_value,
+        max_value,
+        sum_value,
+        value_count INTEGER NOT NULL);
+
+CREATE UNIQUE INDEX IF NOT EXISTS lap_channel_lap_id_index_id on lap_channel(lap_id, channel);
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS lap_range
+        (session_id INTEGER NOT NULL,
+        current_lap,
+        start_sample_id INTEGER NOT NULL,
+        end_sample_id INTEGER NOT NULL,
+        sample_count INTEGER NOT NULL);
+
+CREATE INDEX IF NOT EXISTS lap_range_session_id_index_id on lap_range(session_id, current_lap);
+
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS channel_stats
+        (session_id INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        value_count INTEGER NOT NULL,
+        zero_count INTEGER NOT NULL,
+        sum_value,
+        sum_squares,
+        min_value,
+        max_value);
+
+CREATE UNIQUE INDEX IF NOT EXISTS channel_stats_session_channel_index_id on channel_stats(session_id, channel);
@@ -0,0 +1 @@
+ALTER TABLE lap_summary ADD COLUMN summary_version INTEGER NOT NULL DEFAULT 0;
@@ -125,6 +125,7 @@ class MigrationTool(object):
                 Column('id', types.Integer, primary_key=True),
                 Column('migration', types.String(80)),
                 Column('applied', types.DateTime, default=datetime.datetime.now),
+                extend_existing=True,
             )
 
     def install(self):
@@ -0,0 +1,92 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import threading
+import Queue
+from autosportlabs.comms.comms import InProcessComms, STAY_ALIVE_TIMEOUT
+from autosportlabs.comms.commscommon import PortNotOpenException
+
+
+class LoopbackConnection(object):
+    """
+    A connection that echoes every write back as a received line
+    """
+
+    def __init__(self):
+        self.opened = threading.Event()
+        self.closed = threading.Event()
+        self._lines = Queue.Queue()
+
+    def open(self, device):
+        self.opened.set()
+
+    def close(self):
+        self.closed.set()
+
+    def flushInput(self):
+        pass
+
+    def flushOutput(self):
+        pass
+
+    def read_lines(self):
+        try:
+            return [self._lines.get(True, 0.1)]
+        except Queue.Empty:
+            return []
+
+    def write(self, data):
+        self._lines.put(data.strip())
+
+
+class InProcessCommsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = LoopbackConnection()
+        self.comms = InProcessComms('loopback', self.connection)
+
+    def tearDown(self):
+        self.comms.close()
+
+    def test_write_read(self):
+        self.comms.open()
+        self.assertTrue(self.connection.opened.is_set())
+        self.assertTrue(self.comms.isOpen())
+        self.comms.write_message('{"getVer":null}\r\n')
+        self.assertEqual('{"getVer":null}', self.comms.read_message())
+        self.assertIsNone(self.comms.read_message())
+
+    def test_close(self):
+        self.comms.open()
+        self.comms.close()
+        self.assertTrue(self.connection.closed.is_set())
+        self.assertFalse(self.comms.isOpen())
+        self.assertRaises(PortNotOpenException, self.comms.write_message, 'x')
+        self.assertRaises(PortNotOpenException, self.comms.read_message)
+
+    def test_keep_alive_timeout(self):
+        self.comms.open()
+        self.comms._last_keep_alive -= STAY_ALIVE_TIMEOUT + 1
+        self.comms.keep_alive()
+        self.assertTrue(self.comms.isOpen())
+        self.comms._last_keep_alive -= STAY_ALIVE_TIMEOUT + 1
+        self.assertFalse(self.comms.isOpen())
+        self.assertTrue(self.connection.closed.is_set())
@@ -0,0 +1,77 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+import unittest
+import unittest
+from autosportlabs.comms.lineframer import LineFramer
+
+
+class LineFramerTest(unittest.TestCase):
+
+    def test_messages(self):
+        framer = LineFramer()
+        framer.feed('{"a":1}\r\n{"b":2}\r\n{"c"')
+        self.assertListEqual(framer.messages(), ['{"a":1}', '{"b":2}'])
+        self.assertIsNone(framer.next_message())
+        framer.feed(':3}\r\n')
+        self.assertEqual(framer.next_message(), '{"c":3}')
+        self.assertEqual(framer.buffered, 0)
+
+    def test_split_delimiter(self):
+        framer = LineFramer()
+        framer.feed('abc\r')
+        self.assertListEqual(framer.messages(), [])
+        framer.feed('\ndef\r')
+        self.assertListEqual(framer.messages(), ['abc'])
+        framer.feed('\n')
+        self.assertListEqual(framer.messages(), ['def'])
+
+    def test_skips_empty_lines(self):
+        framer = LineFramer()
+        framer.feed('\r\n\r\nabc\r\n\r\n')
+        self.assertListEqual(framer.messages(), ['abc'])
+
+    def test_compacts_and_grows(self):
+        framer = LineFramer(buffer_size=16)
+        messages = []
+        for i in range(100):
+            framer.feed('message{}\r\nmess'.format(i))
+            framer.feed('age\r\n')
+            messages.extend(framer.messages())
+        self.assertEqual(len(messages), 200)
+        self.assertEqual(messages[-2], 'message99')
+
+        long_message = 'x' * 100
+        framer.feed(long_message + '\r\n')
+        self.assertListEqual(framer.messages(), [long_message])
+
+    def test_recv_into(self):
+        framer = LineFramer(buffer_size=8)
+        chunks = ['abc\r\nde', 'f\r\nghijklmnop', 'qrstuvwxyz\r\n']
+
+        def recv_into(buf):
+            chunk = chunks.pop(0)
+            buf[0:len(chunk)] = chunk
+            return len(chunk)
+
+        messages = []
+        while chunks:
+            framer.recv_into(recv_into, 32)
+            messages.extend(framer.messages())
+        self.assertListEqual(messages, ['abc', 'def', 'ghijklmnopqrstuvwxyz'])
@@ -0,0 +1,131 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import json
+from time import sleep, time
+from autosportlabs.racecapture.api.deviceprobe import DeviceProber, DeviceProbeScores
+
+
+class FakeProbeConnection(object):
+    """
+    A connection to one of a set of fake devices. Each device replies to
+    getVer with its version after a delay, or never if its delay is None.
+    """
+
+    def __init__(self, devices, opened, closed):
+        self.timeout = 1
+        self._devices = devices
+        self._opened = opened
+        self._closed = closed
+        self._reply_at = None
+        self._reply = None
+
+    def open(self, device):
+        self._opened.append(device)
+        delay, version = self._devices[device]
+        if isinstance(delay, Exception):
+            raise delay
+        self._delay = delay
+        self._reply = json.dumps({'ver': version})
+
+    def close(self):
+        self._closed.append(self)
+
+    def flushInput(self):
+        pass
+
+    def write(self, data):
+        if self._delay is not None:
+            self._reply_at = time() + self._delay
+
+    def read_lines(self):
+        if self._reply_at is not None and time() >= self._reply_at:
+            self._reply_at = None
+            return ['{"s":{"t":1,"d":[1]}}', self._reply]
+        sleep(self.timeout)
+        return []
+
+
+class DeviceProberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+        self.closed = []
+
+    def _prober(self, devices, **kwargs):
+        return DeviceProber(lambda: FakeProbeConnection(devices, self.opened, self.closed),
+                            lambda version: version.get('major') == 2, **kwargs)
+
+    def test_first_valid_reply_wins(self):
+        devices = {'slow': (0.5, {'major': 2}),
+                   'fast': (0.1, {'major': 2}),
+                   'invalid': (0.0, {'major': 1}),
+                   'silent': (None, None),
+                   'broken': (IOError('busy'), None)}
+        scores = DeviceProbeScores()
+        start = time()
+        result = self._prober(devices, probe_timeout=2).probe(sorted(devices.keys()), scores)
+        self.assertLess(time() - start, 1.0)
+        self.assertEqual('fast', result.device)
+        self.assertEqual({'major': 2}, result.version_json['ver'])
+        # every probe connection was closed
+        self.assertEqual(len(self.opened), len(self.closed))
+        self.assertEqual(1, scores.score('fast'))
+        # the slow probe was cancelled and not penalised
+        self.assertEqual(0, scores.score('slow'))
+
+    def test_no_device(self):
+        devices = {'silent': (None, None), 'invalid': (0.0, {'major': 1})}
+        self.assertIsNone(self._prober(devices, probe_timeout=0.3).probe(devices.keys()))
+        self.assertEqual(2, len(self.closed))
+
+    def test_max_parallel(self):
+        devices = {'a': (None, None), 'b': (None, None), 'c': (0.0, {'major': 2})}
+        result = self._prober(devices, probe_timeout=0.3, max_parallel=1).probe(['a', 'b', 'c'])
+        self.assertEqual('c', result.device)
+        self.assertListEqual(['a', 'b', 'c'], self.opened)
+
+
+class DeviceProbeScoresTest(unittest.TestCase):
+
+    def test_order(self):
+        scores = DeviceProbeScores()
+        scores.responded('COM3')
+        scores.responded('COM4')
+        scores.responded('COM4')
+        scores.failed('COM3')
+        self.assertListEqual(['COM4', 'COM3', 'COM1', 'COM2'], scores.order(['COM1', 'COM2', 'COM3', 'COM4']))
+
+    def test_decay(self):
+        scores = DeviceProbeScores()
+        scores.responded('COM3')
+        for i in range(10):
+            scores.failed('COM3')
+        self.assertEqual(0, scores.score('COM3'))
+        self.assertEqual('{}', scores.to_json())
+
+    def test_json(self):
+        scores = DeviceProbeScores()
+        scores.responded('/dev/ttyACM0')
+        scores = DeviceProbeScores.from_json(scores.to_json())
+        self.assertEqual(1, scores.score('/dev/ttyACM0'))
+        self.assertEqual(0, DeviceProbeScores.from_json('not json').score('/dev/ttyACM0'))
+        self.assertEqual(0, DeviceProbeScores.from_json(None).score('/dev/ttyACM0'))
@@ -19,8 +19,11 @@
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
+import Queue
+import threading
+from time import sleep
 from mock import Mock
-from autosportlabs.racecapture.api.rcpapi import RcpApi
+from autosportlabs.racecapture.api.rcpapi import RcpApi, RcpCmd, parse_message
 
 class TestRcpApi(unittest.TestCase):
     def setUp(self):
@@ -41,6 +44,127 @@ class TestRcpApi(unittest.TestCase):
         rcpapi = RcpApi(settings=self.settings, comms=self.comms)
         self.assertFalse(rcpapi.is_firmware_update_supported())
 
+    def test_parse_message(self):
+        self.assertEqual(parse_message('{"s":{"t":33,"d":[47.2561641,1,3]}}'), {'s': {'t': 33, 'd': [47.2561641, 1, 3]}})
+        # illegal characters are dropped
+        self.assertEqual(parse_message('{"a":"x\xffy\tz"}'), {'a': 'xy\tz'})
+
+
+class FakeDevice(object):
+    """
+    Replies to commands in order from a separate thread, optionally
+    dropping or delaying the replies to some of them. Each reply holds the
+    position of its command in the commands sent.
+    """
+
+    def __init__(self, api, drop=None, delay=None):
+        self.api = api
+        self.drop = drop or []
+        self.delay = delay or {}
+        self.sent = []
+        self.replies = 0
+        self.max_in_flight = 0
+        self._pending = Queue.Queue()
+        self._running = True
+        t = threading.Thread(target=self._reply_worker)
+        t.daemon = True
+        t.start()
+
+    def command(self, name):
+        return RcpCmd(name, lambda: self._send(name))
+
+    def _send(self, name):
+        self.sent.append(name)
+        self.max_in_flight = max(self.max_in_flight, len(self.sent) - self.replies)
+        if name in self.drop:
+            self.drop.remove(name)
+            self.replies += 1
+        else:
+            self._pending.put((name, len(self.sent) - 1))
+
+    def _reply_worker(self):
+        while self._running:
+            try:
+                name, position = self._pending.get(True, 0.1)
+            except Queue.Empty:
+                continue
+            sleep(self.delay.pop(name, 0.005))
+            self.replies += 1
+            self.api.rcpCmdComplete({name: {'rc': 1, 'position': position}})
+
+    def stop(self):
+        self._running = False
+
+
+class TestRcpApiCommandSequence(unittest.TestCase):
+    def setUp(self):
+        self.api = RcpApi(settings=Mock(), comms=Mock())
+        self.api.msg_rx_timeout = 0.2
+        self.api.recoverTimeout = Mock()
+        while not self.api.cmdSequenceQueue.empty():
+            self.api.cmdSequenceQueue.get_nowait()
+
+    def _execute(self, device, names):
+        results = {}
+        completed = []
+        commands = [device.command(name) for name in names]
+        self.api._execute_sequence(commands, results, lambda: completed.append(1))
+        device.stop()
+        return results, len(completed)
+
+    def test_pipelined_sequence(self):
+        self.api.pipeline_window = 3
+        device = FakeDevice(self.api)
+        names = ['a{}'.format(i) for i in range(10)] + ['flashCfg']
+        results, completed = self._execute(device, names)
+
+        self.assertEqual(completed, len(names))
+        self.assertListEqual(sorted(results.keys()), sorted(names))
+        self.assertListEqual(device.sent, names)
+        self.assertGreater(device.max_in_flight, 1)
+        self.assertLessEqual(device.max_in_flight, 3)
+        self.assertTrue(self.api._pipeline_supported)
+
+    def test_pipelined_same_name_replies(self):
+        self.api.pipeline_window = 4
+        device = FakeDevice(self.api)
+        results, completed = self._execute(device, ['setAnalogCfg'] * 8 + ['flashCfg'])
+        self.assertEqual(completed, 9)
+        self.assertListEqual(sorted(results.keys()), ['flashCfg', 'setAnalogCfg'])
+
+    def test_serial_sequence(self):
+        self.api.pipeline_window = 1
+        device = FakeDevice(self.api)
+        results, completed = self._execute(device, ['a', 'b', 'c'])
+        self.assertEqual(completed, 3)
+        self.assertEqual(device.max_in_flight, 1)
+
+    def test_pipeline_fallback(self):
+        self.api.pipeline_window = 4
+        device = FakeDevice(self.api, drop=['b'])
+        results, completed = self._execute(device, ['a', 'b', 'c', 'd', 'flashCfg'])
+
+        self.assertEqual(completed, 5)
+        self.assertListEqual(sorted(results.keys()), ['a', 'b', 'c', 'd', 'flashCfg'])
+        # the commands from the failed one onward are resent in order
+        self.assertListEqual(device.sent, ['a', 'b', 'c', 'd', 'b', 'c', 'd', 'flashCfg'])
+        self.assertFalse(self.api._pipeline_supported)
+
+    def test_pipeline_timeout_keeps_write_order(self):
+        self.api.pipeline_window = 4
+        # the reply to the second page arrives after the read timeout
+        device = FakeDevice(self.api, delay={'setScriptPage': 0.3})
+        names = ['setTrackCfg', 'setScriptPage', 'setScriptPage', 'setScriptPage', 'setTrackCfg', 'flashCfg']
+        results, completed = self._execute(device, names)
+
+        self.assertEqual(completed, len(names))
+        # the pages are last written in their original order, then flashed
+        self.assertListEqual(device.sent, names[:5] + names[1:])
+        # the late replies were discarded rather than completing the resent commands
+        self.assertEqual(results['setScriptPage']['position'], 7)
+        self.assertEqual(results['setTrackCfg']['position'], 8)
+        self.assertFalse(self.api._pipeline_supported)
+
 
 def main():
     unittest.main()
@@ -20,7 +20,7 @@
 
 import unittest
 import json
-from autosportlabs.racecapture.data.sampledata import Sample
+from autosportlabs.racecapture.data.sampledata import Sample, SampleMetaException, ChannelMetaCollection
 
 TEST_SAMPLE1 = '{"s":{"t":33,"meta":[{"nm":"Battery","ut":"Volts","sr":1},{"nm":"AccelX","ut":"G","sr":25},{"nm":"AccelY","ut":"G","sr":25},{"nm":"AccelZ","ut":"G","sr":25},{"nm":"Yaw","ut":"Deg/Sec","sr":25},{"nm":"Latitude","ut":"Degrees","sr":50},{"nm":"Longitude","ut":"Degrees","sr":50},{"nm":"Speed","ut":"MPH","sr":50},{"nm":"Time","ut":"","sr":50},{"nm":"Distance","ut":"Miles","sr":50},{"nm":"LapCount","ut":"Count","sr":1},{"nm":"LapTime","ut":"Min","sr":1},{"nm":"Sector","ut":"Count","sr":1},{"nm":"SectorTime","ut":"Min","sr":1}],"d":[0.00,2.50,2.50,-2.50,397.0,0.000000,0.000000,0.00,0.000000,0.000,0,0.0000,0,0.0000,16383]}}'
 
@@ -55,6 +55,34 @@ class SampleDataTest(unittest.TestCase):
     
     def test_meta_data(self):
         pass
+
+    def _metas(self, count):
+        meta_json = [{'nm': 'Channel{}'.format(i), 'ut': '', 'sr': 10} for i in range(count)]
+        metas = ChannelMetaCollection()
+        metas.channel_metas = []
+        metas.fromJson(meta_json)
+        return metas
+
+    def test_sparse_sample_data(self):
+        sample = Sample(channelMetas=self._metas(40))
+
+        # channels 1, 3 and 33 present
+        sample.processData([1.5, 3, 33.5, (1 << 1) | (1 << 3), 1 << 1])
+        self.assertEqual(sample.channel_indexes, (1, 3, 33))
+        self.assertEqual([s.channelMeta.name for s in sample.samples], ['Channel1', 'Channel3', 'Channel33'])
+        self.assertEqual([s.value for s in sample.samples], [1.5, 3.0, 33.5])
+
+        # values of channels absent from a sample are retained
+        sample.processData([2.5, 1 << 1, 0])
+        self.assertEqual(sample.channel_indexes, (1,))
+        self.assertEqual(sample.values[1], 2.5)
+        self.assertEqual(sample.values[3], 3.0)
+
+    def test_unexpected_data_count(self):
+        sample = Sample(channelMetas=self._metas(4))
+        self.assertRaises(SampleMetaException, sample.processData, [1, 2, 3, 4, 5, 15])
+        # bitmask selects more channels than there are values
+        self.assertRaises(SampleMetaException, sample.processData, [1, 2, 15])
         
 def main():
     unittest.main()
@@ -0,0 +1,77 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import math
+from threading import Thread
+from autosportlabs.racecapture.data.samplering import SampleRing
+
+
+class SampleRingTest(unittest.TestCase):
+
+    def test_snapshots(self):
+        ring = SampleRing(['a', 'b'], 4)
+        ring.update({'a': 1, 'unknown': 5})
+        self.assertTrue(ring.push())
+        ring.update({'b': 2})
+        self.assertTrue(ring.push())
+        ring.update({'a': 3})
+
+        records = ring.read(10, 0)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0][0], 1)
+        self.assertTrue(math.isnan(records[0][1]))
+        self.assertListEqual(records[1], [1, 2])
+        self.assertEqual(ring.count, 0)
+
+    def test_full(self):
+        ring = SampleRing(['a'], 3)
+        for i in range(0, 3):
+            ring.update({'a': i})
+            self.assertTrue(ring.push())
+        self.assertEqual(ring.fill_level, 1.0)
+        self.assertFalse(ring.push())
+
+        self.assertListEqual(ring.read(2, 0), [[0], [1]])
+        ring.update({'a': 3})
+        self.assertTrue(ring.push())
+        self.assertListEqual(ring.read(10, 0), [[2], [3]])
+
+    def test_read_timeout(self):
+        ring = SampleRing(['a'], 3)
+        self.assertListEqual(ring.read(1, 0.01), [])
+
+    def test_threaded(self):
+        ring = SampleRing(['a'], 8)
+        count = 1000
+        received = []
+
+        def consume():
+            while len(received) < count:
+                received.extend(r[0] for r in ring.read(4, 1.0))
+
+        consumer = Thread(target=consume)
+        consumer.start()
+        for i in range(0, count):
+            ring.update({'a': i})
+            while not ring.push():
+                pass
+        consumer.join()
+        self.assertListEqual(received, range(0, count))
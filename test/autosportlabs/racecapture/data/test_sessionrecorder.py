@@ -21,7 +21,8 @@
 import unittest
 from mock import Mock, patch
 from autosportlabs.racecapture.data.sessionrecorder import SessionRecorder
-import Queue
+from autosportlabs.racecapture.data.samplering import SampleRing
+import math
 
 class TestSessionRecorder(unittest.TestCase):
 
@@ -158,40 +159,69 @@ class TestSessionRecorder(unittest.TestCase):
         disconnect_listener()
         self.assertTrue(session_recorder.recording, "Session recorder stops recording on disconnect")
 
-    def test_on_sample(self):
-        # warning: this is test is  necessarily slow, as it involves timing the queue performance.
+    def _recording_session_recorder(self):
         session_recorder = SessionRecorder(self.mock_datastore, self.mock_databus, self.mock_rcp_api,
                                            self.mock_settings, self.mock_track_manager, self.mock_status_pump)
-        
-	q = session_recorder._sample_queue
+        session_recorder._sample_ring = SampleRing(['a', 'v'], SessionRecorder.SAMPLE_RING_SIZE)
         session_recorder.recording = True
+        return session_recorder
+
+    def test_on_sample(self):
+        session_recorder = self._recording_session_recorder()
+        ring = session_recorder._sample_ring
+
+        session_recorder._on_sample({'v': 0})
+        session_recorder._on_sample({'a': 1})
+        records = ring.read(10, 0)
+        self.assertEqual(len(records), 2, "Session recorder basic ring test")
+        self.assertTrue(math.isnan(records[0][0]), "Channels without a value are NaN")
+        self.assertListEqual(records[1], [1, 0], "Samples are merged with previous values")
+
+    def test_on_sample_backpressure(self):
+        session_recorder = self._recording_session_recorder()
+        ring = session_recorder._sample_ring
+
+        # no throttling while the writer keeps up
+        for i in range(0, ring.capacity / 2):
+            session_recorder._on_sample({'v': i})
+        self.assertEqual(ring.count, ring.capacity / 2)
+
+        # past the slowing threshold, samples arriving faster than the send delay are merged, not stored
+        for i in range(0, ring.capacity):
+            session_recorder._on_sample({'v': i})
+        self.assertLess(ring.count, ring.capacity)
+        self.assertFalse(session_recorder._sample_ring_full)
+
+        self.assertEqual(session_recorder._sample_send_delay(SessionRecorder.SAMPLE_RING_SLOWING_THRESHOLD), 0)
+        self.assertEqual(session_recorder._sample_send_delay(1.0), SessionRecorder.SAMPLE_MAX_SEND_DELAY)
+
+        # once drained, every sample is stored again
+        ring.read(ring.capacity, 0)
+        session_recorder._on_sample({'v': 1})
+        session_recorder._on_sample({'v': 2})
+        self.assertEqual(ring.count, 2)
+
+    def test_batch_writes(self):
+        session_recorder = self._recording_session_recorder()
+        for i in range(0, 10):
+            session_recorder._on_sample({'v': i})
+        session_recorder.recording = False
+
+        # not recording, so the worker drains the ring and exits
+        session_recorder._session_recorder_batch_worker(session_recorder._sample_ring)
+
+        self.assertEqual(len(self.mock_datastore.insert_records_nocommit.mock_calls), 1, "Writes the backlog as one batch")
+        records, channels, session_id = self.mock_datastore.insert_records_nocommit.call_args[0]
+        self.assertListEqual(channels, ['a', 'v'])
+        self.assertListEqual([r[1] for r in records], range(0, 10))
+        self.assertEqual(len(self.mock_datastore.commit.mock_calls), 1, "Commits the batch")
+
+    def test_queue_high_water(self):
+        session_recorder = self._recording_session_recorder()
+        for i in range(0, 5):
+            session_recorder._on_sample({'v': i})
+        self.assertEqual(session_recorder.queue_high_water, 5)
 
-	sampleIn = { 'v': 0 }
-	session_recorder._on_sample( sampleIn )
-	sampleOut = q.get( True, 0 )
-        self.assertTrue(sampleIn == sampleOut, "Session recorder basic queue test")
-
-	i = 0
-        while not session_recorder._sample_queue_full:
-            session_recorder._on_sample( { 'v': i } )
-            i += 1
-
-        self.assertTrue( session_recorder._sample_send_delay
-            == SessionRecorder.SAMPLE_QUEUE_MAX_SEND_DELAY_MS,
-                "Session recorder is slowing sample rate" )
-        
-        for i in range( 0, SessionRecorder.SAMPLE_QUEUE_MAX_SIZE * 2 ):
-            session_recorder._on_sample( { 'v': i } )
-            try:
-                sampleOut = q.get( True, 0 )
-                sampleOut = q.get( True, 0 )
-            except Queue.Empty:
-                pass
-
-        self.assertTrue( session_recorder._sample_send_delay
-            == SessionRecorder.SAMPLE_QUEUE_MIN_SEND_DELAY_MS,
-                "Session recorder is restoring max sample rate" )
-        
 
 def main():
     unittest.main()
@@ -19,6 +19,7 @@
 # this code. If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
+from mock import patch
 from autosportlabs.racecapture.databus.databus import DataBus
 from autosportlabs.racecapture.data.sampledata import Sample, ChannelMeta, SampleValue,\
 	ChannelMetaCollection
@@ -141,6 +142,85 @@ class DataBusTest(unittest.TestCase):
 		dataBus.notify_listeners(None)
 		self.assertEqual(self.channelMeta['RPM'], metas.channel_metas[0])
 		
+	def _sample(self, **values):
+		sample = Sample()
+		sample.samples = [SampleValue(value, ChannelMeta(name=name)) for name, value in values.iteritems()]
+		return sample
+
+	def test_notifies_changes_only(self):
+		values = []
+		dataBus = DataBus()
+		dataBus.addChannelListener('RPM', values.append)
+		dataBus.update_samples(self._sample(RPM=1000))
+		dataBus.notify_listeners(None)
+		dataBus.update_samples(self._sample(RPM=1000))
+		dataBus.notify_listeners(None)
+		dataBus.notify_listeners(None)
+		dataBus.update_samples(self._sample(RPM=2000))
+		dataBus.notify_listeners(None)
+		self.assertEqual(values, [1000, 2000])
+
+	def test_new_listener_gets_current_value(self):
+		dataBus = DataBus()
+		dataBus.update_samples(self._sample(RPM=1000))
+		dataBus.notify_listeners(None)
+
+		values = []
+		samples = []
+		dataBus.addChannelListener('RPM', values.append)
+		dataBus.add_sample_listener(lambda sample: samples.append(dict(sample)))
+		dataBus.notify_listeners(None)
+		self.assertEqual(values, [1000])
+		self.assertEqual(samples, [{'RPM': 1000}])
+
+	def test_max_rate(self):
+		values = []
+		samples = []
+		dataBus = DataBus()
+		dataBus.addChannelListener('RPM', values.append, max_rate=8)
+		dataBus.add_sample_listener(lambda sample: samples.append(dict(sample)), max_rate=8)
+		with patch('autosportlabs.racecapture.databus.databus.time') as mock_time:
+			for tick in range(0, 10):
+				# 64Hz updates
+				mock_time.return_value = 100 + tick / 64.0
+				dataBus.update_samples(self._sample(RPM=tick))
+				dataBus.notify_listeners(None)
+			# the latest value is delivered once the interval passes, without a new update
+			mock_time.return_value = 100.3
+			dataBus.notify_listeners(None)
+		self.assertEqual(values, [0, 8, 9])
+		self.assertEqual([s['RPM'] for s in samples], [0, 8, 9])
+
+	def test_remove_listeners(self):
+		values = []
+		dataBus = DataBus()
+		dataBus.addChannelListener('RPM', values.append)
+		dataBus.add_sample_listener(values.append)
+		dataBus.removeChannelListener('RPM', values.append)
+		dataBus.remove_sample_listener(values.append)
+		dataBus.update_samples(self._sample(RPM=1000))
+		dataBus.notify_listeners(None)
+		self.assertEqual(values, [])
+
+	def test_filter_channels_notified(self):
+		class DoubleFilter(object):
+			def get_channel_meta(self, channel_metas):
+				return {'Double': ChannelMeta(name='Double')}
+
+			def filter(self, channel_data):
+				channel_data['Double'] = channel_data.get('RPM', 0) * 2
+
+		values = []
+		dataBus = DataBus()
+		dataBus.data_filters = []
+		dataBus.add_data_filter(DoubleFilter())
+		dataBus.addChannelListener('Double', values.append)
+		dataBus.update_samples(self._sample(RPM=1000))
+		dataBus.notify_listeners(None)
+		dataBus.update_samples(self._sample(RPM=1000))
+		dataBus.notify_listeners(None)
+		self.assertEqual(values, [2000])
+
 def main():
 	unittest.main()
 
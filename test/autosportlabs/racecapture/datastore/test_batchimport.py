@@ -0,0 +1,76 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import os.path
+from autosportlabs.racecapture.datastore.datastore import DataStore, DatalogImport
+
+
+fqp = os.path.dirname(os.path.realpath(__file__))
+db_path = os.path.join(fqp, 'rctest_batch.sql3')
+log_path = os.path.join(fqp, 'rc_adj.log')
+import_export_path = os.path.join(fqp, 'import_export.log')
+
+
+class BatchImportTest(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        self.ds = DataStore()
+        self.ds.open_db(db_path)
+
+    def tearDown(self):
+        self.ds.close()
+        os.remove(db_path)
+
+    def _record_count(self, session_id):
+        return len(self.ds.query(sessions=[session_id], channels=['Interval']).fetch_records())
+
+    def test_import_datalogs(self):
+        progress = []
+        imports = [DatalogImport(log_path, 'rc_adj', 'the notes'),
+                   DatalogImport(import_export_path, 'import_export'),
+                   DatalogImport(log_path, 'rc_adj again')]
+        self.ds.import_datalogs(imports, progress_cb=progress.append, worker_count=2)
+
+        for datalog in imports:
+            self.assertTrue(datalog.success, datalog.error)
+
+        self.assertEqual(len(set(d.session_id for d in imports)), 3)
+        self.assertEqual(self._record_count(imports[0].session_id), 25691)
+        self.assertEqual(self._record_count(imports[2].session_id), 25691)
+        self.assertEqual(self.ds.get_laps(imports[0].session_id).keys(),
+                         self.ds.get_laps(imports[2].session_id).keys())
+        self.assertEqual(progress[-1], 100)
+
+        single_id = self.ds.import_datalog(import_export_path, 'single')
+        self.assertEqual(self._record_count(imports[1].session_id), self._record_count(single_id))
+
+    def test_import_failure(self):
+        imports = [DatalogImport(os.path.join(fqp, 'missing.log'), 'missing'),
+                   DatalogImport(log_path, 'rc_adj')]
+        self.ds.import_datalogs(imports)
+
+        self.assertFalse(imports[0].success)
+        self.assertIsNotNone(imports[0].error)
+        self.assertTrue(imports[1].success)
+        self.assertEqual(len(self.ds.get_sessions()), 1)
@@ -0,0 +1,144 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import unittest
+import os
+import os.path
+from autosportlabs.racecapture.datastore import channelstats
+from autosportlabs.racecapture.datastore.datastore import DataStore
+from autosportlabs.racecapture.datastore.columnstore import ColumnarDataStore
+from autosportlabs.racecapture.datastore.channelstats import ChannelStatistics, summarize_values
+
+fqp = os.path.dirname(os.path.realpath(__file__))
+row_db_path = os.path.join(fqp, 'rctest_stats_row.sql3')
+column_db_path = os.path.join(fqp, 'rctest_stats_column.sql3')
+sonoma_log_path = os.path.join(fqp, 'sonoma.log')
+rc_adj_log_path = os.path.join(fqp, 'rc_adj.log')
+
+
+class SummarizeValuesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.numpy = channelstats.np
+
+    def tearDown(self):
+        channelstats.np = self.numpy
+
+    def _check_summarize_values(self):
+        stats = summarize_values([None, 0, 2.0, float('nan'), -1.0, 4.0, 0])
+        self.assertEqual((5, 2, 5.0, 21.0, 2.0, 4.0), (stats.value_count, stats.zero_count, stats.sum_value,
+                                                      stats.sum_squares, stats.min_value, stats.max_value))
+        self.assertEqual(1.0, stats.average)
+        self.assertAlmostEqual(5.0 / 3, stats.nonzero_average)
+        self.assertAlmostEqual(math.sqrt(21.0 / 5 - 1), stats.std_dev)
+        self.assertEqual(0, summarize_values([None]).value_count)
+
+    def test_summarize_values(self):
+        self._check_summarize_values()
+
+    def test_summarize_values_python(self):
+        channelstats.np = None
+        self._check_summarize_values()
+
+    def test_merge(self):
+        stats = ChannelStatistics()
+        stats.merge(summarize_values([0, 3]))
+        stats.merge(ChannelStatistics())
+        stats.merge(summarize_values([1, -2]))
+        self.assertEqual((4, 1, 2, 14, 1, 3), (stats.value_count, stats.zero_count, stats.sum_value,
+                                              stats.sum_squares, stats.min_value, stats.max_value))
+        self.assertIsNone(ChannelStatistics().average)
+        self.assertIsNone(ChannelStatistics().std_dev)
+
+
+class ChannelStatsTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stores = []
+        for store_class, path in [(DataStore, row_db_path), (ColumnarDataStore, column_db_path)]:
+            if os.path.exists(path):
+                os.remove(path)
+            ds = store_class()
+            ds.open_db(path)
+            ds.import_datalog(sonoma_log_path, 'sonoma')
+            ds.import_datalog(rc_adj_log_path, 'rc_adj')
+            cls.stores.append(ds)
+
+    @classmethod
+    def tearDownClass(cls):
+        for ds in cls.stores:
+            ds.close()
+        os.remove(row_db_path)
+        os.remove(column_db_path)
+
+    def test_stats_match_samples(self):
+        for ds in self.stores:
+            for sessions in ([1], [2], [1, 2]):
+                for channel in ('RPM', 'Speed', 'Latitude', 'Interval'):
+                    if not all(channel in [c.name for c in ds.get_channel_list(session_id)] for session_id in sessions):
+                        continue
+                    values = [record[1] for record in ds.query(sessions, [channel]).fetch_records()]
+                    present = [value for value in values if value is not None]
+                    positive = [value for value in present if value > 0]
+                    stats = ds.get_channel_stats(channel, sessions)
+                    self.assertEqual(len(present), stats.value_count)
+                    self.assertEqual(present.count(0), stats.zero_count)
+                    self.assertAlmostEqual(sum(present), stats.sum_value, delta=abs(sum(present)) * 1e-12)
+                    self.assertEqual(min(positive), stats.min_value)
+                    self.assertEqual(max(positive), stats.max_value)
+
+    def test_aggregates_match_scans(self):
+        for ds in self.stores:
+            for sessions in ([1], [2], [1, 2], None):
+                for channel in ('RPM', 'Latitude', 'Coolant'):
+                    if not ds.channel_exists(channel):
+                        continue
+                    self.assertAlmostEqual(ds._scan_channel_average(channel, sessions),
+                                           ds.get_channel_average(channel, sessions), places=9)
+                    self.assertEqual(ds._get_channel_aggregate('MAX', channel, sessions),
+                                     ds.get_channel_max(channel, sessions))
+                    self.assertEqual(ds._get_channel_aggregate('MIN', channel, sessions),
+                                     ds.get_channel_min(channel, sessions))
+                for expected, actual in zip(ds._scan_location_center(sessions), ds.get_location_center(sessions)):
+                    self.assertAlmostEqual(expected, actual, places=9)
+
+    def test_recorded_stats(self):
+        for ds in self.stores:
+            session_id = ds.create_session('recorded')
+            # statistics kept up to date as samples are recorded, across commits
+            for index in range(1000):
+                ds.insert_sample_nocommit({'Interval': index * 10, 'RPM': index % 300}, session_id)
+                if index % 37 == 0:
+                    ds.commit()
+                    self.assertEqual(index + 1, ds.get_channel_stats('RPM', [session_id]).value_count)
+            ds.commit()
+
+            stats = ds.get_channel_stats('RPM', [session_id])
+            self.assertEqual((1000, 4, 1, 299), (stats.value_count, stats.zero_count, stats.min_value, stats.max_value))
+            self.assertEqual(sum(index % 300 for index in range(1000)), stats.sum_value)
+            ds.rebuild_lap_summaries()
+            rebuilt = ds.get_channel_stats('RPM', [session_id])
+            self.assertEqual((stats.value_count, stats.sum_value, stats.sum_squares),
+                             (rebuilt.value_count, rebuilt.sum_value, rebuilt.sum_squares))
+            ds.delete_session(session_id)
+            self.assertEqual(0, ds.connection.execute('SELECT COUNT(*) FROM channel_stats WHERE session_id = ?',
+                                                      (session_id,)).fetchone()[0])
@@ -0,0 +1,302 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import tempfile
+import unittest
+import os
+import os.path
+from autosportlabs.racecapture.datastore.datastore import DataStore, Filter
+from autosportlabs.racecapture.views.analysis.analysisdata import AnalysisDatastoreFactory, ColumnarAnalysisDatastore
+from autosportlabs.racecapture.datastore.columnstore import ColumnarDataStore, \
+    _pack_values, _unpack_values
+
+
+fqp = os.path.dirname(os.path.realpath(__file__))
+row_db_path = os.path.join(fqp, 'rctest_row.sql3')
+column_db_path = os.path.join(fqp, 'rctest_column.sql3')
+log_path = os.path.join(fqp, 'rc_adj.log')
+
+
+class ColumnPackingTest(unittest.TestCase):
+
+    def test_pack_float32_when_lossless(self):
+        typecode, data = _pack_values([1.0, 2.5, None, 6246.0])
+        self.assertEqual(typecode, 'f')
+        self.assertListEqual(_unpack_values(typecode, data), [1.0, 2.5, None, 6246.0])
+
+    def test_pack_float64_when_lossy(self):
+        typecode, data = _pack_values([3.437, None, 47.256164])
+        self.assertEqual(typecode, 'd')
+        self.assertListEqual(_unpack_values(typecode, data), [3.437, None, 47.256164])
+
+
+class FilterEvaluationTest(unittest.TestCase):
+
+    def test_matches(self):
+        f = Filter().lt('LapCount', 1).group(
+            Filter().gt('Coolant', 212).or_().gt('RPM', 9000))
+        self.assertTrue(f.matches({'LapCount': 0, 'Coolant': 213, 'RPM': 0}))
+        self.assertTrue(f.matches({'LapCount': 0, 'Coolant': 0, 'RPM': 9001}))
+        self.assertFalse(f.matches({'LapCount': 1, 'Coolant': 213, 'RPM': 9001}))
+        self.assertFalse(f.matches({'LapCount': None, 'Coolant': 213, 'RPM': 0}))
+
+    def test_match_columns(self):
+        f = Filter().lt('LapCount', 1).group(
+            Filter().gt('Coolant', 212).or_().gt('RPM', 9000))
+        columns = {'LapCount': [0, 0, 1, None], 'Coolant': [213, 0, 213, 213], 'RPM': [0, 9001, 9001, 0]}
+        self.assertListEqual([True, True, False, False], f.match_columns(columns, 4))
+        self.assertListEqual([False, False], Filter().eq('Speed', 1).match_columns({}, 2))
+
+    def test_may_match(self):
+        f = Filter().eq('CurrentLap', 3)
+        self.assertTrue(f.may_match({'CurrentLap': (2, 4)}))
+        self.assertFalse(f.may_match({'CurrentLap': (4, 6)}))
+        self.assertFalse(f.may_match({'CurrentLap': (None, None)}))
+
+    def test_pinned_values(self):
+        self.assertEqual(set([3]), Filter().neq('Speed', 0).and_().eq('CurrentLap', 3).pinned_values('CurrentLap'))
+        laps = Filter().eq('CurrentLap', 2).or_().eq('CurrentLap', 4)
+        self.assertEqual(set([2, 4]), laps.pinned_values('CurrentLap'))
+        self.assertEqual(set([2, 4]), Filter().group(laps).and_().gt('RPM', 0).pinned_values('CurrentLap'))
+        self.assertIsNone(Filter().eq('CurrentLap', 2).or_().gt('RPM', 0).pinned_values('CurrentLap'))
+        self.assertIsNone(laps.pinned_values('LapCount'))
+        self.assertEqual(set([1, 5]), Filter().in_('CurrentLap', [1, 5]).pinned_values('CurrentLap'))
+
+    def test_in(self):
+        f = Filter().in_('CurrentLap', [1, 5]).and_().gt('RPM', 0)
+        self.assertTrue(f.matches({'CurrentLap': 5, 'RPM': 1}))
+        self.assertFalse(f.matches({'CurrentLap': 3, 'RPM': 1}))
+        self.assertTrue(f.may_match({'CurrentLap': (4, 6), 'RPM': (0, 1)}))
+        self.assertFalse(f.may_match({'CurrentLap': (2, 4), 'RPM': (0, 1)}))
+
+
+class ColumnarDataStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        for path in [row_db_path, column_db_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+        self.row_ds = DataStore()
+        self.row_ds.open_db(row_db_path)
+        self.row_ds.import_datalog(log_path, 'rc_adj', 'the notes')
+
+        self.ds = ColumnarDataStore()
+        self.ds.open_db(column_db_path)
+        self.ds.import_datalog(log_path, 'rc_adj', 'the notes')
+
+    @classmethod
+    def tearDownClass(self):
+        self.row_ds.close()
+        self.ds.close()
+        os.remove(row_db_path)
+        os.remove(column_db_path)
+
+    def _assert_same_records(self, channels, data_filter=None, distinct_records=False):
+        expected = self.row_ds.query(sessions=[1], channels=channels, data_filter=data_filter,
+                                     distinct_records=distinct_records).fetch_records()
+        actual = self.ds.query(sessions=[1], channels=channels, data_filter=data_filter,
+                               distinct_records=distinct_records).fetch_records()
+        self.assertEqual(len(expected), len(actual))
+        self.assertListEqual(expected, actual)
+
+    def test_query_no_filter(self):
+        self._assert_same_records(['Coolant', 'RPM', 'MAP'])
+
+    def test_query_lap_filter(self):
+        self._assert_same_records(['Interval', 'Speed'], Filter().eq('LapCount', 5))
+
+    def test_query_location_filter(self):
+        f = Filter().neq('Latitude', 0).and_().neq('Longitude', 0).eq('LapCount', 2)
+        self._assert_same_records(['Latitude', 'Longitude'], f)
+
+    def test_query_distinct(self):
+        self._assert_same_records(['LapCount', 'LapTime'], Filter().gt('LapCount', 0), True)
+
+    def test_get_laps(self):
+        expected = self.row_ds.get_laps(1)
+        actual = self.ds.get_laps(1)
+        self.assertListEqual(expected.keys(), actual.keys())
+        for lap in expected.keys():
+            self.assertEqual(expected[lap].lap_time, actual[lap].lap_time)
+
+    def test_channel_aggregates(self):
+        self.assertEqual(self.row_ds.get_channel_min('RPM'), self.ds.get_channel_min('RPM'))
+        self.assertEqual(self.row_ds.get_channel_max('RPM'), self.ds.get_channel_max('RPM'))
+        self.assertEqual(self.row_ds.get_channel_max('RPM', extra_channels=['LapCount']),
+                         self.ds.get_channel_max('RPM', extra_channels=['LapCount']))
+        self.assertEqual(self.row_ds.get_channel_min('RPM', extra_channels=['LapCount']),
+                         self.ds.get_channel_min('RPM', extra_channels=['LapCount']))
+        self.assertAlmostEqual(self.row_ds.get_channel_average('Latitude'),
+                               self.ds.get_channel_average('Latitude'), places=9)
+
+    def test_location_center(self):
+        expected = self.row_ds.get_location_center([1])
+        actual = self.ds.get_location_center([1])
+        self.assertAlmostEqual(expected[0], actual[0], places=9)
+        self.assertAlmostEqual(expected[1], actual[1], places=9)
+
+    def test_export_session(self):
+        with tempfile.TemporaryFile() as expected_file, tempfile.TemporaryFile() as actual_file:
+            expected_rows = self.row_ds.export_session(1, expected_file)
+            actual_rows = self.ds.export_session(1, actual_file)
+            self.assertEqual(expected_rows, actual_rows)
+            expected_file.seek(0)
+            actual_file.seek(0)
+            self.assertEqual(expected_file.read(), actual_file.read())
+
+    def test_query_streams_chunks(self):
+        read_chunks = []
+        read_columns = self.ds._read_columns
+
+        def counting_read_columns(session_id, channels, chunk_indexes=None):
+            read_chunks.extend(chunk_indexes)
+            return read_columns(session_id, channels, chunk_indexes)
+        self.ds._read_columns = counting_read_columns
+        try:
+            dataset = self.ds.query(sessions=[1], channels=['Coolant', 'RPM'])
+            self.assertEqual(len(dataset.fetch_records(10)), 10)
+            self.assertListEqual([0], read_chunks)
+        finally:
+            del self.ds._read_columns
+
+    def test_record_samples(self):
+        session_id = self.ds.create_session('recorded')
+        chunk_size = ColumnarDataStore.CHUNK_SIZE
+        sample_count = chunk_size + 10
+        for index in range(sample_count):
+            self.ds.insert_sample_nocommit({'Interval': index * 10, 'RPM': index}, session_id)
+            if index % 37 == 0:
+                self.ds.commit()
+        self.ds.commit()
+
+        records = self.ds.query(sessions=[session_id], channels=['Interval', 'RPM']).fetch_records()
+        self.assertEqual(len(records), sample_count)
+        self.assertEqual(records[-1], (session_id, (sample_count - 1) * 10, sample_count - 1))
+        self.ds.delete_session(session_id)
+
+    def test_record_batches(self):
+        session_id = self.ds.create_session('recorded batches')
+        chunk_size = ColumnarDataStore.CHUNK_SIZE
+        self.ds.insert_records_nocommit([[index * 10, index] for index in range(10)], ['Interval', 'RPM'], session_id)
+        self.ds.commit()
+        # a later batch adding a channel, with the channels in another order, spanning a chunk boundary
+        self.ds.insert_records_nocommit([[index, index * 10, 1.5] for index in range(10, chunk_size + 20)],
+                                        ['RPM', 'Interval', 'Speed'], session_id)
+        self.ds.commit()
+
+        records = self.ds.query(sessions=[session_id], channels=['Interval', 'RPM', 'Speed']).fetch_records()
+        self.assertEqual(len(records), chunk_size + 20)
+        self.assertEqual(records[9], (session_id, 90, 9, None))
+        self.assertEqual(records[10], (session_id, 100, 10, 1.5))
+        self.assertEqual(records[-1], (session_id, (chunk_size + 19) * 10, chunk_size + 19, 1.5))
+        self.ds.delete_session(session_id)
+
+    def test_migration(self):
+        db_path = os.path.join(fqp, 'rctest_migrate.sql3')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        try:
+            legacy = DataStore()
+            legacy.open_db(db_path)
+            legacy.import_datalog(log_path, 'rc_adj', 'the notes')
+            legacy.close()
+
+            self.assertFalse(ColumnarDataStore.is_columnar_database(db_path))
+            migrated = ColumnarDataStore()
+            migrated.open_db(db_path)
+            # opening the database leaves the rows in place until they are converted
+            self.assertNotEqual(0, migrated.connection.execute('SELECT COUNT(*) FROM datapoint').fetchone()[0])
+            self.assertEqual(1, migrated.migrate_row_sessions())
+            self.assertEqual(0, migrated.migrate_row_sessions())
+            self.assertTrue(ColumnarDataStore.is_columnar_database(db_path))
+            expected = self.row_ds.query(sessions=[1], channels=['Coolant', 'RPM']).fetch_records()
+            actual = migrated.query(sessions=[1], channels=['Coolant', 'RPM']).fetch_records()
+            self.assertListEqual(expected, actual)
+            self.assertEqual(0, migrated.connection.execute('SELECT COUNT(*) FROM datapoint').fetchone()[0])
+            migrated.close()
+        finally:
+            os.remove(db_path)
+
+    def test_interrupted_migration(self):
+        db_path = os.path.join(fqp, 'rctest_migrate_interrupted.sql3')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        try:
+            legacy = DataStore()
+            legacy.open_db(db_path)
+            legacy.import_datalog(log_path, 'rc_adj', 'the notes')
+            legacy.close()
+
+            migrated = ColumnarDataStore()
+            migrated.open_db(db_path)
+            datapoint_count = migrated.connection.execute('SELECT COUNT(*) FROM datapoint').fetchone()[0]
+
+            def interrupt(session_id):
+                # a commit through the datastore's connection mid-conversion
+                migrated.commit()
+                raise IOError('interrupted')
+            migrated._delete_lap_summary = interrupt
+            self.assertRaises(IOError, migrated.migrate_row_sessions)
+            del migrated._delete_lap_summary
+
+            # nothing of the partial conversion was kept
+            self.assertFalse(ColumnarDataStore.is_columnar_database(db_path))
+            self.assertEqual(0, migrated.connection.execute('SELECT COUNT(*) FROM column_chunk').fetchone()[0])
+            self.assertEqual(datapoint_count, migrated.connection.execute('SELECT COUNT(*) FROM datapoint').fetchone()[0])
+
+            self.assertEqual(1, migrated.migrate_row_sessions())
+            expected = self.row_ds.query(sessions=[1], channels=['Coolant', 'RPM']).fetch_records()
+            actual = migrated.query(sessions=[1], channels=['Coolant', 'RPM']).fetch_records()
+            self.assertListEqual(expected, actual)
+            migrated.close()
+        finally:
+            os.remove(db_path)
+
+
+class AnalysisDatastoreFactoryTest(unittest.TestCase):
+
+    def test_create_datastore(self):
+        db_path = os.path.join(fqp, 'rctest_factory.sql3')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        factory = AnalysisDatastoreFactory()
+        try:
+            datastore = factory.create_datastore(db_path)
+            self.assertNotIsInstance(datastore, ColumnarDataStore)
+            datastore.open_db(db_path)
+            datastore.import_datalog(log_path, 'rc_adj')
+            datastore.close()
+
+            # column storage is only used once requested
+            self.assertNotIsInstance(factory.create_datastore(db_path), ColumnarDataStore)
+            datastore = factory.create_datastore(db_path, columnar=True)
+            self.assertIsInstance(datastore, ColumnarAnalysisDatastore)
+            datastore.open_db(db_path)
+            datastore.migrate_row_sessions()
+            self.assertEqual(len(datastore.get_cached_session_laps(1)),
+                             len(datastore.get_laps(1)))
+            datastore.close()
+
+            # a converted database stays in column storage
+            self.assertIsInstance(factory.create_datastore(db_path, columnar=False), ColumnarAnalysisDatastore)
+        finally:
+            os.remove(db_path)
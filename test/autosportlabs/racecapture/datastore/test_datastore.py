@@ -27,6 +27,7 @@ import os.path
 from collections import namedtuple
 from autosportlabs.racecapture.datastore.datastore import DataStore, Filter, \
     DataSet, _interp_dpoints, _smooth_dataset, _scrub_sql_value
+from autosportlabs.racecapture.data.channels import ChannelMeta
 
 
 fqp = os.path.dirname(os.path.realpath(__file__))
@@ -332,6 +333,22 @@ class DataStoreTest(unittest.TestCase):
         self.assertEqual(session.notes, 'the notes')
         self.assertIsNotNone(session.date)
 
+    def test_insert_samples(self):
+        metas = {'BatchA': ChannelMeta(name='BatchA'), 'BatchB': ChannelMeta(name='BatchB')}
+        session_id = self.ds.init_session('batch', metas)
+        try:
+            samples = [{'BatchA': 1}, {'BatchA': 2, 'BatchB': 20}, {'BatchB': 30}, {'BatchA': 4, 'BatchB': 40}]
+            for sample in samples:
+                self.ds.insert_sample_nocommit(sample, session_id)
+            # NaN values are stored as NULL
+            self.ds.insert_records_nocommit([[5, float('nan')], [6, 60]], ['BatchA', 'BatchB'], session_id)
+            self.ds.commit()
+            records = self.ds.query(sessions=[session_id], channels=['BatchA', 'BatchB']).fetch_records()
+            self.assertListEqual([tuple(r[1:]) for r in records],
+                                 [(1, None), (2, 20), (None, 30), (4, 40), (5, None), (6, 60)])
+        finally:
+            self.ds.delete_session(session_id)
+
     def test_location_center(self):
         lat, lon = self.ds.get_location_center([1])
         self.assertIsNotNone(lat)
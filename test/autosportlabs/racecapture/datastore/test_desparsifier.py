@@ -0,0 +1,86 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import os.path
+from StringIO import StringIO
+from autosportlabs.racecapture.datastore.datastore import DataStore
+from autosportlabs.racecapture.datastore.desparsifier import ChunkedDesparsifier
+
+
+fqp = os.path.dirname(os.path.realpath(__file__))
+log_path = os.path.join(fqp, 'rc_adj.log')
+
+
+def _apply_backfills(records, backfills):
+    for index, (value, count) in backfills.iteritems():
+        for record in records[:count]:
+            record[index] = value
+    return records
+
+
+def _nan_to_none(records):
+    return [[None if v != v else v for v in record] for record in records]
+
+
+@unittest.skipUnless(ChunkedDesparsifier.available(), 'NumPy is not available')
+class ChunkedDesparsifierTest(unittest.TestCase):
+
+    def _legacy_records(self, data_file):
+        return list(DataStore()._desparsified_data_generator(data_file))
+
+    def _chunked_records(self, data_file, channel_count, chunk_size=ChunkedDesparsifier.CHUNK_SIZE_BYTES,
+                         warnings=None):
+        desparsifier = ChunkedDesparsifier(data_file, channel_count, warnings=warnings, chunk_size=chunk_size)
+        records = list(desparsifier.records())
+        return _nan_to_none(_apply_backfills(records, desparsifier.backfills))
+
+    def test_matches_generator(self):
+        with open(log_path, 'rb') as data_file:
+            channel_count = len(data_file.readline().split(','))
+            expected = self._legacy_records(data_file)
+            data_file.seek(0)
+            data_file.readline()
+            actual = self._chunked_records(data_file, channel_count, chunk_size=64 * 1024)
+        self.assertEqual(len(expected), len(actual))
+        self.assertListEqual(expected, actual)
+
+    def test_extrapolation(self):
+        log = '\n'.join([',,1',
+                         '2,,',
+                         ',,',
+                         ',5,3',
+                         ',,']) + '\n'
+        expected = [[2.0, 5.0, 1.0],
+                    [2.0, 5.0, 1.0],
+                    [2.0, 5.0, 1.0],
+                    [2.0, 5.0, 3.0],
+                    [2.0, 5.0, 3.0]]
+        self.assertListEqual(self._legacy_records(StringIO(log)), expected)
+        # one line at a time, so the back fill spans chunks
+        self.assertListEqual(self._chunked_records(StringIO(log), 3, chunk_size=1), expected)
+
+    def test_bad_lines(self):
+        warnings = []
+        log = '1,2\n1,2,3\n3,abc\n4,\n'
+        actual = self._chunked_records(StringIO(log), 2, warnings=warnings)
+        self.assertListEqual(actual, [[1.0, 2.0], [4.0, 2.0]])
+        self.assertEqual(len(warnings), 1)
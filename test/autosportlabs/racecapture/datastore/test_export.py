@@ -0,0 +1,183 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import os.path
+import gzip
+import shutil
+import tempfile
+from StringIO import StringIO
+from autosportlabs.racecapture.datastore.datastore import DataStore
+from autosportlabs.racecapture.datastore.export import CsvExportTarget, ExportTarget, SessionExporter, \
+    open_export_file
+
+fqp = os.path.dirname(os.path.realpath(__file__))
+db_path = os.path.join(fqp, 'rcexport.sql3')
+import_export_path = os.path.join(fqp, 'import_export.log')
+
+
+def legacy_export(datastore, session_id, export_file, progress_callback=None):
+    """
+    The previous export_session, which read the whole session and built each
+    row by concatenation, as the reference for the output format
+    """
+    channels = datastore.get_channel_list(session_id)
+    header = ''
+    for channel in channels:
+        header += '"{}"|"{}"|{}|{}|{},'.format(channel.name, channel.units, channel.min,
+                                               channel.max, channel.sample_rate)
+    export_file.write(header[:-1] + '\n')
+    channel_names = [c.name for c in channels]
+    channel_intervals = [DataStore.MAX_SAMPLE_RATE / c.sample_rate for c in channels]
+    system_channel_indexes = [c.name in DataStore.SYSTEM_CHANNELS for c in channels]
+    export_count = datastore._get_session_record_count(session_id)
+    records = datastore.query([session_id], channel_names).fetch_records()
+    datalog_interval_index = channel_names.index('Interval')
+    sync_point = None
+    row_index = 0
+    for record in records:
+        sampled = False
+        while not sampled:
+            if sync_point is None:
+                interval_record = record[1 + datalog_interval_index]
+                if interval_record is None:
+                    break
+                sync_point = long(interval_record)
+            row = ''
+            current_interval = long(record[1 + datalog_interval_index])
+            for index in range(len(channels)):
+                if system_channel_indexes[index]:
+                    value = long(record[1 + index])
+                elif (current_interval - sync_point) % channel_intervals[index] == 0:
+                    value = record[1 + index]
+                    if value is None:
+                        value = ''
+                    sampled = True
+                else:
+                    value = ''
+                row += str(value) + ','
+            if sampled:
+                export_file.write(row[:-1] + '\n')
+            else:
+                sync_point = None
+        row_index += 1
+        progress = row_index * 100 / export_count
+        if progress % 5 == 0 and progress_callback is not None:
+            if progress_callback(progress) == True:
+                break
+    return row_index
+
+
+class ExportTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        cls.ds = DataStore()
+        cls.ds.open_db(db_path)
+        cls.session_id = cls.ds.import_datalog(import_export_path, 'import_export', 'the notes')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ds.close()
+        os.remove(db_path)
+
+    def _legacy_output(self, progress_callback=None):
+        export_file = StringIO()
+        rows = legacy_export(self.ds, self.session_id, export_file, progress_callback)
+        return rows, export_file.getvalue()
+
+    def test_same_output(self):
+        expected_rows, expected = self._legacy_output()
+        export_file = StringIO()
+        progress = []
+
+        def progress_cb(pct):
+            progress.append(pct)
+
+        rows = self.ds.export_session(self.session_id, export_file, progress_cb)
+        self.assertEqual(expected_rows, rows)
+        self.assertEqual(expected, export_file.getvalue())
+        self.assertEqual(100, progress[-1])
+
+        # rows buffered and written in small batches
+        export_file = StringIO()
+        self.ds.export_session(self.session_id, CsvExportTarget(export_file, buffer_rows=7))
+        self.assertEqual(expected, export_file.getvalue())
+
+    def test_cancel(self):
+        def cancel_at_10(pct):
+            return pct >= 10
+
+        expected_rows, expected = self._legacy_output(cancel_at_10)
+        export_file = StringIO()
+        rows = self.ds.export_session(self.session_id, export_file, cancel_at_10)
+        self.assertEqual(expected_rows, rows)
+        self.assertTrue(rows < self.ds._get_session_record_count(self.session_id))
+        # rows exported before cancelling are written out
+        self.assertEqual(expected, export_file.getvalue())
+
+    def test_gzip(self):
+        _, expected = self._legacy_output()
+        export_dir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(export_dir, 'export.log.gz')
+            with open_export_file(filename) as export_file:
+                self.ds.export_session(self.session_id, export_file)
+            with gzip.open(filename, 'rb') as export_file:
+                self.assertEqual(expected, export_file.read())
+        finally:
+            shutil.rmtree(export_dir)
+
+    def test_iter_records(self):
+        channels = ['Interval', 'c1000hz']
+        expected = self.ds.query([self.session_id], channels).fetch_records()
+        records = list(self.ds.query([self.session_id], channels).iter_records(13))
+        self.assertListEqual(expected, records)
+
+
+class SessionExporterTest(unittest.TestCase):
+
+    class ListTarget(ExportTarget):
+
+        def __init__(self):
+            self.rows = []
+
+        def write_row(self, values):
+            self.rows.append(values)
+
+    def test_resync(self):
+        # Interval, Utc, 10 hz, 50 hz
+        exporter = SessionExporter([1, 1, 100, 20], [True, True, False, False], 0)
+        records = [(1, 1000, 5, 1.0, 10.0),
+                   (1, 1020, 5, None, 11.0),
+                   (1, 1030, 5, 2.0, 12.0),
+                   (1, 1033, 5, 3.0, 13.0),
+                   (1, 1053, 5, 4.0, 14.0)]
+        target = self.ListTarget()
+        self.assertEqual(5, exporter.export(records, target, len(records)))
+        self.assertListEqual([[1000, 5, 1.0, 10.0],
+                              [1020, 5, None, 11.0],
+                              # 1030 is off the 50 hz interval, re-syncing there
+                              [1030, 5, 2.0, 12.0],
+                              [1033, 5, 3.0, 13.0],
+                              [1053, 5, None, 14.0]], target.rows)
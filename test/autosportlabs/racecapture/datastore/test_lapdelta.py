@@ -0,0 +1,178 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import unittest
+import os
+import os.path
+from kivy.clock import Clock
+from autosportlabs.racecapture.datastore import lapdelta, DatastoreException
+from autosportlabs.racecapture.datastore.lapdelta import ReferenceLap, lap_trace
+from autosportlabs.racecapture.views.analysis.analysisdata import CachingAnalysisDatastore
+from autosportlabs.racecapture.views.analysis.markerevent import SourceRef
+
+fqp = os.path.dirname(os.path.realpath(__file__))
+db_path = os.path.join(fqp, 'rctest_lapdelta.sql3')
+sonoma_log_path = os.path.join(fqp, 'sonoma.log')
+
+
+def lap_samples(lap_seconds, length=2.0, start_time=1000, start_distance=5.0, sample_rate=50, gps_rate=10):
+    """
+    A lap at constant speed, with the distance updated at the GPS rate
+    """
+    distances = []
+    times = []
+    sample_count = int(lap_seconds * sample_rate) + 1
+    for index in range(sample_count):
+        elapsed = float(index) / sample_rate
+        fix = int(elapsed * gps_rate) / float(gps_rate)
+        distances.append(start_distance + length * fix / lap_seconds)
+        times.append(start_time + elapsed * 1000.0)
+    return distances, times
+
+
+class ReferenceLapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.numpy = lapdelta.np
+
+    def tearDown(self):
+        lapdelta.np = self.numpy
+
+    def _check_deltas(self):
+        reference = ReferenceLap(*lap_samples(100))
+        distances, times = lap_samples(102, start_time=500000, start_distance=12.0)
+        deltas = reference.sample_deltas(distances, times)
+        self.assertEqual(len(distances), len(deltas))
+        self.assertAlmostEqual(0, deltas[0], places=6)
+        self.assertAlmostEqual(1.0, deltas[len(deltas) / 2], delta=0.05)
+        self.assertAlmostEqual(2.0, deltas[-1], delta=0.05)
+
+        # distance measured longer, at the same pace
+        distances, times = lap_samples(100, length=2.04)
+        self.assertTrue(all(abs(delta) < 0.05 for delta in reference.sample_deltas(distances, times)))
+
+        grid_deltas = reference.grid_deltas(*lap_samples(98))
+        self.assertEqual(len(reference.grid), len(grid_deltas))
+        self.assertAlmostEqual(-2.0, grid_deltas[-1], delta=0.05)
+
+    def test_deltas(self):
+        self._check_deltas()
+
+    def test_deltas_python(self):
+        lapdelta.np = None
+        self._check_deltas()
+
+    def test_same_with_and_without_numpy(self):
+        reference_samples = lap_samples(100)
+        distances, times = lap_samples(103)
+        expected = ReferenceLap(*reference_samples).sample_deltas(distances, times)
+        lapdelta.np = None
+        actual = ReferenceLap(*reference_samples).sample_deltas(distances, times)
+        self.assertEqual(len(expected), len(actual))
+        for expected_delta, delta in zip(expected, actual):
+            self.assertAlmostEqual(expected_delta, delta, places=9)
+
+    def test_missing_values(self):
+        reference = ReferenceLap(*lap_samples(100))
+        distances, times = lap_samples(101)
+        distances[0] = None
+        times[200] = None
+        deltas = reference.sample_deltas(distances, times)
+        self.assertIsNone(deltas[0])
+        self.assertIsNone(deltas[200])
+        self.assertIsNotNone(deltas[201])
+
+        trace_distances, trace_times = lap_trace([None, 1.0, 1.0, 1.2, 1.1, 1.3], [0, 10, 20, 30, 40, 50])
+        self.assertEqual([0, 0.2, 0.3], [round(distance, 6) for distance in trace_distances])
+        self.assertEqual([0, 20, 40], list(trace_times))
+
+    def test_no_distance(self):
+        reference = ReferenceLap([0.0] * 10, range(10))
+        self.assertFalse(reference.valid)
+        self.assertIsNone(reference.sample_deltas(*lap_samples(100)))
+        self.assertIsNone(ReferenceLap(*lap_samples(100)).sample_deltas([None] * 10, range(10)))
+
+
+class CachedTimeDeltaTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        cls.ds = CachingAnalysisDatastore()
+        cls.ds.open_db(db_path)
+        cls.session_id = cls.ds.import_datalog(sonoma_log_path, 'sonoma')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ds.close()
+        os.remove(db_path)
+
+    def _get_time_deltas(self, reference_ref, source_refs, with_fail_callback=False):
+        # the time deltas, or the exception passed to the fail callback
+        results = []
+        self.ds.get_time_delta_data(reference_ref, source_refs, results.append,
+                                    results.append if with_fail_callback else None)
+        timeout = time.time() + 10
+        while not results and time.time() < timeout:
+            Clock.tick()
+        self.assertEqual(1, len(results))
+        return results[0]
+
+    def test_time_deltas(self):
+        laps = self.ds.get_cached_session_laps(self.session_id)
+        reference_ref = SourceRef(2, self.session_id)
+        source_refs = [SourceRef(3, self.session_id), SourceRef(4, self.session_id)]
+        deltas = self._get_time_deltas(reference_ref, source_refs)
+        self.assertItemsEqual([str(source_ref) for source_ref in source_refs], deltas.keys())
+        for source_ref in source_refs:
+            channel_data = deltas[str(source_ref)]
+            self.assertEqual(CachingAnalysisDatastore.TIME_DELTA_CHANNEL, channel_data.channel)
+            # the delta at the end of the lap is the difference in lap time
+            lap_time_delta = (laps[source_ref.lap].lap_time - laps[reference_ref.lap].lap_time) * 60.0
+            self.assertAlmostEqual(lap_time_delta, channel_data.values[-1], delta=0.2)
+            self.assertTrue(channel_data.min <= channel_data.values[-1] <= channel_data.max)
+
+        # cached until either lap's session is invalidated
+        cached = self._get_time_deltas(reference_ref, source_refs[:1])
+        self.assertIs(deltas[str(source_refs[0])], cached[str(source_refs[0])])
+        self.ds.invalidate_session(self.session_id)
+        self.assertIsNot(deltas[str(source_refs[0])],
+                         self._get_time_deltas(reference_ref, source_refs[:1])[str(source_refs[0])])
+
+    def test_failed_query(self):
+        reference_ref = SourceRef(2, self.session_id)
+        source_refs = [SourceRef(3, self.session_id)]
+        self.ds.invalidate_session(self.session_id)
+
+        def fail(*args):
+            raise DatastoreException('query failed')
+
+        query_channel_data = CachingAnalysisDatastore._query_channel_data
+        CachingAnalysisDatastore._query_channel_data = fail
+        try:
+            error = self._get_time_deltas(reference_ref, source_refs, with_fail_callback=True)
+            self.assertIsInstance(error, DatastoreException)
+
+            # without a fail callback the deltas that could not be computed are left out
+            self.assertEqual({}, self._get_time_deltas(reference_ref, source_refs))
+        finally:
+            CachingAnalysisDatastore._query_channel_data = query_channel_data
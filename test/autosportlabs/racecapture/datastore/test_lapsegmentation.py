@@ -0,0 +1,234 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+from autosportlabs.racecapture.datastore import lapsegmentation
+from autosportlabs.racecapture.datastore.lapsegmentation import find_gate_crossings, segment_laps, segment_columns
+from autosportlabs.racecapture.datastore.datastore import DataStore, Filter
+from autosportlabs.racecapture.datastore.columnstore import ColumnarDataStore
+from autosportlabs.racecapture.datastore.batchimport import DatalogImport
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
+from autosportlabs.racecapture.tracks.trackmanager import TrackMap
+
+fqp = os.path.dirname(os.path.realpath(__file__))
+sonoma_log_path = os.path.join(fqp, 'sonoma.log')
+
+CENTER = GeoPoint.fromPoint(38.16, -122.45)
+# a circular track of 200m radius, lapped once a minute
+RADIUS_DEGREES = 200.0 / lapsegmentation.METERS_PER_DEGREE
+LAP_MS = 60000.0
+
+
+def circle_point(angle):
+    return GeoPoint.fromPoint(CENTER.latitude + RADIUS_DEGREES * math.sin(angle),
+                              CENTER.longitude + RADIUS_DEGREES * math.cos(angle) /
+                              math.cos(math.radians(CENTER.latitude)))
+
+
+def circle_session(duration_ms, start_angle=-math.pi / 6, sample_ms=20, fix_ms=100):
+    """
+    Samples every sample_ms around the circle, with GPS positions updated every fix_ms
+    """
+    times, latitudes, longitudes = [], [], []
+    point = None
+    for time in range(0, duration_ms, sample_ms):
+        if time % fix_ms == 0:
+            point = circle_point(start_angle + 2 * math.pi * time / LAP_MS)
+        times.append(time)
+        latitudes.append(point.latitude)
+        longitudes.append(point.longitude)
+    return times, latitudes, longitudes
+
+
+class SegmentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self._np = lapsegmentation.np
+
+    def tearDown(self):
+        lapsegmentation.np = self._np
+
+    def _both_implementations(self, fn):
+        results = [fn()]
+        lapsegmentation.np = None
+        results.append(fn())
+        return results
+
+    def test_find_gate_crossings(self):
+        times, latitudes, longitudes = circle_session(190000)
+        for crossings in self._both_implementations(
+                lambda: find_gate_crossings(times, latitudes, longitudes, circle_point(0))):
+            self.assertEqual(4, len(crossings))
+            # interpolated between the fixes around each crossing
+            for lap, crossing in enumerate(crossings):
+                self.assertAlmostEqual(5000 + lap * LAP_MS, crossing, delta=1)
+
+        # the far side of the track is out of range
+        self.assertEqual([], find_gate_crossings(times, latitudes, longitudes, CENTER))
+
+    def test_parked_near_gate(self):
+        times, latitudes, longitudes = circle_session(30000)
+        # parked across the gate with the position wandering back and forth
+        gate = circle_point(0)
+        for index in range(0, 500):
+            point = circle_point(0.001 * (-1) ** (index / 5))
+            times.append(30000 + index * 20)
+            latitudes.append(point.latitude)
+            longitudes.append(point.longitude)
+        for crossings in self._both_implementations(
+                lambda: find_gate_crossings(times, latitudes, longitudes, gate)):
+            # the lap's crossing, then one for the time parked
+            self.assertEqual(2, len(crossings))
+            self.assertAlmostEqual(5000, crossings[0], delta=1)
+
+    def test_gps_dropout(self):
+        times, latitudes, longitudes = circle_session(70000)
+        for index in range(len(times)):
+            if 60000 < times[index] < 70000:
+                latitudes[index] = longitudes[index] = 0
+        # the second crossing falls in the dropout, the first is still found
+        self.assertEqual(1, len(find_gate_crossings(times, latitudes, longitudes, circle_point(0))))
+
+    def test_segment_laps(self):
+        times, latitudes, longitudes = circle_session(190000)
+        sectors = [circle_point(2 * math.pi / 3), circle_point(4 * math.pi / 3), GeoPoint()]
+        for segments in self._both_implementations(
+                lambda: segment_laps(times, latitudes, longitudes, circle_point(0), sectors)):
+            # before the start, three sectors for each of three laps, then the first sector of the lap in progress
+            self.assertEqual(1 + 3 * 3 + 1, len(segments))
+            first = segments[0]
+            self.assertEqual((0, 0, 0, 0), (first.start_index, first.lap_count, first.current_lap, first.sector))
+            self.assertEqual(len(times) - 1, segments[-1].end_index)
+            for previous, segment in zip(segments, segments[1:]):
+                self.assertEqual(previous.end_index + 1, segment.start_index)
+
+            lap_two = [segment for segment in segments if segment.current_lap == 2]
+            self.assertListEqual([1, 2, 3], [segment.sector for segment in lap_two])
+            self.assertEqual([1, 1, 1], [segment.lap_count for segment in lap_two])
+            self.assertAlmostEqual(1.0, lap_two[0].lap_time, places=4)
+            self.assertAlmostEqual(1 / 3.0, lap_two[1].sector_time, places=4)
+            self.assertAlmostEqual(65000, lap_two[0].lap_start_time, delta=1)
+            self.assertEqual(3, segments[-1].lap_count)
+
+    def test_stage(self):
+        times, latitudes, longitudes = circle_session(190000)
+        segments = segment_laps(times, latitudes, longitudes, circle_point(0), finish_point=circle_point(math.pi))
+        # each lap completes half way around, with the next starting at the start point
+        self.assertListEqual([(0, 0), (0, 1), (1, 1), (1, 2), (2, 2), (2, 3), (3, 3), (3, 4)],
+                             [(segment.lap_count, segment.current_lap) for segment in segments])
+        self.assertAlmostEqual(0.5, segments[2].lap_time, places=4)
+
+    def test_segment_columns(self):
+        times, latitudes, longitudes = circle_session(70000)
+        segments = segment_laps(times, latitudes, longitudes, circle_point(0))
+        for columns in self._both_implementations(lambda: segment_columns(segments, times, include_sectors=False)):
+            self.assertListEqual(sorted(['LapCount', 'CurrentLap', 'LapTime', 'ElapsedTime']), sorted(columns.keys()))
+            self.assertEqual(len(times), len(columns['CurrentLap']))
+            start = segments[1].start_index
+            self.assertEqual((0, 1), (columns['CurrentLap'][start - 1], columns['CurrentLap'][start]))
+            self.assertEqual(0, columns['ElapsedTime'][start - 1])
+            self.assertAlmostEqual((times[-1] - segments[-1].lap_start_time) / 60000.0, columns['ElapsedTime'][-1])
+
+
+class TrackManagerStub(object):
+
+    def __init__(self, track):
+        self.track = track
+        self.searches = 0
+
+    def find_nearby_tracks(self, point, searchRadius=None, searchBearing=None):
+        self.searches += 1
+        return [self.track]
+
+
+class ImportSegmentationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.mkdtemp()
+        # sonoma.log without the lap timing the firmware recorded
+        cls.log_path = os.path.join(cls.work_dir, 'sonoma_no_laps.log')
+        timing_channels = ['LapCount', 'LapTime', 'PredTime', 'ElapsedTime', 'CurrentLap']
+        with open(sonoma_log_path) as log, open(cls.log_path, 'w') as stripped:
+            header = log.readline().rstrip('\n').split(',')
+            keep = [index for index, channel in enumerate(header)
+                    if channel.split('|')[0].strip('"') not in timing_channels]
+            for line in [','.join(header)] + list(log):
+                values = line.rstrip('\n').split(',')
+                stripped.write(','.join(values[index] for index in keep) + '\n')
+
+        cls.track = TrackMap()
+        cls.track.name = 'Sonoma'
+        cls.track.start_finish_point = GeoPoint.fromPoint(38.161633, -122.454758)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.work_dir)
+
+    def _open(self, store_class, name, **kwargs):
+        ds = store_class(**kwargs)
+        ds.open_db(os.path.join(self.work_dir, name))
+        return ds
+
+    def test_import(self):
+        recorded = self._open(DataStore, 'recorded.sql3')
+        recorded_laps = recorded.get_laps(recorded.import_datalog(sonoma_log_path, 'recorded'))
+        recorded.close()
+
+        for store_class in (DataStore, ColumnarDataStore):
+            ds = self._open(store_class, '{}.sql3'.format(store_class.__name__),
+                            track_manager=TrackManagerStub(self.track))
+            session_id = ds.import_datalog(self.log_path, 'imported')
+            laps = ds.get_laps(session_id)
+            self.assertListEqual(recorded_laps.keys(), laps.keys())
+            for lap in recorded_laps.keys()[:-1]:
+                # the firmware times the lap from its own gate
+                self.assertAlmostEqual(recorded_laps[lap].lap_time, laps[lap].lap_time, delta=0.005)
+
+            lap_records = ds.query([session_id], ['Interval', 'LapCount'], Filter().eq('CurrentLap', 3)).fetch_records()
+            self.assertTrue(len(lap_records) > 0)
+            self.assertTrue(all(record[2] == 2 for record in lap_records))
+            ds.close()
+
+    def test_batch_import(self):
+        ds = self._open(DataStore, 'batch.sql3', track_manager=TrackManagerStub(self.track))
+        datalog = ds.import_datalogs([DatalogImport(self.log_path, 'imported')], worker_count=1)[0]
+        self.assertTrue(datalog.success)
+        self.assertEqual(8, len(ds.get_laps(datalog.session_id)))
+        ds.close()
+
+    def test_no_track(self):
+        ds = self._open(DataStore, 'no_track.sql3', track_manager=TrackManagerStub(TrackMap()))
+        session_id = ds.import_datalog(self.log_path, 'imported')
+        self.assertListEqual([1], ds.get_laps(session_id).keys())
+        self.assertFalse(ds.channel_exists('CurrentLap'))
+        ds.close()
+
+    def test_recorded_laps_kept(self):
+        track_manager = TrackManagerStub(self.track)
+        ds = self._open(DataStore, 'kept.sql3', track_manager=track_manager)
+        ds.import_datalog(sonoma_log_path, 'recorded')
+        self.assertEqual(0, track_manager.searches)
+        ds.close()
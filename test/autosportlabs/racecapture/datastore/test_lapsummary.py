@@ -0,0 +1,209 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import os.path
+from autosportlabs.racecapture.datastore.datastore import DataStore, Filter
+from autosportlabs.racecapture.datastore.columnstore import ColumnarDataStore
+from autosportlabs.racecapture.datastore.lapsummary import ChannelSummary, summarize_columns
+
+fqp = os.path.dirname(os.path.realpath(__file__))
+row_db_path = os.path.join(fqp, 'rctest_laps_row.sql3')
+column_db_path = os.path.join(fqp, 'rctest_laps_column.sql3')
+sonoma_log_path = os.path.join(fqp, 'sonoma.log')
+rc_adj_log_path = os.path.join(fqp, 'rc_adj.log')
+
+
+def summary_rows(laps):
+    return [(lap.lap_count, lap.current_lap, lap.lap_time, lap.start_sample_id, lap.end_sample_id, lap.sample_count,
+             sorted((channel, stats.min_value, stats.max_value, stats.value_count)
+                    for channel, stats in lap.channels.iteritems()))
+            for lap in laps]
+
+
+class SummarizeColumnsTest(unittest.TestCase):
+
+    def test_summarize_columns(self):
+        laps = summarize_columns(10, [None, 0, 0, 1, 0], [None, 1, 1, 2, 1], [None, 0, 0, 1.5, 0],
+                                 {'RPM': [0, 1000, None, 3000, 2000]})
+        self.assertListEqual([None, 0, 1], [lap.lap_count for lap in laps])
+        lap = laps[1]
+        self.assertEqual((11, 14, 3), (lap.start_sample_id, lap.end_sample_id, lap.sample_count))
+        self.assertEqual((1000, 2000), (lap.channels['RPM'].min_value, lap.channels['RPM'].max_value))
+        self.assertEqual(1500, lap.channels['RPM'].average)
+        # zero is left out of the min / max, not the average
+        self.assertEqual((None, None, 0), (laps[0].channels['RPM'].min_value, laps[0].channels['RPM'].max_value,
+                                          laps[0].channels['RPM'].average))
+
+        summary = ChannelSummary(1, 5, 6, 2)
+        summary.merge(ChannelSummary(0.5, 2, 2.5, 2))
+        self.assertEqual((0.5, 5, 8.5, 4), (summary.min_value, summary.max_value, summary.sum_value,
+                                            summary.value_count))
+
+
+class LapSummaryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stores = []
+        for store_class, path in [(DataStore, row_db_path), (ColumnarDataStore, column_db_path)]:
+            if os.path.exists(path):
+                os.remove(path)
+            ds = store_class()
+            ds.open_db(path)
+            ds.import_datalog(sonoma_log_path, 'sonoma')
+            ds.import_datalog(rc_adj_log_path, 'rc_adj')
+            cls.stores.append(ds)
+
+    @classmethod
+    def tearDownClass(cls):
+        for ds in cls.stores:
+            ds.close()
+        os.remove(row_db_path)
+        os.remove(column_db_path)
+
+    def _scanned(self, ds, session_ids, fetch):
+        # the same request answered by scanning the samples
+        for session_id in session_ids:
+            ds._delete_lap_summary(session_id)
+        try:
+            return fetch()
+        finally:
+            for session_id in session_ids:
+                ds._update_lap_summary(session_id)
+            ds.commit()
+
+    def test_laps(self):
+        for ds in self.stores:
+            for session_id in (1, 2):
+                self.assertIsNotNone(ds.get_lap_summary(session_id))
+                expected = self._scanned(ds, [session_id], lambda: ds.get_laps(session_id))
+                laps = ds.get_laps(session_id)
+                self.assertListEqual(expected.keys(), laps.keys())
+                self.assertListEqual([lap.lap_time for lap in expected.values()],
+                                     [lap.lap_time for lap in laps.values()])
+                self.assertEqual(self._scanned(ds, [session_id], lambda: ds.session_has_laps(session_id)),
+                                 ds.session_has_laps(session_id))
+            self.assertTrue(ds.session_has_laps(1))
+            self.assertTrue(len(ds.get_laps(1)) > 2)
+
+    def test_channel_aggregates(self):
+        for ds in self.stores:
+            for sessions in ([1], [2], None):
+                for channel in ('RPM', 'Speed', 'LapTime'):
+                    expected = self._scanned(ds, [1, 2], lambda: ds.get_channel_max(channel, sessions))
+                    self.assertEqual(expected, ds.get_channel_max(channel, sessions))
+                    expected = self._scanned(ds, [1, 2], lambda: ds.get_channel_min(channel, sessions, ['LapCount']))
+                    self.assertEqual(expected, ds.get_channel_min(channel, sessions, ['LapCount']))
+
+    def test_lap_query(self):
+        ds = self.stores[0]
+        lap_count = ds.get_lap_summary(1)[3].lap_count
+        self.assertTrue(len(ds._filter_sample_ranges([1], Filter().eq('LapCount', lap_count))) > 0)
+        self.assertTrue(len(ds._filter_sample_ranges([1], Filter().eq('CurrentLap', 2))) > 0)
+        self.assertIsNone(ds._filter_sample_ranges([1, 99], Filter().eq('LapCount', lap_count)))
+        # the whole session when the filter does not select laps
+        self.assertEqual(1, len(ds._query_sample_ranges([1], Filter().neq('CurrentLap', 2))))
+        for data_filter in (Filter().eq('LapCount', lap_count),
+                            Filter().neq('Latitude', 0).and_().eq('LapCount', lap_count),
+                            Filter().eq('LapCount', 999),
+                            Filter().eq('CurrentLap', 3),
+                            Filter().eq('CurrentLap', 2).or_().eq('CurrentLap', 4),
+                            Filter().neq('Latitude', 0).and_().neq('Longitude', 0).eq('CurrentLap', 3),
+                            Filter().neq('Speed', 0).or_().eq('CurrentLap', 3),
+                            None):
+            for sessions in ([1], [1, 2]):
+                fetch = lambda: ds.query(sessions, ['Interval', 'Speed'], data_filter).fetch_records()
+                self.assertListEqual(self._scanned(ds, [1, 2], fetch), fetch())
+
+    def test_recorded_laps(self):
+        for ds in self.stores:
+            session_id = ds.create_session('recorded')
+            # laps summarized as they are recorded, across commits part way through laps
+            for index in range(1000):
+                lap_count = index / 150
+                ds.insert_sample_nocommit({'Interval': index * 10, 'LapCount': lap_count, 'CurrentLap': lap_count + 1,
+                                           'LapTime': 1.5 * lap_count, 'RPM': 5000 + index % 300}, session_id)
+                if index % 37 == 0:
+                    ds.commit()
+            ds.commit()
+
+            recorded = summary_rows(ds.get_lap_summary(session_id))
+            self.assertEqual(7, len(recorded))
+            self.assertEqual(1000, sum(lap[5] for lap in recorded))
+            ds.rebuild_lap_summaries()
+            self.assertListEqual(summary_rows(ds.get_lap_summary(session_id)), recorded)
+            self.assertEqual(5000, ds.get_channel_min('RPM', [session_id]))
+            ds.delete_session(session_id)
+            self.assertIsNone(ds.get_lap_summary(session_id))
+
+    def test_unsummarized_until_committed(self):
+        for ds in self.stores:
+            session_id = ds.create_session('live')
+            ds.insert_sample_nocommit({'Interval': 10, 'LapCount': 0, 'CurrentLap': 1, 'RPM': 5000}, session_id)
+            update_lap_summaries = ds._update_lap_summaries
+            uncommitted = []
+
+            def record_uncommitted():
+                summarized = update_lap_summaries()
+                uncommitted.append(set(ds._unsummarized_sessions))
+                return summarized
+
+            ds._update_lap_summaries = record_uncommitted
+            try:
+                ds.commit()
+            finally:
+                del ds._update_lap_summaries
+            # readers keep scanning the session until its summary is committed
+            self.assertListEqual([set([session_id])], uncommitted)
+            self.assertEqual(set(), ds._unsummarized_sessions)
+            ds.delete_session(session_id)
+
+    def test_summarized_once(self):
+        for store_class, path in [(DataStore, row_db_path), (ColumnarDataStore, column_db_path)]:
+            ds = store_class()
+            ds.open_db(path)
+            try:
+                empty_session_id = ds.create_session('empty')
+                ds.commit()
+                # as left by a version before the lap ranges and channel statistics were kept
+                ds.connection.execute('UPDATE lap_summary SET summary_version = 0 WHERE session_id = 1')
+                ds.connection.execute('DELETE FROM lap_range WHERE session_id = 1')
+                ds.connection.commit()
+
+                summarized = []
+                update_lap_summary = ds._update_lap_summary
+
+                def record_summary(session_id):
+                    summarized.append(session_id)
+                    update_lap_summary(session_id)
+
+                ds._update_lap_summary = record_summary
+                ds.open_db(path)
+                self.assertListEqual([1, empty_session_id], summarized)
+                self.assertNotEqual(0, ds.connection.execute(
+                    'SELECT COUNT(*) FROM lap_range WHERE session_id = 1').fetchone()[0])
+                # sessions without samples are not summarized again
+                ds.open_db(path)
+                self.assertListEqual([1, empty_session_id], summarized)
+                ds.delete_session(empty_session_id)
+            finally:
+                ds.close()
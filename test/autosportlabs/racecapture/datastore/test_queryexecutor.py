@@ -0,0 +1,100 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+import unittest
+import unittest
+from threading import Event
+from autosportlabs.racecapture.datastore.queryexecutor import QueryExecutor
+
+WAIT_TIMEOUT = 5
+
+
+class QueryExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queried = []
+        self.completed = []
+        self.done = Event()
+        self.gate = Event()
+        self.executor = QueryExecutor(lambda: 'reader', worker_count=1)
+        # occupy the single worker until the gate opens, so queued
+        # requests can be arranged before any run
+        self.executor.submit(['gate'], lambda reader, keys: self.gate.wait(WAIT_TIMEOUT) and {}, lambda request: None)
+
+    def tearDown(self):
+        self.gate.set()
+        self.executor.stop()
+
+    def _query(self, reader, keys):
+        self.queried.append(keys)
+        return dict((key, key.upper()) for key in keys)
+
+    def _complete(self, request):
+        self.completed.append(request)
+        if len(self.completed) == self.expected:
+            self.done.set()
+
+    def _run(self, expected):
+        self.expected = expected
+        self.gate.set()
+        self.assertTrue(self.done.wait(WAIT_TIMEOUT))
+
+    def test_priority(self):
+        self.executor.submit(['a'], self._query, self._complete, priority=1)
+        self.executor.submit(['b'], self._query, self._complete, priority=3)
+        self.executor.submit(['c'], self._query, self._complete, priority=2)
+        self._run(3)
+        self.assertListEqual(self.queried, [['b'], ['c'], ['a']])
+        self.assertDictEqual(self.completed[0].results, {'b': 'B'})
+
+    def test_deduplicates_keys(self):
+        first = self.executor.submit(['a', 'b'], self._query, self._complete)
+        second = self.executor.submit(['b', 'c'], self._query, self._complete)
+        self._run(2)
+        self.assertListEqual(sorted(self.queried), [['a', 'b'], ['c']])
+        self.assertDictEqual(first.results, {'a': 'A', 'b': 'B'})
+        self.assertDictEqual(second.results, {'b': 'B', 'c': 'C'})
+
+    def test_dedup_raises_priority(self):
+        self.executor.submit(['a'], self._query, self._complete, priority=1)
+        self.executor.submit(['b'], self._query, self._complete, priority=2)
+        self.executor.submit(['a'], self._query, self._complete, priority=3)
+        self._run(3)
+        self.assertListEqual(self.queried, [['a'], ['b']])
+
+    def test_cancel(self):
+        cancelled = self.executor.submit(['a'], self._query, self._complete)
+        shared = self.executor.submit(['b'], self._query, self._complete)
+        self.executor.submit(['b'], self._query, self._complete)
+        self.executor.submit(['c'], self._query, self._complete)
+        cancelled.cancel()
+        shared.cancel()
+        self._run(2)
+        self.assertListEqual(sorted(self.queried), [['b'], ['c']])
+        self.assertTrue(cancelled.cancelled)
+        self.assertNotIn(cancelled, self.completed)
+        self.assertNotIn(shared, self.completed)
+
+    def test_error(self):
+        def query(reader, keys):
+            raise ValueError('failed')
+        request = self.executor.submit(['a'], query, self._complete)
+        self._run(1)
+        self.assertIsInstance(request.error, ValueError)
+        self.assertDictEqual(request.results, {})
@@ -0,0 +1,55 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import random
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
+from autosportlabs.racecapture.geo.geoindex import GeoGridIndex
+
+
+class GeoGridIndexTest(unittest.TestCase):
+
+    def test_within_circle_matches_scan(self):
+        random.seed(1)
+        points = {}
+        index = GeoGridIndex(cell_size=0.5)
+        for key in range(2000):
+            point = GeoPoint.fromPoint(random.uniform(-60, 60), random.uniform(-180, 180))
+            points[key] = point
+            index.put(key, point)
+        self.assertEqual(2000, len(index))
+
+        for radius in (0.1, 1.0, 7.5, 500.0, float('inf')):
+            for i in range(20):
+                center = GeoPoint.fromPoint(random.uniform(-60, 60), random.uniform(-180, 180))
+                expected = set(k for k, p in points.iteritems() if p.withinCircle(center, radius))
+                found = set(k for k, p in index.within_circle(center, radius))
+                self.assertSetEqual(expected, found)
+
+    def test_put_remove(self):
+        index = GeoGridIndex()
+        index.put('a', GeoPoint.fromPoint(47.25, -123.1))
+        index.put('a', GeoPoint.fromPoint(-33.9, 151.2))
+        self.assertListEqual([], list(index.within_circle(GeoPoint.fromPoint(47.25, -123.1), 1)))
+        self.assertListEqual(['a'], [k for k, p in index.within_circle(GeoPoint.fromPoint(-33.9, 151.2), 1)])
+        index.remove('a')
+        index.remove('a')
+        self.assertEqual(0, len(index))
+        self.assertListEqual([], list(index.within_box(-90, -180, 90, 180)))
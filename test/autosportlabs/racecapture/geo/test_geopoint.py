@@ -0,0 +1,42 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from autosportlabs.racecapture.geo.geopoint import GeoPointSeries
+
+
+class GeoPointSeriesTest(unittest.TestCase):
+
+    def test_from_samples(self):
+        latitudes = [0, 38.1, None, 38.2, 38.3, 0]
+        longitudes = [0, -122.1, None, 0, -122.3, -122.4]
+        series = GeoPointSeries.fromSamples(latitudes, longitudes)
+        # samples without a fix are left off the path
+        self.assertListEqual([(38.1, -122.1), (38.3, -122.3)],
+                             [(point.latitude, point.longitude) for point in series])
+        # every sample stays aligned with the latest fix
+        self.assertListEqual([38.1, 38.1, 38.1, 38.1, 38.3, 38.3, 38.3],
+                             [series.point_at_sample(index).latitude for index in range(7)])
+
+    def test_point_at_sample(self):
+        series = GeoPointSeries([1.0, 2.0], [3.0, 4.0])
+        self.assertEqual(2.0, series.point_at_sample(1).latitude)
+        self.assertEqual(2.0, series.point_at_sample(5).latitude)
+        self.assertIsNone(GeoPointSeries.fromSamples([0], [0]).point_at_sample(0))
@@ -18,7 +18,11 @@
 # have received a copy of the GNU General Public License along with
 # this code. If not, see <http://www.gnu.org/licenses/>.
 import unittest
-from autosportlabs.racecapture.tracks.trackmanager import TrackMap
+import os
+import shutil
+import tempfile
+from autosportlabs.racecapture.tracks.trackmanager import TrackMap, TrackManager
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
 from autosportlabs.util.timeutil import time_to_epoch
 
 class TrackMapTest(unittest.TestCase):
@@ -33,6 +37,78 @@ class TrackMapTest(unittest.TestCase):
         self.assertTrue(len(tm.map_points) == 0)
         self.assertTrue(len(tm.sector_points) == 0)
 
+
+class TrackManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.user_dir = tempfile.mkdtemp()
+        base_dir = os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')
+        self.track_manager = TrackManager(user_dir=self.user_dir, base_dir=base_dir)
+        self.track_manager.load_regions()
+
+    def tearDown(self):
+        shutil.rmtree(self.user_dir)
+
+    def _add_track(self, name, latitude, longitude, created):
+        track = TrackMap.create_new()
+        track.name = name
+        track.created = created
+        track.map_points.append(GeoPoint.fromPoint(latitude, longitude))
+        self.track_manager.add_track(track)
+        return track
+
+    def test_find_tracks(self):
+        tm = self.track_manager
+        laguna = self._add_track('Laguna Seca', 36.584, -121.753, '2015-01-01T00:00:00')
+        laguna2 = self._add_track('Laguna Seca short', 36.585, -121.752, '2016-01-01T00:00:00')
+        sebring = self._add_track('Sebring', 27.450, -81.348, '2015-06-01T00:00:00')
+
+        # most recent first
+        self.assertListEqual([laguna2, laguna], tm.find_nearby_tracks(GeoPoint.fromPoint(36.58, -121.75)))
+        self.assertListEqual([], tm.find_nearby_tracks(GeoPoint.fromPoint(37.58, -121.75)))
+        self.assertIs(sebring, tm.find_track_by_short_id(sebring.short_id))
+        self.assertIsNone(tm.find_track_by_short_id(1))
+
+        self.assertListEqual([laguna.track_id, laguna2.track_id], tm.filter_tracks_by_region('USA West'))
+        self.assertListEqual([laguna.track_id, laguna2.track_id, sebring.track_id], tm.filter_tracks_by_region('All'))
+
+        # replacing a track re-indexes it
+        moved = TrackMap()
+        moved.from_dict(laguna.to_dict())
+        moved.map_points[0] = GeoPoint.fromPoint(27.451, -81.349)
+        moved.created = '2014-01-01T00:00:00'
+        tm.add_track(moved)
+        self.assertListEqual([sebring, moved], tm.find_nearby_tracks(GeoPoint.fromPoint(27.45, -81.35)))
+        self.assertIsNone(tm.find_track_by_short_id(laguna.short_id))
+        self.assertIs(moved, tm.find_track_by_short_id(moved.short_id))
+        self.assertListEqual([laguna2.track_id], tm.filter_tracks_by_region('USA West'))
+
+        # reloading from the saved files rebuilds the indexes
+        tm.load_tracks()
+        self.assertEqual(3, len(tm.tracks))
+        self.assertEqual(sebring.track_id, tm.find_track_by_short_id(sebring.short_id).track_id)
+        self.assertListEqual([laguna2.track_id], tm.filter_tracks_by_region('USA West'))
+    def test_track_cache(self):
+        tm = self.track_manager
+        laguna = self._add_track('Laguna Seca', 36.584, -121.753, '2015-01-01T00:00:00')
+        laguna.map_points.append(GeoPoint.fromPoint(36.585, -121.754))
+        laguna.sector_points.append(GeoPoint.fromPoint(36.586, -121.755))
+        tm.add_track(laguna)
+        self._add_track('Sebring', 27.450, -81.348, '2015-06-01T00:00:00')
+
+        tm.load_tracks()
+        tm.load_tracks()
+        track = tm.get_track_by_id(laguna.track_id)
+        # loaded from the summary; the points are read when first used
+        self.assertIsNotNone(track._load_details)
+        self.assertEqual('Laguna Seca', track.name)
+        self.assertEqual(laguna.short_id, track.short_id)
+        self.assertEqual(str(laguna.centerpoint), str(track.centerpoint))
+        self.assertIs(track, tm.find_nearby_tracks(GeoPoint.fromPoint(36.58, -121.75))[0])
+        self.assertIsNotNone(track._load_details)
+        self.assertEqual(laguna.to_dict(), track.to_dict())
+        self.assertIsNone(track._load_details)
+
 def main():
     unittest.main()
 
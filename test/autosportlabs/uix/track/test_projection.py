@@ -0,0 +1,111 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import random
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
+from autosportlabs.uix.track import projection
+from autosportlabs.uix.track.projection import ProjectedPath, MapTransform, project_point, union_bounds, heat_segments
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(2)
+        self.geo_points = [GeoPoint.fromPoint(random.uniform(45.0, 45.02), random.uniform(-122.03, -122.0))
+                           for i in range(200)]
+        self.numpy = projection.np
+
+    def tearDown(self):
+        projection.np = self.numpy
+
+    def _check_path(self):
+        path = ProjectedPath(self.geo_points)
+        self.assertEqual(len(self.geo_points), len(path))
+        for i, geo_point in enumerate(self.geo_points):
+            x, y = project_point(geo_point.latitude, geo_point.longitude)
+            self.assertAlmostEqual(x, path.x[i])
+            self.assertAlmostEqual(y, path.y[i])
+
+        # the path fits the box, touching both sides of the constraining axis
+        transform = MapTransform(path.bounds, (10, 20), (400, 300), padding=1)
+        points = transform.apply(path)
+        self.assertEqual(len(path) * 2, len(points))
+        xs = points[0::2]
+        ys = points[1::2]
+        self.assertAlmostEqual(21, min(ys))
+        self.assertAlmostEqual(319, max(ys))
+        self.assertAlmostEqual(210, (min(xs) + max(xs)) / 2.0)
+        self.assertTrue(min(xs) >= 11 and max(xs) <= 409)
+        self.assertEqual(transform.apply_point(path.x[7], path.y[7]), (points[14], points[15]))
+
+    def test_projected_path(self):
+        self._check_path()
+
+    def test_projected_path_without_numpy(self):
+        projection.np = None
+        self._check_path()
+
+    def test_empty(self):
+        path = ProjectedPath([])
+        self.assertEqual(0, len(path))
+        self.assertIsNone(path.bounds)
+        self.assertIsNone(union_bounds([path.bounds]))
+        self.assertListEqual([], MapTransform(None, (0, 0), (100, 100)).apply(path))
+
+    def test_union_bounds(self):
+        self.assertEqual((0, -1, 5, 3), union_bounds([(0, 0, 1, 3), None, (2, -1, 5, 1)]))
+
+    def _check_heat_segments(self):
+        self.assertListEqual([(0, 2, 0), (1, 4, 50), (3, 5, 100)],
+                             heat_segments([0, 0.1, 50, 50.5, 100, 100], 5, 0, 100))
+        # missing values are 0%, and a range of 0 makes everything 0%
+        self.assertListEqual([(0, 2, 50), (1, 3, 0)], heat_segments([50, 50, None], 10, 0, 100))
+        self.assertListEqual([(0, 3, 0)], heat_segments([1, 2, 3], 3, 5, 5))
+        self.assertListEqual([], heat_segments([], 3, 0, 100))
+
+    def test_heat_segments(self):
+        self._check_heat_segments()
+
+    def test_heat_segments_without_numpy(self):
+        projection.np = None
+        self._check_heat_segments()
+
+    def test_detail_levels(self):
+        path = ProjectedPath(self.geo_points)
+        extent = max(path.bounds[2] - path.bounds[0], path.bounds[3] - path.bounds[1])
+        self.assertIsNone(path.detail_level(0))
+        self.assertEqual(0, path.detail_level(extent * 2))
+        self.assertEqual(3, path.detail_level(extent / 7.0))
+        self.assertIsNone(path.detail_level(extent / 2 ** 30))
+        self.assertListEqual(range(len(path)), path.detail_indexes(None))
+
+        # coarser levels keep fewer points, always including the ends
+        counts = []
+        for level in range(0, 12, 2):
+            indexes = path.detail_indexes(level)
+            self.assertEqual(0, indexes[0])
+            self.assertEqual(len(path) - 1, indexes[-1])
+            counts.append(len(indexes))
+        self.assertListEqual(sorted(counts), counts)
+        self.assertTrue(counts[0] < len(path))
+        # only the points asked for are transformed
+        transform = MapTransform(path.bounds, (0, 0), (100, 100))
+        self.assertEqual(transform.apply(path)[10:12], transform.apply(path, [0, 5, 9])[2:4])
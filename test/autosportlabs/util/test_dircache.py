@@ -0,0 +1,88 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import shutil
+import tempfile
+from autosportlabs.util.dircache import DirectoryCache
+
+
+class DirectoryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in ('a.json', 'b.json', 'notes.txt'):
+            self._write(name, name)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(content)
+
+    def _load(self, version=1):
+        cache = DirectoryCache(self.directory, version)
+        summaries = {}
+        for name in cache.list_files('.json'):
+            summary = cache.get(name)
+            if summary is None:
+                summary = {'name': name, 'size': os.path.getsize(os.path.join(self.directory, name))}
+                cache.put(name, summary)
+            summaries[name] = summary
+        cache.save()
+        return cache, summaries
+
+    def test_cache(self):
+        cache, summaries = self._load()
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+        self.assertEqual({'name': 'a.json', 'size': 6}, summaries['a.json'])
+
+        cache, summaries = self._load()
+        self.assertEqual((2, 0), (cache.hits, cache.misses))
+        self.assertEqual({'name': 'a.json', 'size': 6}, summaries['a.json'])
+        self.assertListEqual(['a.json', 'b.json', 'notes.txt'], sorted(cache.list_files()))
+
+    def test_changed_files(self):
+        self._load()
+        self._write('a.json', 'changed')
+        os.remove(os.path.join(self.directory, 'b.json'))
+        self._write('c.json', 'c')
+        cache, summaries = self._load()
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+        self.assertEqual(7, summaries['a.json']['size'])
+
+        cache, summaries = self._load()
+        self.assertEqual((2, 0), (cache.hits, cache.misses))
+        self.assertListEqual(['a.json', 'c.json'], sorted(summaries.keys()))
+
+    def test_version_change(self):
+        self._load()
+        cache, summaries = self._load(version=2)
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+
+    def test_corrupt_cache(self):
+        self._load()
+        self._write(DirectoryCache.CACHE_FILE_NAME, 'RCDC garbage')
+        cache, summaries = self._load()
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+        cache, summaries = self._load()
+        self.assertEqual((2, 0), (cache.hits, cache.misses))
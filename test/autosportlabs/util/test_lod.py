@@ -0,0 +1,159 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import math
+import bisect
+import random
+from autosportlabs.util import lod
+from autosportlabs.util.lod import minmax_decimate, path_importance, SeriesLOD, SeriesXIndex
+
+
+def douglas_peucker(xs, ys, first, last, tolerance, keep):
+    """
+    Textbook recursive Douglas-Peucker, for reference
+    """
+    keep.add(first)
+    keep.add(last)
+    if last - first < 2:
+        return
+    dx = xs[last] - xs[first]
+    dy = ys[last] - ys[first]
+    length = math.hypot(dx, dy)
+    distance = -1
+    farthest = first + 1
+    for i in range(first + 1, last):
+        if length > 0:
+            d = abs(dy * (xs[i] - xs[first]) - dx * (ys[i] - ys[first])) / length
+        else:
+            d = math.hypot(xs[i] - xs[first], ys[i] - ys[first])
+        if d > distance:
+            distance = d
+            farthest = i
+    if distance > tolerance:
+        douglas_peucker(xs, ys, first, farthest, tolerance, keep)
+        douglas_peucker(xs, ys, farthest, last, tolerance, keep)
+
+
+class LODTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(3)
+        self.numpy = lod.np
+
+    def tearDown(self):
+        lod.np = self.numpy
+
+    def _check_minmax_decimate(self):
+        ys = [math.sin(i / 50.0) + random.gauss(0, 0.01) for i in range(1003)]
+        ys[517] = 10.0
+        ys[800] = -10.0
+        keep = minmax_decimate(ys, 8)
+        self.assertEqual(keep, sorted(set(keep)))
+        self.assertIn(0, keep)
+        self.assertIn(1002, keep)
+        self.assertIn(517, keep)
+        self.assertIn(800, keep)
+        self.assertTrue(len(keep) <= 2 * (1003 // 8 + 1) + 2)
+        # every bucket's extremes are kept
+        for start in range(0, 1003, 8):
+            bucket = ys[start:start + 8]
+            self.assertIn(start + bucket.index(max(bucket)), keep)
+            self.assertIn(start + bucket.index(min(bucket)), keep)
+        return keep
+
+    def test_minmax_decimate(self):
+        with_numpy = self._check_minmax_decimate()
+        lod.np = None
+        random.seed(3)
+        self.assertListEqual(with_numpy, self._check_minmax_decimate())
+
+    def _check_path_importance(self):
+        xs = []
+        ys = []
+        for i in range(400):
+            angle = 2 * math.pi * i / 399
+            xs.append(math.cos(angle) * (1 + 0.05 * math.sin(angle * 9)) + random.gauss(0, 0.001))
+            ys.append(math.sin(angle) * 1.5 + random.gauss(0, 0.001))
+        importance = path_importance(xs, ys)
+        for tolerance in (0.5, 0.1, 0.01, 0.001, 0.0001):
+            expected = set()
+            douglas_peucker(xs, ys, 0, len(xs) - 1, tolerance, expected)
+            kept = set(i for i, value in enumerate(importance) if value > tolerance)
+            self.assertSetEqual(expected, kept)
+
+    def test_path_importance(self):
+        self._check_path_importance()
+
+    def test_path_importance_without_numpy(self):
+        lod.np = None
+        self._check_path_importance()
+
+    def test_series_lod(self):
+        count = 20000
+        xs = [i * 0.1 for i in range(count)]
+        ys = [math.sin(i / 300.0) for i in range(count)]
+        ys[12345] = 5.0
+        series = SeriesLOD(xs, ys, range(100, 100 + count))
+        self.assertEqual(count, len(series))
+        self.assertTrue(len(series.levels) > 2)
+        for level_xs, level_ys, level_indexes in series.levels:
+            # every level keeps the peak and both ends
+            self.assertIn(5.0, level_ys)
+            self.assertEqual(0, level_xs[0])
+            self.assertEqual(xs[-1], level_xs[-1])
+            self.assertEqual(100, level_indexes[0])
+        self.assertTrue(series.size > 0)
+
+        # the whole series on a narrow chart uses a coarse level
+        full = series.get_points(0, xs[-1], 200)
+        self.assertTrue(200 <= len(full) < 400)
+        # zoomed in, the finest level, clipped to the visible range plus one point each side
+        zoomed = series.get_points(1000, 1010, 200)
+        self.assertListEqual([(x, y) for x, y in zip(xs, ys) if 999.9 <= x <= 1010.1], zoomed)
+
+        xs, ys, indexes = series.get_level(1000)
+        self.assertTrue(len(xs) >= 1000)
+        self.assertEqual(xs[7], (indexes[7] - 100) * 0.1)
+
+    def test_series_lod_small(self):
+        series = SeriesLOD([], [])
+        self.assertEqual(0, len(series))
+        self.assertListEqual([], series.get_points(0, 100, 500))
+        series = SeriesLOD([3, 1, 2], [4, 5, 6])
+        self.assertEqual(1, len(series.levels))
+        # x values that are not increasing are drawn in full
+        self.assertListEqual([(3, 4), (1, 5), (2, 6)], series.get_points(1.5, 2.5, 500))
+
+    def test_series_x_index(self):
+        xs = [0, 10, 10, 25, 40]
+        index = SeriesXIndex(xs, [5, 6, 7, 8, 9])
+        self.assertEqual(40, index.max_x)
+        self.assertTrue(index.size > 0)
+        # the first sample past x, the same as bisecting the x values
+        for x in (-1, 0, 5, 10, 24.9, 39):
+            self.assertEqual(5 + bisect.bisect_right(xs, x), index.sample_index(x))
+        self.assertIsNone(index.sample_index(40))
+
+        # x values that are not increasing are sorted
+        index = SeriesXIndex([3, 1, 2])
+        self.assertEqual(1, index.sample_index(0))
+        self.assertEqual(0, index.sample_index(2.5))
+        self.assertIsNone(SeriesXIndex([]).max_x)
@@ -0,0 +1,79 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+import unittest
+import unittest
+from autosportlabs.util.lrucache import LRUCache
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = LRUCache(100)
+        cache.put('a', 1, 10)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('b', 2), 2)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.current_bytes, 10)
+
+        # replacing a value replaces its size
+        cache.put('a', 3, 20)
+        self.assertEqual(cache.get('a'), 3)
+        self.assertEqual(cache.current_bytes, 20)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(30)
+        cache.put('a', 1, 10)
+        cache.put('b', 2, 10)
+        cache.put('c', 3, 10)
+        cache.get('a')
+        cache.put('d', 4, 10)
+
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertIn('c', cache)
+        self.assertIn('d', cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.current_bytes, 30)
+
+        cache.put('e', 5, 25)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 4)
+
+    def test_oversized_value_not_cached(self):
+        cache = LRUCache(30)
+        cache.put('a', 1, 10)
+        cache.put('b', 2, 31)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+
+    def test_invalidate_group(self):
+        cache = LRUCache(100)
+        cache.put('a', 1, 10, group=1)
+        cache.put('b', 2, 10, group=2)
+        cache.put('c', 3, 10, group=1)
+        cache.invalidate(1)
+        self.assertEqual(len(cache), 1)
+        self.assertIn('b', cache)
+        self.assertEqual(cache.current_bytes, 10)
+
+        cache.clear()
+        self.assertEqual(cache.stats['entries'], 0)
+        self.assertEqual(cache.stats['bytes'], 0)
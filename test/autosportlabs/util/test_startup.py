@@ -0,0 +1,98 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from autosportlabs.util.startup import StartupProfiler, StagedStartup
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class StartupProfilerTest(unittest.TestCase):
+
+    def test_phases(self):
+        clock = FakeClock()
+        profiler = StartupProfiler(enabled=True, clock=clock)
+        with profiler.phase('import'):
+            clock.now += 0.5
+        clock.now += 0.25
+        profiler.mark('built')
+        phases = profiler.phases
+        self.assertListEqual(['import', 'built'], [phase.name for phase in phases])
+        self.assertEqual((0, 0.5), (phases[0].start, phases[0].duration))
+        self.assertEqual((0.75, 0), (phases[1].start, phases[1].duration))
+
+    def test_disabled(self):
+        profiler = StartupProfiler()
+        with profiler.phase('import'):
+            pass
+        profiler.mark('built')
+        self.assertListEqual([], profiler.phases)
+
+    def test_requested(self):
+        self.assertTrue(StartupProfiler.requested({StartupProfiler.ENV_VAR: '1'}, flag_file='does_not_exist'))
+        self.assertFalse(StartupProfiler.requested({}, flag_file='does_not_exist'))
+
+
+class StagedStartupTest(unittest.TestCase):
+
+    def _run(self, startup):
+        # run each scheduled callback in turn, as the clock would one per frame
+        scheduled = []
+        startup._schedule = lambda callback, delay: scheduled.append(callback)
+        startup.start()
+        frames = 0
+        while scheduled:
+            try:
+                scheduled.pop(0)(0)
+            except ValueError:
+                pass
+            frames += 1
+        return frames
+
+    def test_priority_order(self):
+        ran = []
+        startup = StagedStartup(schedule=lambda callback, delay: None)
+        startup.add_task(2, 'data', lambda: ran.append('data'))
+        startup.add_task(0, 'comms', lambda: ran.append('comms'))
+        startup.add_task(1, 'view', lambda: ran.append('view'))
+        startup.add_task(0, 'toolbar', lambda: ran.append('toolbar'))
+        frames = self._run(startup)
+        self.assertListEqual(['comms', 'toolbar', 'view', 'data'], ran)
+        # one frame per task, then the completion
+        self.assertEqual(5, frames)
+
+    def test_failed_task(self):
+        ran = []
+
+        def fail():
+            raise ValueError()
+
+        startup = StagedStartup(schedule=lambda callback, delay: None)
+        startup.add_task(0, 'fail', fail)
+        startup.add_task(1, 'data', lambda: ran.append('data'))
+        self._run(startup)
+        self.assertListEqual(['data'], ran)
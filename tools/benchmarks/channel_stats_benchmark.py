@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the channel min / max / average and location center queries on
+a database of several sessions: scanning the samples against answering
+from the per session channel statistics, along with the time the
+statistics add to each import.
+
+Usage: python tools/benchmarks/channel_stats_benchmark.py [sessions] [samples per session]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.datastore.datastore import DataStore
+from autosportlabs.racecapture.datastore.columnstore import ColumnarDataStore
+
+CHANNELS = ['Interval', 'Utc', 'LapCount', 'CurrentLap', 'LapTime', 'Latitude', 'Longitude', 'Speed', 'RPM', 'TPS',
+            'Coolant', 'OilPress', 'AccelX', 'AccelY', 'AccelZ', 'Yaw']
+
+
+def write_log(path, samples):
+    with open(path, 'w') as log:
+        log.write(','.join('"{}"|""|0|1000|50'.format(name) for name in CHANNELS) + '\n')
+        for sample in xrange(samples):
+            interval = sample * 20
+            lap = sample / 5000
+            values = [interval, 1500000000000 + interval, lap, lap + 1, 1.5 * lap,
+                      '{:.6f}'.format(38.16 + random.random() * 0.01), '{:.6f}'.format(-122.45 + random.random() * 0.01)]
+            values += ['{:.3f}'.format(random.random() * 100) for _ in CHANNELS[7:]]
+            log.write(','.join(str(value) for value in values) + '\n')
+
+
+def timed(fn):
+    start = time.time()
+    result = fn()
+    return time.time() - start, result
+
+
+def queries(datastore, sessions):
+    return [lambda: datastore.get_channel_max('RPM', sessions),
+            lambda: datastore.get_channel_min('Coolant', sessions),
+            lambda: datastore.get_channel_average('Speed', sessions),
+            lambda: datastore.get_location_center(sessions)]
+
+
+def scans(datastore, sessions):
+    return [lambda: datastore._get_channel_aggregate('MAX', 'RPM', sessions),
+            lambda: datastore._get_channel_aggregate('MIN', 'Coolant', sessions),
+            lambda: datastore._scan_channel_average('Speed', sessions),
+            lambda: datastore._scan_location_center(sessions)]
+
+
+def main():
+    session_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    random.seed(0)
+    work_dir = tempfile.mkdtemp()
+    try:
+        log_path = os.path.join(work_dir, 'session.log')
+        write_log(log_path, samples)
+        print '{} sessions of {} samples, {} channels'.format(session_count, samples, len(CHANNELS))
+        names = ['max RPM', 'min Coolant', 'average Speed', 'location center']
+
+        for store_class in (DataStore, ColumnarDataStore):
+            datastore = store_class()
+            datastore.open_db(os.path.join(work_dir, store_class.__name__ + '.sql3'))
+            import_time, _ = timed(lambda: [datastore.import_datalog(log_path, 'session') for _ in range(session_count)])
+
+            # the imports again, without keeping the channel statistics
+            plain = store_class()
+            plain.open_db(os.path.join(work_dir, store_class.__name__ + '_plain.sql3'))
+            plain._update_channel_stats = lambda session_id, after_sample_id=None: None
+            plain_time, _ = timed(lambda: [plain.import_datalog(log_path, 'session') for _ in range(session_count)])
+            plain.close()
+
+            print '{}: imports {:.2f} s, {:.2f} s without channel statistics (+{:.0f}%)'.format(
+                store_class.__name__, import_time, plain_time, (import_time - plain_time) * 100 / plain_time)
+            for label, sessions in [('one session', [1]), ('all sessions', None)]:
+                for name, scan, query in zip(names, scans(datastore, sessions), queries(datastore, sessions)):
+                    scan_time, expected = timed(scan)
+                    query_time, actual = timed(query)
+                    print '  {:13s} {:16s} scan {:8.1f} ms  statistics {:6.2f} ms'.format(
+                        label, name + ':', scan_time * 1000, query_time * 1000)
+            datastore.close()
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    main()
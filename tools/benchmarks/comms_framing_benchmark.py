@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures receive throughput and CPU use of the connection line framing,
+over a pty for the serial connection and a localhost socket for the socket
+connection. A writer floods telemetry sample lines; a reader thread frames
+them and passes them through a multiprocessing.Queue, as the comms
+connection process does, to a consumer.
+
+The previous framing (per byte reads for serial, 32 byte receives and
+string concatenation for sockets, one queue transfer per line) is included
+for comparison.
+
+Usage: python tools/benchmarks/comms_framing_benchmark.py [message count] [channel count]
+"""
+
+import os
+import sys
+import time
+import json
+import random
+import socket
+import threading
+import multiprocessing
+import serial
+from Queue import Empty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.comms.serial.serialconnection import SerialConnection
+from autosportlabs.comms.socket.socketconnection import SocketConnection
+
+WRITE_BATCH = 20
+
+
+class LegacySerialConnection(SerialConnection):
+
+    def read_line(self):
+        msg = ''
+        while True:
+            c = self.read(1)
+            if c == '':
+                return None
+            msg += c
+            if msg[-2:] == '\r\n':
+                msg = msg[:-2]
+                return msg
+
+
+class LegacySocketConnection(SocketConnection):
+
+    def __init__(self, port):
+        super(LegacySocketConnection, self).__init__(port)
+        self._data = ''
+
+    def read_line(self, keep_reading):
+        while keep_reading.is_set():
+            if '\r\n' in self._data:
+                msg, self._data = self._data.split('\r\n', 1)
+                return msg
+            data = self.socket.recv(32)
+            if data == '':
+                return None
+            self._data += data
+
+
+def make_messages(channel_count, count):
+    random.seed(0)
+    messages = []
+    for i in range(count):
+        values = [round(random.random() * 1000, 4) for c in range(channel_count)]
+        messages.append(json.dumps({'s': {'t': i, 'd': values + [(1 << 30) - 1]}}, separators=(',', ':')) + '\r\n')
+    return messages
+
+
+def run(read, write, messages, batched):
+    """
+    Time delivering every message from write() through read() and a
+    multiprocessing.Queue to the consumer
+    """
+    rx_queue = multiprocessing.Queue()
+    should_run = threading.Event()
+    should_run.set()
+
+    def reader():
+        while should_run.is_set():
+            if batched:
+                msgs = read()
+                if msgs:
+                    rx_queue.put(msgs)
+            else:
+                msg = read()
+                if msg:
+                    rx_queue.put(msg)
+
+    def writer():
+        for i in range(0, len(messages), WRITE_BATCH):
+            write(''.join(messages[i:i + WRITE_BATCH]))
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.daemon = True
+    reader_thread.start()
+
+    start_cpu = sum(os.times()[:2])
+    start = time.time()
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.daemon = True
+    writer_thread.start()
+
+    received = 0
+    while received < len(messages):
+        try:
+            item = rx_queue.get(True, 10)
+        except Empty:
+            raise Exception('Timed out after {} messages'.format(received))
+        received += len(item) if batched else 1
+    elapsed = time.time() - start
+    cpu = sum(os.times()[:2]) - start_cpu
+    should_run.clear()
+    return elapsed, cpu
+
+
+def report(name, messages, elapsed, cpu):
+    print '{:28s} {:9.0f} msgs/s, {:5.1f}% CPU, {:6.1f} us CPU/msg'.format(
+        name, len(messages) / elapsed, cpu / elapsed * 100, cpu / len(messages) * 1000000)
+
+
+def bench_serial(messages):
+    import tty
+    for name, connection_class, batched in [('serial (pty), previous', LegacySerialConnection, False),
+                                            ('serial (pty), framer', SerialConnection, True)]:
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        connection = connection_class()
+        # hardware flow control settings skip the modem line ioctls, which ptys reject
+        connection.ser = serial.Serial(os.ttyname(slave), timeout=0.1, dsrdtr=True, rtscts=True)
+        read = connection.read_lines if batched else connection.read_line
+
+        def write(data, master=master):
+            while data:
+                data = data[os.write(master, data):]
+        elapsed, cpu = run(read, write, messages, batched)
+        report(name, messages, elapsed, cpu)
+        connection.close()
+        os.close(master)
+        os.close(slave)
+
+
+def bench_socket(messages):
+    for name, batched in [('socket (localhost), previous', False),
+                          ('socket (localhost), framer', True)]:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        port = server.getsockname()[1]
+        connection = LegacySocketConnection(port) if not batched else SocketConnection(port)
+        connection.open('127.0.0.1')
+        client, _ = server.accept()
+        keep_reading = threading.Event()
+        keep_reading.set()
+        if batched:
+            read = lambda: connection.read_lines(keep_reading)
+        else:
+            read = lambda: connection.read_line(keep_reading)
+        elapsed, cpu = run(read, client.sendall, messages, batched)
+        report(name, messages, elapsed, cpu)
+        keep_reading.clear()
+        client.close()
+        connection.close()
+        server.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    channel_count = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    messages = make_messages(channel_count, count)
+    print '{} sample messages, {} bytes each'.format(count, len(messages[0]))
+    bench_serial(messages)
+    bench_socket(messages)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures serial comms latency for each comms transport, against a loopback
+fake device on a pty. The device streams telemetry samples at a fixed rate
+and answers commands immediately, so the measured times are the overhead of
+the app side of the connection.
+
+Reported for each transport, as 50th / 90th / 99th percentiles:
+- command round trip: write_message() to the reply arriving from read_message()
+- sample jitter: how far the time between sample arrivals strays from the
+  device's sample period
+
+Usage: python tools/benchmarks/comms_latency_benchmark.py [duration s] [sample rate Hz] [channel count]
+"""
+
+import os
+import sys
+import json
+import random
+import threading
+import time
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.comms.comms import Comms, InProcessComms, TRANSPORT_IN_PROCESS, TRANSPORTS
+from autosportlabs.comms.serial.serialconnection import SerialConnection
+
+COMMAND_INTERVAL = 0.02
+LINE_DELIMITER = '\r\n'
+
+
+class PtySerialConnection(SerialConnection):
+
+    def open(self, device):
+        self._framer.clear()
+        # hardware flow control settings skip the modem line ioctls, which ptys reject
+        self.ser = serial.Serial(device, timeout=self.timeout, write_timeout=self.writeTimeout, dsrdtr=True, rtscts=True)
+
+
+class LoopbackDevice(object):
+    """
+    Streams samples at a fixed rate on the master end of a pty, and echoes
+    each command line received back as its reply
+    """
+
+    def __init__(self, sample_rate, channel_count):
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.device = os.ttyname(self.slave)
+        self.period = 1.0 / sample_rate
+        self.channel_count = channel_count
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+
+    def start(self):
+        self._running.set()
+        for target in (self._sample_worker, self._command_worker):
+            t = threading.Thread(target=target)
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        self._running.clear()
+
+    def _write(self, data):
+        with self._lock:
+            while data:
+                data = data[os.write(self.master, data):]
+
+    def _sample_worker(self):
+        random.seed(0)
+        tick = 0
+        start = time.time()
+        while self._running.is_set():
+            values = [round(random.random() * 1000, 4) for c in range(self.channel_count)]
+            self._write(json.dumps({'s': {'t': tick, 'd': values + [(1 << 30) - 1]}}, separators=(',', ':')) + LINE_DELIMITER)
+            tick += 1
+            delay = start + tick * self.period - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _command_worker(self):
+        data = ''
+        while self._running.is_set():
+            try:
+                chunk = os.read(self.master, 4096)
+            except OSError:
+                break
+            data += chunk
+            while LINE_DELIMITER in data:
+                line, data = data.split(LINE_DELIMITER, 1)
+                if line:
+                    self._write(line + LINE_DELIMITER)
+
+
+def percentiles(values, points=(50, 90, 99)):
+    values = sorted(values)
+    return [values[min(len(values) - 1, int(len(values) * p / 100.0))] for p in points]
+
+
+def run(transport, duration, sample_rate, channel_count):
+    device = LoopbackDevice(sample_rate, channel_count)
+    comms_class = InProcessComms if transport == TRANSPORT_IN_PROCESS else Comms
+    comms = comms_class(device.device, PtySerialConnection())
+    comms.open()
+    device.start()
+
+    sent = {}
+    round_trips = []
+    sample_times = []
+    should_run = threading.Event()
+    should_run.set()
+
+    def receiver():
+        while should_run.is_set():
+            msg = comms.read_message()
+            now = time.time()
+            if msg is None:
+                continue
+            if msg.startswith('{"s"'):
+                sample_times.append(now)
+            else:
+                sent_at = sent.pop(json.loads(msg)['ping']['id'], None)
+                if sent_at is not None:
+                    round_trips.append(now - sent_at)
+
+    receiver_thread = threading.Thread(target=receiver)
+    receiver_thread.daemon = True
+    receiver_thread.start()
+
+    # let the connection settle before measuring
+    time.sleep(0.5)
+    del sample_times[:]
+    start_cpu = sum(os.times()[:4])
+    end = time.time() + duration
+    command_id = 0
+    next_keep_alive = 0
+    while time.time() < end:
+        if time.time() > next_keep_alive:
+            # as RcpApi does, or the connection closes
+            comms.keep_alive()
+            next_keep_alive = time.time() + 1
+        sent[command_id] = time.time()
+        comms.write_message(json.dumps({'ping': {'id': command_id}}) + LINE_DELIMITER)
+        command_id += 1
+        time.sleep(COMMAND_INTERVAL)
+    time.sleep(0.2)
+
+    should_run.clear()
+    device.stop()
+    comms.close()
+    # once joined, the connection process is counted in the children's times
+    cpu = sum(os.times()[:4]) - start_cpu
+    os.close(device.master)
+    os.close(device.slave)
+
+    intervals = [b - a for a, b in zip(sample_times, sample_times[1:])]
+    jitter = [abs(i - device.period) for i in intervals]
+    rt50, rt90, rt99 = [t * 1000 for t in percentiles(round_trips)]
+    j50, j90, j99 = [t * 1000 for t in percentiles(jitter)]
+    print '{:9s} round trip ms {:6.2f} {:6.2f} {:6.2f} | sample jitter ms {:6.2f} {:6.2f} {:6.2f} | {} cmds, {} samples, {:4.1f}% CPU'.format(
+        transport, rt50, rt90, rt99, j50, j90, j99, len(round_trips), len(sample_times), cpu / duration * 100)
+    sys.stdout.flush()
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    sample_rate = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    channel_count = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    print '{}s at {}Hz, {} channels; percentiles p50 p90 p99'.format(duration, sample_rate, channel_count)
+    sys.stdout.flush()
+    for transport in TRANSPORTS:
+        run(transport, duration, sample_rate, channel_count)
+
+if __name__ == '__main__':
+    main()
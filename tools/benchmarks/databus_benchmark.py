@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Feeds synthetic samples through the DataBus and measures the cost of the
+periodic listener notification, which runs on the UI thread.
+
+The listener mix resembles a dashboard: several gauges, a 10Hz telemetry
+sample listener and a full rate recorder sample listener. The previous
+DataBus, which notified every channel on every tick, is included for
+comparison.
+
+Usage: python tools/benchmarks/databus_benchmark.py [channel count] [ticks]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.databus import databus
+from autosportlabs.racecapture.databus.databus import DataBus
+from autosportlabs.racecapture.data.sampledata import Sample, SampleValue
+from autosportlabs.racecapture.data.channels import ChannelMeta
+
+TICK_RATE = 50
+CHANNEL_RATES = [1, 5, 10, 25, 50]
+GAUGE_CHANNEL_COUNT = 40
+
+
+class LegacyDataBus(object):
+    """
+    The notification strategy prior to change tracking: every listener of
+    every channel, and every sample listener, is called on every tick while
+    holding the update lock
+    """
+
+    def __init__(self):
+        self.update_lock = databus.Lock()
+        self.channel_data = {}
+        self.channel_listeners = {}
+        self.sample_listeners = []
+
+    def update_samples(self, sample):
+        with self.update_lock:
+            cd = self.channel_data
+            for sample_item in sample.samples:
+                cd[sample_item.channelMeta.name] = sample_item.value
+
+    def notify_listeners(self, dt):
+        with self.update_lock:
+            cd = self.channel_data
+            for channel, value in cd.iteritems():
+                listeners = self.channel_listeners.get(channel)
+                if listeners:
+                    for listener in listeners:
+                        listener(value)
+            for listener in self.sample_listeners:
+                listener(cd)
+
+    def addChannelListener(self, channel, callback, max_rate=None):
+        self.channel_listeners.setdefault(channel, []).append(callback)
+
+    def add_sample_listener(self, callback, max_rate=None):
+        self.sample_listeners.append(callback)
+
+
+def make_samples(channel_count, ticks):
+    # Fast channels change on nearly every update; slow channels such as
+    # temperatures mostly repeat their value
+    random.seed(0)
+    metas = [ChannelMeta(name='Channel{}'.format(i)) for i in range(channel_count)]
+    rates = [CHANNEL_RATES[i % len(CHANNEL_RATES)] for i in range(channel_count)]
+    current = [0.0] * channel_count
+    samples = []
+    for tick in range(ticks):
+        sample_values = []
+        for i, rate in enumerate(rates):
+            if tick % (TICK_RATE / rate) == 0:
+                if rate >= 25 or random.random() < 0.2:
+                    current[i] = round(random.random() * 100, 1)
+                sample_values.append(SampleValue(current[i], metas[i]))
+        sample = Sample()
+        sample.samples = sample_values
+        samples.append(sample)
+    return metas, samples
+
+
+class ListenerCounter(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+
+
+def run(bus, metas, samples):
+    counter = ListenerCounter()
+    for meta in metas[:GAUGE_CHANNEL_COUNT]:
+        bus.addChannelListener(meta.name, counter)
+    bus.add_sample_listener(counter)
+    bus.add_sample_listener(counter, max_rate=10)
+
+    notify_time = 0.0
+    for tick, sample in enumerate(samples):
+        databus.time = lambda: tick / float(TICK_RATE)
+        bus.update_samples(sample)
+        start = time.time()
+        bus.notify_listeners(None)
+        notify_time += time.time() - start
+    return notify_time, counter.calls
+
+
+def report(name, notify_time, calls, ticks):
+    print '{}: {:.1f} us/tick, {:.1f} listener calls/tick'.format(
+        name, notify_time / ticks * 1000000, float(calls) / ticks)
+
+
+def main():
+    channel_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    metas, samples = make_samples(channel_count, ticks)
+    print 'Notifying {} ticks; {} channels, {} with gauge listeners'.format(
+        ticks, channel_count, GAUGE_CHANNEL_COUNT)
+
+    legacy_time, legacy_calls = run(LegacyDataBus(), metas, samples)
+    report('Notify every channel', legacy_time, legacy_calls, ticks)
+
+    current_time, current_calls = run(DataBus(), metas, samples)
+    report('Notify changed channels', current_time, current_calls, ticks)
+
+    print 'Speedup: {:.1f}x'.format(legacy_time / current_time)
+
+if __name__ == '__main__':
+    main()
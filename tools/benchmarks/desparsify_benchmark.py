@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the desparsified data generator with the chunked NumPy
+desparsifier on a synthetic, sparse RaceCapture log.
+
+Usage: python tools/benchmarks/desparsify_benchmark.py [row count]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.datastore.datastore import DataStore
+from autosportlabs.racecapture.datastore.desparsifier import ChunkedDesparsifier
+
+# channel name, sample rate; the log is written at the fastest rate
+CHANNELS = [('Interval', 100), ('Utc', 100), ('AccelX', 100), ('AccelY', 100), ('AccelZ', 100),
+            ('Yaw', 100), ('RPM', 50), ('TPS', 50), ('Brake', 50), ('Speed', 25),
+            ('Latitude', 25), ('Longitude', 25), ('Distance', 25), ('MAP', 10), ('AFR', 10),
+            ('OilPress', 10), ('Coolant', 1), ('OilTemp', 1), ('Battery', 1), ('FuelLevel', 1),
+            ('LapCount', 10), ('CurrentLap', 10), ('LapTime', 10), ('PredTime', 5), ('ElapsedTime', 10)]
+LOG_RATE = 100
+
+
+def write_log(path, row_count):
+    random.seed(0)
+    with open(path, 'wb') as log:
+        log.write(','.join('"{}"|""|0|100|{}'.format(name, rate) for name, rate in CHANNELS) + '\n')
+        for row in range(row_count):
+            fields = []
+            for name, rate in CHANNELS:
+                if row % (LOG_RATE / rate) == 0:
+                    fields.append('{:.3f}'.format(random.random() * 100))
+                else:
+                    fields.append('')
+            log.write(','.join(fields) + '\n')
+
+
+def time_generator(path):
+    with open(path, 'rb') as data_file:
+        data_file.readline()
+        start = time.time()
+        count = sum(1 for record in DataStore()._desparsified_data_generator(data_file))
+    return count, time.time() - start
+
+
+def time_chunked(path):
+    with open(path, 'rb') as data_file:
+        data_file.readline()
+        start = time.time()
+        count = sum(1 for record in ChunkedDesparsifier(data_file, len(CHANNELS)).records())
+    return count, time.time() - start
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    if not ChunkedDesparsifier.available():
+        print 'NumPy is not available; cannot benchmark the chunked desparsifier'
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.log')
+    os.close(fd)
+    try:
+        print 'Writing synthetic log: {} rows x {} channels'.format(row_count, len(CHANNELS))
+        write_log(path, row_count)
+        print 'Log size: {:.1f} MB'.format(os.path.getsize(path) / 1048576.0)
+
+        chunked_count, chunked_time = time_chunked(path)
+        print 'Chunked desparsifier: {} records in {:.2f}s ({:.0f} records/s)'.format(
+            chunked_count, chunked_time, chunked_count / chunked_time)
+
+        generator_count, generator_time = time_generator(path)
+        print 'Desparsified data generator: {} records in {:.2f}s ({:.0f} records/s)'.format(
+            generator_count, generator_time, generator_count / generator_time)
+
+        print 'Speedup: {:.1f}x'.format(generator_time / chunked_time)
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures exporting a session to CSV: the time taken and the peak memory
+of the process, with the previous export (reading the whole session, then
+building each row by concatenation) and the streaming export.
+
+Each export runs in a forked process so the peak memory of one does not
+hide the other's.
+
+Usage: python tools/benchmarks/export_benchmark.py [seconds of logging]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import resource
+import tempfile
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.datastore.datastore import DataStore
+
+# name, sample rate
+CHANNELS = [('Interval', 1000), ('Utc', 1000), ('Latitude', 25), ('Longitude', 25), ('Speed', 25),
+            ('Distance', 25), ('LapCount', 1), ('RPM', 100), ('TPS', 100), ('EngineTemp', 1),
+            ('OilPress', 10), ('OilTemp', 1), ('Battery', 1), ('AccelX', 100), ('AccelY', 100),
+            ('AccelZ', 100), ('Yaw', 100), ('Pitch', 100), ('Roll', 100), ('Brake', 50)]
+LOG_RATE = 100
+
+
+def write_log(path, seconds):
+    with open(path, 'w') as log:
+        log.write(','.join('"{}"|""|0|1000|{}'.format(name, rate) for name, rate in CHANNELS) + '\n')
+        interval_ms = 1000 / LOG_RATE
+        for tick in xrange(seconds * LOG_RATE):
+            interval = tick * interval_ms
+            values = [str(interval), str(1500000000000 + interval)]
+            for name, rate in CHANNELS[2:]:
+                values.append('{:.3f}'.format(random.random() * 100) if interval % (1000 / rate) == 0 else '')
+            log.write(','.join(values) + '\n')
+
+
+def legacy_export(datastore, session_id, export_file):
+    channels = datastore.get_channel_list(session_id)
+    header = ''
+    for channel in channels:
+        header += '"{}"|"{}"|{}|{}|{},'.format(channel.name, channel.units, channel.min,
+                                               channel.max, channel.sample_rate)
+    export_file.write(header[:-1] + '\n')
+    channel_names = [c.name for c in channels]
+    channel_intervals = [DataStore.MAX_SAMPLE_RATE / c.sample_rate for c in channels]
+    system_channel_indexes = [c.name in DataStore.SYSTEM_CHANNELS for c in channels]
+    records = datastore.query([session_id], channel_names).fetch_records()
+    datalog_interval_index = channel_names.index('Interval')
+    sync_point = None
+    row_index = 0
+    for record in records:
+        sampled = False
+        while not sampled:
+            if sync_point is None:
+                sync_point = long(record[1 + datalog_interval_index])
+            row = ''
+            current_interval = long(record[1 + datalog_interval_index])
+            for index in range(len(channels)):
+                if system_channel_indexes[index]:
+                    value = long(record[1 + index])
+                elif (current_interval - sync_point) % channel_intervals[index] == 0:
+                    value = record[1 + index]
+                    if value is None:
+                        value = ''
+                    sampled = True
+                else:
+                    value = ''
+                row += str(value) + ','
+            if sampled:
+                export_file.write(row[:-1] + '\n')
+            else:
+                sync_point = None
+        row_index += 1
+    return row_index
+
+
+def run_forked(export, db_path, export_path):
+    """
+    Run an export in a child process, returning (seconds, peak memory increase in MB)
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        datastore = DataStore()
+        datastore.open_db(db_path)
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.time()
+        with open(export_path, 'w') as export_file:
+            export(datastore, 1, export_file)
+        seconds = time.time() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(write_fd, '{} {}'.format(seconds, (peak - baseline) / 1024.0))
+        os._exit(0)
+    os.close(write_fd)
+    result = os.read(read_fd, 100)
+    os.waitpid(pid, 0)
+    seconds, memory = result.split()
+    return float(seconds), float(memory)
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 1200
+    random.seed(0)
+    work_dir = tempfile.mkdtemp()
+    try:
+        log_path = os.path.join(work_dir, 'session.log')
+        db_path = os.path.join(work_dir, 'export.sql3')
+        write_log(log_path, seconds)
+        datastore = DataStore()
+        datastore.open_db(db_path)
+        datastore.import_datalog(log_path, 'benchmark')
+        rows = datastore._get_session_record_count(1)
+        datastore.close()
+        print '{} s session, {} channels, {} rows'.format(seconds, len(CHANNELS), rows)
+
+        previous_path = os.path.join(work_dir, 'previous.log')
+        current_path = os.path.join(work_dir, 'current.log')
+        for name, export, path in [('previous', legacy_export, previous_path),
+                                   ('streaming', lambda ds, session_id, f: ds.export_session(session_id, f), current_path)]:
+            elapsed, memory = run_forked(export, db_path, path)
+            print 'export, {:10s} {:7.2f} s, peak memory +{:7.1f} MB'.format(name + ':', elapsed, memory)
+
+        with open(previous_path) as previous, open(current_path) as current:
+            print 'output identical:', previous.read() == current.read()
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    main()
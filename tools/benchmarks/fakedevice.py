@@ -0,0 +1,160 @@
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A fake RaceCapture device for benchmarks, serving the RCP JSON protocol on a
+localhost TCP socket so the app's socket comms can connect to it.
+"""
+
+import json
+import socket
+import threading
+import Queue
+from time import sleep, time
+
+CONFIG_PATH = 'test/test_scripts/lap_simulation.rcp'
+
+
+def load_config(path):
+    """
+    Load the rcpCfg section of a saved configuration file
+    """
+    with open(path) as f:
+        return json.load(f)['rcpCfg']
+
+
+class FakeRcpDevice(object):
+    """
+    Replies to RCP commands like the firmware: commands are processed one at
+    a time, in the order received. Each reply is delayed by latency seconds
+    to simulate the round trip over a Bluetooth or WiFi link; the link
+    delay overlaps for commands sent back to back.
+
+    max_pending simulates firmware with a small receive buffer: commands
+    arriving while that many are waiting to be processed are dropped.
+    """
+    LINE_DELIMITER = '\r\n'
+
+    def __init__(self, config, latency=0.0, processing_time=0.001, max_pending=None):
+        self.config = config
+        self.latency = latency
+        self.processing_time = processing_time
+        self.max_pending = max_pending
+        self.received = 0
+        self.dropped = 0
+        self._server = None
+        self._client = None
+        self._commands = Queue.Queue()
+        self._replies = Queue.Queue()
+        self._running = threading.Event()
+
+    @property
+    def port(self):
+        return self._server.getsockname()[1]
+
+    def start(self):
+        """
+        Listen on a free localhost port; the port property has the port
+        """
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(1)
+        self._running.set()
+        for target in (self._accept_worker, self._process_worker, self._reply_worker):
+            t = threading.Thread(target=target)
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        self._running.clear()
+        for s in (self._client, self._server):
+            if s is not None:
+                try:
+                    s.close()
+                except socket.error:
+                    pass
+
+    def reply_for(self, command):
+        """
+        Build the reply for a command. Gets return the matching section of
+        the configuration; everything else is acknowledged.
+        """
+        name = command.keys()[0]
+        if name == 'getVer':
+            return {'ver': self.config.get('ver', {})}
+        if name.startswith('get'):
+            reply_name = name[3].lower() + name[4:]
+            return {reply_name: self.config.get(reply_name, {})}
+        return {name: {'rc': 1}}
+
+    def _accept_worker(self):
+        while self._running.is_set():
+            try:
+                client, _ = self._server.accept()
+            except socket.error:
+                break
+            self._client = client
+            self._read_commands(client)
+
+    def _read_commands(self, client):
+        data = ''
+        while self._running.is_set():
+            try:
+                chunk = client.recv(4096)
+            except socket.error:
+                break
+            if not chunk:
+                break
+            data += chunk
+            while self.LINE_DELIMITER in data:
+                line, data = data.split(self.LINE_DELIMITER, 1)
+                line = line.strip()
+                if not line:
+                    continue
+                self.received += 1
+                if self.max_pending is not None and self._commands.qsize() >= self.max_pending:
+                    self.dropped += 1
+                    continue
+                self._commands.put(json.loads(line))
+
+    def _process_worker(self):
+        while self._running.is_set():
+            try:
+                command = self._commands.get(True, 0.1)
+            except Queue.Empty:
+                continue
+            sleep(self.processing_time)
+            reply = json.dumps(self.reply_for(command), separators=(',', ':')) + self.LINE_DELIMITER
+            self._replies.put((time() + self.latency, reply))
+
+    def _reply_worker(self):
+        while self._running.is_set():
+            try:
+                send_at, reply = self._replies.get(True, 0.1)
+            except Queue.Empty:
+                continue
+            delay = send_at - time()
+            if delay > 0:
+                sleep(delay)
+            try:
+                self._client.sendall(reply)
+            except (socket.error, AttributeError):
+                pass
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures computing the time delta channels of several laps against a
+reference lap, as done each time the reference lap is changed: with NumPy
+against the pure Python fallback.
+
+Usage: python tools/benchmarks/lap_delta_benchmark.py [laps] [lap seconds] [sample rate]
+"""
+
+import os
+import sys
+import math
+import time
+import random
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+
+from autosportlabs.racecapture.datastore import lapdelta
+
+GPS_RATE = 10
+LAP_MILES = 2.5
+
+
+def lap_samples(lap_seconds, sample_rate):
+    """
+    A lap with the pace varying through it, the distance updated at the GPS rate
+    """
+    pace = [1 + 0.3 * math.sin(index / 7.0) + random.uniform(-0.02, 0.02) for index in range(50)]
+    distances = []
+    times = []
+    distance = 0.0
+    for index in xrange(int(lap_seconds * sample_rate)):
+        if index % (sample_rate / GPS_RATE) == 0:
+            distance += pace[index * len(pace) / int(lap_seconds * sample_rate)] * LAP_MILES / (lap_seconds * GPS_RATE)
+        distances.append(distance)
+        times.append(index * 1000.0 / sample_rate)
+    return distances, times
+
+
+def timed(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare(reference_samples, laps):
+    reference = lapdelta.ReferenceLap(*reference_samples)
+    return [reference.sample_deltas(distances, times) for distances, times in laps]
+
+
+def main():
+    lap_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    lap_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 90
+    sample_rate = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    random.seed(0)
+
+    reference = lap_samples(lap_seconds, sample_rate)
+    laps = [lap_samples(lap_seconds * random.uniform(0.98, 1.03), sample_rate) for _ in range(lap_count)]
+    print '{} laps of {:.0f} s at {} Hz against a reference lap'.format(lap_count, lap_seconds, sample_rate)
+
+    numpy_time = timed(lambda: compare(reference, laps))
+    numpy_module, lapdelta.np = lapdelta.np, None
+    python_time = timed(lambda: compare(reference, laps))
+    lapdelta.np = numpy_module
+    for name, elapsed in [('NumPy', numpy_time), ('Python', python_time)]:
+        print '{:8s} {:8.1f} ms ({:5.2f} ms / lap)'.format(name + ':', elapsed * 1000, elapsed * 1000 / lap_count)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures fetching the laps of a long session, in a database also holding
+other sessions with the same laps: the previous query, which finds the lap
+through the CurrentLap index across every session, or scans the whole
+session without the index, against the query limited to each lap's range
+of samples.
+
+Usage: python tools/benchmarks/lap_query_benchmark.py [samples] [laps] [other sessions]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.datastore.datastore import DataStore, DataSet, Filter
+
+CHANNELS = ['Interval', 'Utc', 'LapCount', 'CurrentLap', 'LapTime', 'Latitude', 'Longitude', 'Speed', 'RPM', 'TPS']
+QUERY_CHANNELS = ['Interval', 'Latitude', 'Longitude', 'Speed', 'RPM']
+
+
+def write_log(path, samples, laps):
+    samples_per_lap = samples / laps
+    with open(path, 'w') as log:
+        log.write(','.join('"{}"|""|0|1000|50'.format(name) for name in CHANNELS) + '\n')
+        for sample in xrange(samples):
+            interval = sample * 20
+            lap = min(sample / samples_per_lap, laps - 1)
+            values = [interval, 1500000000000 + interval, lap, lap + 1, 1.5 * lap]
+            values += ['{:.3f}'.format(random.random() * 100) for _ in CHANNELS[5:]]
+            log.write(','.join(str(value) for value in values) + '\n')
+
+
+def legacy_query(datastore, session_id, channels, data_filter):
+    """
+    The previous query: the filter and an OR of session ids
+    """
+    columns = ['sample.session_id as session_id'] + ['datapoint.{0} as {0}'.format(ch) for ch in channels]
+    sql = 'SELECT {}\nFROM sample\nJOIN datapoint ON datapoint.sample_id=sample.id\nWHERE {}AND sample.session_id = ?'.format(
+        ','.join(columns), str(data_filter))
+    cursor = datastore.connection.execute(sql, data_filter.params + [session_id])
+    return DataSet(cursor, dict((ch, 0) for ch in ['session_id'] + channels)).fetch_records()
+
+
+def timed(fn):
+    start = time.time()
+    result = fn()
+    return time.time() - start, result
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    laps = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    other_sessions = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    random.seed(0)
+    work_dir = tempfile.mkdtemp()
+    try:
+        log_path = os.path.join(work_dir, 'session.log')
+        other_log_path = os.path.join(work_dir, 'other.log')
+        db_path = os.path.join(work_dir, 'laps.sql3')
+        write_log(log_path, samples, laps)
+        write_log(other_log_path, samples / 5, laps)
+        datastore = DataStore()
+        datastore.open_db(db_path)
+        for _ in range(other_sessions):
+            datastore.import_datalog(other_log_path, 'other')
+        elapsed, session_id = timed(lambda: datastore.import_datalog(log_path, 'benchmark'))
+        print '{} samples, {} laps, {} channels, {} other sessions of {} samples; imported in {:.2f} s'.format(
+            samples, laps, len(CHANNELS), other_sessions, samples / 5, elapsed)
+
+        lap_numbers = range(1, laps + 1)
+
+        def per_lap(query):
+            return [query(Filter().eq('CurrentLap', lap)) for lap in lap_numbers]
+
+        legacy_time, legacy = timed(lambda: per_lap(lambda f: legacy_query(datastore, session_id, QUERY_CHANNELS, f)))
+        range_time, ranged = timed(lambda: per_lap(lambda f: datastore.query([session_id], QUERY_CHANNELS, f).fetch_records()))
+
+        datastore.connection.execute('DROP INDEX CurrentLap_index_id')
+        unindexed_time, unindexed = timed(lambda: per_lap(lambda f: legacy_query(datastore, session_id, QUERY_CHANNELS, f)))
+
+        for name, elapsed in [('CurrentLap index, per lap', legacy_time),
+                              ('no CurrentLap index, per lap', unindexed_time),
+                              ('lap sample ranges, per lap', range_time)]:
+            print '{:30s} {:7.2f} s ({:6.1f} ms / lap)'.format(name + ':', elapsed, elapsed * 1000 / laps)
+        print 'records identical:', legacy == unindexed == ranged
+        datastore.close()
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures dividing a long session without lap timing into laps and sectors
+from its GPS positions: the crossing search with NumPy against the pure
+Python fallback, and the whole step run after import_datalog, against the
+time taken by the import itself.
+
+Usage: python tools/benchmarks/lap_segmentation_benchmark.py [hours] [sample rate]
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import shutil
+import tempfile
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.datastore import lapsegmentation
+from autosportlabs.racecapture.datastore.datastore import DataStore
+from autosportlabs.racecapture.datastore.columnstore import ColumnarDataStore
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
+from autosportlabs.racecapture.tracks.trackmanager import TrackMap
+
+CHANNELS = ['Interval', 'Utc', 'Latitude', 'Longitude', 'Speed', 'RPM', 'TPS']
+CENTER_LATITUDE = 38.16
+CENTER_LONGITUDE = -122.45
+# an oval of about 2.5km, lapped in about 90 seconds
+RADIUS_DEGREES = 400.0 / lapsegmentation.METERS_PER_DEGREE
+LAP_MS = 90000.0
+GPS_RATE = 10
+
+
+def track_point(angle):
+    return GeoPoint.fromPoint(CENTER_LATITUDE + RADIUS_DEGREES * math.sin(angle),
+                              CENTER_LONGITUDE + 1.5 * RADIUS_DEGREES * math.cos(angle) /
+                              math.cos(math.radians(CENTER_LATITUDE)))
+
+
+def write_log(path, samples, sample_rate):
+    sample_ms = 1000 / sample_rate
+    fix_every = sample_rate / GPS_RATE
+    with open(path, 'w') as log:
+        log.write(','.join('"{}"|""|0|1000|{}'.format(name, GPS_RATE if name in ('Latitude', 'Longitude') else sample_rate)
+                           for name in CHANNELS) + '\n')
+        for sample in xrange(samples):
+            interval = sample * sample_ms
+            values = [interval, 1500000000000 + interval]
+            if sample % fix_every == 0:
+                # vary the lap time a little, and the line by a few meters
+                point = track_point(2 * math.pi * interval / LAP_MS * (1 + 0.01 * math.sin(interval / 600000.0)))
+                jitter = random.gauss(0, 2.0 / lapsegmentation.METERS_PER_DEGREE)
+                values += ['{:.7f}'.format(point.latitude + jitter), '{:.7f}'.format(point.longitude)]
+            else:
+                values += ['', '']
+            values += ['{:.2f}'.format(random.random() * 100) for _ in CHANNELS[4:]]
+            log.write(','.join(str(value) for value in values) + '\n')
+
+
+class TrackManagerStub(object):
+
+    def __init__(self, track):
+        self.track = track
+
+    def find_nearby_tracks(self, point, searchRadius=None, searchBearing=None):
+        return [self.track]
+
+
+def timed(fn):
+    start = time.time()
+    result = fn()
+    return time.time() - start, result
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    sample_rate = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    samples = int(hours * 3600 * sample_rate)
+    random.seed(0)
+
+    track = TrackMap()
+    track.name = 'Oval'
+    track.start_finish_point = track_point(0)
+    track.sector_points = [track_point(2 * math.pi / 3), track_point(4 * math.pi / 3)]
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        log_path = os.path.join(work_dir, 'session.log')
+        write_log(log_path, samples, sample_rate)
+        print '{} hours at {} Hz: {} samples, GPS at {} Hz'.format(hours, sample_rate, samples, GPS_RATE)
+
+        datastore = DataStore()
+        datastore.open_db(os.path.join(work_dir, 'source.sql3'))
+        session_id = datastore.import_datalog(log_path, 'plain')
+        _, columns = datastore._read_session_columns(session_id, ['Interval', 'Latitude', 'Longitude'])
+        datastore.close()
+        args = (columns['Interval'], columns['Latitude'], columns['Longitude'], track.start_finish_point,
+                track.sector_points)
+
+        numpy_time, segments = timed(lambda: lapsegmentation.segment_laps(*args))
+        numpy_module, lapsegmentation.np = lapsegmentation.np, None
+        python_time, python_segments = timed(lambda: lapsegmentation.segment_laps(*args))
+        lapsegmentation.np = numpy_module
+        print '{} laps found'.format(segments[-1].lap_count)
+        print '{:34s} {:7.2f} s'.format('crossings and segments, NumPy:', numpy_time)
+        print '{:34s} {:7.2f} s'.format('crossings and segments, Python:', python_time)
+        print 'segments identical:', [(s.start_index, s.lap_count, s.sector) for s in segments] == \
+            [(s.start_index, s.lap_count, s.sector) for s in python_segments]
+
+        for store_class in (DataStore, ColumnarDataStore):
+            plain = store_class()
+            plain.open_db(os.path.join(work_dir, '{}_plain.sql3'.format(store_class.__name__)))
+            import_time, _ = timed(lambda: plain.import_datalog(log_path, 'plain'))
+            plain.close()
+
+            segmented = store_class(track_manager=TrackManagerStub(track))
+            segmented.open_db(os.path.join(work_dir, '{}_segmented.sql3'.format(store_class.__name__)))
+            segmented_time, session_id = timed(lambda: segmented.import_datalog(log_path, 'segmented'))
+            laps = len(segmented.get_laps(session_id)) - 1
+            segmented.close()
+            print '{:18s} import {:6.2f} s, with {} laps found {:6.2f} s (+{:.0%})'.format(
+                store_class.__name__ + ':', import_time, laps, segmented_time, segmented_time / import_time - 1)
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    main()
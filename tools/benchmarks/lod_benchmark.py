@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the levels of detail used by the analysis line chart and track
+map, on a synthetic lap.
+
+For the chart: the points plotted and the braking peak shown, full view
+and zoomed, with the previous fixed stride decimation and with SeriesLOD.
+For the map: the points drawn for a lap at the analysis map size and
+zoomed in, with Douglas-Peucker simplification.
+
+Usage: python tools/benchmarks/lod_benchmark.py [sample count]
+"""
+
+import os
+import sys
+import math
+import random
+import timeit
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.util.lod import SeriesLOD
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
+from autosportlabs.uix.track.projection import ProjectedPath, MapTransform
+
+MAX_SAMPLES_TO_DISPLAY = 1000
+CHART_WIDTH = 1200
+MAP_SIZE = (800, 600)
+DETAIL_TOLERANCE = 0.5
+
+
+def legacy_points(xs, ys, xmin, xmax):
+    interval = max(1, int(len(xs) / MAX_SAMPLES_TO_DISPLAY))
+    return [(xs[i], ys[i]) for i in xrange(0, len(xs), interval)]
+
+
+def make_lap(sample_count):
+    # longitudinal g: a short sharp braking spike at the end of each straight
+    xs = []
+    ys = []
+    for i in xrange(sample_count):
+        t = float(i) / sample_count
+        phase = (t * 8) % 1.0
+        g = 0.3 * (1 - phase) + random.gauss(0, 0.02)
+        if 0.9 < phase < 0.9015:
+            g = -1.4 - random.random() * 0.05
+        xs.append(i * 40.0)
+        ys.append(g)
+    return xs, ys
+
+
+def make_path(point_count):
+    path = []
+    for i in xrange(point_count):
+        angle = 2.0 * math.pi * i / point_count
+        radius = 0.01 * (1 + 0.3 * math.sin(angle * 5))
+        path.append(GeoPoint.fromPoint(45.0 + radius * math.sin(angle) + random.gauss(0, 0.0000005),
+                                       -122.0 + radius * 1.4 * math.cos(angle) + random.gauss(0, 0.0000005)))
+    return path
+
+
+def report(name, points, seconds):
+    peak = min(y for _, y in points) if points else None
+    print '{:32s} {:6d} points, peak {:6.2f}g, {:7.2f} ms'.format(name, len(points), peak, seconds * 1000)
+
+
+def bench_chart(sample_count):
+    xs, ys = make_lap(sample_count)
+    print 'chart: {} samples, braking peak {:.2f}g'.format(sample_count, min(ys))
+    build = min(timeit.repeat(lambda: SeriesLOD(xs, ys), number=1, repeat=3))
+    series = SeriesLOD(xs, ys)
+    print 'SeriesLOD build (once, cached)   {} levels, {:7.2f} ms'.format(len(series.levels), build * 1000)
+
+    full = (0, xs[-1])
+    zoomed = (xs[-1] * 0.1, xs[-1] * 0.1 + (xs[-1] / 40.0))
+    for view, (xmin, xmax) in [('full', full), ('zoomed 40x', zoomed)]:
+        points = [p for p in legacy_points(xs, ys, xmin, xmax) if xmin <= p[0] <= xmax]
+        report('{}, previous'.format(view), points, 0)
+        seconds = min(timeit.repeat(lambda: series.get_points(xmin, xmax, CHART_WIDTH), number=1, repeat=10))
+        report('{}, levels of detail'.format(view), series.get_points(xmin, xmax, CHART_WIDTH), seconds)
+
+
+def bench_map(point_count):
+    path = make_path(point_count)
+    print 'map: lap of {} points'.format(point_count)
+    build = min(timeit.repeat(lambda: ProjectedPath(path).detail_indexes(0), number=1, repeat=3))
+    print 'ranking points (once per lap)    {:7.2f} ms'.format(build * 1000)
+    projected = ProjectedPath(path)
+    transform = MapTransform(projected.bounds, (0, 0), MAP_SIZE)
+    for zoom in (1, 4, 16):
+        level = projected.detail_level(DETAIL_TOLERANCE / (transform.scale * zoom))
+        print 'zoom {:2d}x: {:5d} of {} points drawn'.format(zoom, len(projected.detail_indexes(level)), point_count)
+
+
+def main():
+    sample_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(0)
+    bench_chart(sample_count)
+    bench_map(sample_count / 20)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures end to end configuration read (getRcpCfg) and write (writeRcpCfg)
+time through RcpApi and the socket comms, against a fake device with
+simulated link latency, for several pipeline window sizes.
+
+A window of 1 is the serial behaviour. The last run uses a device that drops
+commands when more than one is waiting, to exercise the serial fallback.
+
+Usage: python tools/benchmarks/rcp_config_benchmark.py [latency ms,...] [window,...]
+"""
+
+import os
+import sys
+import threading
+import time
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from fakedevice import FakeRcpDevice, load_config, CONFIG_PATH
+from autosportlabs.racecapture.api import rcpapi
+from autosportlabs.racecapture.api.rcpapi import RcpApi
+from autosportlabs.racecapture.config.rcpconfig import RcpConfig, VersionConfig
+from autosportlabs.comms.socket.socketcomm import SocketComm
+from autosportlabs.comms.socket.socketconnection import SocketConnection
+
+TIMEOUT = 120
+
+
+class Settings(object):
+    userPrefs = None
+
+
+def run_sequence(start):
+    done = threading.Event()
+    result = {}
+
+    def win(value):
+        result['value'] = value
+        done.set()
+
+    def fail(detail):
+        result['error'] = detail
+        done.set()
+
+    t = time.time()
+    start(win, fail)
+    if not done.wait(TIMEOUT):
+        raise Exception('Timed out')
+    if 'error' in result:
+        raise Exception(result['error'])
+    return time.time() - t
+
+
+def main():
+    latencies = [float(l) / 1000 for l in sys.argv[1].split(',')] if len(sys.argv) > 1 else [0.005, 0.03, 0.1]
+    windows = [int(w) for w in sys.argv[2].split(',')] if len(sys.argv) > 2 else [1, 4, 8]
+
+    # No Kivy event loop runs here; deliver callbacks on the calling thread
+    rcpapi.Clock.schedule_once = lambda callback, timeout=0: callback(0)
+
+    config = load_config(os.path.join(ROOT_PATH, CONFIG_PATH))
+    device = FakeRcpDevice(config)
+    device.start()
+
+    comms = SocketComm(SocketConnection(port=device.port), '127.0.0.1')
+    comms.open()
+    api = RcpApi(Settings(), comms=comms)
+    api._start_message_rx_worker()
+    api._start_cmd_sequence_worker()
+    version = VersionConfig()
+    version.fromJson(config['ver'])
+    api.connected_version = version
+
+    write_cfg = RcpConfig()
+    write_cfg.fromJson(config)
+
+    print 'Config read / write through socket comms; fake device at 127.0.0.1:{}'.format(device.port)
+    try:
+        for latency in latencies:
+            device.latency = latency
+            for window in windows:
+                api.pipeline_window = window
+                api._pipeline_supported = True
+                device.received = 0
+                read_time = run_sequence(lambda win, fail: api.getRcpCfg(RcpConfig(), win, fail))
+                read_count = device.received
+                write_cfg.stale = True
+                device.received = 0
+                write_time = run_sequence(lambda win, fail: api.writeRcpCfg(write_cfg, win, fail))
+                print '{:5.0f}ms latency, window {}: read {:6.2f}s ({} cmds), write {:6.2f}s ({} cmds)'.format(
+                    latency * 1000, window, read_time, read_count, write_time, device.received)
+
+        # firmware that cannot buffer pipelined commands
+        device.latency = latencies[-1]
+        device.max_pending = 1
+        device.dropped = 0
+        api.pipeline_window = max(windows)
+        api._pipeline_supported = True
+        write_cfg.stale = True
+        write_time = run_sequence(lambda win, fail: api.writeRcpCfg(write_cfg, win, fail))
+        print '{:5.0f}ms latency, window {}, dropping device: write {:6.2f}s, {} dropped, pipelining {}'.format(
+            device.latency * 1000, api.pipeline_window, write_time, device.dropped,
+            'kept' if api._pipeline_supported else 'disabled')
+    finally:
+        api._running.clear()
+        comms.close()
+        device.stop()
+
+if __name__ == '__main__':
+    main()
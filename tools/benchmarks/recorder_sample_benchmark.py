@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the per-sample cost paid on the main thread when the session
+recorder receives a sample: merging it into the accumulated values and
+handing a snapshot to the recorder worker.
+
+Compares the previous approach (dict accumulator, copy.deepcopy and a Queue)
+with the SampleRing used by the session recorder. Only the producer side is
+timed; the buffer is drained between timed blocks.
+
+Usage: python tools/benchmarks/recorder_sample_benchmark.py [channel count] [sample count]
+"""
+
+import os
+import sys
+import copy
+import time
+import random
+import Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.data.samplering import SampleRing
+
+BLOCK_SIZE = 32
+
+
+def make_samples(channels, sample_count):
+    # Most samples only carry the fast channels; every 10th sample carries all of them
+    random.seed(0)
+    fast_channels = channels[:len(channels) / 4]
+    samples = []
+    for i in range(sample_count):
+        names = channels if i % 10 == 0 else fast_channels
+        samples.append(dict((name, random.random() * 100) for name in names))
+    return samples
+
+
+def time_deepcopy_queue(samples):
+    accumulator = {}
+    sample_queue = Queue.Queue(maxsize=BLOCK_SIZE)
+    elapsed = 0.0
+    for start in range(0, len(samples), BLOCK_SIZE):
+        block = samples[start:start + BLOCK_SIZE]
+        t = time.time()
+        for sample in block:
+            accumulator.update(sample)
+            sample_queue.put_nowait(copy.deepcopy(accumulator))
+        elapsed += time.time() - t
+        while not sample_queue.empty():
+            sample_queue.get_nowait()
+    return elapsed
+
+
+def time_ring(channels, samples):
+    ring = SampleRing(channels, BLOCK_SIZE)
+    elapsed = 0.0
+    for start in range(0, len(samples), BLOCK_SIZE):
+        block = samples[start:start + BLOCK_SIZE]
+        t = time.time()
+        for sample in block:
+            ring.update(sample)
+            ring.push()
+        elapsed += time.time() - t
+        ring.read(BLOCK_SIZE, 0)
+    return elapsed
+
+
+def main():
+    channel_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    sample_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    channels = ['Channel{}'.format(i) for i in range(channel_count)]
+    samples = make_samples(channels, sample_count)
+    print 'Recording {} samples x {} channels'.format(sample_count, channel_count)
+
+    deepcopy_time = time_deepcopy_queue(samples)
+    print 'deepcopy + Queue: {:.1f} us/sample'.format(deepcopy_time / sample_count * 1000000)
+
+    ring_time = time_ring(channels, samples)
+    print 'SampleRing: {:.1f} us/sample'.format(ring_time / sample_count * 1000000)
+
+    print 'Speedup: {:.1f}x'.format(deepcopy_time / ring_time)
+
+if __name__ == '__main__':
+    main()
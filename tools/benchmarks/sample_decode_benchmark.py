@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the CPU cost of receiving a telemetry sample: parsing the JSON
+message, decoding the sample data and updating the DataBus channel values.
+
+Compares the previous per-bit decoder, which allocated a SampleValue per
+channel, with the cached bitmask decoder used by Sample.processData.
+
+Usage: python tools/benchmarks/sample_decode_benchmark.py [channel count] [seconds of telemetry]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.data.sampledata import Sample, SampleValue
+from autosportlabs.racecapture.data.channels import ChannelMetaCollection
+from autosportlabs.racecapture.api import rcpapi
+
+TELEMETRY_RATE = 50
+CHANNEL_RATES = [1, 5, 10, 25, 50]
+
+
+def make_messages(channel_count, seconds):
+    random.seed(0)
+    rates = [CHANNEL_RATES[i % len(CHANNEL_RATES)] for i in range(channel_count)]
+    bitmask_count = max(0, (channel_count - 1) / 32) + 1
+    meta = [{'nm': 'Channel{}'.format(i), 'ut': '', 'sr': rate} for i, rate in enumerate(rates)]
+    messages = []
+    for tick in range(seconds * TELEMETRY_RATE):
+        values = []
+        bitmasks = [0] * bitmask_count
+        for i, rate in enumerate(rates):
+            if tick % (TELEMETRY_RATE / rate) == 0:
+                values.append(round(random.random() * 1000, 4))
+                bitmasks[i / 32] |= 1 << (i % 32)
+        messages.append(json.dumps({'s': {'t': tick, 'd': values + bitmasks}}, separators=(',', ':')))
+    return meta, messages
+
+
+def legacy_process_data(metas, samples, fieldData):
+    # Sample.processData prior to the bitmask decoder
+    channelConfigCount = len(metas)
+    bitmaskFieldCount = max(0, (channelConfigCount - 1) / 32) + 1
+    fieldDataSize = len(fieldData)
+    bitmaskFields = []
+    for i in range(fieldDataSize - bitmaskFieldCount, fieldDataSize):
+        bitmaskFields.append(int(fieldData[i]))
+
+    del samples[:]
+    channelConfigIndex = 0
+    bitmapIndex = 0
+    fieldIndex = 0
+    mask_index = 0
+    while channelConfigIndex < channelConfigCount:
+        if mask_index >= 32:
+            mask_index = 0
+            bitmapIndex += 1
+        mask = 1 << mask_index
+        if (bitmaskFields[bitmapIndex] & mask) != 0:
+            value = float(fieldData[fieldIndex])
+            fieldIndex += 1
+            samples.append(SampleValue(value, metas[channelConfigIndex]))
+        channelConfigIndex += 1
+        mask_index += 1
+
+
+def time_legacy(meta, messages):
+    metas = ChannelMetaCollection()
+    metas.channel_metas = []
+    metas.fromJson(meta)
+    samples = []
+    channel_data = {}
+    start = time.time()
+    for msg in messages:
+        msg_json = json.loads(unicode(msg, errors='ignore'), strict=False)
+        legacy_process_data(metas.channel_metas, samples, msg_json['s']['d'])
+        for sample_item in samples:
+            channel_data[sample_item.channelMeta.name] = sample_item.value
+    return time.time() - start
+
+
+def time_decoder(meta, messages):
+    metas = ChannelMetaCollection()
+    metas.channel_metas = []
+    metas.fromJson(meta)
+    sample = Sample(channelMetas=metas)
+    channel_data = {}
+    start = time.time()
+    for msg in messages:
+        sample.fromJson(rcpapi.parse_message(msg))
+        value_metas = sample.value_metas
+        values = sample.values
+        for index in sample.channel_indexes:
+            channel_data[value_metas[index].name] = values[index]
+    return time.time() - start
+
+
+def report(name, elapsed, count):
+    per_sample = elapsed / count
+    print '{}: {:.1f} us/sample, {:.1f}% of one core at {}Hz'.format(
+        name, per_sample * 1000000, per_sample * TELEMETRY_RATE * 100, TELEMETRY_RATE)
+
+
+def main():
+    channel_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+
+    meta, messages = make_messages(channel_count, seconds)
+    print 'Decoding {} samples x {} channels; ujson {}'.format(
+        len(messages), channel_count, 'available' if rcpapi._fast_json_loads else 'not available')
+
+    legacy_time = time_legacy(meta, messages)
+    report('Previous decoder', legacy_time, len(messages))
+
+    decoder_time = time_decoder(meta, messages)
+    report('Bitmask decoder', decoder_time, len(messages))
+
+    print 'Speedup: {:.1f}x'.format(legacy_time / decoder_time)
+
+if __name__ == '__main__':
+    main()
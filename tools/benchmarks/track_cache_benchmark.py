@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures TrackManager.load_tracks and PresetManager._load_presets startup
+time on synthetic track and preset directories:
+
+- previous: parsing every file, as before the directory cache
+- cold: the first start, which parses every file and writes the cache
+- warm: later starts, loading summaries from the cache
+
+When run as root on Linux, the OS file cache is dropped before each load
+so the file reads hit the disk; otherwise the files are read from memory.
+
+Usage: python tools/benchmarks/track_cache_benchmark.py [track count] [points per track] [preset count]
+"""
+
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.tracks.trackmanager import TrackManager, TrackMap
+from autosportlabs.racecapture.presets.presetmanager import PresetManager, Preset
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
+from autosportlabs.util.dircache import DirectoryCache
+
+DROP_CACHES = '/proc/sys/vm/drop_caches'
+
+
+def drop_os_cache():
+    try:
+        os.system('sync')
+        with open(DROP_CACHES, 'w') as f:
+            f.write('3\n')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def legacy_load_tracks(tm):
+    tracks = {}
+    for track_path in os.listdir(tm.tracks_user_dir):
+        if track_path.startswith(DirectoryCache.CACHE_FILE_NAME):
+            continue
+        track_dict = json.load(open(os.path.join(tm.tracks_user_dir, track_path)))
+        track = TrackMap()
+        track.from_dict(track_dict)
+        tracks[track.track_id] = track
+    return tracks
+
+
+def legacy_load_presets(pm):
+    presets = {}
+    for preset_path in [f for f in os.listdir(pm.presets_user_dir) if f.endswith('.json')]:
+        preset = Preset()
+        preset.from_dict(json.load(open(os.path.join(pm.presets_user_dir, preset_path))))
+        presets[preset.mapping_id] = preset
+    return presets
+
+
+def make_tracks(tm, count, points):
+    random.seed(0)
+    for i in range(count):
+        track = TrackMap.create_new()
+        track.name = 'Track {}'.format(i)
+        track.created = (datetime(2012, 1, 1) + timedelta(minutes=i)).isoformat()
+        lat, lon = random.uniform(-60, 60), random.uniform(-180, 180)
+        for p in range(points):
+            track.map_points.append(GeoPoint.fromPoint(lat + random.random() * 0.01, lon + random.random() * 0.01))
+        for p in range(5):
+            track.sector_points.append(track.map_points[p * points // 5])
+        track.start_finish_point = track.map_points[0]
+        tm.save_track(track)
+
+
+def make_presets(pm, count):
+    random.seed(0)
+    for i in range(count):
+        preset = Preset()
+        preset.mapping_id = i + 1
+        preset.name = 'Preset {}'.format(i)
+        preset.mapping_type = 'OBDII' if i % 2 else 'CAN'
+        preset.image_url = 'https://example.com/{}.jpg'.format(i)
+        preset.mapping = {'chans': [{'nm': 'Channel{}'.format(c), 'id': random.randint(0, 2047), 'mult': 1.0,
+                                     'offset': c, 'len': 2, 'ut': 'units', 'min': 0, 'max': 100}
+                                    for c in range(60)]}
+        pm._save_preset(preset)
+
+
+def timed(drop, load):
+    if drop:
+        drop_os_cache()
+    start = time.time()
+    load()
+    return time.time() - start
+
+
+def main():
+    track_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    point_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    preset_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    user_dir = tempfile.mkdtemp()
+    try:
+        tm = TrackManager(user_dir=user_dir, base_dir=ROOT_PATH)
+        pm = PresetManager(user_dir=user_dir, base_dir=ROOT_PATH)
+        make_tracks(tm, track_count, point_count)
+        make_presets(pm, preset_count)
+        drop = drop_os_cache()
+        print '{} tracks of {} points, {} presets; OS file cache {}'.format(
+            track_count, point_count, preset_count, 'dropped before each load' if drop else 'not dropped')
+
+        for name, legacy, load, directory in (('tracks', lambda: legacy_load_tracks(tm), tm.load_tracks, tm.tracks_user_dir),
+                                              ('presets', lambda: legacy_load_presets(pm), pm._load_presets, pm.presets_user_dir)):
+            previous = timed(drop, legacy)
+            cold = timed(drop, load)
+            warm = timed(drop, load)
+            cache_size = os.path.getsize(os.path.join(directory, DirectoryCache.CACHE_FILE_NAME))
+            print '{:8s} previous {:6.3f}s   cold {:6.3f}s   warm {:6.3f}s   cache {:5.0f} KB'.format(
+                name, previous, cold, warm, cache_size / 1024.0)
+
+        track = tm.get_track_by_id(tm.track_ids[0])
+        start = time.time()
+        track.map_points
+        print 'first use of a track\'s map points {:.1f} ms'.format((time.time() - start) * 1000)
+    finally:
+        shutil.rmtree(user_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures TrackManager nearby track, region and short id lookups on a
+synthetic track database, using the track indexes and the previous linear
+scans over every track.
+
+Tracks are clustered around the populated areas of the world, as real
+venues are.
+
+Usage: python tools/benchmarks/track_index_benchmark.py [track count] [query count]
+"""
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.tracks.trackmanager import TrackManager, TrackMap
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
+
+# (latitude, longitude, spread in degrees) of areas with many venues
+CLUSTERS = [(39.0, -95.0, 10.0), (50.0, 5.0, 6.0), (-30.0, 140.0, 8.0),
+            (36.0, 138.0, 3.0), (-23.0, -47.0, 5.0), (-26.0, 28.0, 4.0)]
+
+
+def legacy_find_track_by_short_id(tm, short_id):
+    for track_id in tm.tracks.keys():
+        track = tm.tracks.get(track_id)
+        if track and short_id == track.short_id:
+            return track
+    return None
+
+
+def legacy_find_nearby_tracks(tm, point, searchRadius=TrackManager.TRACK_DEFAULT_SEARCH_RADIUS_METERS,
+                              searchBearing=TrackManager.TRACK_DEFAULT_SEARCH_BEARING_DEGREES):
+    tracks = []
+    radius = point.metersToDegrees(searchRadius, searchBearing)
+    for trackId in tm.tracks.keys():
+        track = tm.tracks[trackId]
+        trackCenter = track.centerpoint
+        if trackCenter and trackCenter.withinCircle(point, radius):
+            tracks.append(track)
+    tracks.sort(key=lambda x: x.short_id, reverse=True)
+    return tracks
+
+
+def legacy_filter_tracks_by_region(tm, region_name):
+    filtered_track_ids = []
+    for region in tm.regions:
+        if region.name == region_name:
+            for track_id in tm.track_ids:
+                track = tm.tracks[track_id]
+                if region.withinRegion(track.centerpoint):
+                    filtered_track_ids.append((track.name, track_id))
+            break
+    return tm._sort_track_tuples(filtered_track_ids)
+
+
+def make_track(index, latitude, longitude):
+    track = TrackMap.create_new()
+    track.name = 'Track {}'.format(index)
+    track.created = (datetime(2012, 1, 1) + timedelta(minutes=index)).isoformat()
+    for i in range(100):
+        track.map_points.append(GeoPoint.fromPoint(latitude + i * 0.0001, longitude + i * 0.0001))
+    return track
+
+
+def make_tracks(count):
+    random.seed(0)
+    tracks = []
+    for i in range(count):
+        lat, lon, spread = random.choice(CLUSTERS)
+        tracks.append(make_track(i, random.gauss(lat, spread), random.gauss(lon, spread)))
+    return tracks
+
+
+def report(name, legacy, indexed, count):
+    print '{:24s} previous {:9.1f} us   indexed {:7.1f} us   {:6.0f}x'.format(
+        name, legacy / count * 1e6, indexed / count * 1e6, legacy / indexed)
+
+
+def main():
+    track_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    user_dir = tempfile.mkdtemp()
+    try:
+        tm = TrackManager(user_dir=user_dir, base_dir=ROOT_PATH)
+        tm.load_regions()
+        tracks = make_tracks(track_count)
+        build = timeit.timeit(lambda: [tm._put_track(t) for t in tracks], number=1)
+        print '{} tracks, {} regions; index build {:.2f}s ({:.0f} us per track)'.format(
+            track_count, len(tm.regions), build, build / track_count * 1e6)
+
+        random.seed(1)
+        # half near a track, half random
+        points = [random.choice(tracks).centerpoint if i % 2 == 0 else
+                  GeoPoint.fromPoint(random.uniform(-60, 60), random.uniform(-180, 180))
+                  for i in range(query_count)]
+        for point in points:
+            assert legacy_find_nearby_tracks(tm, point) == tm.find_nearby_tracks(point)
+        report('find_nearby_tracks',
+               timeit.timeit(lambda: [legacy_find_nearby_tracks(tm, p) for p in points], number=1),
+               timeit.timeit(lambda: [tm.find_nearby_tracks(p) for p in points], number=1),
+               query_count)
+
+        short_ids = [random.choice(tracks).short_id for i in range(query_count)]
+        report('find_track_by_short_id',
+               timeit.timeit(lambda: [legacy_find_track_by_short_id(tm, s) for s in short_ids], number=1),
+               timeit.timeit(lambda: [tm.find_track_by_short_id(s) for s in short_ids], number=1),
+               query_count)
+
+        region_names = [r.name for r in tm.regions if len(r.points) > 0]
+        for name in region_names:
+            assert legacy_filter_tracks_by_region(tm, name) == tm.filter_tracks_by_region(name)
+        report('filter_tracks_by_region',
+               timeit.timeit(lambda: [legacy_filter_tracks_by_region(tm, n) for n in region_names], number=1),
+               timeit.timeit(lambda: [list(tm.filter_tracks_by_region(n)) for n in region_names], number=1),
+               len(region_names))
+    finally:
+        shutil.rmtree(user_dir)
+
+if __name__ == '__main__':
+    main()
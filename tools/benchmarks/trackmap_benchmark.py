@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the per frame work of the track map with several heat mapped laps
+overlaid: rescaling everything after a resize, and adding one lap's heat
+values.
+
+The previous TrackMapView rescaled every point through a Point object and
+then cleared the canvas and rebuilt every Line; it is reproduced here,
+counting the canvas instructions it would create. The current version
+projects once, rescales with one transform and updates the points of the
+existing Lines. Creating canvas instructions needs an OpenGL window, so
+only the Python side of a frame is timed; the instruction counts show the
+GL work the previous version added on top.
+
+Usage: python tools/benchmarks/trackmap_benchmark.py [lap count] [points per lap]
+"""
+
+import os
+import sys
+import math
+import random
+import timeit
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.geo.geopoint import GeoPoint
+from autosportlabs.uix.track.projection import ProjectedPath, MapTransform, union_bounds, heat_segments
+
+WIDTH = 800
+HEIGHT = 600
+PADDING = 1
+SECTOR_COUNT = 6
+
+
+class Point(object):
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class LegacyTrackMap(object):
+    """
+    The projection, scaling and heat map drawing of the previous
+    TrackMapView, counting canvas instructions instead of creating them
+    """
+
+    def __init__(self):
+        self.min_XY = Point(-1, -1)
+        self.max_XY = Point(-1, -1)
+        self.map_points = []
+        self.paths = {}
+        self.heat_values = {}
+        self.instructions = 0
+
+    def project_point(self, geo_point):
+        latitude = geo_point.latitude * float(math.pi / 180.0)
+        longitude = geo_point.longitude * float(math.pi / 180.0)
+        return Point(longitude, float(math.log(math.tan((math.pi / 4.0) + 0.5 * latitude))))
+
+    def set_track_points(self, geo_points):
+        points = []
+        min_XY = Point(-1, -1)
+        max_XY = Point(-1, -1)
+        for geo_point in geo_points:
+            point = self.project_point(geo_point)
+            min_XY.x = point.x if min_XY.x == -1 else min(min_XY.x, point.x)
+            min_XY.y = point.y if min_XY.y == -1 else min(min_XY.y, point.y)
+            points.append(point)
+        for point in points:
+            point.x = point.x - min_XY.x
+            point.y = point.y - min_XY.y
+            max_XY.x = point.x if max_XY.x == -1 else max(max_XY.x, point.x)
+            max_XY.y = point.y if max_XY.y == -1 else max(max_XY.y, point.y)
+        self.min_XY = min_XY
+        self.max_XY = max_XY
+        self.map_points = points
+
+    def add_path(self, key, path):
+        points = []
+        for geo_point in path:
+            point = self.project_point(geo_point)
+            point.x = point.x - self.min_XY.x
+            point.y = point.y - self.min_XY.y
+            points.append(point)
+        self.paths[key] = points
+
+    def scale_point(self, point, left, bottom):
+        return Point(int((self.width_padding + (point.x * self.ratio))) + left,
+                     int((self.height_padding + (point.y * self.ratio))) + bottom)
+
+    def update_map(self):
+        max_x = float(self.max_XY.x)
+        max_y = float(self.max_XY.y)
+        self.ratio = min((WIDTH - PADDING * 2) / max_x, (HEIGHT - PADDING * 2) / max_y)
+        self.height_padding = (HEIGHT - (self.ratio * max_y)) / 2.0
+        self.width_padding = (WIDTH - (self.ratio * max_x)) / 2.0
+
+        scaled_map_points = []
+        for point in self.map_points:
+            scaled_point = self.scale_point(point, 0, 0)
+            scaled_map_points.append(scaled_point.x)
+            scaled_map_points.append(scaled_point.y)
+        self.scaled_map_points = scaled_map_points
+
+        scaled_paths = {}
+        for key, path in self.paths.iteritems():
+            scaled_path_points = []
+            for point in path:
+                scaled_path_point = self.scale_point(point, 0, 0)
+                scaled_path_points.append(scaled_path_point.x)
+                scaled_path_points.append(scaled_path_point.y)
+            scaled_paths[key] = scaled_path_points
+        self.scaled_paths = scaled_paths
+        self.draw_current_map()
+
+    def draw_current_map(self):
+        # clear, track outline
+        instructions = 2
+        for key, path_points in self.scaled_paths.iteritems():
+            heat_path = self.heat_values.get(key)
+            point_count = len(path_points)
+            heat_range = 100.0
+            current_heat_pct = int(heat_path[0] / heat_range * 100.0)
+            line_points = [path_points[0], path_points[1]]
+            i = 0
+            value_index = 0
+            while i < point_count - 2:
+                heat_pct = int(heat_path[value_index] / heat_range * 100.0)
+                if heat_pct != current_heat_pct:
+                    instructions += 2
+                    line_points = [path_points[i - 2], path_points[i - 1]]
+                    current_heat_pct = heat_pct
+                line_points.extend([path_points[i], path_points[i + 1]])
+                value_index += 1
+                i += 2
+        # start / finish, and each sector's image and rendered label
+        instructions += 4 + SECTOR_COUNT * 4
+        self.instructions = instructions
+
+
+class ProjectedTrackMap(object):
+    """
+    The projection and scaling of the current TrackMapView, with Lines
+    represented by their (start, end, points) runs
+    """
+
+    def __init__(self):
+        self.map_path = ProjectedPath([])
+        self.paths = {}
+        self.heat_values = {}
+        self.lines = {}
+
+    def set_track_points(self, geo_points):
+        self.map_path = ProjectedPath(geo_points)
+
+    def add_path(self, key, path):
+        self.paths[key] = ProjectedPath(path)
+
+    def update_map(self):
+        bounds = union_bounds([self.map_path.bounds] + [path.bounds for path in self.paths.itervalues()])
+        self.transform = MapTransform(bounds, (0, 0), (WIDTH, HEIGHT), PADDING)
+        self.scaled_map_points = self.transform.apply(self.map_path)
+        for key in self.paths.iterkeys():
+            self.scale_path(key)
+
+    def draw_path(self, key):
+        segments = heat_segments(self.heat_values[key], len(self.paths[key]), 0, 100.0)
+        self.lines[key] = [[start, end, None] for start, end, _ in segments]
+        self.scale_path(key)
+        return len(segments) * 2
+
+    def scale_path(self, key):
+        points = self.transform.apply(self.paths[key])
+        for line in self.lines.get(key, []):
+            line[2] = points[line[0] * 2:line[1] * 2]
+
+
+def make_lap(center, radius, point_count, phase):
+    path = []
+    for i in range(point_count):
+        angle = 2.0 * math.pi * i / point_count
+        wobble = 1.0 + 0.002 * math.sin(angle * 7 + phase)
+        path.append(GeoPoint.fromPoint(center[0] + radius * wobble * math.sin(angle),
+                                       center[1] + radius * 1.4 * wobble * math.cos(angle)))
+    return path
+
+
+def make_heat_values(point_count):
+    # a speed like channel: smooth, with sensor noise
+    return [50 + 45 * math.sin(2.0 * math.pi * 3 * i / point_count) + random.gauss(0, 0.5)
+            for i in range(point_count)]
+
+
+def main():
+    lap_count = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    point_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    random.seed(0)
+    center = (45.0, -122.0)
+    track_points = make_lap(center, 0.01, 600, 0)
+    laps = [make_lap(center, 0.01, point_count, lap) for lap in range(lap_count)]
+    heat_values = [make_heat_values(point_count) for lap in range(lap_count)]
+    print '{} heat mapped laps of {} points, {} point track map'.format(lap_count, point_count, len(track_points))
+
+    legacy = LegacyTrackMap()
+    legacy.set_track_points(track_points)
+    current = ProjectedTrackMap()
+    current.set_track_points(track_points)
+    for lap, (path, values) in enumerate(zip(laps, heat_values)):
+        legacy.add_path(lap, path)
+        legacy.heat_values[lap] = values
+        current.add_path(lap, path)
+        current.heat_values[lap] = values
+    current.update_map()
+    for lap in range(lap_count):
+        current.draw_path(lap)
+
+    repeat = 20
+    legacy_rescale = min(timeit.repeat(legacy.update_map, number=1, repeat=repeat))
+    legacy_instructions = legacy.instructions
+    current_rescale = min(timeit.repeat(current.update_map, number=1, repeat=repeat))
+    print 'rescale, previous:         {:7.2f} ms, {} canvas instructions created'.format(legacy_rescale * 1000, legacy_instructions)
+    print 'rescale, current:          {:7.2f} ms, 0 canvas instructions created'.format(current_rescale * 1000)
+
+    # the previous version redrew every lap when one lap's heat values were added
+    legacy_add = min(timeit.repeat(legacy.draw_current_map, number=1, repeat=repeat))
+    current_add = min(timeit.repeat(lambda: current.draw_path(0), number=1, repeat=repeat))
+    print 'add heat values, previous: {:7.2f} ms, {} canvas instructions created'.format(legacy_add * 1000, legacy.instructions)
+    print 'add heat values, current:  {:7.2f} ms, {} canvas instructions created'.format(current_add * 1000, current.draw_path(0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#
+# Race Capture App
+#
+# Copyright (C) 2014-2017 Autosport Labs
+#
+# This file is part of the Race Capture App
+#
+# This is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See the GNU General Public License for more details. You should
+# have received a copy of the GNU General Public License along with
+# this code. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Rebuilds the per-lap summary of every session in a datastore, for
+databases summarized before a change to the summarized channels.
+Databases holding sessions in column storage are opened with the
+ColumnarDataStore.
+
+Usage: python tools/rebuild_lap_summaries.py <datastore.sq3>
+"""
+
+import os
+import sys
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, ROOT_PATH)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from autosportlabs.racecapture.datastore.datastore import DataStore
+from autosportlabs.racecapture.datastore.columnstore import ColumnarDataStore
+
+
+def main():
+    if len(sys.argv) != 2:
+        print __doc__
+        sys.exit(1)
+
+    db_path = sys.argv[1]
+    datastore = ColumnarDataStore() if ColumnarDataStore.is_columnar_database(db_path) else DataStore()
+    datastore.open_db(db_path)
+    try:
+        def progress(pct):
+            sys.stdout.write('\r{}%'.format(pct))
+            sys.stdout.flush()
+
+        sessions = datastore.rebuild_lap_summaries(progress)
+        print '\nRebuilt the lap summaries of {} sessions'.format(sessions)
+    finally:
+        datastore.close()
+
+if __name__ == '__main__':
+    main()